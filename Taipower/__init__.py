@@ -1,12 +1,17 @@
 __author__ = "Allan Lin"
 __version__ = "0.0.5"
 
-import asyncio
 import sys
-import uuid
 
 
-DEVICE_ID = str(uuid.uuid4())
+def __getattr__(name):
+    # DEVICE_ID is generated on first access so that importing the package stays cheap.
+    if name == "DEVICE_ID":
+        import uuid
+        device_id = globals().setdefault("DEVICE_ID", str(uuid.uuid4()))
+        return device_id
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if sys.platform == "win32": # https://stackoverflow.com/questions/61543406/asyncio-run-runtimeerror-event-loop-is-closed
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
\ No newline at end of file
+    import asyncio
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
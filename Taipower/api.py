@@ -1,11 +1,31 @@
+from __future__ import annotations
+
 import time
 import datetime
-import asyncio
-import httpx
-from typing import Optional, List, Union, Dict
+import threading
+import zlib
+from dataclasses import asdict, replace
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional, List, Union, Dict
 
+from . import codec
 from . import connection
+from . import deadline
 from . import model
+from . import profiling
+from . import rollup
+from . import storage
+from .transport import TaipowerTransport
+
+if TYPE_CHECKING:
+    import httpx
+
+    from . import proxy, refresher
+
+STATE_VERSION = 1
+# Tokens are renewed this many seconds before they expire.
+REAUTH_MARGIN = 7200
+METER_DATA_FIELDS = ("ami", "ami_bill", "ami_unbilled", "bill_records")
 
 
 class TaipowerElectricMeter:
@@ -15,14 +35,24 @@ class TaipowerElectricMeter:
     ----------
     electric_meter_json : dict
         Electric meter json of a specific meter.
+    loader : Callable[[str, str], Awaitable], optional
+        Coroutine function called with the electric number and a field name to fetch a field on first access.
+        If None is given, fields stay None until they are assigned, by default None.
+
+    Notes
+    -----
+    Data fields are kept in an immutable `model.TaipowerMeterSnapshot` which is replaced as a whole on every
+    assignment or `publish`, so reads are lock-free. Read `snapshot` once to get several fields of the same refresh.
     """
 
-    def __init__(self, electric_meter_json) -> None:
+    def __init__(self, electric_meter_json, loader : Optional[Callable[[str, str], Awaitable[Any]]] = None) -> None:
         self._json : dict = electric_meter_json
-        self._ami : Optional[Dict[str, model.TaipowerAMI]] = None
-        self._ami_bill : Optional[model.TaipowerAMIBill] = None
-        self._ami_unbilled : Optional[model.TaipowerAMIUnbilled] = None
-        self._bill_records : Optional[Dict[str, model.TaipowerBillRecord]] = None
+        self._loader : Optional[Callable[[str, str], Awaitable[Any]]] = loader
+        self._snapshot : model.TaipowerMeterSnapshot = model.TaipowerMeterSnapshot()
+        # Fields the loader returned None for, which are not fetched again until they are assigned.
+        self._unavailable : set = set()
+        # Serializes writers only; readers take the current snapshot without locking.
+        self._write_lock : threading.Lock = threading.Lock()
     
     def __repr__(self) -> str:
         ret = (
@@ -40,7 +70,8 @@ class TaipowerElectricMeter:
     def from_electric_meter_list(
         cls,
         electric_meter_json : dict,
-        electric_numbers : Optional[Union[List[str], str]] = None
+        electric_numbers : Optional[Union[List[str], str]] = None,
+        loader : Optional[Callable[[str, str], Awaitable[Any]]] = None
     ) -> Dict[str, object]:
         """Use electric numbers to pick electric_meter_json accordingly.
 
@@ -50,6 +81,8 @@ class TaipowerElectricMeter:
             electric_meter_json retrieved from connection.GetMember.
         electric_numbers : Optional[Union[List[str], str]]
             Electric numbers. If None is given, all ami enabled meters will be included, by default None.
+        loader : Callable[[str, str], Awaitable], optional
+            Loader given to every meter, see TaipowerElectricMeter, by default None.
 
         Returns
         -------
@@ -66,44 +99,205 @@ class TaipowerElectricMeter:
             electric_number = meter["electricNumber"]
             ami = True if meter["ami"] == "true" else False
             if ami and (electric_numbers is None or electric_number in electric_numbers):
-                electric_meters[electric_number] = cls(meter)
+                electric_meters[electric_number] = cls(meter, loader=loader)
         
         assert electric_numbers is None or len(electric_numbers) == len(electric_meters), \
             "Some of electric_numbers are not available from the API."
         
         return electric_meters
     
+    def _loadable(self, field : str) -> bool:
+        # AMI of unverified meters is unavailable, see TaipowerAPI.refresh_status.
+        return (
+            getattr(self._snapshot, field) is None
+            and self._loader is not None
+            and field not in self._unavailable
+            and (field != "ami" or self.number_verified)
+        )
+
+    def _lazy_load(self, field : str) -> None:
+        if not self._loadable(field):
+            return
+        if profiling.in_event_loop():
+            raise RuntimeError(
+                f"`{field}` is not loaded and cannot be fetched from a running event loop, "
+                f"use `await meter.async_load(\"{field}\")` instead."
+            )
+        profiling.run(self.async_load(field))
+
+    async def async_load(self, field : str) -> Any:
+        """Asynchronously get a data field, fetching only this field of this meter if it is not loaded yet.
+
+        Parameters
+        ----------
+        field : str
+            `ami`, `ami_bill`, `ami_unbilled` or `bill_records`.
+
+        Returns
+        -------
+        Any
+            The field value. None if it is not loaded and the meter has no loader, or if it is unavailable,
+            in which case it is not fetched again until it is assigned.
+
+        Raises
+        ------
+        RuntimeError
+            If an error occurs when fetching, RuntimeError will be raised.
+        """
+
+        if field not in METER_DATA_FIELDS:
+            raise ValueError(f"field accepts either {', '.join(f'`{f}`' for f in METER_DATA_FIELDS)}.")
+
+        if self._loadable(field):
+            value = await self._loader(self.number, field)
+            if value is None:
+                self._unavailable.add(field)
+            else:
+                setattr(self, field, value)
+        return getattr(self._snapshot, field)
+
+    @property
+    def snapshot(self) -> model.TaipowerMeterSnapshot:
+        """The current data of the meter as one consistent, immutable snapshot. Nothing is fetched.
+
+        Returns
+        -------
+        model.TaipowerMeterSnapshot
+            Snapshot.
+        """
+
+        return self._snapshot
+
+    def publish(self, merge_ami : bool = False, ami_retention : Optional[float] = None, **fields) -> model.TaipowerMeterSnapshot:
+        """Replace several data fields at once with a single snapshot swap.
+
+        Parameters
+        ----------
+        merge_ami : bool, optional
+            Whether or not to merge `ami` into the loaded AMI, see `merge_ami`, instead of replacing it, by default False.
+        ami_retention : float, optional
+            Seconds of AMI kept when merging. AMI starting this long before the latest merged AMI are dropped.
+            If None is given, all AMI are kept, by default None.
+        **fields
+            New values keyed by `ami`, `ami_bill`, `ami_unbilled` or `bill_records`.
+
+        Returns
+        -------
+        model.TaipowerMeterSnapshot
+            The published snapshot.
+
+        Raises
+        ------
+        ValueError
+            If a field is unknown.
+        """
+
+        if any(field not in METER_DATA_FIELDS for field in fields):
+            raise ValueError(f"fields accept either {', '.join(f'`{f}`' for f in METER_DATA_FIELDS)}.")
+        ami = fields.get("ami")
+        if isinstance(ami, Mapping) and not isinstance(ami, model.TaipowerAMISeries):
+            fields["ami"] = ami = model.TaipowerAMISeries(ami)
+        bill_records = fields.get("bill_records")
+        if isinstance(bill_records, Mapping) and not isinstance(bill_records, model.TaipowerBillRecords):
+            fields["bill_records"] = model.TaipowerBillRecords(bill_records)
+
+        with self._write_lock:
+            self._unavailable.difference_update(fields)
+            snapshot = self._snapshot
+            if merge_ami and isinstance(snapshot.ami, model.TaipowerAMISeries) and isinstance(ami, Mapping):
+                if ami_retention is not None and len(ami) != 0:
+                    # Trimming bounds both the series and the copy made on every merge.
+                    cutoff = max(model.time_to_epoch(key) for key in ami) - int(ami_retention)
+                    series = snapshot.ami.slice(start=cutoff)
+                    series.merge({key: value for key, value in ami.items() if model.time_to_epoch(key) >= cutoff})
+                else:
+                    series = snapshot.ami.copy()
+                    series.merge(ami)
+                fields["ami"] = series
+            snapshot = replace(snapshot, version=snapshot.version + 1, published_at=time.time(), **fields)
+            self._snapshot = snapshot
+        return snapshot
+
     @property
-    def ami(self) -> Optional[Dict[str, model.TaipowerAMI]]:
-        return self._ami
+    def ami(self) -> Optional[model.TaipowerAMISeries]:
+        """AMI. Fetched on first access if the meter has a loader.
+
+        Returns
+        -------
+        Optional[model.TaipowerAMISeries]
+            AMI keyed by start time in time order. Assigned dicts are converted.
+        """
+
+        self._lazy_load("ami")
+        return self._snapshot.ami
     
     @ami.setter
     def ami(self, x : Dict[str, model.TaipowerAMI]):
-        self._ami = x
+        self.publish(ami=x)
     
+    def merge_ami(self, amis : Dict[str, model.TaipowerAMI]) -> None:
+        """Merge newly retrieved AMI into the loaded AMI without duplicates.
+
+        The loaded series is not modified in place; a merged copy replaces it.
+
+        Parameters
+        ----------
+        amis : Dict[str, model.TaipowerAMI]
+            AMI keyed by start time.
+        """
+
+        self.publish(merge_ami=True, ami=amis)
+
     @property
     def ami_bill(self) -> Optional[model.TaipowerAMIBill]:
-        return self._ami_bill
+        """AMI bill. Fetched on first access if the meter has a loader.
+
+        Returns
+        -------
+        Optional[model.TaipowerAMIBill]
+            AMI bill.
+        """
+
+        self._lazy_load("ami_bill")
+        return self._snapshot.ami_bill
     
     @ami_bill.setter
     def ami_bill(self, x : model.TaipowerAMIBill):
-        self._ami_bill = x
+        self.publish(ami_bill=x)
     
     @property
     def ami_unbilled(self) -> Optional[model.TaipowerAMIUnbilled]:
-        return self._ami_unbilled
+        """AMI unbilled. Fetched on first access if the meter has a loader.
+
+        Returns
+        -------
+        Optional[model.TaipowerAMIUnbilled]
+            AMI unbilled.
+        """
+
+        self._lazy_load("ami_unbilled")
+        return self._snapshot.ami_unbilled
     
     @ami_unbilled.setter
     def ami_unbilled(self, x : model.TaipowerAMIUnbilled):
-        self._ami_unbilled = x
+        self.publish(ami_unbilled=x)
     
     @property
-    def bill_records(self) -> Optional[Dict[str, model.TaipowerBillRecord]]:
-        return self._bill_records
+    def bill_records(self) -> Optional[model.TaipowerBillRecords]:
+        """Bill records. Fetched on first access if the meter has a loader.
+
+        Returns
+        -------
+        Optional[Dict[str, model.TaipowerBillRecord]]
+            Bill records keyed by issue year and month.
+        """
+
+        self._lazy_load("bill_records")
+        return self._snapshot.bill_records
     
     @bill_records.setter
     def bill_records(self, x : Dict[str, model.TaipowerBillRecord]):
-        self._bill_records = x
+        self.publish(bill_records=x)
 
     @property
     def user_id(self) -> str:
@@ -206,6 +400,26 @@ class TaipowerAPI:
         Maximum number of retries when setting status, by default 5.
     print_response : bool, optional
         If set, all responses of httpx and MQTT will be printed, by default False.
+    lazy : bool, optional
+        If set, nothing is fetched at login, and the first access to a data field of a meter
+        fetches only that field of that meter, by default False.
+    transport : httpx.AsyncBaseTransport, optional
+        Transport of every HTTP client, e.g. `cassette.TaipowerRecordTransport` or
+        `cassette.TaipowerReplayTransport`. If None is given, the default network transport of each client is used,
+        by default None. With `http2` or `transfer_stats` set, it is wrapped in a `transport.TaipowerTransport`,
+        unless it is one, and the wrapper is kept as `transport`.
+    proxies : str, list of str, dict of str to int or proxy.TaipowerProxyPool, optional
+        Proxy URLs, optionally mapped to weights, or a pool shared with other APIs. Requests are spread
+        over the proxies, see proxy.TaipowerProxyPool. Cannot be combined with `transport`, by default None.
+    http2 : bool, optional
+        Whether or not to negotiate HTTP/2 on the default network transport or through the proxies given as URLs,
+        multiplexing the concurrent requests of a refresh over one connection. Requires h2, by default False.
+    transfer_stats : bool, optional
+        Whether or not to count the bytes of the responses and the bytes compression saved,
+        see `transport.TaipowerTransport.stats`, by default False.
+    ami_retention : float, optional
+        Seconds of AMI kept by refreshes. If given, refreshed AMI are merged into the loaded AMI, and AMI starting
+        this long before the latest one are dropped. If None is given, refreshed AMI replace the loaded AMI, by default None.
     """
 
     def __init__(self, 
@@ -214,11 +428,25 @@ class TaipowerAPI:
         electric_numbers : Optional[Union[List[str], str]] = None,
         ami_period : str = "daily",
         max_retries : int = 5,
-        print_response : bool = False
+        print_response : bool = False,
+        lazy : bool = False,
+        transport : Optional[httpx.AsyncBaseTransport] = None,
+        proxies : Optional[Union[str, List[str], Dict[str, int], proxy.TaipowerProxyPool]] = None,
+        http2 : bool = False,
+        ami_retention : Optional[float] = None,
+        transfer_stats : bool = False,
     ) -> None:
 
         if ami_period not in ["quater", "hour", "daily", "monthly"]:
             raise ValueError("ami_period accepts either `quater`, `hour`, `daily` or `monthly`.")
+        if proxies is not None:
+            if transport is not None:
+                raise ValueError("Either transport or proxies can be given, but not both.")
+            from .proxy import TaipowerProxyPool
+
+            transport = proxies if isinstance(proxies, TaipowerProxyPool) else TaipowerProxyPool(proxies, http2=http2)
+        if (http2 or transfer_stats) and not isinstance(transport, TaipowerTransport):
+            transport = TaipowerTransport(transport, http2=http2)
 
         self.account : str = account
         self.password : str = password
@@ -226,9 +454,13 @@ class TaipowerAPI:
         self.ami_period : str = ami_period
         self.max_retries : int = max_retries
         self.print_response : bool = print_response
+        self.lazy : bool = lazy
+        self.ami_retention : Optional[float] = ami_retention
+        self.transport : Optional[httpx.AsyncBaseTransport] = transport
 
         self._meters : Dict[str, TaipowerElectricMeter] = {}
         self._taipower_tokens : Optional[connection.TaipowerTokens] = None
+        self._power_rates : Dict[str, dict] = {}
     
     @property
     def meters(self) -> Dict[str, TaipowerElectricMeter]:
@@ -242,41 +474,163 @@ class TaipowerAPI:
     
         return self._meters
     
-    def _check_before_publish(self) -> None:
-        # Reauthenticate 2 hours (7200 seconds), which is regarded as logged out, before TaipowerTokens expiration.
+    @property
+    def _loader(self) -> Optional[Callable[[str, str], Awaitable[Any]]]:
+        return self._async_load_field if self.lazy else None
+
+    async def _async_load_field(self, electric_number : str, field : str) -> Any:
+        getters = {
+            "ami": self.async_get_ami,
+            "ami_bill": self.async_get_ami_bill,
+            "ami_unbilled": self.async_get_ami_unbilled,
+            "bill_records": self.async_get_bill_records,
+        }
+        async with self._create_client() as client:
+            await self._async_check_before_publish(client=client)
+            return await getters[field](electric_number, client=client)
+
+    def _create_client(self) -> httpx.AsyncClient:
+        import httpx
+
+        return httpx.AsyncClient(transport=self.transport)
+
+    def _need_reauth(self) -> bool:
+        # Reauthenticate 2 hours (REAUTH_MARGIN), which is regarded as logged out, before TaipowerTokens expiration.
         current_time = time.time()
-        if self._taipower_tokens.expiration - current_time <= 7200:
+        return self._taipower_tokens.expiration - current_time <= REAUTH_MARGIN
+
+    def _check_before_publish(self) -> None:
+        if self._need_reauth():
             self.reauth()
-    
-    def login(self) -> None:
+
+    async def _async_check_before_publish(self, client : Optional[httpx.AsyncClient] = None) -> None:
+        if self._need_reauth():
+            await self.async_reauth(client=client)
+
+    def profile(self, profiler : Optional[str] = None, interval : float = 0.001) -> profiling.TaipowerProfile:
+        """Profile the API calls made within a `with` block.
+
+        Examples
+        --------
+        >>> with api.profile("sampling") as profile:
+        ...     api.refresh_status()
+        >>> print(profile.summary())
+        >>> profile.dump("refresh")
+
+        Parameters
+        ----------
+        profiler : str, optional
+            `cprofile`, `sampling` or None to only time the stages, see profiling.TaipowerProfile, by default None.
+        interval : float, optional
+            Seconds between samples of the `sampling` profiler, by default 0.001.
+
+        Returns
+        -------
+        profiling.TaipowerProfile
+            Profiling context.
+        """
+
+        return profiling.TaipowerProfile(profiler=profiler, interval=interval)
+
+    def start_token_refresher(
+        self,
+        ahead : float = 1800.0,
+        jitter : float = 600.0,
+        retry_interval : float = 60.0,
+    ) -> "refresher.TaipowerTokenRefresher":
+        """Renew tokens in a background thread before requests would have to, see refresher.TaipowerTokenRefresher.
+
+        Examples
+        --------
+        >>> with api.start_token_refresher():
+        ...     api.refresh_status()
+
+        Parameters
+        ----------
+        ahead : float, optional
+            Seconds before requests would reauthenticate at which tokens are renewed, by default 1800.
+        jitter : float, optional
+            Maximum random seconds renewals are moved earlier by, by default 600.
+        retry_interval : float, optional
+            Seconds between attempts after a failed renewal, by default 60.
+
+        Returns
+        -------
+        refresher.TaipowerTokenRefresher
+            Started refresher. Stop it with `stop` or a `with` block.
+        """
+
+        from .refresher import TaipowerTokenRefresher
+
+        token_refresher = TaipowerTokenRefresher(self, ahead=ahead, jitter=jitter, retry_interval=retry_interval)
+        token_refresher.start()
+        return token_refresher
+
+    def login(self, fetch_data : bool = True) -> None:
         """Login API.
 
+        Parameters
+        ----------
+        fetch_data : bool, optional
+            Whether or not to refresh the data of all meters right after they are discovered.
+            If False, no data is fetched until `refresh_status` is called. Ignored in lazy mode, by default True.
+
         Raises
         ------
         RuntimeError
             If a login error occurs, RuntimeError will be raised.
         """
 
-        conn = connection.GetMember(
-            account=self.account,
-            password=self.password,
-            print_response=self.print_response,
-        )
-        self._taipower_tokens = conn._taipower_tokens
-        conn_status, conn_json = asyncio.run(conn.async_get_data())
+        profiling.run(self.async_login(fetch_data=fetch_data))
 
-        if conn_status == "OK":
-            self._meters = TaipowerElectricMeter.from_electric_meter_list(
-                conn_json,
-                self.electric_numbers
+    async def async_login(self, fetch_data : bool = True) -> None:
+        """Asynchronously login API.
+
+        Authentication, meter discovery and the first refresh share one event loop and one connection pool,
+        and the data requests of every meter are issued as soon as the meter list arrives.
+
+        Parameters
+        ----------
+        fetch_data : bool, optional
+            Whether or not to refresh the data of all meters right after they are discovered.
+            If False, no data is fetched until `refresh_status` is called. Ignored in lazy mode, by default True.
+
+        Raises
+        ------
+        RuntimeError
+            If a login error occurs, RuntimeError will be raised.
+        """
+
+        async with self._create_client() as client:
+            conn = connection.GetMember(
+                account=self.account,
+                password=self.password,
+                print_response=self.print_response,
+                transport=self.transport,
+                auto_login=False,
             )
-        else:
-            raise RuntimeError(f"An error occurred when retrieving electric meters: {conn_status}")
-        
-        try:
-            self.refresh_status() # suppress errors when login
-        except:
-            pass
+            conn_status, taipower_tokens = await conn.async_login(client=client)
+            if conn_status != "OK":
+                raise RuntimeError(f"An error occurred when signing into Taipower API: {conn_status}")
+            conn._taipower_tokens = self._taipower_tokens = taipower_tokens
+
+            conn_status, conn_json = await conn.async_get_data(client=client)
+
+            if conn_status == "OK":
+                with profiling.span("build"):
+                    self._meters = TaipowerElectricMeter.from_electric_meter_list(
+                        conn_json,
+                        self.electric_numbers,
+                        loader=self._loader,
+                    )
+            else:
+                raise RuntimeError(f"An error occurred when retrieving electric meters: {conn_status}")
+
+            if fetch_data and not self.lazy:
+                try:
+                    await self.async_refresh_status(client=client) # suppress errors when login
+                except:
+                    pass
 
     def reauth(self, use_refresh_token : bool = False) -> None:
         """Reauthenticate with Taipower API to retrieve new tokens.
@@ -297,12 +651,164 @@ class TaipowerAPI:
             password=self.password,
             taipower_tokens=self._taipower_tokens,
             print_response=self.print_response,
+            transport=self.transport,
+            auto_login=False,
         )
-        conn_status, self._taipower_tokens = conn.login(use_refresh_token=use_refresh_token)
+        conn_status, taipower_tokens = conn.login(use_refresh_token=use_refresh_token)
         if conn_status != "OK":
             raise RuntimeError(f"An error occurred when reauthenticating with Taipower API: {conn_status}")
+        # Replaced in one assignment, so that concurrent requests see either the old or the new tokens.
+        self._taipower_tokens = taipower_tokens
+
+    async def async_reauth(self, use_refresh_token : bool = False, client : Optional[httpx.AsyncClient] = None) -> None:
+        """Asynchronously reauthenticate with Taipower API to retrieve new tokens.
+
+        Parameters
+        ----------
+        use_refresh_token : bool, optional
+            Whether or not to use refresh token, by default False
+        client : httpx.AsyncClient, optional
+            AsyncClient for requests, by default None
+
+        Raises
+        ------
+        RuntimeError
+            If an error occurs, RuntimeError will be raised.
+        """
+
+        conn = connection.TaipowerConnection(
+            account=self.account,
+            password=self.password,
+            taipower_tokens=self._taipower_tokens,
+            print_response=self.print_response,
+            transport=self.transport,
+            auto_login=False,
+        )
+        conn_status, taipower_tokens = await conn.async_login(use_refresh_token=use_refresh_token, client=client)
+        if conn_status != "OK":
+            raise RuntimeError(f"An error occurred when reauthenticating with Taipower API: {conn_status}")
+        self._taipower_tokens = taipower_tokens
     
-    def get_ami(self, electric_number : str, dt: datetime.datetime = None) -> Dict[str, model.TaipowerAMI]:
+    def save_state(self, include_ami : bool = True) -> bytes:
+        """Serialize tokens, meters and the last-fetched data into a compact snapshot.
+
+        Parameters
+        ----------
+        include_ami : bool, optional
+            Whether or not to include AMI. AMI kept in a `storage.TaipowerAMIStore` by `save_ami`
+            need not be included, by default True.
+
+        Returns
+        -------
+        bytes
+            Versioned, zlib compressed JSON snapshot, which can be restored by `load_state`.
+        """
+
+        def values_json(values):
+            return None if values is None else [value._json for value in values.values()]
+
+        meters = []
+        for meter in self._meters.values():
+            snapshot = meter.snapshot
+            meters.append({
+                "meter": meter._json,
+                "ami": values_json(snapshot.ami) if include_ami else None,
+                "ami_bill": None if snapshot.ami_bill is None else snapshot.ami_bill._json,
+                "ami_unbilled": None if snapshot.ami_unbilled is None else snapshot.ami_unbilled._json,
+                "bill_records": values_json(snapshot.bill_records),
+            })
+
+        state = {
+            "version": STATE_VERSION,
+            "saved_at": time.time(),
+            "account": self.account,
+            "ami_period": self.ami_period,
+            "tokens": None if self._taipower_tokens is None else asdict(self._taipower_tokens),
+            "meters": meters,
+        }
+        return zlib.compress(codec.dumps(state))
+
+    def load_state(self, state : bytes) -> None:
+        """Resume from a snapshot created by `save_state` without any network call.
+
+        Tokens are checked as usual on the next refresh, so a reauthentication only happens
+        when the restored tokens are about to expire.
+
+        Parameters
+        ----------
+        state : bytes
+            Snapshot created by `save_state`.
+
+        Raises
+        ------
+        ValueError
+            If the snapshot version is unsupported or the snapshot belongs to another account.
+        """
+
+        state = codec.loads(zlib.decompress(state))
+
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported state version: {state.get('version')}, expected {STATE_VERSION}.")
+        if state["account"] != self.account:
+            raise ValueError("The state belongs to another account.")
+
+        meters = {}
+        for meter_state in state["meters"]:
+            meter = TaipowerElectricMeter(meter_state["meter"], loader=self._loader)
+            fields = {}
+            # AMI retrieved with another period cannot be mixed with the configured one.
+            if meter_state["ami"] is not None and state["ami_period"] == self.ami_period:
+                fields["ami"] = model.TaipowerAMI.from_amis({"data": {"data": meter_state["ami"]}})
+            if meter_state["ami_bill"] is not None:
+                fields["ami_bill"] = model.TaipowerAMIBill(meter_state["ami_bill"])
+            if meter_state["ami_unbilled"] is not None:
+                fields["ami_unbilled"] = model.TaipowerAMIUnbilled(meter_state["ami_unbilled"])
+            if meter_state["bill_records"] is not None:
+                fields["bill_records"] = model.TaipowerBillRecord.from_bill_records({"data": meter_state["bill_records"]})
+            meter.publish(**fields)
+            meters[meter.number] = meter
+
+        self._taipower_tokens = None if state["tokens"] is None else connection.TaipowerTokens(**state["tokens"])
+        self._meters = meters
+
+    def save_ami(self, store : storage.TaipowerAMIStore) -> None:
+        """Write the loaded AMI of every meter to a store of compact binary files.
+
+        Parameters
+        ----------
+        store : storage.TaipowerAMIStore
+            AMI store.
+        """
+
+        for meter in self._meters.values():
+            ami = meter.snapshot.ami
+            if ami is not None:
+                store.write(meter.number, self.ami_period, ami)
+
+    def load_ami(
+        self,
+        store : storage.TaipowerAMIStore,
+        start : Optional[datetime.datetime] = None,
+        end : Optional[datetime.datetime] = None,
+    ) -> None:
+        """Merge AMI of the configured period from a store into the meters without any network call.
+
+        Parameters
+        ----------
+        store : storage.TaipowerAMIStore
+            AMI store.
+        start : datetime.datetime, optional
+            Start of the loaded range, inclusive. If None is given, the range is unbounded, by default None.
+        end : datetime.datetime, optional
+            End of the loaded range, exclusive. If None is given, the range is unbounded, by default None.
+        """
+
+        for meter in self._meters.values():
+            amis = store.load(meter.number, self.ami_period, start, end)
+            if len(amis) != 0:
+                meter.merge_ami(amis)
+
+    def get_ami(self, electric_number : str, dt: datetime.datetime = None, ami_period : Optional[str] = None) -> Dict[str, model.TaipowerAMI]:
         """Get AMI.
 
         Parameters
@@ -311,6 +817,8 @@ class TaipowerAPI:
             Electric number.
         dt : datetime.datetime, optional
             The retrieved AMI date and time, by default None
+        ami_period : str, optional
+            The retrieved AMI period. If None is given, `ami_period` of the API is used, by default None
 
         Returns
         -------
@@ -323,9 +831,9 @@ class TaipowerAPI:
             If an error occurs, RuntimeError will be raised.
         """
 
-        return asyncio.run(self.async_get_ami(electric_number, dt))
+        return profiling.run(self.async_get_ami(electric_number, dt, ami_period=ami_period))
 
-    async def async_get_ami(self, electric_number : str, dt: Optional[datetime.datetime] = None, client : Optional[httpx.AsyncClient] = None) -> Dict[str, model.TaipowerAMI]:
+    async def async_get_ami(self, electric_number : str, dt: Optional[datetime.datetime] = None, client : Optional[httpx.AsyncClient] = None, ami_period : Optional[str] = None) -> Dict[str, model.TaipowerAMI]:
         """Asynchronously get AMI.
 
         Parameters
@@ -336,6 +844,8 @@ class TaipowerAPI:
             The retrieved AMI date and time. If None is given, current date and time will be used, by default None
         client : httpx.AsyncClient, optional
             AsyncClient for requests, by default None
+        ami_period : str, optional
+            The retrieved AMI period. If None is given, `ami_period` of the API is used, by default None
 
         Returns
         -------
@@ -356,13 +866,242 @@ class TaipowerAPI:
             password=self.password,
             taipower_tokens=self._taipower_tokens,
             print_response=self.print_response,
+            transport=self.transport,
         )
-        conn_status, conn_json = await conn.async_get_data(self.ami_period, dt, electric_number, client=client)
+        conn_status, conn_json = await conn.async_get_data(ami_period or self.ami_period, dt, electric_number, client=client)
         if conn_status == "OK":
-            return model.TaipowerAMI.from_amis(conn_json)
+            with profiling.span("build"):
+                return model.TaipowerAMI.from_amis(conn_json)
         else:
             raise RuntimeError(f"An error occurred when retrieving AMI: {conn_status}")
 
+    def get_ami_range(
+        self,
+        electric_number : str,
+        start : datetime.datetime,
+        end : datetime.datetime,
+        ami_period : Optional[str] = None,
+        budget : Optional[float] = None,
+    ) -> Dict[str, model.TaipowerAMI]:
+        """Get AMI within a time range.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        start : datetime.datetime
+            Start of the range, inclusive.
+        end : datetime.datetime
+            End of the range, exclusive.
+        ami_period : str, optional
+            The retrieved AMI period. If None is given, `ami_period` of the API is used, by default None
+        budget : float, optional
+            Seconds the whole range may take. Request timeouts are bounded by the remaining budget.
+            If None is given, the range is unbounded, by default None
+
+        Returns
+        -------
+        Dict[str, model.TaipowerAMI]
+            AMI keyed by start time.
+
+        Raises
+        ------
+        deadline.TaipowerDeadlineExceeded
+            If the budget runs out. The AMI retrieved so far is in `result` and the cancelled request times in `cancelled`.
+        RuntimeError
+            If errors occur, a RuntimeError containing all errors will be raised.
+        """
+
+        return profiling.run(self.async_get_ami_range(electric_number, start, end, ami_period=ami_period, budget=budget))
+
+    async def async_get_ami_range(
+        self,
+        electric_number : str,
+        start : datetime.datetime,
+        end : datetime.datetime,
+        ami_period : Optional[str] = None,
+        client : Optional[httpx.AsyncClient] = None,
+        budget : Optional[float] = None,
+    ) -> Dict[str, model.TaipowerAMI]:
+        """Asynchronously get AMI within a time range. All underlying requests are issued concurrently.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        start : datetime.datetime
+            Start of the range, inclusive.
+        end : datetime.datetime
+            End of the range, exclusive.
+        ami_period : str, optional
+            The retrieved AMI period. If None is given, `ami_period` of the API is used, by default None
+        client : httpx.AsyncClient, optional
+            AsyncClient for requests, by default None
+        budget : float, optional
+            Seconds the whole range may take. Request timeouts are bounded by the remaining budget.
+            If None is given, only the budget of the caller, if any, applies, by default None
+
+        Returns
+        -------
+        Dict[str, model.TaipowerAMI]
+            AMI keyed by start time.
+
+        Raises
+        ------
+        deadline.TaipowerDeadlineExceeded
+            If the budget runs out. The AMI retrieved so far is in `result` and the cancelled request times in `cancelled`.
+        RuntimeError
+            If errors occur, a RuntimeError containing all errors will be raised.
+        """
+
+        ami_period = ami_period or self.ami_period
+
+        # One request covers a day for `quater` and `hour`, a month for `daily` and a year for `monthly`.
+        request_dts = []
+        dt = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while dt < end:
+            request_dts.append(dt)
+            if ami_period in ["quater", "hour"]:
+                dt += datetime.timedelta(days=1)
+            elif ami_period == "daily":
+                dt = (dt.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+            else:
+                dt = dt.replace(year=dt.year + 1, month=1, day=1)
+
+        with deadline.scope(budget):
+            return await self._async_get_ami_dts(electric_number, request_dts, start, end, ami_period, client)
+
+    async def _async_get_ami_dts(
+        self,
+        electric_number : str,
+        request_dts : List[datetime.datetime],
+        start : datetime.datetime,
+        end : datetime.datetime,
+        ami_period : str,
+        client : Optional[httpx.AsyncClient],
+    ) -> Dict[str, model.TaipowerAMI]:
+        if client is None:
+            async with self._create_client() as client:
+                return await self._async_get_ami_dts(electric_number, request_dts, start, end, ami_period, client)
+
+        await self._async_check_before_publish(client=client)
+
+        results, cancelled = await deadline.gather(
+            [self.async_get_ami(electric_number, dt, client=client, ami_period=ami_period) for dt in request_dts],
+            request_dts,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+
+        start_time = start.strftime("%Y%m%d%H%M%S")
+        end_time = end.strftime("%Y%m%d%H%M%S")
+        amis = {}
+        for result in results:
+            if result is None or isinstance(result, Exception):
+                continue
+            for key, ami in result.items():
+                if start_time <= ami.start_time < end_time:
+                    amis[key] = ami
+
+        if len(cancelled) != 0:
+            cancelled_dts = set(cancelled)
+            raise deadline.TaipowerDeadlineExceeded(
+                f"The budget ran out with {len(cancelled)} of {len(request_dts)} AMI requests of {electric_number} outstanding.",
+                completed=[dt for dt in request_dts if dt not in cancelled_dts],
+                cancelled=cancelled,
+                errors=errors,
+                result=amis,
+            )
+        if len(errors) != 0:
+            raise RuntimeError(errors)
+        return amis
+
+    def get_ami_rollup(
+        self,
+        electric_number : str,
+        start : datetime.date,
+        end : datetime.date,
+        ami_rollup : Optional[rollup.TaipowerAMIRollup] = None,
+    ) -> rollup.TaipowerAMIRollup:
+        """Get hourly, daily and monthly AMI derived locally from quarter-hour AMI.
+
+        Only the dates whose quarter-hour AMI is missing or incomplete in `ami_rollup` are retrieved.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        start : datetime.date
+            First date, inclusive.
+        end : datetime.date
+            Last date, inclusive.
+        ami_rollup : rollup.TaipowerAMIRollup, optional
+            Rollup to be updated. If None is given, a new one is created, by default None
+
+        Returns
+        -------
+        rollup.TaipowerAMIRollup
+            The updated rollup.
+
+        Raises
+        ------
+        RuntimeError
+            If errors occur, a RuntimeError containing all errors will be raised.
+        """
+
+        return profiling.run(self.async_get_ami_rollup(electric_number, start, end, ami_rollup=ami_rollup))
+
+    async def async_get_ami_rollup(
+        self,
+        electric_number : str,
+        start : datetime.date,
+        end : datetime.date,
+        ami_rollup : Optional[rollup.TaipowerAMIRollup] = None,
+        client : Optional[httpx.AsyncClient] = None,
+    ) -> rollup.TaipowerAMIRollup:
+        """Asynchronously get hourly, daily and monthly AMI derived locally from quarter-hour AMI.
+
+        Only the dates whose quarter-hour AMI is missing or incomplete in `ami_rollup` are retrieved.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        start : datetime.date
+            First date, inclusive.
+        end : datetime.date
+            Last date, inclusive.
+        ami_rollup : rollup.TaipowerAMIRollup, optional
+            Rollup to be updated. If None is given, a new one is created, by default None
+        client : httpx.AsyncClient, optional
+            AsyncClient for requests, by default None
+
+        Returns
+        -------
+        rollup.TaipowerAMIRollup
+            The updated rollup.
+
+        Raises
+        ------
+        RuntimeError
+            If errors occur, a RuntimeError containing all errors will be raised.
+        """
+
+        if ami_rollup is None:
+            ami_rollup = rollup.TaipowerAMIRollup()
+
+        dates = ami_rollup.missing_dates(start, end)
+        if len(dates) != 0:
+            amis = await self._async_get_ami_dts(
+                electric_number,
+                [datetime.datetime.combine(date, datetime.time()) for date in dates],
+                datetime.datetime.combine(start, datetime.time()),
+                datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time()),
+                "quater",
+                client,
+            )
+            ami_rollup.add(amis.values())
+        return ami_rollup
+
     def get_ami_bill(self, electric_number : str) -> model.TaipowerAMIBill:
         """Get AMI bill.
 
@@ -382,7 +1121,7 @@ class TaipowerAPI:
             If an error occurs, RuntimeError will be raised.
         """
 
-        return asyncio.run(self.async_get_ami_bill(electric_number))
+        return profiling.run(self.async_get_ami_bill(electric_number))
 
     async def async_get_ami_bill(self, electric_number : str, client : httpx.AsyncClient = None) -> model.TaipowerAMIBill:
         """Asynchronously get AMI bill.
@@ -410,11 +1149,13 @@ class TaipowerAPI:
             password=self.password,
             taipower_tokens=self._taipower_tokens,
             print_response=self.print_response,
+            transport=self.transport,
         )
         conn_status, conn_json = await conn.async_get_data(electric_number, client=client)
 
         if conn_status == "OK":
-            return model.TaipowerAMIBill(conn_json["data"])
+            with profiling.span("build"):
+                return model.TaipowerAMIBill(conn_json["data"])
         else:
             raise RuntimeError(f"An error occurred when retrieving AMI bill: {conn_status}")
 
@@ -437,7 +1178,7 @@ class TaipowerAPI:
             If an error occurs, RuntimeError will be raised.
         """
 
-        return asyncio.run(self.async_get_ami_unbilled(electric_number))
+        return profiling.run(self.async_get_ami_unbilled(electric_number))
 
     async def async_get_ami_unbilled(self, electric_number : str, client : httpx.AsyncClient = None) -> model.TaipowerAMIUnbilled:
         """Asynchronously get AMI unbilled.
@@ -465,15 +1206,81 @@ class TaipowerAPI:
             password=self.password,
             taipower_tokens=self._taipower_tokens,
             print_response=self.print_response,
+            transport=self.transport,
         )
         conn_status, conn_json = await conn.async_get_data(electric_number, client=client)
 
         if conn_status == "OK":
-            return model.TaipowerAMIUnbilled(conn_json["data"])
+            with profiling.span("build"):
+                return model.TaipowerAMIUnbilled(conn_json["data"])
         else:
             raise RuntimeError(f"An error occurred when retrieving AMI unbilled: {conn_status}")
 
-    def get_bill_records(self, electric_number : int) -> Dict[str, model.TaipowerBillRecord]:
+    def get_ami_power_rate(self, electric_number : str, use_cache : bool = True) -> dict:
+        """Get the power rate trial of Taipower, cached per meter, e.g. to cross-check a local tariff.TaipowerTariff estimate.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        use_cache : bool, optional
+            Whether or not to return the cached response if any, by default True
+
+        Returns
+        -------
+        dict
+            The `data` of the response.
+
+        Raises
+        ------
+        RuntimeError
+            If an error occurs, RuntimeError will be raised.
+        """
+
+        return profiling.run(self.async_get_ami_power_rate(electric_number, use_cache=use_cache))
+
+    async def async_get_ami_power_rate(self, electric_number : str, use_cache : bool = True, client : httpx.AsyncClient = None) -> dict:
+        """Asynchronously get the power rate trial of Taipower, cached per meter.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        use_cache : bool, optional
+            Whether or not to return the cached response if any, by default True
+        client : httpx.AsyncClient, optional
+            AsyncClient for requests, by default None
+
+        Returns
+        -------
+        dict
+            The `data` of the response.
+
+        Raises
+        ------
+        RuntimeError
+            If an error occurs, RuntimeError will be raised.
+        """
+
+        if use_cache and electric_number in self._power_rates:
+            return self._power_rates[electric_number]
+
+        conn = connection.GetAMIPowerRate(
+            account=self.account,
+            password=self.password,
+            taipower_tokens=self._taipower_tokens,
+            print_response=self.print_response,
+            transport=self.transport,
+        )
+        conn_status, conn_json = await conn.async_get_data(electric_number, client=client)
+
+        if conn_status == "OK":
+            self._power_rates[electric_number] = conn_json["data"]
+            return conn_json["data"]
+        else:
+            raise RuntimeError(f"An error occurred when retrieving AMI power rate: {conn_status}")
+
+    def get_bill_records(self, electric_number : int) -> model.TaipowerBillRecords:
         """Get bill records.
 
         Parameters
@@ -492,9 +1299,9 @@ class TaipowerAPI:
             If an error occurs, RuntimeError will be raised.
         """
         
-        return asyncio.run(self.async_get_bill_records(electric_number))
+        return profiling.run(self.async_get_bill_records(electric_number))
 
-    async def async_get_bill_records(self, electric_number : int, client : httpx.AsyncClient = None) -> Dict[str, model.TaipowerBillRecord]:
+    async def async_get_bill_records(self, electric_number : int, client : httpx.AsyncClient = None) -> model.TaipowerBillRecords:
         """Asynchronously get bill records.
 
         Parameters
@@ -520,11 +1327,13 @@ class TaipowerAPI:
             password=self.password,
             taipower_tokens=self._taipower_tokens,
             print_response=self.print_response,
+            transport=self.transport,
         )
         conn_status, conn_json = await conn.async_get_data(electric_number, client=client)
 
         if conn_status == "OK":
-            return model.TaipowerBillRecord.from_bill_records(conn_json)
+            with profiling.span("build"):
+                return model.TaipowerBillRecord.from_bill_records(conn_json)
         else:
             raise RuntimeError(f"An error occurred when retrieving bill records: {conn_status}")
 
@@ -534,6 +1343,7 @@ class TaipowerAPI:
         refresh_ami_bill : bool = True,
         refresh_ami_unbilled : bool = True,
         refresh_bill_records : bool = True,
+        budget : Optional[float] = None,
     ):
         """Refresh status from Taipower API.
 
@@ -549,19 +1359,101 @@ class TaipowerAPI:
             Whether or not to refresh AMI unbilled, by default True
         refresh_bill_records : bool, optional
             Whether or not to refresh bill records, by default True
+        budget : float, optional
+            Seconds the whole refresh may take. Request timeouts are bounded by the remaining budget.
+            If None is given, the refresh is unbounded, by default None
+
+        Notes
+        -----
+        Refreshed AMI replace the loaded AMI, unless the API has an `ami_retention`, in which case they are merged
+        into the loaded AMI and AMI older than the retention are dropped.
 
         Raise
         -------
+        deadline.TaipowerDeadlineExceeded
+            If the budget runs out. Completed fields are published, and the cancelled
+            (electric number, field) pairs are in `cancelled`.
         RuntimeError
             If errors occur, a RuntimeError containing all errors will be raised.
         """
 
-        self._check_before_publish()
-        
-        async def run(l):
-            return await asyncio.gather(*l, return_exceptions=True)
+        profiling.run(
+            self.async_refresh_status(
+                electric_number,
+                refresh_ami=refresh_ami,
+                refresh_ami_bill=refresh_ami_bill,
+                refresh_ami_unbilled=refresh_ami_unbilled,
+                refresh_bill_records=refresh_bill_records,
+                budget=budget,
+            )
+        )
+
+    async def async_refresh_status(self, 
+        electric_number : str = None,
+        refresh_ami : bool = True,
+        refresh_ami_bill : bool = True,
+        refresh_ami_unbilled : bool = True,
+        refresh_bill_records : bool = True,
+        client : Optional[httpx.AsyncClient] = None,
+        budget : Optional[float] = None,
+    ):
+        """Asynchronously refresh status from Taipower API.
+
+        Parameters
+        ----------
+        electric_number : str, optional
+            Electric number. If None is given, all meters will be refreshed, by default None.
+        refresh_ami : bool, optional
+            Whether or not to refresh AMI, by default True
+        refresh_ami_bill : bool, optional
+            Whether or not to refresh AMI bill, by default True
+        refresh_ami_unbilled : bool, optional
+            Whether or not to refresh AMI unbilled, by default True
+        refresh_bill_records : bool, optional
+            Whether or not to refresh bill records, by default True
+        client : httpx.AsyncClient, optional
+            AsyncClient for requests. If None is given, a client is created for this refresh, by default None
+        budget : float, optional
+            Seconds the whole refresh may take. Request timeouts are bounded by the remaining budget.
+            If None is given, only the budget of the caller, if any, applies, by default None
+
+        Notes
+        -----
+        AMI are replaced or merged, see `refresh_status`.
+
+        Raise
+        -------
+        deadline.TaipowerDeadlineExceeded
+            If the budget runs out. Completed fields are published, and the cancelled
+            (electric number, field) pairs are in `cancelled`.
+        RuntimeError
+            If errors occur, a RuntimeError containing all errors will be raised.
+        """
+
+        if budget is not None:
+            with deadline.scope(budget):
+                return await self.async_refresh_status(
+                    electric_number,
+                    refresh_ami=refresh_ami,
+                    refresh_ami_bill=refresh_ami_bill,
+                    refresh_ami_unbilled=refresh_ami_unbilled,
+                    refresh_bill_records=refresh_bill_records,
+                    client=client,
+                )
+
+        if client is None:
+            async with self._create_client() as client:
+                return await self.async_refresh_status(
+                    electric_number,
+                    refresh_ami=refresh_ami,
+                    refresh_ami_bill=refresh_ami_bill,
+                    refresh_ami_unbilled=refresh_ami_unbilled,
+                    refresh_bill_records=refresh_bill_records,
+                    client=client,
+                )
+
+        await self._async_check_before_publish(client=client)
 
-        client = httpx.AsyncClient()
         async_functions = []
         return_storage = []
         errors = []
@@ -582,13 +1474,26 @@ class TaipowerAPI:
                 async_functions.append(self.async_get_bill_records(number, client=client))
                 return_storage.append((meter, "bill_records"))
 
-        list(
-            map(
-                lambda x, y: setattr(y[0], y[1], x) if not isinstance(x, Exception) else errors.append(x),
-                asyncio.run(run(async_functions)),
-                return_storage
+        labels = [(meter.number, field) for meter, field in return_storage]
+        results, cancelled = await deadline.gather(async_functions, labels)
+        cancelled_labels = set(cancelled)
+        with profiling.span("assign"):
+            # Every meter publishes all of its refreshed fields with one snapshot swap.
+            updates = {}
+            for result, label, (meter, field) in zip(results, labels, return_storage):
+                if isinstance(result, Exception):
+                    errors.append(result)
+                elif label not in cancelled_labels:
+                    updates.setdefault(meter, {})[field] = result
+            for meter, fields in updates.items():
+                meter.publish(merge_ami=self.ami_retention is not None, ami_retention=self.ami_retention, **fields)
+
+        if len(cancelled) != 0:
+            raise deadline.TaipowerDeadlineExceeded(
+                f"The budget ran out with {len(cancelled)} of {len(labels)} requests outstanding.",
+                completed=[label for label in labels if label not in cancelled_labels],
+                cancelled=cancelled,
+                errors=errors,
             )
-        )
-
         if len(errors) != 0:
-            raise RuntimeError(errors)
\ No newline at end of file
+            raise RuntimeError(errors)
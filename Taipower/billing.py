@@ -0,0 +1,244 @@
+import bisect
+import datetime
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from .model import TaipowerAMI, TaipowerAMIBill, TaipowerAMIUnbilled, TaipowerBillRecord
+from .utility import roc_date_to_date
+
+
+@dataclass(frozen=True)
+class TaipowerBillingCycle:
+    """A billing cycle.
+
+    Parameters
+    ----------
+    start : datetime.date
+        First date, inclusive.
+    end : datetime.date
+        Last date, inclusive.
+    source : str
+        `bill_record`, `ami_bill` or `ami_unbilled`.
+    key : str
+        Bill records key (issue year and month) for `bill_record`, otherwise the source.
+    kwh : Optional[float]
+        The billed kwh, if known.
+    """
+
+    start : datetime.date
+    end : datetime.date
+    source : str
+    key : str
+    kwh : Optional[float] = None
+
+
+@dataclass(frozen=True)
+class TaipowerReconciliation:
+    """The result of reconciling AMI with a billing cycle.
+
+    Parameters
+    ----------
+    cycle : TaipowerBillingCycle
+        Billing cycle.
+    ami_kwh : float
+        The summed kwh of the AMI assigned to the cycle.
+    readings : int
+        The number of AMI readings assigned to the cycle.
+    matched : bool
+        Whether or not `ami_kwh` is within tolerance of the billed kwh.
+    """
+
+    cycle : TaipowerBillingCycle
+    ami_kwh : float
+    readings : int
+    matched : bool
+
+    @property
+    def difference(self) -> float:
+        """AMI kwh minus billed kwh.
+
+        Returns
+        -------
+        float
+            Difference.
+        """
+
+        return self.ami_kwh - self.cycle.kwh
+
+
+class TaipowerBillingCycleIndex:
+    """Sorted index of the billing cycles of a meter, assigning AMI readings to cycles by binary search.
+
+    When cycles overlap, bill records take precedence over the AMI bill, which takes precedence over the unbilled data.
+
+    Parameters
+    ----------
+    bill_records : Dict[str, TaipowerBillRecord], optional
+        Bill records, by default None.
+    ami_bill : TaipowerAMIBill, optional
+        AMI bill, by default None.
+    ami_unbilled : TaipowerAMIUnbilled, optional
+        AMI unbilled data, by default None.
+    """
+
+    def __init__(
+        self,
+        bill_records : Optional[Dict[str, TaipowerBillRecord]] = None,
+        ami_bill : Optional[TaipowerAMIBill] = None,
+        ami_unbilled : Optional[TaipowerAMIUnbilled] = None,
+    ) -> None:
+        candidates = []
+        for key, record in (bill_records or {}).items():
+            start_text, end_text = record.period.split("~")
+            candidates.append(TaipowerBillingCycle(
+                roc_date_to_date(start_text), roc_date_to_date(end_text), "bill_record", key, float(record.kwh)
+            ))
+        if ami_bill is not None:
+            candidates.append(TaipowerBillingCycle(
+                ami_bill.start_date,
+                ami_bill.end_date,
+                "ami_bill",
+                "ami_bill",
+                float(ami_bill.kwh) if ami_bill.kwh >= 0 else None,
+            ))
+        if ami_unbilled is not None:
+            candidates.append(TaipowerBillingCycle(
+                ami_unbilled.start_date,
+                ami_unbilled.end_date,
+                "ami_unbilled",
+                "ami_unbilled",
+                ami_unbilled.kwh,
+            ))
+
+        self._cycles : List[TaipowerBillingCycle] = []
+        for cycle in candidates:
+            if not any(cycle.start <= other.end and other.start <= cycle.end for other in self._cycles):
+                self._cycles.append(cycle)
+        self._cycles.sort(key=lambda cycle: cycle.start)
+        self._starts : List[int] = [cycle.start.toordinal() for cycle in self._cycles]
+        self._ends : List[int] = [cycle.end.toordinal() for cycle in self._cycles]
+
+    @classmethod
+    def from_meter(cls, meter) -> "TaipowerBillingCycleIndex":
+        """Build the index from the loaded data of a meter.
+
+        Parameters
+        ----------
+        meter : api.TaipowerElectricMeter
+            Electric meter.
+
+        Returns
+        -------
+        TaipowerBillingCycleIndex
+            Index.
+        """
+
+        return cls(meter.bill_records, meter.ami_bill, meter.ami_unbilled)
+
+    @property
+    def cycles(self) -> List[TaipowerBillingCycle]:
+        """Billing cycles sorted by start date.
+
+        Returns
+        -------
+        List[TaipowerBillingCycle]
+            Billing cycles.
+        """
+
+        return list(self._cycles)
+
+    def _find(self, ordinal : int) -> Optional[TaipowerBillingCycle]:
+        index = bisect.bisect_right(self._starts, ordinal) - 1
+        if index >= 0 and ordinal <= self._ends[index]:
+            return self._cycles[index]
+        return None
+
+    def find(self, date : datetime.date) -> Optional[TaipowerBillingCycle]:
+        """Find the billing cycle containing a date.
+
+        Parameters
+        ----------
+        date : datetime.date
+            Date.
+
+        Returns
+        -------
+        Optional[TaipowerBillingCycle]
+            The billing cycle. None if no cycle contains the date.
+        """
+
+        return self._find(date.toordinal())
+
+    def assign(self, amis : Iterable[TaipowerAMI]) -> Dict[TaipowerBillingCycle, List[TaipowerAMI]]:
+        """Assign AMI readings to billing cycles by their start dates.
+
+        Parameters
+        ----------
+        amis : Iterable[TaipowerAMI]
+            AMI of the `quater`, `hour` or `daily` period.
+
+        Returns
+        -------
+        Dict[TaipowerBillingCycle, List[TaipowerAMI]]
+            Readings keyed by billing cycle. Readings outside of every cycle are dropped.
+        """
+
+        assigned = {cycle: [] for cycle in self._cycles}
+        ordinals = {}
+        for ami in amis:
+            date_text = ami.start_time[0:8]
+            ordinal = ordinals.get(date_text)
+            if ordinal is None:
+                ordinal = ordinals[date_text] = datetime.date(
+                    int(date_text[0:4]), int(date_text[4:6]), int(date_text[6:8])
+                ).toordinal()
+            cycle = self._find(ordinal)
+            if cycle is not None:
+                assigned[cycle].append(ami)
+        return assigned
+
+    def aggregate(self, amis : Iterable[TaipowerAMI]) -> Dict[TaipowerBillingCycle, float]:
+        """Sum the kwh of AMI readings per billing cycle.
+
+        Parameters
+        ----------
+        amis : Iterable[TaipowerAMI]
+            AMI of the `quater`, `hour` or `daily` period.
+
+        Returns
+        -------
+        Dict[TaipowerBillingCycle, float]
+            Kwh keyed by billing cycle.
+        """
+
+        return {
+            cycle: sum(ami.total_kwh or 0.0 for ami in readings)
+            for cycle, readings in self.assign(amis).items()
+        }
+
+    def reconcile(self, amis : Iterable[TaipowerAMI], rel_tol : float = 0.02) -> List[TaipowerReconciliation]:
+        """Reconcile the summed AMI kwh with the billed kwh of every cycle.
+
+        Parameters
+        ----------
+        amis : Iterable[TaipowerAMI]
+            AMI of the `quater`, `hour` or `daily` period.
+        rel_tol : float, optional
+            Relative tolerance, by default 0.02.
+
+        Returns
+        -------
+        List[TaipowerReconciliation]
+            Results of the cycles with billed kwh, sorted by start date.
+        """
+
+        results = []
+        for cycle, readings in self.assign(amis).items():
+            if cycle.kwh is None:
+                continue
+            ami_kwh = sum(ami.total_kwh or 0.0 for ami in readings)
+            results.append(TaipowerReconciliation(
+                cycle, ami_kwh, len(readings), math.isclose(ami_kwh, cycle.kwh, rel_tol=rel_tol)
+            ))
+        return results
@@ -0,0 +1,485 @@
+import abc
+import asyncio
+import csv
+import datetime
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import codec, deadline
+from .api import TaipowerAPI
+from .transport import TaipowerTransport
+
+KINDS = ("ami", "ami_bill", "ami_unbilled", "bill_records")
+FORMATS = ("jsonl", "csv", "parquet")
+
+FIELDS = {
+    "ami": (
+        "start_time", "end_time", "is_missing_data",
+        "total_kwh", "offpeak_kwh", "halfpeak_kwh", "satpeak_kwh", "peak_kwh",
+    ),
+    "ami_bill": ("bill_start_date", "bill_end_date", "current_amount", "kwh", "last_cycle_kwh", "last_year_kwh"),
+    "ami_unbilled": ("charge", "deadline", "kwh", "reading_date", "last_reading_date", "next_reading_date"),
+    "bill_records": ("issue_year_month", "period", "charge", "kwh", "paid", "formula"),
+}
+KEY_FIELDS = ("account", "electric_number")
+
+
+def _rows(account : str, electric_number : str, kind : str, data) -> List[dict]:
+    if kind == "ami":
+        items = [(None, ami) for ami in data.values()]
+    elif kind == "bill_records":
+        items = list(data.items())
+    else:
+        items = [(None, data)]
+
+    rows = []
+    for key, item in items:
+        row = {"account": account, "electric_number": electric_number}
+        for field in FIELDS[kind]:
+            row[field] = key if field == "issue_year_month" else getattr(item, field)
+        rows.append(row)
+    return rows
+
+
+class _FileWriter(abc.ABC):
+    # Appends the rows of every kind to one file, whose sizes are checkpointed for truncation on resume.
+
+    extension = ""
+
+    def __init__(self, directory : str) -> None:
+        self.directory : str = directory
+        self._files : Dict[str, object] = {}
+
+    def path(self, kind : str) -> str:
+        return os.path.join(self.directory, f"{kind}.{self.extension}")
+
+    @abc.abstractmethod
+    def _open(self, kind : str):
+        pass
+
+    def write(self, kind : str, unit : str, rows : List[dict]) -> None:
+        if kind not in self._files:
+            self._files[kind] = self._open(kind)
+        self._write(self._files[kind], kind, rows)
+
+    @abc.abstractmethod
+    def _write(self, f, kind : str, rows : List[dict]) -> None:
+        pass
+
+    def sizes(self) -> Dict[str, int]:
+        sizes = {}
+        for kind, f in self._files.items():
+            f.flush()
+            sizes[self.path(kind)] = f.tell()
+        return sizes
+
+    def truncate(self, sizes : Dict[str, int], kinds : Iterable[str]) -> None:
+        for kind in kinds:
+            path = self.path(kind)
+            size = sizes.get(path, 0)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+class _JSONLWriter(_FileWriter):
+    extension = "jsonl"
+
+    def _open(self, kind : str):
+        return open(self.path(kind), "ab")
+
+    def _write(self, f, kind : str, rows : List[dict]) -> None:
+        f.write(b"".join(codec.dumps(row) + b"\n" for row in rows))
+
+
+class _CSVWriter(_FileWriter):
+    extension = "csv"
+
+    def _open(self, kind : str):
+        f = open(self.path(kind), "a", newline="", encoding="utf-8")
+        if f.tell() == 0:
+            csv.writer(f).writerow(KEY_FIELDS + FIELDS[kind])
+        return f
+
+    def _write(self, f, kind : str, rows : List[dict]) -> None:
+        csv.DictWriter(f, KEY_FIELDS + FIELDS[kind]).writerows(rows)
+
+
+class _ParquetWriter:
+    # Writes one Parquet file per unit, renamed into place once complete.
+
+    def __init__(self, directory : str) -> None:
+        self.directory : str = directory
+
+    def write(self, kind : str, unit : str, rows : List[dict]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        directory = os.path.join(self.directory, kind)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, unit.replace("/", "_") + ".parquet")
+        table = pa.Table.from_pylist(rows) if len(rows) != 0 else pa.table({field: [] for field in KEY_FIELDS + FIELDS[kind]})
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def sizes(self) -> Dict[str, int]:
+        return {}
+
+    def truncate(self, sizes : Dict[str, int], kinds : Iterable[str]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class TaipowerExportCheckpoint:
+    """Append-only log of exported units, with the output file sizes after each unit.
+
+    Parameters
+    ----------
+    path : str
+        Checkpoint file path, created if it does not exist.
+    """
+
+    def __init__(self, path : str) -> None:
+        self.path : str = path
+        self.done : Set[str] = set()
+        self.sizes : Dict[str, int] = {}
+
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = codec.loads(line)
+                    except Exception:
+                        break  # An interrupted write.
+                    self.done.add(entry["unit"])
+                    self.sizes.update(entry["sizes"])
+        self._file = open(path, "ab")
+
+    def mark(self, unit : str, sizes : Dict[str, int]) -> None:
+        """Record an exported unit.
+
+        Parameters
+        ----------
+        unit : str
+            Unit identifier.
+        sizes : Dict[str, int]
+            Output file sizes after the unit is written.
+        """
+
+        self.done.add(unit)
+        self.sizes.update(sizes)
+        self._file.write(codec.dumps({"unit": unit, "sizes": sizes}) + b"\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the log."""
+
+        self._file.close()
+
+
+def month_ranges(
+    start : datetime.date, end : datetime.date, ami_period : str = "daily"
+) -> List[Tuple[str, datetime.datetime, datetime.datetime]]:
+    """Split a date range into the export units of AMI, months or years for the `monthly` period.
+
+    Parameters
+    ----------
+    start : datetime.date
+        First date, inclusive.
+    end : datetime.date
+        Last date, inclusive.
+    ami_period : str, optional
+        AMI period, by default `daily`.
+
+    Returns
+    -------
+    List[Tuple[str, datetime.datetime, datetime.datetime]]
+        Unit key in yyyymm or yyyy format, start inclusive and end exclusive.
+    """
+
+    ranges = []
+    dt = datetime.datetime.combine(start, datetime.time())
+    last = datetime.datetime.combine(end, datetime.time()) + datetime.timedelta(days=1)
+    while dt < last:
+        if ami_period == "monthly":
+            key = dt.strftime("%Y")
+            next_dt = dt.replace(year=dt.year + 1, month=1, day=1)
+        else:
+            key = dt.strftime("%Y%m")
+            next_dt = (dt.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        ranges.append((key, dt, min(next_dt, last)))
+        dt = next_dt
+    return ranges
+
+
+class _RequestLimiter:
+    # Transport of all the accounts of an export, bounding the requests in flight. A unit fans out into
+    # a request per day of AMI, so bounding the units alone does not bound the load on Taipower.
+
+    def __init__(self, transport, limit : int) -> None:
+        import httpx
+
+        self._owned : bool = transport is None
+        self._transport = httpx.AsyncHTTPTransport() if transport is None else transport
+        self._semaphore : asyncio.Semaphore = asyncio.Semaphore(limit)
+        self.in_flight : int = 0
+        self.max_in_flight : int = 0
+
+    async def handle_async_request(self, request):
+        async with self._semaphore:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                response = await self._transport.handle_async_request(request)
+                # The body is read while the request still counts as in flight.
+                try:
+                    await response.aread()
+                finally:
+                    await response.aclose()
+            finally:
+                self.in_flight -= 1
+        return response
+
+    async def finish(self) -> None:
+        # Called once in the export loop, after every client of the export closed.
+        if self._owned:
+            await self._transport.aclose()
+            return
+        from .cassette import TaipowerRecordTransport
+        from .proxy import TaipowerProxyPool
+
+        # A given transport is never closed, but the connection pools it keeps for the export loop are.
+        if isinstance(self._transport, (TaipowerTransport, TaipowerProxyPool, TaipowerRecordTransport)):
+            await self._transport.aclose()
+
+    # Clients of every account enter and close the transport while others still use it.
+    async def __aenter__(self) -> "_RequestLimiter":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+
+class TaipowerBulkExporter:
+    """Concurrent, resumable export of AMI, bills and bill records of many accounts.
+
+    Every meter is exported in units: AMI per month (per year for the `monthly` period) and the other kinds at once.
+    Rows of a unit are written as soon as it arrives, and each written unit is checkpointed, so a rerun
+    with the same checkpoint skips finished units and drops rows of the interrupted ones.
+
+    Parameters
+    ----------
+    output : str
+        Output directory, created if it does not exist.
+    output_format : str, optional
+        `jsonl`, `csv` or `parquet`, by default `jsonl`. Parquet requires pyarrow and writes one file per unit.
+    kinds : Iterable[str], optional
+        Exported kinds among `KINDS`, by default all.
+    ami_period : str, optional
+        AMI period, by default `daily`.
+    concurrency : int, optional
+        Maximum requests to Taipower in flight at once, and maximum units and logins in progress, by default 4.
+    checkpoint : str, optional
+        Checkpoint path. If None is given, the export is not resumable, by default None.
+        Rows in the output files that are not covered by the checkpoint are dropped when the export starts.
+    transport : httpx.AsyncBaseTransport, optional
+        Transport of every account, e.g. a `cassette.TaipowerRecordTransport`, by default None.
+    proxies : list of str, dict of str to int or proxy.TaipowerProxyPool, optional
+        Proxy URLs, optionally mapped to weights, or a pool. All accounts share one pool, spreading
+        their requests over the proxies. Cannot be combined with `transport`, by default None.
+    http2 : bool, optional
+        Whether or not to negotiate HTTP/2 on the default network transport or through the proxies given as URLs.
+        All accounts share one transport, so their concurrent requests are multiplexed over few connections.
+        Requires h2, by default False.
+    transfer_stats : bool, optional
+        Whether or not to count the bytes of the responses of all accounts and the bytes compression saved,
+        see `transport.TaipowerTransport.stats`, by default False.
+    """
+
+    def __init__(
+        self,
+        output : str,
+        output_format : str = "jsonl",
+        kinds : Optional[Iterable[str]] = None,
+        ami_period : str = "daily",
+        concurrency : int = 4,
+        checkpoint : Optional[str] = None,
+        transport = None,
+        proxies = None,
+        http2 : bool = False,
+        transfer_stats : bool = False,
+    ) -> None:
+        if output_format not in FORMATS:
+            raise ValueError("output_format accepts either `jsonl`, `csv` or `parquet`.")
+        if proxies is not None:
+            if transport is not None:
+                raise ValueError("Either transport or proxies can be given, but not both.")
+            from .proxy import TaipowerProxyPool
+
+            transport = proxies if isinstance(proxies, TaipowerProxyPool) else TaipowerProxyPool(proxies, http2=http2)
+        if (http2 or transfer_stats) and not isinstance(transport, TaipowerTransport):
+            transport = TaipowerTransport(transport, http2=http2)
+        kinds = tuple(kinds or KINDS)
+        if any(kind not in KINDS for kind in kinds):
+            raise ValueError("kinds accepts `ami`, `ami_bill`, `ami_unbilled` and `bill_records`.")
+
+        os.makedirs(output, exist_ok=True)
+        self.output : str = output
+        self.output_format : str = output_format
+        self.kinds : Tuple[str, ...] = kinds
+        self.ami_period : str = ami_period
+        self.concurrency : int = concurrency
+        self.checkpoint_path : Optional[str] = checkpoint
+        self.transport = transport
+
+        self.errors : List[str] = []
+        self.cancelled : List[str] = []
+        self.exported : Dict[str, int] = {kind: 0 for kind in kinds}
+        self._writer = None
+        self._checkpoint : Optional[TaipowerExportCheckpoint] = None
+        self._limiter : Optional[_RequestLimiter] = None
+
+    def _create_api(self, account : str, password : str, electric_numbers : Optional[List[str]]) -> TaipowerAPI:
+        return TaipowerAPI(account, password, electric_numbers, ami_period=self.ami_period, transport=self._limiter)
+
+    async def _export_unit(self, api : TaipowerAPI, unit : str, kind : str, electric_number : str, fetch, semaphore) -> None:
+        if self._checkpoint is not None and unit in self._checkpoint.done:
+            return
+        async with semaphore:
+            try:
+                data = await fetch()
+            except Exception as e:
+                if deadline.is_cut(e):
+                    raise
+                self.errors.append(f"{unit}: {e}")
+                return
+        rows = _rows(api.account, electric_number, kind, data)
+        self._writer.write(kind, unit, rows)
+        self.exported[kind] += len(rows)
+        if self._checkpoint is not None:
+            self._checkpoint.mark(unit, self._writer.sizes())
+
+    async def _export_account(
+        self,
+        account : dict,
+        start : Optional[datetime.date],
+        end : Optional[datetime.date],
+        semaphore : asyncio.Semaphore,
+    ) -> None:
+        api = self._create_api(account["account"], account["password"], account.get("electric_numbers"))
+        async with semaphore:
+            try:
+                await api.async_login(fetch_data=False)
+            except Exception as e:
+                if deadline.is_cut(e):
+                    self.cancelled.append(api.account)
+                else:
+                    self.errors.append(f"{api.account}: {e}")
+                return
+
+        async with api._create_client() as client:
+            units = []
+            for number, meter in api.meters.items():
+                prefix = f"{api.account}/{number}"
+                if "ami" in self.kinds and start is not None and meter.number_verified:
+                    for key, range_start, range_end in month_ranges(start, end or datetime.date.today(), self.ami_period):
+                        fetch = lambda number=number, range_start=range_start, range_end=range_end: api.async_get_ami_range(
+                            number, range_start, range_end, client=client
+                        )
+                        units.append((f"{prefix}/ami/{key}", "ami", number, fetch))
+                for kind in self.kinds:
+                    if kind != "ami":
+                        fetch = lambda number=number, kind=kind: getattr(api, f"async_get_{kind}")(number, client=client)
+                        units.append((f"{prefix}/{kind}", kind, number, fetch))
+
+            await api._async_check_before_publish(client=client)
+            # Units cut by the budget are not checkpointed, so a resumed export retries them.
+            _, cancelled = await deadline.gather(
+                [self._export_unit(api, unit, kind, number, fetch, semaphore) for unit, kind, number, fetch in units],
+                [unit for unit, _, _, _ in units],
+            )
+            self.cancelled.extend(cancelled)
+
+    async def async_export(
+        self,
+        accounts : Iterable[dict],
+        start : Optional[datetime.date] = None,
+        end : Optional[datetime.date] = None,
+        budget : Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Asynchronously export accounts.
+
+        Parameters
+        ----------
+        accounts : Iterable[dict]
+            Accounts with `account`, `password` and optionally `electric_numbers` keys.
+        start : datetime.date, optional
+            First date of AMI, inclusive. If None is given, AMI is not exported, by default None.
+        end : datetime.date, optional
+            Last date of AMI, inclusive. If None is given, today is used, by default None.
+        budget : float, optional
+            Seconds the export may take. Units outstanding when it runs out are cancelled and listed
+            in `cancelled`. If None is given, the export is unbounded, by default None.
+
+        Returns
+        -------
+        Dict[str, int]
+            The number of rows exported in this run by kind. Failed units are listed in `errors`.
+        """
+
+        self._writer = {"jsonl": _JSONLWriter, "csv": _CSVWriter, "parquet": _ParquetWriter}[self.output_format](self.output)
+        self._checkpoint = None if self.checkpoint_path is None else TaipowerExportCheckpoint(self.checkpoint_path)
+        if self._checkpoint is not None:
+            # Rows written after the last checkpointed unit belong to interrupted units.
+            self._writer.truncate(self._checkpoint.sizes, self.kinds)
+
+        # Units and logins hold a slot of `semaphore` while their requests wait for a slot of the limiter.
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self._limiter = _RequestLimiter(self.transport, self.concurrency)
+        try:
+            with deadline.scope(budget):
+                await asyncio.gather(*[self._export_account(account, start, end, semaphore) for account in accounts])
+        finally:
+            await self._limiter.finish()
+            self._writer.close()
+            if self._checkpoint is not None:
+                self._checkpoint.close()
+        return dict(self.exported)
+
+    def export(
+        self,
+        accounts : Iterable[dict],
+        start : Optional[datetime.date] = None,
+        end : Optional[datetime.date] = None,
+        budget : Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Export accounts, see `async_export`.
+
+        Parameters
+        ----------
+        accounts : Iterable[dict]
+            Accounts with `account`, `password` and optionally `electric_numbers` keys.
+        start : datetime.date, optional
+            First date of AMI, inclusive. If None is given, AMI is not exported, by default None.
+        end : datetime.date, optional
+            Last date of AMI, inclusive. If None is given, today is used, by default None.
+        budget : float, optional
+            Seconds the export may take, see `async_export`, by default None.
+
+        Returns
+        -------
+        Dict[str, int]
+            The number of rows exported in this run by kind.
+        """
+
+        return asyncio.run(self.async_export(accounts, start, end, budget=budget))
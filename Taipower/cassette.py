@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import time
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from . import codec
+from .transport import _LoopTransports
+
+if TYPE_CHECKING:
+    import httpx
+
+CASSETTE_VERSION = 1
+
+# Values of these fields are replaced by REDACTED, in requests and responses alike.
+SECRET_FIELDS = frozenset((
+    "username", "password", "phoneNo", "device_id", "deviceId",
+    "access_token", "refresh_token", "token", "jti",
+    "idNumber", "idNumberSha", "employerId", "electricName", "nickname", "mainAddr",
+))
+# Values of these fields are replaced by consistent pseudonyms of the same shape, so replayed requests still match.
+IDENTIFIER_FIELDS = frozenset(("customNo", "custNo", "electricNumber", "userID"))
+REDACTED = "REDACTED"
+
+
+class TaipowerRedactor:
+    """Redact secrets and pseudonymize identifiers in request and response bodies.
+
+    Pseudonyms are consistent within a redactor, e.g. an electric number maps to the same pseudonym
+    in the meter list and in every request for that meter.
+    """
+
+    def __init__(self) -> None:
+        self._pseudonyms : Dict[Any, Any] = {}
+
+    def _pseudonym(self, value : Any) -> Any:
+        pseudonym = self._pseudonyms.get(value)
+        if pseudonym is None:
+            index = len(self._pseudonyms) + 1
+            if isinstance(value, int):
+                pseudonym = 100000 + index
+            else:
+                pseudonym = str(index).zfill(len(str(value)))
+            self._pseudonyms[value] = pseudonym
+        return pseudonym
+
+    def _replace_known(self, text : str) -> str:
+        for value, pseudonym in self._pseudonyms.items():
+            value = str(value)
+            if len(value) >= 6 and value in text:
+                text = text.replace(value, str(pseudonym))
+        return text
+
+    def redact(self, obj : Any, pseudonymize : bool = True) -> Any:
+        """Redact a decoded JSON document or form.
+
+        Parameters
+        ----------
+        obj : Any
+            Decoded document.
+        pseudonymize : bool, optional
+            Whether or not to pseudonymize identifiers. Secrets are always redacted, by default True.
+
+        Returns
+        -------
+        Any
+            A redacted copy.
+        """
+
+        if isinstance(obj, dict):
+            redacted = {}
+            for key, value in obj.items():
+                if key in SECRET_FIELDS and value not in (None, ""):
+                    redacted[key] = REDACTED
+                elif key in IDENTIFIER_FIELDS and pseudonymize and isinstance(value, (str, int)) and value != "":
+                    redacted[key] = self._pseudonym(value)
+                else:
+                    redacted[key] = self.redact(value, pseudonymize)
+            return redacted
+        elif isinstance(obj, list):
+            return [self.redact(value, pseudonymize) for value in obj]
+        elif isinstance(obj, str) and pseudonymize:
+            return self._replace_known(obj)
+        return obj
+
+    def redact_body(self, content : bytes, content_type : str, pseudonymize : bool = True) -> str:
+        """Redact a raw JSON or form body.
+
+        Parameters
+        ----------
+        content : bytes
+            Body.
+        content_type : str
+            Content type of the body.
+        pseudonymize : bool, optional
+            Whether or not to pseudonymize identifiers, by default True.
+
+        Returns
+        -------
+        str
+            Redacted body, JSON with sorted keys or a urlencoded form.
+        """
+
+        if len(content) == 0:
+            return ""
+        if "x-www-form-urlencoded" in content_type:
+            form = self.redact(dict(parse_qsl(content.decode())), pseudonymize)
+            return urlencode(sorted(form.items()))
+        try:
+            document = codec.loads(content)
+        except Exception:
+            return REDACTED
+        import json
+
+        return json.dumps(self.redact(document, pseudonymize), sort_keys=True, ensure_ascii=False)
+
+
+def _request_key(request : httpx.Request, body : str) -> Tuple[str, str, str]:
+    return request.method, request.url.path, body
+
+
+class TaipowerRecordTransport:
+    """httpx transport recording redacted request and response pairs into a cassette.
+
+    Interactions are appended to a gzip compressed JSON lines file as they complete, so an interrupted
+    recording keeps everything recorded so far. The transport may be shared by many clients, e.g. through
+    `TaipowerAPI(transport=...)`. The default network transports of an event loop are closed with the clients
+    of the loop, once none of their requests is in flight, and the cassette by `finish`.
+
+    Parameters
+    ----------
+    path : str
+        Cassette path. An existing cassette is appended to.
+    transport : httpx.AsyncBaseTransport, optional
+        Transport performing the requests. If None is given, the default network transports are used, by default None.
+    """
+
+    def __init__(self, path : str, transport = None) -> None:
+        self.path : str = path
+        self._transport = transport
+        # Connection pools are bound to an event loop, and the synchronous API runs one loop per call.
+        self._async_transports : _LoopTransports = _LoopTransports(self._create_async_transport)
+        self._sync_transport = None
+        self._redactor : TaipowerRedactor = TaipowerRedactor()
+        self._file = gzip.open(path, "ab")
+        self._file.write(codec.dumps({"version": CASSETTE_VERSION, "recorded_at": time.time()}) + b"\n")
+
+    def _record(self, request : httpx.Request, response : httpx.Response, elapsed : float) -> httpx.Response:
+        import httpx
+
+        response_type = response.headers.get("content-type", "application/json")
+        interaction = {
+            "method": request.method,
+            "path": request.url.path,
+            "request": self._redactor.redact_body(request.content, request.headers.get("content-type", "")),
+            "status": response.status_code,
+            "content_type": response_type,
+            "response": self._redactor.redact_body(response.content, response_type),
+            "elapsed": round(elapsed, 6),
+        }
+        self._file.write(codec.dumps(interaction) + b"\n")
+        self._file.flush()
+
+        # The body is already decoded, so encoding headers no longer apply.
+        headers = [
+            (name, value) for name, value in response.headers.items()
+            if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(response.status_code, headers=headers, content=response.content, request=request)
+
+    def _create_async_transport(self, key : Hashable = None):
+        import httpx
+
+        return httpx.AsyncHTTPTransport()
+
+    async def _async_read(self, transport, request : httpx.Request) -> Tuple[httpx.Response, float]:
+        start = time.perf_counter()
+        response = await transport.handle_async_request(request)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        return response, time.perf_counter() - start
+
+    async def handle_async_request(self, request : httpx.Request) -> httpx.Response:
+        if self._transport is not None:
+            response, elapsed = await self._async_read(self._transport, request)
+        else:
+            async with self._async_transports.use() as transport:
+                response, elapsed = await self._async_read(transport, request)
+        return self._record(request, response, elapsed)
+
+    def handle_request(self, request : httpx.Request) -> httpx.Response:
+        import httpx
+
+        if self._sync_transport is None:
+            self._sync_transport = self._transport if isinstance(self._transport, httpx.BaseTransport) else httpx.HTTPTransport()
+        start = time.perf_counter()
+        response = self._sync_transport.handle_request(request)
+        try:
+            response.read()
+        finally:
+            response.close()
+        return self._record(request, response, time.perf_counter() - start)
+
+    def finish(self) -> None:
+        """Close the cassette and the synchronous transport, and drop the asynchronous ones of event loops whose clients were not closed."""
+
+        if self._sync_transport is not None:
+            self._sync_transport.close()
+        self._async_transports.clear()
+        self._file.close()
+
+    # Clients enter and close their transport. The cassette and the synchronous transport outlive
+    # the clients, while the asynchronous transports are bound to the event loop of the client.
+    def __enter__(self) -> "TaipowerRecordTransport":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._file.flush()
+
+    async def __aenter__(self) -> "TaipowerRecordTransport":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    def close(self) -> None:
+        self._file.flush()
+
+    async def aclose(self) -> None:
+        self._file.flush()
+        if self._transport is None:
+            await self._async_transports.aclose()
+
+
+def load_cassette(path : str) -> List[dict]:
+    """Load the interactions of a cassette.
+
+    Parameters
+    ----------
+    path : str
+        Cassette path.
+
+    Returns
+    -------
+    List[dict]
+        Interactions in recorded order.
+
+    Raises
+    ------
+    ValueError
+        If the cassette version is unsupported.
+    """
+
+    interactions = []
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            entry = codec.loads(line)
+            if "version" in entry:
+                if entry["version"] != CASSETTE_VERSION:
+                    raise ValueError(f"Unsupported cassette version: {entry['version']}, expected {CASSETTE_VERSION}.")
+                continue
+            interactions.append(entry)
+    return interactions
+
+
+class TaipowerReplayTransport:
+    """httpx transport answering requests from a cassette without any network access.
+
+    A request is answered by the recorded interaction with the same method, path and redacted body.
+    Requests without an exact match, e.g. logins of another account, are answered by the recorded
+    interactions of the same method and path in turn.
+
+    Parameters
+    ----------
+    path : str
+        Cassette path.
+    time_scale : float, optional
+        Multiplier of the recorded response times. 1 replays the original timing and 0 answers immediately, by default 1.0.
+    """
+
+    def __init__(self, path : str, time_scale : float = 1.0) -> None:
+        self.path : str = path
+        self.time_scale : float = time_scale
+        self.interactions : List[dict] = load_cassette(path)
+        self.replayed : int = 0
+
+        self._redactor : TaipowerRedactor = TaipowerRedactor()
+        self._exact : Dict[Tuple[str, str, str], dict] = {}
+        self._by_path : Dict[Tuple[str, str], List[dict]] = {}
+        self._cursors : Dict[Tuple[str, str], int] = {}
+        for interaction in self.interactions:
+            self._exact.setdefault((interaction["method"], interaction["path"], interaction["request"]), interaction)
+            self._by_path.setdefault((interaction["method"], interaction["path"]), []).append(interaction)
+
+    def _match(self, request : httpx.Request) -> dict:
+        import httpx
+
+        body = self._redactor.redact_body(request.content, request.headers.get("content-type", ""), pseudonymize=False)
+        interaction = self._exact.get(_request_key(request, body))
+        if interaction is None:
+            key = (request.method, request.url.path)
+            candidates = self._by_path.get(key)
+            if not candidates:
+                raise httpx.TransportError(f"No recorded interaction for {request.method} {request.url.path}.")
+            cursor = self._cursors.get(key, 0)
+            interaction = candidates[cursor % len(candidates)]
+            self._cursors[key] = cursor + 1
+        self.replayed += 1
+        return interaction
+
+    def _response(self, request : httpx.Request, interaction : dict) -> httpx.Response:
+        import httpx
+
+        return httpx.Response(
+            interaction["status"],
+            headers={"content-type": interaction["content_type"]},
+            content=interaction["response"].encode(),
+            request=request,
+        )
+
+    async def handle_async_request(self, request : httpx.Request) -> httpx.Response:
+        interaction = self._match(request)
+        if self.time_scale > 0:
+            await asyncio.sleep(interaction["elapsed"] * self.time_scale)
+        return self._response(request, interaction)
+
+    def handle_request(self, request : httpx.Request) -> httpx.Response:
+        interaction = self._match(request)
+        if self.time_scale > 0:
+            time.sleep(interaction["elapsed"] * self.time_scale)
+        return self._response(request, interaction)
+
+    def __enter__(self) -> "TaipowerReplayTransport":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    async def __aenter__(self) -> "TaipowerReplayTransport":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
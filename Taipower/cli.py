@@ -0,0 +1,226 @@
+import argparse
+import datetime
+import os
+import sys
+from typing import List, Optional
+
+from . import __version__, codec
+
+
+def _date(text : str) -> datetime.date:
+    return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def _load_accounts(path : str) -> List[dict]:
+    # A JSON list, or JSON lines, of objects with `account`, `password` and optionally `electric_numbers`.
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        accounts = codec.loads(content)
+    except Exception:
+        accounts = [codec.loads(line) for line in content.splitlines() if line.strip()]
+    return accounts if isinstance(accounts, list) else [accounts]
+
+
+def _add_network_arguments(parser : argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--proxy", action="append", dest="proxies", metavar="URL[=WEIGHT]",
+        help="Proxy to spread requests over, repeatable. An optional weight applies to round-robin selection.",
+    )
+    parser.add_argument(
+        "--proxy-strategy", choices=("round_robin", "least_latency"), default="round_robin",
+        help="Proxy selection, by default round_robin.",
+    )
+    parser.add_argument(
+        "--http2", action="store_true",
+        help="Multiplex concurrent requests over HTTP/2 connections. Requires h2.",
+    )
+
+
+def _proxy_pool(args : argparse.Namespace):
+    if not args.proxies:
+        return None
+    from .proxy import TaipowerProxyPool
+
+    weights = {}
+    for proxy in args.proxies:
+        url, separator, weight = proxy.rpartition("=")
+        if separator == "" or not weight.isdigit():
+            url, weight = proxy, "1"
+        weights[url] = int(weight)
+    return TaipowerProxyPool(weights, strategy=args.proxy_strategy, http2=args.http2)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser of the `taipower` command.
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        Parser.
+    """
+
+    from .bulk import FORMATS, KINDS
+
+    parser = argparse.ArgumentParser(prog="taipower", description="Taipower data tools.")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Export AMI, bills and bill records.")
+    source = export.add_mutually_exclusive_group(required=True)
+    source.add_argument("--account", help="User phone number. The password is read from TAIPOWER_PASSWORD if omitted.")
+    source.add_argument("--accounts", metavar="FILE", help="JSON or JSON lines file of accounts for a fleet export.")
+    export.add_argument("--password", default=os.environ.get("TAIPOWER_PASSWORD"), help="User password.")
+    export.add_argument("--electric-number", action="append", dest="electric_numbers", help="Electric number, repeatable.")
+    export.add_argument("-o", "--output", required=True, help="Output directory.")
+    export.add_argument("-f", "--format", choices=FORMATS, default="jsonl", help="Output format, by default jsonl.")
+    export.add_argument("--data", nargs="+", choices=KINDS, default=list(KINDS), help="Exported kinds, by default all.")
+    export.add_argument("--start", type=_date, help="First date of AMI in YYYY-MM-DD. AMI is skipped if omitted.")
+    export.add_argument("--end", type=_date, help="Last date of AMI in YYYY-MM-DD, by default today.")
+    export.add_argument(
+        "--period", choices=("quater", "hour", "daily", "monthly"), default="daily", help="AMI period, by default daily."
+    )
+    export.add_argument("-j", "--concurrency", type=int, default=4, help="Requests in flight at once, by default 4.")
+    export.add_argument(
+        "--checkpoint",
+        help="Checkpoint file for resuming, by default `.checkpoint.jsonl` in the output directory.",
+    )
+    export.add_argument("--no-checkpoint", action="store_true", help="Disable checkpointing.")
+    export.add_argument(
+        "--budget", type=float, help="Seconds the export may take. Units left over are retried when resuming."
+    )
+    cassette = export.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE", help="Record redacted requests and responses into a cassette.")
+    cassette.add_argument("--replay", metavar="CASSETTE", help="Answer requests from a cassette without network access.")
+    export.add_argument(
+        "--time-scale", type=float, default=0.0, help="Multiplier of the recorded response times when replaying, by default 0."
+    )
+    _add_network_arguments(export)
+
+    serve = subparsers.add_parser("serve", help="Serve cached meter data over HTTP for local consumers.")
+    serve.add_argument("--account", required=True, help="User phone number.")
+    serve.add_argument("--password", default=os.environ.get("TAIPOWER_PASSWORD"), help="User password, by default TAIPOWER_PASSWORD.")
+    serve.add_argument("--electric-number", action="append", dest="electric_numbers", help="Electric number, repeatable.")
+    serve.add_argument(
+        "--period", choices=("quater", "hour", "daily", "monthly"), default="daily", help="AMI period, by default daily."
+    )
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on, by default 127.0.0.1.")
+    serve.add_argument("--port", type=int, default=8000, help="Port to listen on, by default 8000.")
+    serve.add_argument("--ttl", type=float, default=900.0, help="Seconds before meter data is refreshed, by default 900.")
+    _add_network_arguments(serve)
+    return parser
+
+
+def _serve(args : argparse.Namespace) -> int:
+    from .api import TaipowerAPI
+    from .gateway import TaipowerGateway
+
+    if args.password is None:
+        print("taipower: a password is required, see --password.", file=sys.stderr)
+        return 2
+
+    try:
+        api = TaipowerAPI(
+            args.account,
+            args.password,
+            electric_numbers=args.electric_numbers,
+            ami_period=args.period,
+            proxies=_proxy_pool(args),
+            http2=args.http2,
+            transfer_stats=True,
+        )
+    except ImportError as e:
+        print(f"taipower: {e}", file=sys.stderr)
+        return 2
+    gateway = TaipowerGateway(api, ttl=args.ttl, host=args.host, port=args.port)
+    gateway.bind()
+    host, port = gateway.address
+    print(f"Serving {args.account} on http://{host}:{port}", file=sys.stderr)
+    # Tokens are renewed in the background once the gateway logs in, so requests never wait for a login.
+    token_refresher = api.start_token_refresher()
+    try:
+        gateway.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.stop()
+        token_refresher.stop()
+    return 0
+
+
+def _export(args : argparse.Namespace) -> int:
+    from .bulk import TaipowerBulkExporter
+    from .cassette import TaipowerRecordTransport, TaipowerReplayTransport
+
+    if args.accounts is not None:
+        accounts = _load_accounts(args.accounts)
+    else:
+        if args.password is None:
+            print("taipower: a password is required, see --password.", file=sys.stderr)
+            return 2
+        accounts = [{"account": args.account, "password": args.password, "electric_numbers": args.electric_numbers}]
+
+    checkpoint = None
+    if not args.no_checkpoint:
+        checkpoint = args.checkpoint or os.path.join(args.output, ".checkpoint.jsonl")
+
+    try:
+        pool = _proxy_pool(args)
+        transport = pool
+        if args.record is not None:
+            transport = TaipowerRecordTransport(args.record, transport=pool)
+        elif args.replay is not None:
+            transport = TaipowerReplayTransport(args.replay, time_scale=args.time_scale)
+        exporter = TaipowerBulkExporter(
+            args.output,
+            output_format=args.format,
+            kinds=args.data,
+            ami_period=args.period,
+            concurrency=args.concurrency,
+            checkpoint=checkpoint,
+            transport=transport,
+            http2=args.http2,
+            transfer_stats=True,
+        )
+    except ImportError as e:
+        print(f"taipower: {e}", file=sys.stderr)
+        return 2
+    try:
+        exported = exporter.export(accounts, args.start, args.end, budget=args.budget)
+    finally:
+        if args.record is not None:
+            transport.finish()
+        if pool is not None:
+            pool.finish()
+    for kind, count in exported.items():
+        print(f"{kind}: {count} rows")
+    stats = exporter.transport.stats()
+    if stats["bytes_saved"] > 0:
+        print(f"Received {stats['bytes_received']} bytes, {stats['bytes_saved']} saved by compression", file=sys.stderr)
+    for error in exporter.errors:
+        print(f"taipower: {error}", file=sys.stderr)
+    if len(exporter.cancelled) != 0:
+        print(f"taipower: the budget ran out with {len(exporter.cancelled)} units outstanding.", file=sys.stderr)
+    return 1 if len(exporter.errors) != 0 or len(exporter.cancelled) != 0 else 0
+
+
+def main(argv : Optional[List[str]] = None) -> int:
+    """Entry point of the `taipower` command.
+
+    Parameters
+    ----------
+    argv : List[str], optional
+        Arguments. If None is given, `sys.argv` is used, by default None.
+
+    Returns
+    -------
+    int
+        Exit status.
+    """
+
+    args = build_parser().parse_args(argv)
+    if args.command == "export":
+        return _export(args)
+    if args.command == "serve":
+        return _serve(args)
+    return 2
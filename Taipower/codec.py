@@ -0,0 +1,376 @@
+import json
+import typing
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+_backend : Optional[str] = None
+_loads : Optional[Callable[[Union[bytes, str]], Any]] = None
+_dumps : Optional[Callable[[Any], bytes]] = None
+_decode : Optional[Callable[[Union[bytes, str], Optional[str]], Any]] = None
+
+
+def _key(name : str, default : Any = None):
+    # Field of a record, decoded from the `name` key of the payload.
+    if default is list:
+        return field(default_factory=list, metadata={"key": name})
+    return field(default=default, metadata={"key": name})
+
+
+@dataclass
+class AMI:
+    """AMI of an `api/ami/{period}` response."""
+
+    start_time : Optional[str] = _key("startTime")
+    end_time : Optional[str] = _key("endTime")
+    is_missing_data : Optional[int] = _key("isMssingData")
+    offpeak_kwh : Optional[float] = _key("offPeakKwh")
+    halfpeak_kwh : Optional[float] = _key("halfPeakKwh")
+    satpeak_kwh : Optional[float] = _key("satPeakKwh")
+    peak_kwh : Optional[float] = _key("peakTimeKwh")
+    total_kwh : Optional[float] = _key("totalKwh")
+    kwh : Optional[float] = _key("kwh")
+
+
+@dataclass
+class AMIPage:
+    """Data of an `api/ami/{period}` response."""
+
+    data : List[AMI] = _key("data", list)
+
+
+@dataclass
+class AMIBill:
+    """Data of an `api/home/bills` response."""
+
+    start_date : Optional[str] = _key("startDate")
+    end_date : Optional[str] = _key("endDate")
+    current_amount : Optional[int] = _key("currentAmount")
+    kwh : Optional[int] = _key("kwh")
+    kwh_data : Optional[bool] = _key("kwhData")
+    last_cycle_kwh : Optional[int] = _key("theLast2Kwh")
+    last_year_kwh : Optional[int] = _key("lastKwh")
+
+
+@dataclass
+class AMIUnbilled:
+    """Data of an `applyCase/amiUnbillData` response."""
+
+    ami : Optional[bool] = _key("ami")
+    total_amount : Optional[Union[int, str]] = _key("totalAmount")
+    pay_deadline : Optional[str] = _key("payDeadline")
+    final_kwh : Optional[Union[float, str]] = _key("finalKwh")
+    reading_date : Optional[str] = _key("readingDate")
+    last_read_date : Optional[str] = _key("lastReadDate")
+    next_reading_date : Optional[str] = _key("nextReadingDate")
+
+
+@dataclass
+class BillRecord:
+    """Bill record of an `api/mybill/records` response."""
+
+    issue_ym : Optional[str] = _key("issueYM")
+    bill_from_and_to_date : Optional[str] = _key("billFromAndToDate")
+    total_kwh : Optional[Union[int, float]] = _key("totalKwh")
+    total_charge : Optional[str] = _key("totalCharge")
+    bill_formula : Optional[str] = _key("billFormula")
+    has_paid : Optional[str] = _key("hasPaid")
+
+
+# Type of the `data` of the responses of each schema.
+SCHEMAS : Dict[str, Any] = {
+    "ami": AMIPage,
+    "ami_bill": AMIBill,
+    "ami_unbilled": AMIUnbilled,
+    "bill_records": List[BillRecord],
+}
+
+_fields_cache : Dict[type, Tuple[Tuple[str, str, Optional[type]], ...]] = {}
+
+
+def _record_fields(cls : type) -> Tuple[Tuple[str, str, Optional[type]], ...]:
+    # Field names, payload keys and the record type of list items of a record type.
+    if cls not in _fields_cache:
+        hints = typing.get_type_hints(cls)
+        _fields_cache[cls] = tuple(
+            (f.name, f.metadata["key"], _list_item(hints[f.name])) for f in fields(cls)
+        )
+    return _fields_cache[cls]
+
+
+def _list_item(tp : Any) -> Optional[type]:
+    if getattr(tp, "__origin__", None) is list:
+        return tp.__args__[0]
+    return None
+
+
+def _build(tp : Any, obj : Any) -> Any:
+    # Build records of a schema type from decoded JSON.
+    item = _list_item(tp)
+    if item is not None:
+        return [_build(item, value) for value in obj]
+    values = {}
+    for name, key, item in _record_fields(tp):
+        value = obj.get(key)
+        if item is not None:
+            value = [] if value is None else [_build(item, element) for element in value]
+        values[name] = value
+    return tp(**values)
+
+
+def record(cls : type, obj : Any) -> Any:
+    """Get a record of a record type, building it if a decoded JSON object is given.
+
+    Parameters
+    ----------
+    cls : type
+        Record type, e.g. `AMI`.
+    obj : dict or record
+        Decoded JSON object, or a record of `cls` decoded by any backend.
+
+    Returns
+    -------
+    record
+        Record with the fields of `cls`.
+    """
+
+    return _build(cls, obj) if isinstance(obj, dict) else obj
+
+
+def to_dict(obj : Any) -> dict:
+    """Convert a record into a JSON object with the keys of the payload. Absent fields are left out.
+
+    Parameters
+    ----------
+    obj : record
+        Record, e.g. `AMI`.
+
+    Returns
+    -------
+    dict
+        JSON object.
+    """
+
+    cls = _RECORDS[type(obj)]
+    result = {}
+    for name, key, item in _record_fields(cls):
+        value = getattr(obj, name)
+        if value is None:
+            continue
+        result[key] = [to_dict(element) for element in value] if item is not None else value
+    return result
+
+
+# Record type of the records and of the msgspec Structs decoded by the backends.
+_RECORDS : Dict[type, type] = {cls: cls for cls in (AMI, AMIPage, AMIBill, AMIUnbilled, BillRecord)}
+
+
+def _json_dumps(obj : Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _dict_decoder(loads : Callable[[Union[bytes, str]], Any]) -> Callable[[Union[bytes, str], Optional[str]], Any]:
+    # Records are built from the decoded objects.
+    def decode(data : Union[bytes, str], schema : Optional[str] = None) -> Any:
+        obj = loads(data)
+        if schema is not None and isinstance(obj, dict) and obj.get("data") is not None:
+            try:
+                obj["data"] = _build(SCHEMAS[schema], obj["data"])
+            except (AttributeError, TypeError):
+                pass
+        return obj
+
+    return decode
+
+
+def _msgspec_struct(cls : type, structs : Dict[type, Any]):
+    # msgspec Struct with the fields of a record type, decoding payloads into records without dicts.
+    import msgspec
+
+    if cls not in structs:
+        hints = typing.get_type_hints(cls)
+        definitions = []
+        for name, key, item in _record_fields(cls):
+            if item is not None:
+                definitions.append((name, List[_msgspec_struct(item, structs)], msgspec.field(default_factory=list)))
+            else:
+                definitions.append((name, hints[name], None))
+        structs[cls] = msgspec.defstruct(
+            f"{cls.__name__}Struct", definitions, rename={name: key for name, key, _ in _record_fields(cls)}, module=__name__
+        )
+        _RECORDS[structs[cls]] = cls
+    return structs[cls]
+
+
+def _msgspec_decoder() -> Callable[[Union[bytes, str], Optional[str]], Any]:
+    import msgspec
+
+    structs = {}
+    decoders = {}
+    for schema, tp in SCHEMAS.items():
+        item = _list_item(tp)
+        tp = List[_msgspec_struct(item, structs)] if item is not None else _msgspec_struct(tp, structs)
+        decoders[schema] = msgspec.json.Decoder(tp)
+    generic = msgspec.json.Decoder()
+    envelope = msgspec.json.Decoder(Dict[str, msgspec.Raw])
+
+    # The envelope is split into raw values, and only `data` is decoded into records.
+    def decode(data : Union[bytes, str], schema : Optional[str] = None) -> Any:
+        if schema is None:
+            return generic.decode(data)
+        try:
+            raws = envelope.decode(data)
+        except msgspec.ValidationError:
+            return generic.decode(data)
+        obj = {}
+        for key, raw in raws.items():
+            if key == "data":
+                try:
+                    obj[key] = decoders[schema].decode(raw)
+                    continue
+                except msgspec.ValidationError:
+                    pass
+            obj[key] = generic.decode(raw)
+        return obj
+
+    return decode
+
+
+def _load_backend(name : str) -> Tuple[
+    Callable[[Union[bytes, str]], Any], Callable[[Any], bytes], Callable[[Union[bytes, str], Optional[str]], Any]
+]:
+    if name == "orjson":
+        import orjson
+        return orjson.loads, orjson.dumps, _dict_decoder(orjson.loads)
+    elif name == "msgspec":
+        import msgspec
+        return msgspec.json.Decoder().decode, msgspec.json.Encoder().encode, _msgspec_decoder()
+    elif name == "json":
+        return json.loads, _json_dumps, _dict_decoder(json.loads)
+    else:
+        raise ValueError(f"backend accepts either {', '.join(f'`{b}`' for b in BACKENDS)}.")
+
+
+def available_backends() -> list:
+    """List installed JSON backends.
+
+    Returns
+    -------
+    list
+        Backend names, fastest first.
+    """
+
+    available = []
+    for name in BACKENDS:
+        try:
+            _load_backend(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def set_backend(name : Optional[str] = None) -> str:
+    """Select the JSON backend used to decode responses and encode snapshots.
+
+    Parameters
+    ----------
+    name : str, optional
+        `orjson`, `msgspec` or `json`. If None is given, the fastest installed backend is picked, by default None.
+
+    Returns
+    -------
+    str
+        The selected backend.
+
+    Raises
+    ------
+    ImportError
+        If the requested backend is not installed.
+    """
+
+    global _backend, _loads, _dumps, _decode
+
+    if name is None:
+        name = available_backends()[0]
+    _loads, _dumps, _decode = _load_backend(name)
+    _backend = name
+    return name
+
+
+def get_backend() -> str:
+    """Get the selected JSON backend.
+
+    Returns
+    -------
+    str
+        The selected backend.
+    """
+
+    if _backend is None:
+        set_backend()
+    return _backend
+
+
+def loads(data : Union[bytes, str]) -> Any:
+    """Decode JSON with the selected backend.
+
+    Parameters
+    ----------
+    data : bytes or str
+        Raw JSON document, e.g. the body of a response.
+
+    Returns
+    -------
+    Any
+        Decoded object.
+    """
+
+    if _loads is None:
+        set_backend()
+    return _loads(data)
+
+
+def decode(data : Union[bytes, str], schema : Optional[str] = None) -> Any:
+    """Decode a response with the selected backend, decoding its `data` straight into the records of `schema`.
+
+    msgspec decodes into Structs with the fields of the records, and the other backends build the records
+    from the decoded objects. `data` is left as decoded JSON if it does not match the schema, e.g. on errors.
+
+    Parameters
+    ----------
+    data : bytes or str
+        Raw JSON document, e.g. the body of a response.
+    schema : str, optional
+        `ami`, `ami_bill`, `ami_unbilled` or `bill_records`, see `SCHEMAS`. If None is given,
+        the response is decoded as `loads` does, by default None.
+
+    Returns
+    -------
+    Any
+        Decoded response.
+    """
+
+    if _decode is None:
+        set_backend()
+    return _decode(data, schema)
+
+
+def dumps(obj : Any) -> bytes:
+    """Encode JSON with the selected backend.
+
+    Parameters
+    ----------
+    obj : Any
+        Object consisting of JSON compatible types.
+
+    Returns
+    -------
+    bytes
+        Compact UTF-8 encoded JSON document.
+    """
+
+    if _dumps is None:
+        set_backend()
+    return _dumps(obj)
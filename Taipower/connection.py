@@ -1,12 +1,16 @@
+from __future__ import annotations
+
 import json
 import logging
 import time
-import asyncio
 from dataclasses import dataclass
 from datetime import datetime
+from typing import TYPE_CHECKING
+
+from . import codec, deadline, profiling, utility
 
-import httpx
-from . import DEVICE_ID, utility
+if TYPE_CHECKING:
+    import httpx
 
 ENDPOINT = "mapp-2019.taipower.com.tw"
 BASIC_AUTH = "dHBlYy13U1pvLTVDNjZTZG84ZzM6X1UyVlpZd05kWi1hTW9ILV9fZlctZ3ROR0lwVmgydy4="
@@ -36,19 +40,31 @@ class TaipowerConnection:
         otherwise, a login procedure is performed to obtain new taipower_tokens,
         by default None.
     proxy : str, optional
-        Proxy setting. Format:"IP:port", by default None. 
+        Proxy setting. Format:"IP:port" or a proxy URL. Ignored if `transport` is given,
+        see proxy.TaipowerProxyPool for several proxies, by default None.
     print_response : bool, optional
         If set, all responses of httpx will be printed, by default False.
+    auto_login : bool, optional
+        If set and taipower_tokens is not given, login immediately.
+        Otherwise, the caller is responsible for obtaining tokens via `login` or `async_login`, by default True.
+    transport : httpx.AsyncBaseTransport, optional
+        Transport of the clients created by the connection. Synchronous requests require it to be
+        an httpx.BaseTransport as well, by default None.
     """
 
-    def __init__(self, account, password, taipower_tokens=None, proxy=None, print_response=False):
+    # Schema of the `data` of the responses, see codec.decode.
+    schema = None
+
+    def __init__(self, account, password, taipower_tokens=None, proxy=None, print_response=False, auto_login=True, transport=None):
         self._login_response = None
         self._account = account
         self._password = password
         self._print_response = print_response
-        self._proxies = {'http': proxy, 'https': proxy} if proxy else None
+        # A single proxy is used by the connection pool of each client, which closes it.
+        self._proxy = (proxy if "://" in proxy else f"http://{proxy}") if proxy and transport is None else None
+        self._transport = transport
 
-        if taipower_tokens:
+        if taipower_tokens or not auto_login:
             self._taipower_tokens = taipower_tokens
         else:
             conn_status, self._taipower_tokens = self.login()
@@ -65,12 +81,14 @@ class TaipowerConnection:
         return headers
     
     def _handle_response(self, response):
-        response_json = response.json()
+        import httpx
+
+        response_json = codec.decode(response.content, self.schema)
         
         if response.status_code == httpx.codes.ok:
             if "success" in response_json and "message" in response_json:
                 if response_json["success"] == True:
-                    if self.__class__.__name__ == "GetAMIUnbilled" and response_json["data"]["ami"] == False:
+                    if self.__class__.__name__ == "GetAMIUnbilled" and codec.record(codec.AMIUnbilled, response_json["data"]).ami == False:
                         return "No AMI unbilled data", response_json                    
                     return "OK", response_json
                 else:
@@ -86,39 +104,47 @@ class TaipowerConnection:
             return "Unknown error", response_json
     
     def _send(self, api_name, **kwargs):
-        with httpx.Client(proxies=self._proxies) as c:
+        import httpx
+
+        timeout = deadline.timeout(kwargs.pop("timeout") if "timeout" in kwargs else 10.0)
+        with httpx.Client(transport=self._transport, proxy=self._proxy) as c:
             headers = kwargs.pop("headers") if "headers" in kwargs else self._generate_headers()
-            timeout = kwargs.pop("timeout") if "timeout" in kwargs else 10.0
-            req = c.post(
-                f"https://{ENDPOINT}/{api_name}",
-                headers=headers,
-                timeout=timeout,
-                **kwargs,
-            )
+            with profiling.span("send"):
+                req = c.post(
+                    f"https://{ENDPOINT}/{api_name}",
+                    headers=headers,
+                    timeout=timeout,
+                    **kwargs,
+                )
         if self._print_response:
             self.print_response(req)
 
-        message, response_json = self._handle_response(req)
+        with profiling.span("decode"):
+            message, response_json = self._handle_response(req)
 
         return message, response_json
 
     async def _async_send(self, api_name, client=None, **kwargs):
-        c = httpx.AsyncClient(proxies=self._proxies) if client is None else client
+        import httpx
+
+        timeout = deadline.timeout(kwargs.pop("timeout") if "timeout" in kwargs else 10.0)
+        c = httpx.AsyncClient(transport=self._transport, proxy=self._proxy) if client is None else client
         headers = kwargs.pop("headers") if "headers" in kwargs else self._generate_headers()
-        timeout = kwargs.pop("timeout") if "timeout" in kwargs else 10.0
-        req = await c.post(
-            f"https://{ENDPOINT}/{api_name}",
-            headers=headers,
-            timeout=timeout,
-            **kwargs,
-        )
+        with profiling.span("send"):
+            req = await c.post(
+                f"https://{ENDPOINT}/{api_name}",
+                headers=headers,
+                timeout=timeout,
+                **kwargs,
+            )
         if client is None:
             await c.aclose()
         
         if self._print_response:
             self.print_response(req)
 
-        message, response_json = self._handle_response(req)
+        with profiling.span("decode"):
+            message, response_json = self._handle_response(req)
 
         return message, response_json
 
@@ -137,12 +163,33 @@ class TaipowerConnection:
             (status, Taipower tokens).
         """
 
+        return profiling.run(self.async_login(use_refresh_token=use_refresh_token))
+
+    async def async_login(self, use_refresh_token=False, client=None):
+        """Asynchronously login API.
+
+        Parameters
+        ----------
+        use_refresh_token : bool, optional
+            Whether or not to use TaipowerTokens.refresh_token to login. 
+            If TaipowerTokens is not provided, fallback to email and password, by default False
+        client : httpx.AsyncClient, optional
+            AsyncClient for requests, by default None
+
+        Returns
+        -------
+        (str, TaipowerTokens)
+            (status, Taipower tokens).
+        """
+
         if use_refresh_token and self._taipower_tokens != None:
             login_json_data = {
                 "refresh_token": self._taipower_tokens.refresh_token,
                 "grant_type": "refresh_token",
             }
         else:
+            from . import DEVICE_ID
+
             use_refresh_token = False
             login_json_data = {
                 "username": self._account,
@@ -155,7 +202,8 @@ class TaipowerConnection:
         
         login_headers = self._generate_headers(token_type="basic")
 
-        status, response = asyncio.run(self._async_send("oauth/token", data=login_json_data, headers=login_headers))
+        with profiling.span("auth"):
+            status, response = await self._async_send("oauth/token", data=login_json_data, headers=login_headers, client=client)
 
         taipower_tokens = None
         if status == "OK" and response["token_type"] == "bearer":
@@ -180,7 +228,7 @@ class TaipowerConnection:
         print(self.__class__.__name__, 'Response:')
         print('headers:', response.headers)
         print('status_code:', response.status_code)
-        print('text:', json.dumps(response.json(), indent=True))
+        print('text:', json.dumps(codec.loads(response.content), indent=True))
         print('===================================================')
 
 
@@ -299,6 +347,7 @@ class GetAMIBill(TaipowerConnection):
     """
 
     api_name = "api/home/bills"
+    schema = "ami_bill"
     
     def setup_payload(self, electric_number):
         json_data = {
@@ -331,6 +380,18 @@ class GetAMIPowerRate(TaipowerConnection):
     def __init__(self, account, password, **kwargs):
         super().__init__(account, password, **kwargs)
 
+    def setup_payload(self, electric_number : str):
+        json_data = {
+            "customNo": electric_number,
+        }
+        return json_data
+
+    def get_data(self, electric_number: str):
+        return super().get_data(electric_number)
+
+    async def async_get_data(self, electric_number: str, client: httpx.AsyncClient = None):
+        return await super().async_get_data(electric_number, client=client)
+
 
 class GetAMI(TaipowerConnection):
     """API internal endpoint.
@@ -343,6 +404,8 @@ class GetAMI(TaipowerConnection):
         User password.
     """
 
+    schema = "ami"
+
     def __init__(self, account, password, **kwargs):
         super().__init__(account, password, **kwargs)
     
@@ -387,6 +450,7 @@ class GetAMIUnbilled(TaipowerConnection):
     """
 
     api_name = "applyCase/amiUnbillData"
+    schema = "ami_unbilled"
 
     def __init__(self, account, password, **kwargs):
         super().__init__(account, password, **kwargs)
@@ -416,6 +480,7 @@ class GetBillRecords(TaipowerConnection):
     """
 
     api_name = "api/mybill/records"
+    schema = "bill_records"
 
     def __init__(self, account, password, **kwargs):
         super().__init__(account, password, **kwargs)
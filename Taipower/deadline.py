@@ -0,0 +1,239 @@
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, List, Optional, Sequence, Tuple
+
+_current : contextvars.ContextVar = contextvars.ContextVar("taipower_deadline", default=None)
+
+
+class TaipowerDeadlineExceeded(RuntimeError):
+    """The budget of a call ran out. Work still outstanding was cancelled.
+
+    Parameters
+    ----------
+    message : str
+        Message.
+    completed : list, optional
+        Work that completed, successfully or not, by default empty.
+    cancelled : list, optional
+        Work that was cancelled, by default empty.
+    errors : list, optional
+        Errors of the completed work, by default empty.
+    result : Any, optional
+        Partial result of the completed work, by default None.
+    """
+
+    def __init__(
+        self,
+        message : str,
+        completed : Optional[list] = None,
+        cancelled : Optional[list] = None,
+        errors : Optional[list] = None,
+        result : Any = None,
+    ) -> None:
+        super().__init__(message)
+        self.completed : list = completed or []
+        self.cancelled : list = cancelled or []
+        self.errors : list = errors or []
+        self.result : Any = result
+
+
+class TaipowerDeadline:
+    """Deadline of a budget, shared by all requests made within its context, including in tasks started within it.
+
+    A nested deadline never extends the deadline it is nested in.
+
+    Parameters
+    ----------
+    budget : float
+        Seconds from now.
+    """
+
+    def __init__(self, budget : float) -> None:
+        if budget < 0:
+            raise ValueError("budget must be non-negative.")
+        self.budget : float = budget
+        self.expires_at : float = time.monotonic() + budget
+        self._token = None
+
+    def __enter__(self) -> "TaipowerDeadline":
+        outer = _current.get()
+        if outer is not None and outer.expires_at < self.expires_at:
+            self.budget = outer.remaining()
+            self.expires_at = outer.expires_at
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *args) -> None:
+        _current.reset(self._token)
+        self._token = None
+
+    def remaining(self) -> float:
+        """Seconds left, 0 if expired.
+
+        Returns
+        -------
+        float
+            Seconds.
+        """
+
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        """Whether or not the budget ran out.
+
+        Returns
+        -------
+        bool
+            Expired.
+        """
+
+        return time.monotonic() >= self.expires_at
+
+
+class _NoDeadline:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NO_DEADLINE = _NoDeadline()
+
+
+def scope(budget : Optional[float]):
+    """Bound the calls made within a `with` block by a budget.
+
+    Parameters
+    ----------
+    budget : float, optional
+        Seconds. If None is given, the current deadline, if any, is kept.
+
+    Returns
+    -------
+    ContextManager
+        `TaipowerDeadline`, or a no-op context manager if `budget` is None.
+    """
+
+    return _NO_DEADLINE if budget is None else TaipowerDeadline(budget)
+
+
+def current() -> Optional[TaipowerDeadline]:
+    """The deadline of the current context.
+
+    Returns
+    -------
+    Optional[TaipowerDeadline]
+        Deadline. None if the calls are unbounded.
+    """
+
+    return _current.get()
+
+
+def timeout(default : float) -> float:
+    """Timeout of a request, bounded by the remaining budget.
+
+    Parameters
+    ----------
+    default : float
+        Timeout without a deadline.
+
+    Returns
+    -------
+    float
+        Seconds.
+
+    Raises
+    ------
+    TaipowerDeadlineExceeded
+        If the budget already ran out.
+    """
+
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise TaipowerDeadlineExceeded(f"The budget of {deadline.budget:.3f} s ran out before sending a request.")
+    return min(default, remaining)
+
+
+def is_cut(error : BaseException) -> bool:
+    """Whether or not an error was caused by the current budget running out.
+
+    Parameters
+    ----------
+    error : BaseException
+        Error.
+
+    Returns
+    -------
+    bool
+        True for `TaipowerDeadlineExceeded`, and for timeouts and cancellations once the budget ran out.
+    """
+
+    if isinstance(error, TaipowerDeadlineExceeded):
+        return True
+    deadline = _current.get()
+    if deadline is None or not deadline.expired:
+        return False
+    import httpx
+
+    return isinstance(error, (httpx.TimeoutException, asyncio.TimeoutError, asyncio.CancelledError))
+
+
+async def gather(awaitables : Sequence[Awaitable], labels : Sequence) -> Tuple[List[Any], List[Any]]:
+    """Run awaitables concurrently until they complete or the current budget runs out.
+
+    Awaitables still outstanding when the budget runs out are cancelled, and so are the ones
+    whose requests timed out because of it.
+
+    Parameters
+    ----------
+    awaitables : Sequence[Awaitable]
+        Awaitables.
+    labels : Sequence
+        Labels of the awaitables, used in the report of cancelled work.
+
+    Returns
+    -------
+    Tuple[List[Any], List[Any]]
+        Results or exceptions of the completed awaitables, in order and None for cancelled ones,
+        and the labels of the cancelled awaitables.
+    """
+
+    deadline = _current.get()
+    if deadline is None:
+        return list(await asyncio.gather(*awaitables, return_exceptions=True)), []
+
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    if len(tasks) != 0:
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=deadline.remaining())
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        for task in pending:
+            task.cancel()
+        # Let cancelled tasks unwind, e.g. release their connections.
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = []
+    cancelled = []
+    for task, label in zip(tasks, labels):
+        if not task.cancelled():
+            error = task.exception()
+            if error is None:
+                results.append(task.result())
+                continue
+            if not is_cut(error):
+                results.append(error)
+                continue
+        results.append(None)
+        cancelled.append(label)
+    return results, cancelled
@@ -0,0 +1,231 @@
+from collections.abc import Mapping
+from typing import Any, Dict, List, Union
+
+from .model import TAIWAN_TIMEZONE, TaipowerAMISeries, time_to_epoch
+from .shared import TaipowerSharedAMI
+from .storage import COLUMNS, FLAG_MISSING, TaipowerAMICompressedFile, TaipowerAMIFile
+from .utility import roc_date_to_date
+
+AMI_COLUMNS = ("start_time", "is_missing_data", "total_kwh", "offpeak_kwh", "halfpeak_kwh", "satpeak_kwh", "peak_kwh")
+BILL_RECORD_COLUMNS = ("issue_year_month", "start_date", "end_date", "charge", "kwh", "paid")
+
+
+AMIs = Union[Mapping, TaipowerAMIFile, TaipowerAMICompressedFile, TaipowerSharedAMI]
+
+
+def ami_columns(amis : Mapping) -> Dict[str, List[Any]]:
+    """Transpose AMI into columns straight from the decoded records.
+
+    Parameters
+    ----------
+    amis : Mapping[str, TaipowerAMI]
+        AMI keyed by start time, e.g. `TaipowerElectricMeter.ami`.
+
+    Returns
+    -------
+    Dict[str, List[Any]]
+        Lists keyed by `AMI_COLUMNS`, in the order of `amis`. Start times are Unix timestamps and absent kwh are None.
+    """
+
+    values = list(amis.values())
+    if isinstance(amis, TaipowerAMISeries):
+        epochs = list(amis._epochs)
+    else:
+        epochs = [time_to_epoch(ami.start_time) for ami in values]
+
+    return {
+        "start_time": epochs,
+        "is_missing_data": [ami.is_missing_data for ami in values],
+        "total_kwh": [ami.total_kwh for ami in values],
+        "offpeak_kwh": [ami.offpeak_kwh for ami in values],
+        "halfpeak_kwh": [ami.halfpeak_kwh for ami in values],
+        "satpeak_kwh": [ami.satpeak_kwh for ami in values],
+        "peak_kwh": [ami.peak_kwh for ami in values],
+    }
+
+
+def ami_to_numpy(amis : AMIs) -> Dict[str, Any]:
+    """Convert AMI into NumPy columns. Requires NumPy.
+
+    Columns of a memory-mapped `storage.TaipowerAMIFile` are views of the file without copying. Those of a
+    `shared.TaipowerSharedAMI` are views of the meter copied once out of shared memory when it was read.
+
+    Parameters
+    ----------
+    amis : Mapping[str, TaipowerAMI], storage.TaipowerAMIFile, storage.TaipowerAMICompressedFile or shared.TaipowerSharedAMI
+        AMI.
+
+    Returns
+    -------
+    Dict[str, numpy.ndarray]
+        Arrays keyed by `AMI_COLUMNS`: `int64` Unix timestamps, `bool` flags and float kwh with NaN for None.
+    """
+
+    import numpy as np
+
+    if isinstance(amis, (TaipowerAMIFile, TaipowerAMICompressedFile, TaipowerSharedAMI)):
+        array = amis.to_numpy()
+        columns = {
+            "start_time": array["offset"].astype(np.int64) + amis.base,
+            "is_missing_data": (array["flags"] & FLAG_MISSING) != 0,
+        }
+        for column, name in zip(AMI_COLUMNS[2:], COLUMNS):
+            columns[column] = array[name]
+        return columns
+
+    columns = ami_columns(amis)
+    arrays = {
+        "start_time": np.array(columns["start_time"], dtype=np.int64),
+        "is_missing_data": np.array(columns["is_missing_data"], dtype=bool),
+    }
+    for column in AMI_COLUMNS[2:]:
+        arrays[column] = np.array(columns[column], dtype=np.float64)
+    return arrays
+
+
+def ami_to_pandas(amis : AMIs):
+    """Convert AMI into a DataFrame. Requires pandas.
+
+    Parameters
+    ----------
+    amis : Mapping[str, TaipowerAMI], storage.TaipowerAMIFile, storage.TaipowerAMICompressedFile or shared.TaipowerSharedAMI
+        AMI.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by the start time in Taiwan time, with the other `AMI_COLUMNS` as columns.
+    """
+
+    import pandas as pd
+
+    columns = ami_to_numpy(amis)
+    index = pd.to_datetime(columns.pop("start_time"), unit="s", utc=True).tz_convert(TAIWAN_TIMEZONE)
+    return pd.DataFrame(columns, index=index.rename("start_time"), copy=False)
+
+
+def ami_to_arrow(amis : AMIs):
+    """Convert AMI into an Arrow table. Requires pyarrow.
+
+    Parameters
+    ----------
+    amis : Mapping[str, TaipowerAMI], storage.TaipowerAMIFile, storage.TaipowerAMICompressedFile or shared.TaipowerSharedAMI
+        AMI.
+
+    Returns
+    -------
+    pyarrow.Table
+        Table of `AMI_COLUMNS`, start times as timestamps in Taiwan time.
+    """
+
+    import numpy as np
+    import pyarrow as pa
+
+    columns = ami_to_numpy(amis)
+    arrays = [pa.array(columns["start_time"], type=pa.timestamp("s", tz="+08:00"))]
+    arrays.append(pa.array(columns["is_missing_data"]))
+    for column in AMI_COLUMNS[2:]:
+        values = np.ascontiguousarray(columns[column])
+        arrays.append(pa.array(values, mask=np.isnan(values)))
+    return pa.Table.from_arrays(arrays, names=list(AMI_COLUMNS))
+
+
+def bill_records_columns(bill_records : Mapping) -> Dict[str, List[Any]]:
+    """Transpose bill records into columns straight from the decoded records.
+
+    Parameters
+    ----------
+    bill_records : Mapping[str, TaipowerBillRecord]
+        Bill records keyed by issue year and month, e.g. `TaipowerElectricMeter.bill_records`.
+
+    Returns
+    -------
+    Dict[str, List[Any]]
+        Lists keyed by `BILL_RECORD_COLUMNS`, in the order of `bill_records`.
+    """
+
+    records = list(bill_records.values())
+    periods = [record.period.split("~") for record in records]
+    return {
+        "issue_year_month": list(bill_records),
+        "start_date": [roc_date_to_date(start) for start, _ in periods],
+        "end_date": [roc_date_to_date(end) for _, end in periods],
+        "charge": [record.charge for record in records],
+        "kwh": [record.kwh for record in records],
+        "paid": [record.paid for record in records],
+    }
+
+
+def bill_records_to_numpy(bill_records : Mapping) -> Dict[str, Any]:
+    """Convert bill records into NumPy columns. Requires NumPy.
+
+    Parameters
+    ----------
+    bill_records : Mapping[str, TaipowerBillRecord]
+        Bill records.
+
+    Returns
+    -------
+    Dict[str, numpy.ndarray]
+        Arrays keyed by `BILL_RECORD_COLUMNS`, dates as `datetime64[D]`.
+    """
+
+    import numpy as np
+
+    columns = bill_records_columns(bill_records)
+    return {
+        "issue_year_month": np.array(columns["issue_year_month"], dtype=str),
+        "start_date": np.array(columns["start_date"], dtype="datetime64[D]"),
+        "end_date": np.array(columns["end_date"], dtype="datetime64[D]"),
+        "charge": np.array(columns["charge"], dtype=np.int64),
+        "kwh": np.array(columns["kwh"], dtype=np.float64),
+        "paid": np.array(columns["paid"], dtype=bool),
+    }
+
+
+def bill_records_to_pandas(bill_records : Mapping):
+    """Convert bill records into a DataFrame. Requires pandas.
+
+    Parameters
+    ----------
+    bill_records : Mapping[str, TaipowerBillRecord]
+        Bill records.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by the issue year and month, with the other `BILL_RECORD_COLUMNS` as columns.
+    """
+
+    import pandas as pd
+
+    columns = bill_records_to_numpy(bill_records)
+    index = pd.Index(columns.pop("issue_year_month"), name="issue_year_month")
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def bill_records_to_arrow(bill_records : Mapping):
+    """Convert bill records into an Arrow table. Requires pyarrow.
+
+    Parameters
+    ----------
+    bill_records : Mapping[str, TaipowerBillRecord]
+        Bill records.
+
+    Returns
+    -------
+    pyarrow.Table
+        Table of `BILL_RECORD_COLUMNS`.
+    """
+
+    import pyarrow as pa
+
+    columns = bill_records_columns(bill_records)
+    return pa.table({
+        "issue_year_month": pa.array(columns["issue_year_month"], type=pa.string()),
+        "start_date": pa.array(columns["start_date"], type=pa.date32()),
+        "end_date": pa.array(columns["end_date"], type=pa.date32()),
+        "charge": pa.array(columns["charge"], type=pa.int64()),
+        "kwh": pa.array(columns["kwh"], type=pa.float64()),
+        "paid": pa.array(columns["paid"], type=pa.bool_()),
+    })
@@ -0,0 +1,388 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .model import TAIWAN_TIMEZONE, TaipowerAMI, datetime_to_epoch, time_to_epoch
+
+_LOGGER = logging.getLogger(__name__)
+
+PERIOD_SECONDS = {
+    "quater": 900,
+    "hour": 3600,
+    "daily": 86400,
+}
+
+
+class _GapBitmap:
+    # One bit per interval from `base`; a set bit is a gap (missing or absent).
+
+    def __init__(self, base : int, step : int) -> None:
+        self.base : int = base
+        self.step : int = step
+        self.bits : bytearray = bytearray()
+        self.size : int = 0
+
+    def _grow(self, size : int) -> None:
+        if size > self.size:
+            self.bits.extend(b"\x00" * ((size + 7) // 8 - len(self.bits)))
+            for index in range(self.size, size):
+                self.bits[index >> 3] |= 1 << (index & 7)
+            self.size = size
+
+    def expect(self, start : int, end : int) -> None:
+        if start < self.base:
+            shift = (self.base - start + self.step - 1) // self.step
+            old = self.gaps()
+            self.base -= shift * self.step
+            self.bits = bytearray()
+            size = self.size + shift
+            self.size = 0
+            self._grow(size)
+            known = set(old)
+            for index in range(shift, size):
+                if self.base + index * self.step not in known:
+                    self.set(index, False)
+        self._grow((end - self.base + self.step - 1) // self.step)
+
+    def set(self, index : int, gap : bool) -> None:
+        if gap:
+            self.bits[index >> 3] |= 1 << (index & 7)
+        else:
+            self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def observe(self, epoch : int, gap : bool) -> None:
+        index = (epoch - self.base) // self.step
+        if 0 <= index < self.size:
+            self.set(index, gap)
+
+    def count(self) -> int:
+        return bin(int.from_bytes(self.bits, "little")).count("1")
+
+    def gaps(self) -> List[int]:
+        gaps = []
+        for byte_index, byte in enumerate(self.bits):
+            if byte == 0:
+                continue
+            for bit in range(8):
+                index = byte_index * 8 + bit
+                if byte >> bit & 1 and index < self.size:
+                    gaps.append(self.base + index * self.step)
+        return gaps
+
+
+class TaipowerAMIGapTracker:
+    """Compact per-meter bitmaps of missing or absent AMI intervals.
+
+    Parameters
+    ----------
+    ami_period : str, optional
+        `quater`, `hour` or `daily`, by default `quater`.
+    """
+
+    def __init__(self, ami_period : str = "quater") -> None:
+        if ami_period not in PERIOD_SECONDS:
+            raise ValueError("ami_period accepts either `quater`, `hour` or `daily`.")
+        self.ami_period : str = ami_period
+        self._step : int = PERIOD_SECONDS[ami_period]
+        self._bitmaps : Dict[str, _GapBitmap] = {}
+
+    @property
+    def electric_numbers(self) -> List[str]:
+        """Tracked electric numbers.
+
+        Returns
+        -------
+        List[str]
+            Electric numbers.
+        """
+
+        return list(self._bitmaps)
+
+    def expect(self, electric_number : str, start : datetime.datetime, end : datetime.datetime) -> None:
+        """Declare the time range whose intervals are expected. Intervals not observed yet are gaps.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        start : datetime.datetime
+            Start of the range, inclusive. A naive datetime is regarded as Taiwan local time.
+        end : datetime.datetime
+            End of the range, exclusive.
+        """
+
+        start_epoch = datetime_to_epoch(start) // self._step * self._step
+        end_epoch = datetime_to_epoch(end)
+        bitmap = self._bitmaps.get(electric_number)
+        if bitmap is None:
+            bitmap = self._bitmaps[electric_number] = _GapBitmap(start_epoch, self._step)
+        bitmap.expect(start_epoch, end_epoch)
+
+    def observe(self, electric_number : str, amis : Iterable[TaipowerAMI]) -> None:
+        """Record retrieved AMI. Intervals with missing data stay gaps, and meters without an expected range are ignored.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        amis : Iterable[TaipowerAMI]
+            AMI of the tracked period.
+        """
+
+        bitmap = self._bitmaps.get(electric_number)
+        if bitmap is None:
+            return
+        for ami in amis:
+            bitmap.observe(time_to_epoch(ami.start_time), ami.is_missing_data)
+
+    def gaps(self, electric_number : str) -> List[int]:
+        """Get the start times of the gaps.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+
+        Returns
+        -------
+        List[int]
+            Unix timestamps in time order.
+        """
+
+        bitmap = self._bitmaps.get(electric_number)
+        return [] if bitmap is None else bitmap.gaps()
+
+    def gap_dates(self, electric_number : str) -> List[datetime.date]:
+        """Get the request dates covering the gaps, i.e. dates for `quater` and `hour`, and first days of months for `daily`.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+
+        Returns
+        -------
+        List[datetime.date]
+            Dates in time order.
+        """
+
+        dates = []
+        for epoch in self.gaps(electric_number):
+            date = datetime.datetime.fromtimestamp(epoch, TAIWAN_TIMEZONE).date()
+            if self.ami_period == "daily":
+                date = date.replace(day=1)
+            if len(dates) == 0 or dates[-1] != date:
+                dates.append(date)
+        return dates
+
+    def completeness(self, electric_number : Optional[str] = None) -> float:
+        """Get the percentage of expected intervals that are recorded.
+
+        Parameters
+        ----------
+        electric_number : str, optional
+            Electric number. If None is given, all meters are counted, by default None.
+
+        Returns
+        -------
+        float
+            Percentage in [0, 100]. 100 if nothing is expected.
+        """
+
+        bitmaps = self._bitmaps.values() if electric_number is None else [self._bitmaps[electric_number]]
+        size = sum(bitmap.size for bitmap in bitmaps)
+        if size == 0:
+            return 100.0
+        return 100.0 * (size - sum(bitmap.count() for bitmap in bitmaps)) / size
+
+    def report(self) -> Dict[str, float]:
+        """Get the completeness of every meter.
+
+        Returns
+        -------
+        Dict[str, float]
+            Percentage keyed by electric number.
+        """
+
+        return {electric_number: self.completeness(electric_number) for electric_number in self._bitmaps}
+
+
+class TaipowerAMIGapRepairer:
+    """Background task re-retrieving only the dates that still have gaps.
+
+    Each date is retried with exponentially growing spacing, and given up once it is older than the horizon.
+    A check that fails, e.g. when reauthenticating, is logged and counted in `failures`, and the next check is made as usual.
+
+    Parameters
+    ----------
+    api : api.TaipowerAPI
+        Logged in API.
+    tracker : TaipowerAMIGapTracker
+        Gap tracker.
+    initial_delay : float, optional
+        Seconds before the second attempt of a date, doubled after every attempt, by default 900.
+    max_delay : float, optional
+        Maximum seconds between attempts, by default 86400.
+    horizon : float, optional
+        Seconds after the end of a date when it is given up, by default 7 days.
+    """
+
+    def __init__(
+        self,
+        api,
+        tracker : TaipowerAMIGapTracker,
+        initial_delay : float = 900.0,
+        max_delay : float = 86400.0,
+        horizon : float = 7 * 86400.0,
+    ) -> None:
+        self.api = api
+        self.tracker : TaipowerAMIGapTracker = tracker
+        self.initial_delay : float = initial_delay
+        self.max_delay : float = max_delay
+        self.horizon : float = horizon
+
+        self._attempts : Dict[Tuple[str, datetime.date], Tuple[int, float]] = {}
+        self._given_up : Dict[str, List[datetime.date]] = {}
+        self._task : Optional[asyncio.Task] = None
+
+        self.failures : int = 0
+        self.last_error : Optional[Exception] = None
+
+    @property
+    def given_up(self) -> Dict[str, List[datetime.date]]:
+        """Dates given up.
+
+        Returns
+        -------
+        Dict[str, List[datetime.date]]
+            Dates keyed by electric number.
+        """
+
+        return {electric_number: list(dates) for electric_number, dates in self._given_up.items()}
+
+    def _date_end(self, date : datetime.date) -> float:
+        if self.tracker.ami_period == "daily":
+            date = (date + datetime.timedelta(days=32)).replace(day=1)
+        else:
+            date = date + datetime.timedelta(days=1)
+        return datetime_to_epoch(datetime.datetime.combine(date, datetime.time()))
+
+    def due(self, now : Optional[float] = None) -> List[Tuple[str, datetime.date]]:
+        """Get the (electric number, date) pairs to be retried now, giving up the ones beyond the horizon.
+
+        Parameters
+        ----------
+        now : float, optional
+            Unix timestamp. If None is given, the current time is used, by default None.
+
+        Returns
+        -------
+        List[Tuple[str, datetime.date]]
+            Pairs due.
+        """
+
+        now = time.time() if now is None else now
+        due = []
+        for electric_number in self.tracker.electric_numbers:
+            for date in self.tracker.gap_dates(electric_number):
+                if date in self._given_up.get(electric_number, []):
+                    continue
+                if now - self._date_end(date) > self.horizon:
+                    self._given_up.setdefault(electric_number, []).append(date)
+                    self._attempts.pop((electric_number, date), None)
+                    continue
+                _, next_attempt = self._attempts.get((electric_number, date), (0, 0.0))
+                if next_attempt <= now:
+                    due.append((electric_number, date))
+        return due
+
+    async def run_once(self, now : Optional[float] = None) -> Dict[str, float]:
+        """Retry every due date once.
+
+        Parameters
+        ----------
+        now : float, optional
+            Unix timestamp. If None is given, the current time is used, by default None.
+
+        Returns
+        -------
+        Dict[str, float]
+            Completeness keyed by electric number after the retries.
+        """
+
+        now = time.time() if now is None else now
+        due = self.due(now)
+        if len(due) != 0:
+            async with self.api._create_client() as client:
+                await self.api._async_check_before_publish(client=client)
+                results = await asyncio.gather(
+                    *[
+                        self.api.async_get_ami(
+                            electric_number,
+                            datetime.datetime.combine(date, datetime.time()),
+                            client=client,
+                            ami_period=self.tracker.ami_period,
+                        )
+                        for electric_number, date in due
+                    ],
+                    return_exceptions=True,
+                )
+
+            for (electric_number, date), result in zip(due, results):
+                if not isinstance(result, Exception):
+                    self.tracker.observe(electric_number, result.values())
+                    meter = self.api.meters.get(electric_number)
+                    if meter is not None and self.api.ami_period == self.tracker.ami_period:
+                        meter.merge_ami(result)
+            gap_dates = {electric_number: set(self.tracker.gap_dates(electric_number)) for electric_number, _ in due}
+            for electric_number, date in due:
+                if date not in gap_dates[electric_number]:
+                    # Repaired dates need no further attempts.
+                    self._attempts.pop((electric_number, date), None)
+                    continue
+                attempts, _ = self._attempts.get((electric_number, date), (0, 0.0))
+                delay = min(self.initial_delay * 2 ** attempts, self.max_delay)
+                self._attempts[(electric_number, date)] = (attempts + 1, now + delay)
+        return self.tracker.report()
+
+    async def _run(self, interval : float) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # An error, e.g. a failed reauthentication, only skips this check.
+                _LOGGER.warning("Repairing AMI gaps failed, retrying in %s seconds: %s", interval, e)
+                self.failures += 1
+                self.last_error = e
+            else:
+                self.last_error = None
+            await asyncio.sleep(interval)
+
+    def start(self, interval : float = 60.0) -> asyncio.Task:
+        """Start repairing in the background of the running event loop.
+
+        Parameters
+        ----------
+        interval : float, optional
+            Seconds between checks for due dates, by default 60.
+
+        Returns
+        -------
+        asyncio.Task
+            The background task.
+        """
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(interval))
+        return self._task
+
+    def stop(self) -> None:
+        """Stop repairing."""
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,411 @@
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from . import codec
+from .transport import TaipowerTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Flight:
+    __slots__ = ("event", "error")
+
+    def __init__(self) -> None:
+        self.event : threading.Event = threading.Event()
+        self.error : Optional[Exception] = None
+
+
+def _values_json(values) -> Optional[list]:
+    return None if values is None else [value._json for value in values.values()]
+
+
+def _field(data, name : str):
+    # Fields missing from a response are left out of the metrics.
+    try:
+        return getattr(data, name)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _label(value : str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class TaipowerGateway:
+    """Local read-through HTTP gateway serving the meters of one API, so that several consumers share one poller.
+
+    Meter data older than `ttl` is refreshed from Taipower when requested. Concurrent requests for
+    stale data wait for a single upstream refresh instead of each issuing their own, and a refresh of
+    all meters also answers requests for any single meter. If a refresh fails, the last data is served
+    and marked as stale. Meters whose refresh failed, by an error or by fields all failing, are not refreshed
+    again for `retry_interval` seconds, doubled on every consecutive failure up to `ttl`, so a failing upstream
+    is not hit by every request.
+
+    Endpoints:
+
+    - `GET /meters`: all meters without AMI.
+    - `GET /meters/<electric number>`: a meter. AMI is included with `?ami=1`.
+    - `GET /metrics`: Prometheus text exposition of the meters and of the gateway, and of the upstream
+      responses if the API counts them, see `api.TaipowerAPI(transfer_stats=True)`.
+    - `GET /healthz`: liveness.
+
+    Parameters
+    ----------
+    api : api.TaipowerAPI
+        API. It is logged into on the first request if it has no meters.
+    ttl : float, optional
+        Seconds after which meter data is refreshed, by default 900.
+    host : str, optional
+        Address to listen on, by default `127.0.0.1`.
+    port : int, optional
+        Port to listen on. 0 picks a free port, see `address`, by default 8000.
+    retry_interval : float, optional
+        Seconds before the first retry of a failed refresh, by default 30.
+    """
+
+    def __init__(self, api, ttl : float = 900.0, host : str = "127.0.0.1", port : int = 8000, retry_interval : float = 30.0) -> None:
+        self.api = api
+        self.ttl : float = ttl
+        self.retry_interval : float = retry_interval
+        self.host : str = host
+        self.port : int = port
+
+        self.requests : Dict[str, int] = {}
+        self.cache_hits : int = 0
+        self.cache_misses : int = 0
+        self.upstream_refreshes : int = 0
+        self.upstream_errors : int = 0
+        self.upstream_seconds : float = 0.0
+        self.coalesced : int = 0
+
+        self._lock : threading.Lock = threading.Lock()
+        self._upstream_lock : threading.Lock = threading.Lock()
+        self._flights : Dict[Optional[str], _Flight] = {}
+        # Time of the last failed refresh and consecutive failures by electric number.
+        self._failures : Dict[str, Tuple[float, int]] = {}
+        self._server : Optional[ThreadingHTTPServer] = None
+        self._thread : Optional[threading.Thread] = None
+
+    def __enter__(self) -> "TaipowerGateway":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """Address the gateway listens on.
+
+        Returns
+        -------
+        Tuple[str, int]
+            Host and port.
+        """
+
+        if self._server is None:
+            return self.host, self.port
+        return self._server.server_address[:2]
+
+    def bind(self) -> ThreadingHTTPServer:
+        """Open the listening socket. Called by `serve_forever` and `start` if not yet opened.
+
+        Returns
+        -------
+        http.server.ThreadingHTTPServer
+            Server.
+        """
+
+        if self._server is None:
+            self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+            self._server.daemon_threads = True
+        return self._server
+
+    def serve_forever(self) -> None:
+        """Serve requests until `stop` is called from another thread or the process is interrupted."""
+
+        self.bind().serve_forever()
+
+    def start(self) -> None:
+        """Serve requests in a background thread."""
+
+        if self._thread is not None:
+            raise RuntimeError("The gateway is already running.")
+        self._thread = threading.Thread(target=self.bind().serve_forever, name="taipower-gateway", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _numbers(self, electric_number : Optional[str]) -> List[str]:
+        return list(self.api.meters) if electric_number is None else [electric_number]
+
+    def _stale(self, electric_number : Optional[str]) -> bool:
+        now = time.time()
+        for number in self._numbers(electric_number):
+            snapshot = self.api.meters[number].snapshot
+            if snapshot.version != 0 and now - snapshot.published_at <= self.ttl:
+                continue
+            with self._lock:
+                failed_at, failures = self._failures.get(number, (0.0, 0))
+            if failures == 0 or now - failed_at >= min(self.retry_interval * 2 ** (failures - 1), self.ttl):
+                return True
+        return False
+
+    def _record(self, electric_number : Optional[str], started : float) -> None:
+        # Meters not published since the refresh started failed it.
+        now = time.time()
+        with self._lock:
+            for number in self._numbers(electric_number):
+                if self.api.meters[number].snapshot.published_at >= started:
+                    self._failures.pop(number, None)
+                else:
+                    self._failures[number] = (now, self._failures.get(number, (0.0, 0))[1] + 1)
+
+    def _ensure_login(self) -> None:
+        if len(self.api.meters) == 0:
+            with self._upstream_lock:
+                if len(self.api.meters) == 0:
+                    self.api.login(fetch_data=False)
+
+    def refresh(self, electric_number : Optional[str] = None, force : bool = False) -> Optional[Exception]:
+        """Refresh stale meter data, sharing the upstream refresh with concurrent callers.
+
+        Parameters
+        ----------
+        electric_number : str, optional
+            Electric number. If None is given, all meters are refreshed, by default None.
+        force : bool, optional
+            Whether or not to refresh even if the data is fresh, by default False.
+
+        Returns
+        -------
+        Optional[Exception]
+            The error of the upstream refresh, None if it succeeded or was not needed.
+        """
+
+        self._ensure_login()
+        if not force and not self._stale(electric_number):
+            with self._lock:
+                self.cache_hits += 1
+            return None
+
+        with self._lock:
+            self.cache_misses += 1
+            flight = self._flights.get(None)
+            if flight is None:
+                flight = self._flights.get(electric_number)
+            leader = flight is None
+            if leader:
+                flight = self._flights[electric_number] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            return flight.error
+
+        try:
+            with self._upstream_lock:
+                # A refresh may have completed while waiting for the upstream.
+                if force or self._stale(electric_number):
+                    started = time.time()
+                    start = time.perf_counter()
+                    try:
+                        self.api.refresh_status(electric_number)
+                    finally:
+                        self._record(electric_number, started)
+                        with self._lock:
+                            self.upstream_refreshes += 1
+                            self.upstream_seconds += time.perf_counter() - start
+        except Exception as e:
+            _LOGGER.warning("Refreshing %s failed: %s", electric_number or "all meters", e)
+            flight.error = e
+            with self._lock:
+                self.upstream_errors += 1
+        finally:
+            with self._lock:
+                del self._flights[electric_number]
+            flight.event.set()
+        return flight.error
+
+    def meter_json(self, electric_number : str, include_ami : bool = False) -> dict:
+        """JSON document of the current data of a meter. Nothing is fetched.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        include_ami : bool, optional
+            Whether or not to include AMI, by default False.
+
+        Returns
+        -------
+        dict
+            Document.
+        """
+
+        meter = self.api.meters[electric_number]
+        snapshot = meter.snapshot
+        document = {
+            "electric_number": meter.number,
+            "name": meter.name,
+            "nickname": meter.nickname,
+            "version": snapshot.version,
+            "published_at": snapshot.published_at,
+            "stale": snapshot.version == 0 or time.time() - snapshot.published_at > self.ttl,
+            "meter": meter._json,
+            "ami_bill": None if snapshot.ami_bill is None else snapshot.ami_bill._json,
+            "ami_unbilled": None if snapshot.ami_unbilled is None else snapshot.ami_unbilled._json,
+            "bill_records": _values_json(snapshot.bill_records),
+        }
+        if include_ami:
+            document["ami"] = _values_json(snapshot.ami)
+        return document
+
+    def metrics(self) -> str:
+        """Prometheus text exposition of the current meter data and of the gateway counters. Nothing is fetched.
+
+        Returns
+        -------
+        str
+            Metrics.
+        """
+
+        families : Dict[str, Tuple[str, str, List[str]]] = {}
+
+        def add(name : str, kind : str, help_text : str, value, labels : str = "") -> None:
+            if value is None:
+                return
+            family = families.setdefault(name, (kind, help_text, []))
+            family[2].append(f"{name}{labels} {float(value)!r}")
+
+        for number, meter in sorted(self.api.meters.items()):
+            snapshot = meter.snapshot
+            labels = f'{{electric_number="{_label(number)}"}}'
+            add("taipower_meter_version", "counter", "Publications of the meter data.", snapshot.version, labels)
+            if snapshot.version != 0:
+                add("taipower_meter_published_timestamp_seconds", "gauge", "Time of the last publication.", snapshot.published_at, labels)
+            if snapshot.ami_bill is not None:
+                add("taipower_meter_bill_kwh", "gauge", "kWh of the current billing cycle.", _field(snapshot.ami_bill, "kwh"), labels)
+                add("taipower_meter_bill_amount", "gauge", "Amount of the current billing cycle.", _field(snapshot.ami_bill, "current_amount"), labels)
+            if snapshot.ami_unbilled is not None:
+                add("taipower_meter_unbilled_kwh", "gauge", "Unbilled kWh.", _field(snapshot.ami_unbilled, "kwh"), labels)
+                add("taipower_meter_unbilled_charge", "gauge", "Unbilled charge.", _field(snapshot.ami_unbilled, "charge"), labels)
+            if snapshot.ami is not None and len(snapshot.ami) != 0:
+                latest = snapshot.ami[max(snapshot.ami)]
+                add("taipower_meter_ami_latest_kwh", "gauge", "Total kWh of the latest AMI interval.", _field(latest, "total_kwh"), labels)
+
+        with self._lock:
+            for endpoint, count in sorted(self.requests.items()):
+                add("taipower_gateway_requests_total", "counter", "Requests served.", count, f'{{endpoint="{_label(endpoint)}"}}')
+            add("taipower_gateway_cache_hits_total", "counter", "Requests answered from fresh data.", self.cache_hits)
+            add("taipower_gateway_cache_misses_total", "counter", "Requests for stale data.", self.cache_misses)
+            add("taipower_gateway_coalesced_total", "counter", "Requests that waited for a refresh of another request.", self.coalesced)
+            add("taipower_gateway_upstream_refreshes_total", "counter", "Refreshes from Taipower.", self.upstream_refreshes)
+            add("taipower_gateway_upstream_errors_total", "counter", "Failed refreshes from Taipower.", self.upstream_errors)
+            add("taipower_gateway_upstream_seconds_total", "counter", "Seconds spent refreshing from Taipower.", self.upstream_seconds)
+
+        transport = getattr(self.api, "transport", None)
+        if isinstance(transport, TaipowerTransport):
+            stats = transport.stats()
+            for version, count in sorted(stats["http_versions"].items()):
+                add("taipower_upstream_responses_total", "counter", "Responses from Taipower.", count, f'{{http_version="{_label(version)}"}}')
+            add("taipower_upstream_received_bytes_total", "counter", "Bytes of the responses on the wire.", stats["bytes_received"])
+            add("taipower_upstream_decoded_bytes_total", "counter", "Bytes of the responses once decoded.", stats["bytes_decoded"])
+            add("taipower_upstream_compression_saved_bytes_total", "counter", "Bytes compression saved on the wire.", stats["bytes_saved"])
+
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def _count(self, endpoint : str) -> None:
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def handle(self, path : str) -> Tuple[int, str, bytes]:
+        """Answer a GET request.
+
+        Parameters
+        ----------
+        path : str
+            Request path with the query string.
+
+        Returns
+        -------
+        Tuple[int, str, bytes]
+            Status code, content type and body.
+        """
+
+        url = urlsplit(path)
+        parts = [part for part in url.path.split("/") if part != ""]
+        query = parse_qs(url.query)
+
+        if parts == ["healthz"]:
+            return 200, "text/plain", b"ok\n"
+
+        try:
+            if parts == ["metrics"]:
+                self._count("metrics")
+                self.refresh()
+                return 200, METRICS_CONTENT_TYPE, self.metrics().encode()
+            if parts == ["meters"]:
+                self._count("meters")
+                error = self.refresh()
+                meters = [self.meter_json(number) for number in self.api.meters]
+                if error is not None and all(meter["version"] == 0 for meter in meters):
+                    return self._error(502, f"An error occurred when refreshing meters: {error}")
+                return 200, "application/json", codec.dumps({"meters": meters})
+            if len(parts) == 2 and parts[0] == "meters":
+                self._count("meter")
+                if parts[1] not in self.api.meters:
+                    return self._error(404, f"Unknown electric number: {parts[1]}.")
+                error = self.refresh(parts[1])
+                document = self.meter_json(parts[1], include_ami=query.get("ami", ["0"])[0] in ("1", "true"))
+                if error is not None and document["version"] == 0:
+                    return self._error(502, f"An error occurred when refreshing meter {parts[1]}: {error}")
+                return 200, "application/json", codec.dumps(document)
+        except Exception as e:
+            _LOGGER.exception("Serving %s failed", path)
+            return self._error(502, f"An error occurred when serving {url.path}: {e}")
+        return self._error(404, f"Not found: {url.path}.")
+
+    @staticmethod
+    def _error(status : int, message : str) -> Tuple[int, str, bytes]:
+        return status, "application/json", codec.dumps({"error": message})
+
+    def _handler(self) -> type:
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            server_version = "TaipowerGateway"
+
+            def do_GET(self) -> None:
+                status, content_type, body = gateway.handle(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format : str, *args) -> None:
+                _LOGGER.debug("%s - %s", self.address_string(), format % args)
+
+        return Handler
@@ -0,0 +1,229 @@
+import struct
+from typing import Iterator, List, Sequence, Tuple
+
+# Block header: first and last start times, the number of rows and the payload size in bytes.
+BLOCK_HEADER = struct.Struct("<qqII")
+# A week of quarters per block keeps random access cheap while amortizing the block headers.
+BLOCK_SIZE = 672
+COLUMN_COUNT = 5
+
+# Delta-of-delta buckets: control bits, control bit length and value bit length.
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+Row = Tuple[int, int, Tuple[float, ...]]
+
+
+class _BitWriter:
+    def __init__(self) -> None:
+        self.data : bytearray = bytearray()
+        self._acc : int = 0
+        self._bits : int = 0
+
+    def write(self, value : int, bits : int) -> None:
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.data.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self) -> bytes:
+        if self._bits != 0:
+            return bytes(self.data) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self.data)
+
+
+class _BitReader:
+    def __init__(self, data : bytes) -> None:
+        self._data : bytes = data
+        self._position : int = 0
+        self._acc : int = 0
+        self._bits : int = 0
+
+    def read(self, bits : int) -> int:
+        while self._bits < bits:
+            self._acc = (self._acc << 8) | self._data[self._position]
+            self._position += 1
+            self._bits += 8
+        self._bits -= bits
+        value = self._acc >> self._bits
+        self._acc &= (1 << self._bits) - 1
+        return value
+
+    def read_signed(self, bits : int) -> int:
+        value = self.read(bits)
+        return value - (1 << bits) if value >> (bits - 1) else value
+
+
+def _float_bits(rows : Sequence[Row]) -> List[int]:
+    count = len(rows) * COLUMN_COUNT
+    return list(struct.unpack(f"<{count}I", struct.pack(f"<{count}f", *[value for row in rows for value in row[2]])))
+
+
+def encode_block(rows : Sequence[Row]) -> bytes:
+    """Compress rows into a block.
+
+    Start times are delta-of-delta encoded, flags are run-length encoded and every float32 column is XOR encoded
+    against its previous value, so regular intervals and repeated values take a few bits per row.
+
+    Parameters
+    ----------
+    rows : Sequence[Tuple[int, int, Tuple[float, ...]]]
+        Unix timestamp, flags and `COLUMN_COUNT` values per row, in time order.
+
+    Returns
+    -------
+    bytes
+        Block header followed by the payload.
+    """
+
+    writer = _BitWriter()
+    bits = _float_bits(rows)
+
+    previous_epoch = previous_delta = previous_flags = 0
+    previous_values = [0] * COLUMN_COUNT
+    windows = [(-1, 0)] * COLUMN_COUNT
+    for index, (epoch, flags, _) in enumerate(rows):
+        if index == 0:
+            writer.write(flags, 32)
+        elif flags == previous_flags:
+            writer.write(0, 1)
+        else:
+            writer.write(1, 1)
+            writer.write(flags, 32)
+
+        if index == 1:
+            previous_delta = epoch - previous_epoch
+            writer.write(previous_delta, 32)
+        elif index > 1:
+            delta = epoch - previous_epoch
+            dod = delta - previous_delta
+            previous_delta = delta
+            if dod == 0:
+                writer.write(0, 1)
+            else:
+                for control, control_bits, value_bits in _DOD_BUCKETS:
+                    if -(1 << (value_bits - 1)) <= dod < 1 << (value_bits - 1):
+                        writer.write(control, control_bits)
+                        writer.write(dod, value_bits)
+                        break
+                else:
+                    writer.write(0b1111, 4)
+                    writer.write(dod, 32)
+        previous_epoch = epoch
+        previous_flags = flags
+
+        for column in range(COLUMN_COUNT):
+            value = bits[index * COLUMN_COUNT + column]
+            if index == 0:
+                writer.write(value, 32)
+                previous_values[column] = value
+                continue
+            xor = value ^ previous_values[column]
+            previous_values[column] = value
+            if xor == 0:
+                writer.write(0, 1)
+                continue
+            writer.write(1, 1)
+            leading = 32 - xor.bit_length()
+            trailing = (xor & -xor).bit_length() - 1
+            window_leading, window_length = windows[column]
+            if window_leading != -1 and leading >= window_leading and trailing >= 32 - window_leading - window_length:
+                # The meaningful bits fit in the previous window.
+                writer.write(0, 1)
+                writer.write(xor >> (32 - window_leading - window_length), window_length)
+            else:
+                length = 32 - leading - trailing
+                windows[column] = (leading, length)
+                writer.write(1, 1)
+                writer.write(leading, 5)
+                writer.write(length - 1, 5)
+                writer.write(xor >> trailing, length)
+
+    payload = writer.getvalue()
+    return BLOCK_HEADER.pack(rows[0][0], rows[-1][0], len(rows), len(payload)) + payload
+
+
+def decode_block(data : bytes) -> List[Row]:
+    """Decompress a block encoded by `encode_block`.
+
+    Parameters
+    ----------
+    data : bytes
+        Block header followed by the payload. Trailing bytes are ignored.
+
+    Returns
+    -------
+    List[Tuple[int, int, Tuple[float, ...]]]
+        Rows in time order.
+    """
+
+    first_epoch, _, count, size = BLOCK_HEADER.unpack_from(data)
+    reader = _BitReader(bytes(data[BLOCK_HEADER.size:BLOCK_HEADER.size + size]))
+
+    epochs = []
+    flags_list = []
+    bits = []
+    epoch = first_epoch
+    delta = flags = 0
+    previous_values = [0] * COLUMN_COUNT
+    windows = [(0, 0)] * COLUMN_COUNT
+    for index in range(count):
+        if index == 0 or reader.read(1):
+            flags = reader.read(32)
+
+        if index == 1:
+            delta = reader.read_signed(32)
+            epoch += delta
+        elif index > 1:
+            if reader.read(1):
+                for _, _, value_bits in _DOD_BUCKETS:
+                    if not reader.read(1):
+                        delta += reader.read_signed(value_bits)
+                        break
+                else:
+                    delta += reader.read_signed(32)
+            epoch += delta
+        epochs.append(epoch)
+        flags_list.append(flags)
+
+        for column in range(COLUMN_COUNT):
+            if index == 0:
+                value = reader.read(32)
+            elif not reader.read(1):
+                value = previous_values[column]
+            else:
+                if reader.read(1):
+                    leading = reader.read(5)
+                    length = reader.read(5) + 1
+                    windows[column] = (leading, length)
+                leading, length = windows[column]
+                value = previous_values[column] ^ (reader.read(length) << (32 - leading - length))
+            previous_values[column] = value
+            bits.append(value)
+
+    values = struct.unpack(f"<{len(bits)}f", struct.pack(f"<{len(bits)}I", *bits))
+    return [
+        (epochs[index], flags_list[index], values[index * COLUMN_COUNT:(index + 1) * COLUMN_COUNT])
+        for index in range(count)
+    ]
+
+
+def encode_blocks(rows : Sequence[Row], block_size : int = BLOCK_SIZE) -> Iterator[bytes]:
+    """Compress rows into consecutive blocks.
+
+    Parameters
+    ----------
+    rows : Sequence[Tuple[int, int, Tuple[float, ...]]]
+        Rows in time order.
+    block_size : int, optional
+        Maximum rows per block, by default BLOCK_SIZE.
+
+    Returns
+    -------
+    Iterator[bytes]
+        Blocks.
+    """
+
+    for start in range(0, len(rows), block_size):
+        yield encode_block(rows[start:start + block_size])
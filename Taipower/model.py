@@ -1,25 +1,79 @@
-from typing import Dict, Optional
+import bisect
+import datetime
+from collections.abc import Mapping, MutableMapping
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 
-from .utility import roc_year_to_wastern
+from . import codec
+from .utility import roc_date_to_date, roc_year_to_wastern
+
+TAIWAN_TIMEZONE = datetime.timezone(datetime.timedelta(hours=8))
+
+
+def time_to_epoch(time_text : str) -> int:
+    """Convert an AMI time to a Unix timestamp.
+
+    Parameters
+    ----------
+    time_text : str
+        In yyyymmddhhmmss format, Taiwan local time.
+
+    Returns
+    -------
+    int
+        Unix timestamp.
+    """
+
+    return int(datetime.datetime(
+        int(time_text[0:4]),
+        int(time_text[4:6]),
+        int(time_text[6:8]),
+        int(time_text[8:10]),
+        int(time_text[10:12]),
+        int(time_text[12:14]),
+        tzinfo=TAIWAN_TIMEZONE,
+    ).timestamp())
+
+
+def datetime_to_epoch(dt : datetime.datetime) -> int:
+    """Convert a datetime to a Unix timestamp.
+
+    Parameters
+    ----------
+    dt : datetime.datetime
+        Datetime. A naive datetime is regarded as Taiwan local time.
+
+    Returns
+    -------
+    int
+        Unix timestamp.
+    """
+
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=TAIWAN_TIMEZONE)
+    return int(dt.timestamp())
 
 class TaipowerAMI:
     """Taipower AMI.
 
     Parameters
     ----------
-    ami : dict
-        AMI.
+    ami : dict or codec.AMI
+        AMI JSON, or AMI decoded by `codec.decode`.
     """
 
-    def __init__(self, ami : dict):
-        self._json : dict = ami
+    def __init__(self, ami : Union[dict, codec.AMI]):
+        self._data : codec.AMI = codec.record(codec.AMI, ami)
+
+    @property
+    def _json(self) -> dict:
+        return codec.to_dict(self._data)
     
     @classmethod
     def from_amis(cls, ami_json : dict) -> Dict[str, object]:
         amis = {}
-        for ami in ami_json["data"]["data"]:
-            start_time = ami["startTime"]
-            amis[start_time] = cls(ami)
+        for ami in codec.record(codec.AMIPage, ami_json["data"]).data:
+            amis[ami.start_time] = cls(ami)
         return amis
 
     @property
@@ -32,7 +86,7 @@ class TaipowerAMI:
             In yyyymmddhhmmss format.
         """
 
-        return self._json["startTime"]
+        return self._data.start_time
     
     @property
     def end_time(self) -> str:
@@ -44,7 +98,7 @@ class TaipowerAMI:
             In yyyymmddhhmmss format.
         """
 
-        return self._json["endTime"]
+        return self._data.end_time
     
     @property
     def is_missing_data(self) -> bool:
@@ -56,7 +110,7 @@ class TaipowerAMI:
             Return True if the data is missing.
         """
 
-        return True if self._json["isMssingData"] == 1 else False
+        return True if self._data.is_missing_data == 1 else False
     
     @property
     def offpeak_kwh(self) -> Optional[float]:
@@ -68,7 +122,7 @@ class TaipowerAMI:
             Off-peak kwh. Return None if the ami period is `quater`.
         """
 
-        return self._json.get("offPeakKwh", None)
+        return self._data.offpeak_kwh
     
     @property
     def halfpeak_kwh(self) -> Optional[float]:
@@ -80,7 +134,7 @@ class TaipowerAMI:
             Half-peak kwh. Return None if the ami period is `quater`.
         """
 
-        return self._json.get("halfPeakKwh", None)
+        return self._data.halfpeak_kwh
 
     @property
     def satpeak_kwh(self) -> Optional[float]:
@@ -92,7 +146,7 @@ class TaipowerAMI:
             Saturday half-peak kwh. Return None if the ami period is `quater`.
         """
 
-        return self._json.get("satPeakKwh", None)
+        return self._data.satpeak_kwh
 
     @property
     def peak_kwh(self) -> Optional[float]:
@@ -104,7 +158,7 @@ class TaipowerAMI:
             Peak kwh. Return None if the ami period is `quater`.
         """
 
-        return self._json.get("peakTimeKwh", None)
+        return self._data.peak_kwh
 
     @property
     def total_kwh(self) -> Optional[float]:
@@ -116,7 +170,205 @@ class TaipowerAMI:
             Total kwh.
         """
 
-        return self._json.get("totalKwh", self._json.get("kwh", None))
+        return self._data.total_kwh if self._data.total_kwh is not None else self._data.kwh
+
+
+class TaipowerAMISeries(MutableMapping):
+    """AMI keyed by start time and kept in time order.
+
+    It behaves like the dict returned by `TaipowerAMI.from_amis`, while start times are also indexed as sorted
+    Unix timestamps, so range queries are binary searches and iteration is in time order.
+
+    Parameters
+    ----------
+    amis : Mapping[str, TaipowerAMI], optional
+        AMI keyed by start time in yyyymmddhhmmss format, by default None.
+    """
+
+    def __init__(self, amis : Optional[Mapping] = None) -> None:
+        self._amis : Dict[str, TaipowerAMI] = {}
+        self._keys : List[str] = []
+        self._epochs : List[int] = []
+        if amis:
+            self.merge(amis)
+
+    def __getitem__(self, key : str) -> TaipowerAMI:
+        return self._amis[key]
+
+    def __setitem__(self, key : str, ami : TaipowerAMI) -> None:
+        if key not in self._amis:
+            epoch = time_to_epoch(key)
+            index = bisect.bisect(self._epochs, epoch)
+            self._epochs.insert(index, epoch)
+            self._keys.insert(index, key)
+        self._amis[key] = ami
+
+    def __delitem__(self, key : str) -> None:
+        del self._amis[key]
+        index = bisect.bisect_left(self._epochs, time_to_epoch(key))
+        del self._epochs[index]
+        del self._keys[index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self)} AMI)"
+
+    def copy(self) -> "TaipowerAMISeries":
+        """Shallow copy.
+
+        Returns
+        -------
+        TaipowerAMISeries
+            A new series containing the same AMI.
+        """
+
+        series = self.__class__()
+        series._amis = dict(self._amis)
+        series._keys = list(self._keys)
+        series._epochs = list(self._epochs)
+        return series
+
+    @property
+    def epochs(self) -> List[int]:
+        """Start times as Unix timestamps in time order.
+
+        Returns
+        -------
+        List[int]
+            Unix timestamps.
+        """
+
+        return list(self._epochs)
+
+    def merge(self, amis : Mapping) -> None:
+        """Merge AMI, e.g. from an overlapping fetch. AMI of known start times are replaced, so no duplicates exist.
+
+        Parameters
+        ----------
+        amis : Mapping[str, TaipowerAMI]
+            AMI keyed by start time in yyyymmddhhmmss format.
+        """
+
+        new_keys = [key for key in amis if key not in self._amis]
+        self._amis.update(amis)
+        if len(new_keys) > len(self._keys) // 8:
+            # Rebuilding in one sort is cheaper than many list insertions.
+            pairs = sorted(
+                list(zip(self._epochs, self._keys)) + [(time_to_epoch(key), key) for key in new_keys]
+            )
+            self._epochs = [epoch for epoch, _ in pairs]
+            self._keys = [key for _, key in pairs]
+        else:
+            for key in new_keys:
+                epoch = time_to_epoch(key)
+                index = bisect.bisect(self._epochs, epoch)
+                self._epochs.insert(index, epoch)
+                self._keys.insert(index, key)
+
+    def _bounds(self, start : Optional[Union[datetime.datetime, int]], end : Optional[Union[datetime.datetime, int]]):
+        def to_epoch(dt):
+            return dt if isinstance(dt, int) else datetime_to_epoch(dt)
+
+        lower = 0 if start is None else bisect.bisect_left(self._epochs, to_epoch(start))
+        upper = len(self._epochs) if end is None else bisect.bisect_left(self._epochs, to_epoch(end))
+        return lower, upper
+
+    def slice(
+        self,
+        start : Optional[Union[datetime.datetime, int]] = None,
+        end : Optional[Union[datetime.datetime, int]] = None,
+    ) -> "TaipowerAMISeries":
+        """Get the AMI starting within a time range.
+
+        Parameters
+        ----------
+        start : datetime.datetime or int, optional
+            Start of the range, inclusive. A naive datetime is regarded as Taiwan local time,
+            and an int as a Unix timestamp. If None is given, the range is unbounded, by default None.
+        end : datetime.datetime or int, optional
+            End of the range, exclusive. If None is given, the range is unbounded, by default None.
+
+        Returns
+        -------
+        TaipowerAMISeries
+            A new series.
+        """
+
+        lower, upper = self._bounds(start, end)
+        series = self.__class__()
+        series._keys = self._keys[lower:upper]
+        series._epochs = self._epochs[lower:upper]
+        series._amis = {key: self._amis[key] for key in series._keys}
+        return series
+
+    def irange(
+        self,
+        start : Optional[Union[datetime.datetime, int]] = None,
+        end : Optional[Union[datetime.datetime, int]] = None,
+    ) -> Iterable[TaipowerAMI]:
+        """Iterate the AMI starting within a time range in time order, without copying.
+
+        Parameters
+        ----------
+        start : datetime.datetime or int, optional
+            Start of the range, inclusive, see `slice`, by default None.
+        end : datetime.datetime or int, optional
+            End of the range, exclusive, see `slice`, by default None.
+
+        Returns
+        -------
+        Iterable[TaipowerAMI]
+            AMI.
+        """
+
+        lower, upper = self._bounds(start, end)
+        amis = self._amis
+        keys = self._keys
+        return (amis[keys[index]] for index in range(lower, upper))
+
+    def to_numpy(self) -> Dict[str, object]:
+        """Convert into NumPy columns, see `export.ami_to_numpy`. Requires NumPy.
+
+        Returns
+        -------
+        Dict[str, numpy.ndarray]
+            Arrays keyed by column name.
+        """
+
+        from .export import ami_to_numpy
+
+        return ami_to_numpy(self)
+
+    def to_pandas(self):
+        """Convert into a DataFrame indexed by start time, see `export.ami_to_pandas`. Requires pandas.
+
+        Returns
+        -------
+        pandas.DataFrame
+            AMI.
+        """
+
+        from .export import ami_to_pandas
+
+        return ami_to_pandas(self)
+
+    def to_arrow(self):
+        """Convert into an Arrow table, see `export.ami_to_arrow`. Requires pyarrow.
+
+        Returns
+        -------
+        pyarrow.Table
+            AMI.
+        """
+
+        from .export import ami_to_arrow
+
+        return ami_to_arrow(self)
 
 
 class TaipowerAMIBill:
@@ -124,12 +376,16 @@ class TaipowerAMIBill:
 
     Parameters
     ----------
-    bill : dict
-        Bill.
+    bill : dict or codec.AMIBill
+        Bill JSON, or a bill decoded by `codec.decode`.
     """
 
-    def __init__(self, bill : dict):
-        self._json : dict = bill
+    def __init__(self, bill : Union[dict, codec.AMIBill]):
+        self._data : codec.AMIBill = codec.record(codec.AMIBill, bill)
+
+    @property
+    def _json(self) -> dict:
+        return codec.to_dict(self._data)
     
     @property
     def bill_start_date(self) -> str:
@@ -141,7 +397,7 @@ class TaipowerAMIBill:
             In yyyy/mm format.
         """
 
-        return roc_year_to_wastern(self._json['startDate'])
+        return roc_year_to_wastern(self._data.start_date)
 
     @property
     def bill_end_date(self) -> str:
@@ -153,7 +409,31 @@ class TaipowerAMIBill:
             In yyyy/mm format.
         """
 
-        return roc_year_to_wastern(self._json['endDate'])
+        return roc_year_to_wastern(self._data.end_date)
+
+    @property
+    def start_date(self) -> datetime.date:
+        """First date of the billing period.
+
+        Returns
+        -------
+        datetime.date
+            Date.
+        """
+
+        return roc_date_to_date(self._data.start_date)
+
+    @property
+    def end_date(self) -> datetime.date:
+        """Last date of the billing period.
+
+        Returns
+        -------
+        datetime.date
+            Date.
+        """
+
+        return roc_date_to_date(self._data.end_date)
 
     @property
     def current_amount(self) -> int:
@@ -165,7 +445,7 @@ class TaipowerAMIBill:
             Current amount.
         """
 
-        return self._json["currentAmount"]
+        return self._data.current_amount
 
     @property
     def kwh(self) -> int:
@@ -177,7 +457,7 @@ class TaipowerAMIBill:
             Kw/h.
         """
 
-        return self._json["kwh"] if self._json["kwhData"] else -1
+        return self._data.kwh if self._data.kwh_data else -1
     
     @property
     def last_cycle_kwh(self) -> int:
@@ -189,7 +469,7 @@ class TaipowerAMIBill:
             Last cycle kw/h.
         """
 
-        return self._json["theLast2Kwh"]
+        return self._data.last_cycle_kwh
     
     @property
     def last_year_kwh(self) -> int:
@@ -201,7 +481,7 @@ class TaipowerAMIBill:
             The same cycle in last year kw/h.
         """
 
-        return self._json["lastKwh"]
+        return self._data.last_year_kwh
 
 
 class TaipowerAMIUnbilled:
@@ -209,12 +489,16 @@ class TaipowerAMIUnbilled:
 
     Parameters
     ----------
-    unbilled_data : dict
-        AMI unbilled data.
+    unbilled_data : dict or codec.AMIUnbilled
+        AMI unbilled data JSON, or AMI unbilled data decoded by `codec.decode`.
     """
 
-    def __init__(self, unbilled_data : dict):
-        self._json : dict = unbilled_data
+    def __init__(self, unbilled_data : Union[dict, codec.AMIUnbilled]):
+        self._data : codec.AMIUnbilled = codec.record(codec.AMIUnbilled, unbilled_data)
+
+    @property
+    def _json(self) -> dict:
+        return codec.to_dict(self._data)
     
     @property
     def charge(self) -> int:
@@ -226,7 +510,7 @@ class TaipowerAMIUnbilled:
             The amount of the unbilled data.
         """
 
-        return int(self._json["totalAmount"])
+        return int(self._data.total_amount)
     
     @property
     def deadline(self) -> str:
@@ -238,7 +522,7 @@ class TaipowerAMIUnbilled:
             In yyyymmdd format.
         """
 
-        return roc_year_to_wastern(self._json["payDeadline"])
+        return roc_year_to_wastern(self._data.pay_deadline)
 
     @property
     def kwh(self) -> float:
@@ -250,7 +534,7 @@ class TaipowerAMIUnbilled:
             Kw/h.
         """
 
-        return float(self._json["finalKwh"])
+        return float(self._data.final_kwh)
     
     @property
     def reading_date(self) -> str:
@@ -262,7 +546,7 @@ class TaipowerAMIUnbilled:
             In yyyymmdd format.
         """
 
-        return roc_year_to_wastern(self._json["readingDate"])
+        return roc_year_to_wastern(self._data.reading_date)
 
     @property
     def last_reading_date(self) -> str:
@@ -274,7 +558,7 @@ class TaipowerAMIUnbilled:
             In yyyymmdd format.
         """
 
-        return roc_year_to_wastern(self._json["lastReadDate"])
+        return roc_year_to_wastern(self._data.last_read_date)
     
     @property
     def next_reading_date(self) -> str:
@@ -286,7 +570,31 @@ class TaipowerAMIUnbilled:
             In yyyymmdd format.
         """
 
-        return roc_year_to_wastern(self._json["nextReadingDate"])
+        return roc_year_to_wastern(self._data.next_reading_date)
+
+    @property
+    def start_date(self) -> datetime.date:
+        """First date covered by the unbilled data, i.e. the last meter reading date.
+
+        Returns
+        -------
+        datetime.date
+            Date.
+        """
+
+        return roc_date_to_date(self._data.last_read_date)
+
+    @property
+    def end_date(self) -> datetime.date:
+        """Last date covered by the unbilled data, i.e. the day before the meter reading date.
+
+        Returns
+        -------
+        datetime.date
+            Date.
+        """
+
+        return roc_date_to_date(self._data.reading_date) - datetime.timedelta(days=1)
 
 
 class TaipowerBillRecord:
@@ -294,18 +602,23 @@ class TaipowerBillRecord:
 
     Parameters
     ----------
-    bill_record : dict
-        Bill record.
+    bill_record : dict or codec.BillRecord
+        Bill record JSON, or a bill record decoded by `codec.decode`.
     """
 
-    def __init__(self, bill_record : dict):
-        self._json : dict = bill_record
+    def __init__(self, bill_record : Union[dict, codec.BillRecord]):
+        self._data : codec.BillRecord = codec.record(codec.BillRecord, bill_record)
+
+    @property
+    def _json(self) -> dict:
+        return codec.to_dict(self._data)
     
     @classmethod
-    def from_bill_records(cls, bill_record_json : dict) -> Dict[str, object]:    
-        records = {}
+    def from_bill_records(cls, bill_record_json : dict) -> "TaipowerBillRecords":
+        records = TaipowerBillRecords()
         for record in bill_record_json["data"]:
-            issue_year_month = f"{str( 1911 + int(record['issueYM'][0:3]))}{record['issueYM'][3:]}" 
+            record = codec.record(codec.BillRecord, record)
+            issue_year_month = f"{str( 1911 + int(record.issue_ym[0:3]))}{record.issue_ym[3:]}" 
             records[issue_year_month] = cls(record)
         return records
 
@@ -319,7 +632,7 @@ class TaipowerBillRecord:
             The amount of the bill.
         """
 
-        return int(self._json["totalCharge"].replace(",",""))
+        return int(self._data.total_charge.replace(",",""))
     
     @property
     def formula(self) -> str:
@@ -331,7 +644,7 @@ class TaipowerBillRecord:
             The formula of the bill.
         """
 
-        return self._json["billFormula"]
+        return self._data.bill_formula
     
     @property
     def kwh(self) -> int:
@@ -343,7 +656,7 @@ class TaipowerBillRecord:
             The kw/h consumed in the bill cycle.
         """
 
-        return self._json["totalKwh"]
+        return self._data.total_kwh
     
     @property
     def period(self) -> str:
@@ -355,7 +668,7 @@ class TaipowerBillRecord:
             In `yyy/mm/dd~yyy/mm/dd` (ROC calendar) format.
         """
 
-        return self._json["billFromAndToDate"]
+        return self._data.bill_from_and_to_date
     
     @property
     def paid(self) -> bool:
@@ -367,4 +680,79 @@ class TaipowerBillRecord:
             Return True if paid.
         """
 
-        return True if self._json["hasPaid"] == "C" else False
+        return True if self._data.has_paid == "C" else False
+
+
+class TaipowerBillRecords(dict):
+    """Bill records keyed by issue year and month, with columnar exports."""
+
+    def to_numpy(self) -> Dict[str, object]:
+        """Convert into NumPy columns, see `export.bill_records_to_numpy`. Requires NumPy.
+
+        Returns
+        -------
+        Dict[str, numpy.ndarray]
+            Arrays keyed by column name.
+        """
+
+        from .export import bill_records_to_numpy
+
+        return bill_records_to_numpy(self)
+
+    def to_pandas(self):
+        """Convert into a DataFrame indexed by issue year and month, see `export.bill_records_to_pandas`. Requires pandas.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Bill records.
+        """
+
+        from .export import bill_records_to_pandas
+
+        return bill_records_to_pandas(self)
+
+    def to_arrow(self):
+        """Convert into an Arrow table, see `export.bill_records_to_arrow`. Requires pyarrow.
+
+        Returns
+        -------
+        pyarrow.Table
+            Bill records.
+        """
+
+        from .export import bill_records_to_arrow
+
+        return bill_records_to_arrow(self)
+
+
+@dataclass(frozen=True)
+class TaipowerMeterSnapshot:
+    """Immutable, consistent view of the data of a meter.
+
+    A meter publishes a new snapshot with a single reference swap whenever its data changes, so a reader
+    holding a snapshot never sees fields of different refreshes mixed. The values are shared between
+    snapshots and must not be modified in place.
+
+    Parameters
+    ----------
+    ami : TaipowerAMISeries, optional
+        AMI.
+    ami_bill : TaipowerAMIBill, optional
+        AMI bill.
+    ami_unbilled : TaipowerAMIUnbilled, optional
+        AMI unbilled.
+    bill_records : TaipowerBillRecords, optional
+        Bill records.
+    version : int
+        Number of publications before this snapshot.
+    published_at : float
+        Unix timestamp of the publication, 0 for the initial empty snapshot.
+    """
+
+    ami : Optional[TaipowerAMISeries] = None
+    ami_bill : Optional[TaipowerAMIBill] = None
+    ami_unbilled : Optional[TaipowerAMIUnbilled] = None
+    bill_records : Optional[TaipowerBillRecords] = None
+    version : int = 0
+    published_at : float = 0.0
@@ -0,0 +1,342 @@
+import asyncio
+import contextvars
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+STAGES = ("run", "auth", "send", "decode", "build", "assign")
+PROFILERS = ("cprofile", "sampling")
+
+T = TypeVar("T")
+
+_active : contextvars.ContextVar = contextvars.ContextVar("taipower_profile", default=None)
+_stack : contextvars.ContextVar = contextvars.ContextVar("taipower_profile_stack", default=())
+
+
+@dataclass
+class TaipowerStageStats:
+    """Timings of a stage.
+
+    Parameters
+    ----------
+    count : int
+        Number of spans.
+    total : float
+        Seconds spent in the spans, including nested stages. Concurrent spans are all counted.
+    wall : float
+        Seconds during which at least one span was open.
+    exclusive : float
+        Seconds spent in the spans, excluding the time covered by nested stages.
+    max : float
+        Seconds of the longest span.
+    """
+
+    count : int = 0
+    total : float = 0.0
+    wall : float = 0.0
+    exclusive : float = 0.0
+    max : float = 0.0
+
+
+def _union(intervals : List[Tuple[float, float]]) -> float:
+    # Length of the union of intervals, so that concurrent spans are counted once.
+    length = 0.0
+    end = -math.inf
+    for interval_start, interval_end in sorted(intervals):
+        if interval_end > end:
+            length += interval_end - max(interval_start, end)
+            end = interval_end
+    return length
+
+
+class _Span:
+    __slots__ = ("profile", "stage", "start", "children", "token")
+
+    def __init__(self, profile : "TaipowerProfile", stage : str) -> None:
+        self.profile = profile
+        self.stage = stage
+        self.children : List[Tuple[float, float]] = []
+
+    def __enter__(self) -> "_Span":
+        self.token = _stack.set(_stack.get() + (self,))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        end = time.perf_counter()
+        _stack.reset(self.token)
+        parents = _stack.get()
+        if len(parents) != 0:
+            parents[-1].children.append((self.start, end))
+        path = ";".join(span.stage for span in parents + (self,))
+        self.profile._record(self.stage, path, self.start, end, end - self.start - _union(self.children))
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage : str):
+    """Time a stage if a profile is active in the current context.
+
+    Parameters
+    ----------
+    stage : str
+        Stage, see `STAGES`.
+
+    Returns
+    -------
+    ContextManager
+        Span. Without an active profile, a shared no-op context manager is returned.
+    """
+
+    profile = _active.get()
+    if profile is None:
+        return _NULL_SPAN
+    return _Span(profile, stage)
+
+
+def in_event_loop() -> bool:
+    """Whether or not the calling thread is running an event loop, from which `run` cannot be called.
+
+    Returns
+    -------
+    bool
+        Running.
+    """
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def run(coroutine : Awaitable[T]) -> T:
+    """`asyncio.run` timed as the `run` stage.
+
+    The exclusive time of the stage is the event loop setup, scheduling and teardown
+    plus any work outside of the other stages.
+
+    Parameters
+    ----------
+    coroutine : Awaitable
+        Coroutine.
+
+    Returns
+    -------
+    Any
+        The result of the coroutine.
+
+    Raises
+    ------
+    RuntimeError
+        If the calling thread is running an event loop. The coroutine is closed without running.
+    """
+
+    if in_event_loop():
+        if hasattr(coroutine, "close"):
+            coroutine.close()
+        raise RuntimeError("Synchronous calls cannot be made from a running event loop, await their `async_` counterparts instead.")
+    with span("run"):
+        return asyncio.run(coroutine)
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id : int, interval : float) -> None:
+        super().__init__(name="taipower-profile-sampler", daemon=True)
+        self.thread_id : int = thread_id
+        self.interval : float = interval
+        self.samples : Dict[str, int] = {}
+        self._stop_event : threading.Event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if len(frames) != 0:
+                stack = ";".join(reversed(frames))
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class TaipowerProfile:
+    """Opt-in profiling context timing the stages of API calls.
+
+    Within the context, the `auth`, `send`, `decode`, `build` and `assign` stages and the event loops
+    of synchronous calls (`run`) are timed, including in tasks started within it.
+    Optionally, a `cProfile` or sampling profiler runs alongside.
+
+    Parameters
+    ----------
+    profiler : str, optional
+        `cprofile` for deterministic profiling or `sampling` for sampling the stacks of the profiled thread.
+        If None is given, only stages are timed, by default None.
+    interval : float, optional
+        Seconds between samples of the `sampling` profiler, by default 0.001.
+    """
+
+    def __init__(self, profiler : Optional[str] = None, interval : float = 0.001) -> None:
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError("profiler accepts either `cprofile` or `sampling`.")
+        self.profiler : Optional[str] = profiler
+        self.interval : float = interval
+        self.stages : Dict[str, TaipowerStageStats] = {}
+        self.wall : float = 0.0
+        self.stats = None
+
+        self._paths : Dict[str, float] = {}
+        self._intervals : Dict[str, List[Tuple[float, float]]] = {}
+        self._samples : Dict[str, int] = {}
+        self._lock : threading.Lock = threading.Lock()
+        self._token = None
+        self._start : float = 0.0
+        self._cprofile = None
+        self._sampler : Optional[_Sampler] = None
+
+    def _record(self, stage : str, path : str, start : float, end : float, exclusive : float) -> None:
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = TaipowerStageStats()
+                self._intervals[stage] = []
+            stats.count += 1
+            stats.total += end - start
+            stats.exclusive += exclusive
+            stats.max = max(stats.max, end - start)
+            self._intervals[stage].append((start, end))
+            self._paths[path] = self._paths.get(path, 0.0) + exclusive
+
+    def __enter__(self) -> "TaipowerProfile":
+        if self._token is not None:
+            raise RuntimeError("The profile is already active.")
+        self._token = _active.set(self)
+        if self.profiler == "cprofile":
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self.profiler == "sampling":
+            self._sampler = _Sampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.wall += time.perf_counter() - self._start
+        for stage, intervals in self._intervals.items():
+            self.stages[stage].wall = _union(intervals)
+        if self._cprofile is not None:
+            import pstats
+
+            self._cprofile.disable()
+            self.stats = pstats.Stats(self._cprofile)
+            self._cprofile = None
+        if self._sampler is not None:
+            self._sampler.stop()
+            for stack, count in self._sampler.samples.items():
+                self._samples[stack] = self._samples.get(stack, 0) + count
+            self._sampler = None
+        _active.reset(self._token)
+        self._token = None
+
+    def summary(self, limit : int = 20) -> str:
+        """Human-readable summary of the stages, and of the hottest functions if `profiler` is given.
+
+        Parameters
+        ----------
+        limit : int, optional
+            Number of the hottest functions, by default 20.
+
+        Returns
+        -------
+        str
+            Summary.
+        """
+
+        lines = [f"wall time: {self.wall * 1000:.3f} ms", ""]
+        lines.append(f"{'stage':<8}{'count':>8}{'total ms':>12}{'wall ms':>12}{'self ms':>12}{'max ms':>12}{'wall %':>9}")
+        for stage in sorted(self.stages, key=lambda stage: STAGES.index(stage) if stage in STAGES else len(STAGES)):
+            stats = self.stages[stage]
+            share = 100 * stats.wall / self.wall if self.wall > 0 else 0.0
+            lines.append(
+                f"{stage:<8}{stats.count:>8}{stats.total * 1000:>12.3f}{stats.wall * 1000:>12.3f}"
+                f"{stats.exclusive * 1000:>12.3f}{stats.max * 1000:>12.3f}{share:>8.1f}%"
+            )
+
+        if self.stats is not None:
+            import io
+
+            stream = io.StringIO()
+            self.stats.stream = stream
+            self.stats.sort_stats("cumulative").print_stats(limit)
+            lines.extend(["", stream.getvalue().strip()])
+        elif len(self._samples) != 0:
+            total = sum(self._samples.values())
+            leaves : Dict[str, int] = {}
+            for stack, count in self._samples.items():
+                leaf = stack.rsplit(";", 1)[-1]
+                leaves[leaf] = leaves.get(leaf, 0) + count
+            lines.extend(["", f"{'samples':>8}{'%':>7}  function"])
+            for leaf, count in sorted(leaves.items(), key=lambda item: -item[1])[:limit]:
+                lines.append(f"{count:>8}{100 * count / total:>6.1f}%  {leaf}")
+        return "\n".join(lines)
+
+    def folded(self) -> List[Tuple[str, int]]:
+        """Collapsed stacks for flame graphs, e.g. flamegraph.pl or speedscope.
+
+        Returns
+        -------
+        List[Tuple[str, int]]
+            (semicolon separated stack, weight). Weights are sample counts with the `sampling` profiler,
+            and otherwise the exclusive microseconds of the nested stages summed over concurrent tasks.
+        """
+
+        if len(self._samples) != 0:
+            return sorted(self._samples.items())
+        return sorted((path, round(seconds * 1e6)) for path, seconds in self._paths.items() if seconds > 0)
+
+    def dump(self, prefix : str) -> List[str]:
+        """Write the summary, the collapsed stacks and, with `cprofile`, the raw statistics.
+
+        Parameters
+        ----------
+        prefix : str
+            Path prefix of `<prefix>.txt`, `<prefix>.folded` and `<prefix>.pstats`.
+
+        Returns
+        -------
+        List[str]
+            Written paths.
+        """
+
+        paths = [f"{prefix}.txt", f"{prefix}.folded"]
+        with open(paths[0], "w") as f:
+            f.write(self.summary() + "\n")
+        with open(paths[1], "w") as f:
+            for stack, weight in self.folded():
+                f.write(f"{stack} {weight}\n")
+        if self.stats is not None:
+            paths.append(f"{prefix}.pstats")
+            self.stats.dump_stats(paths[2])
+        return paths
@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Union
+
+from .transport import _LoopTransports, http2_available
+
+if TYPE_CHECKING:
+    import httpx
+
+STRATEGIES = ("round_robin", "least_latency")
+# Responses with these statuses come from an overloaded, throttled or misconfigured proxy.
+FAILURE_STATUSES = frozenset((407, 429, 502, 503, 504))
+
+
+class TaipowerProxy:
+    """State of a proxy in a `TaipowerProxyPool`.
+
+    Parameters
+    ----------
+    url : str
+        Proxy URL, e.g. `http://10.0.0.1:3128`.
+    weight : int, optional
+        Share of the requests under round-robin selection, by default 1.
+    """
+
+    def __init__(self, url : str, weight : int = 1) -> None:
+        if weight < 1:
+            raise ValueError("weight must be a positive integer.")
+        self.url : str = url
+        self.weight : int = weight
+        self.requests : int = 0
+        self.failures : int = 0
+        self.in_flight : int = 0
+        self.latency : Optional[float] = None
+        self.consecutive_failures : int = 0
+        self.ejections : int = 0
+        self.ejected_until : float = 0.0
+
+        self._current_weight : int = 0
+        self._probing : bool = False
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.url}, {'healthy' if self.healthy else 'ejected'})"
+
+    @property
+    def healthy(self) -> bool:
+        """Whether or not the proxy takes requests.
+
+        Returns
+        -------
+        bool
+            False while the proxy is ejected.
+        """
+
+        return self.ejected_until == 0.0
+
+
+class TaipowerProxyPool:
+    """httpx transport spreading requests over a pool of proxies, each with its own connection pool.
+
+    Proxies failing `max_failures` times in a row, by a connection error or a throttling or gateway
+    status, are ejected for `ejection_time` seconds, doubled on every consecutive ejection. When the
+    time is up, a single request probes the proxy, readmitting it on success. If every proxy is ejected,
+    the one due back first is used rather than failing all requests. `health_check` probes all proxies
+    on demand, and `start_health_checks` does so periodically.
+
+    The pool may be shared by many clients, e.g. through `TaipowerAPI(proxies=...)` or
+    `bulk.TaipowerBulkExporter(proxies=...)`. The connection pools of an event loop are closed with
+    the clients of the loop, once none of their requests is in flight, and the synchronous ones by `finish`.
+
+    Parameters
+    ----------
+    proxies : Sequence[str] or Mapping[str, int]
+        Proxy URLs, or proxy URLs mapped to round-robin weights.
+    strategy : str, optional
+        `round_robin` for smooth weighted round-robin or `least_latency` for the proxy with the lowest
+        latency times requests in flight, by default `round_robin`.
+    max_failures : int, optional
+        Consecutive failures ejecting a proxy, by default 3.
+    ejection_time : float, optional
+        Seconds of the first ejection of a proxy, by default 30.
+    max_connections : int, optional
+        Maximum connections of the connection pool of each proxy, by default 10.
+    http2 : bool, optional
+        Whether or not to negotiate HTTP/2 through the proxies, ignored if `transport_factory` is given.
+        Requires h2, by default False.
+    transport_factory : Callable[[str, bool], Any], optional
+        Factory of the transport of a proxy URL, asynchronous if the flag is set. If None is given,
+        `httpx.AsyncHTTPTransport` and `httpx.HTTPTransport` through the proxy are used, by default None.
+    """
+
+    def __init__(
+        self,
+        proxies : Union[Sequence[str], Mapping[str, int]],
+        strategy : str = "round_robin",
+        max_failures : int = 3,
+        ejection_time : float = 30.0,
+        max_connections : int = 10,
+        http2 : bool = False,
+        transport_factory : Optional[Callable[[str, bool], Any]] = None,
+    ) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError("strategy accepts either `round_robin` or `least_latency`.")
+        if isinstance(proxies, str):
+            proxies = [proxies]
+        weights = dict(proxies) if isinstance(proxies, Mapping) else {url: 1 for url in proxies}
+        if len(weights) == 0:
+            raise ValueError("At least one proxy is required.")
+        if http2 and transport_factory is None and not http2_available():
+            raise ImportError("HTTP/2 requires h2, install it with `pip install libtaipower[http2]`.")
+
+        self.proxies : List[TaipowerProxy] = [TaipowerProxy(url, weight) for url, weight in weights.items()]
+        self.strategy : str = strategy
+        self.max_failures : int = max_failures
+        self.ejection_time : float = ejection_time
+        self.max_connections : int = max_connections
+        self.http2 : bool = http2
+        self._transport_factory = transport_factory
+
+        self._lock : threading.Lock = threading.Lock()
+        # Connection pools are bound to an event loop, and the synchronous API runs one loop per call.
+        self._async_transports : _LoopTransports = _LoopTransports(lambda url: self._create_transport(url, True))
+        self._sync_transports : Dict[str, Any] = {}
+        self._health_thread : Optional[threading.Thread] = None
+        self._health_stop : threading.Event = threading.Event()
+
+    def _create_transport(self, url : str, asynchronous : bool):
+        if self._transport_factory is not None:
+            return self._transport_factory(url, asynchronous)
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.max_connections)
+        if asynchronous:
+            return httpx.AsyncHTTPTransport(proxy=url, limits=limits, http2=self.http2)
+        return httpx.HTTPTransport(proxy=url, limits=limits, http2=self.http2)
+
+    def _sync_transport(self, proxy : TaipowerProxy):
+        with self._lock:
+            transport = self._sync_transports.get(proxy.url)
+            if transport is None:
+                transport = self._sync_transports[proxy.url] = self._create_transport(proxy.url, False)
+        return transport
+
+    def _select_locked(self, now : float) -> TaipowerProxy:
+        for proxy in self.proxies:
+            # An ejected proxy whose time is up takes a single probing request.
+            if not proxy.healthy and not proxy._probing and proxy.ejected_until <= now:
+                proxy._probing = True
+                return proxy
+
+        candidates = [proxy for proxy in self.proxies if proxy.healthy]
+        if len(candidates) == 0:
+            return min(self.proxies, key=lambda proxy: proxy.ejected_until)
+
+        if self.strategy == "least_latency":
+            # Unmeasured proxies go first; ties are broken randomly.
+            return min(candidates, key=lambda proxy: (
+                (proxy.latency or 0.0) * (proxy.in_flight + 1), proxy.in_flight, random.random()
+            ))
+
+        # Smooth weighted round-robin, which interleaves heavier proxies instead of bursting them.
+        total = 0
+        selected = None
+        for proxy in candidates:
+            proxy._current_weight += proxy.weight
+            total += proxy.weight
+            if selected is None or proxy._current_weight > selected._current_weight:
+                selected = proxy
+        selected._current_weight -= total
+        return selected
+
+    def select(self) -> TaipowerProxy:
+        """Select the proxy of the next request.
+
+        Returns
+        -------
+        TaipowerProxy
+            Proxy.
+        """
+
+        with self._lock:
+            proxy = self._select_locked(time.monotonic())
+            proxy.in_flight += 1
+            proxy.requests += 1
+        return proxy
+
+    def _release(self, proxy : TaipowerProxy, elapsed : Optional[float], failed : bool) -> None:
+        # `elapsed` is None if the request neither completed nor failed, e.g. when it was cancelled.
+        with self._lock:
+            proxy.in_flight -= 1
+            proxy._probing = False
+            if failed:
+                proxy.failures += 1
+                proxy.consecutive_failures += 1
+                if not proxy.healthy or proxy.consecutive_failures >= self.max_failures:
+                    self._eject_locked(proxy)
+            elif elapsed is not None:
+                proxy.latency = elapsed if proxy.latency is None else 0.8 * proxy.latency + 0.2 * elapsed
+                proxy.consecutive_failures = 0
+                proxy.ejections = 0
+                proxy.ejected_until = 0.0
+
+    def _eject_locked(self, proxy : TaipowerProxy) -> None:
+        proxy.ejections += 1
+        proxy.consecutive_failures = 0
+        proxy.ejected_until = time.monotonic() + self.ejection_time * 2 ** min(proxy.ejections - 1, 5)
+
+    async def handle_async_request(self, request : httpx.Request) -> httpx.Response:
+        proxy = self.select()
+        start = time.perf_counter()
+        elapsed = None
+        failed = False
+        try:
+            async with self._async_transports.use(proxy.url) as transport:
+                response = await transport.handle_async_request(request)
+                # The body is read before the connection pool may be closed.
+                try:
+                    await response.aread()
+                finally:
+                    await response.aclose()
+            elapsed = time.perf_counter() - start
+            failed = response.status_code in FAILURE_STATUSES
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(proxy, elapsed, failed)
+
+    def handle_request(self, request : httpx.Request) -> httpx.Response:
+        proxy = self.select()
+        start = time.perf_counter()
+        elapsed = None
+        failed = False
+        try:
+            response = self._sync_transport(proxy).handle_request(request)
+            elapsed = time.perf_counter() - start
+            failed = response.status_code in FAILURE_STATUSES
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(proxy, elapsed, failed)
+
+    async def async_health_check(self, url : str, timeout : float = 5.0) -> Dict[str, bool]:
+        """Asynchronously probe every proxy, readmitting healthy and ejecting unhealthy ones.
+
+        Parameters
+        ----------
+        url : str
+            URL requested through every proxy. Any response without a failure status counts as healthy.
+        timeout : float, optional
+            Seconds of a probe, by default 5.
+
+        Returns
+        -------
+        Dict[str, bool]
+            Health keyed by proxy URL.
+        """
+
+        import httpx
+
+        async def probe(proxy : TaipowerProxy) -> bool:
+            try:
+                async with httpx.AsyncClient(transport=self._create_transport(proxy.url, True), timeout=timeout) as client:
+                    response = await client.get(url)
+                return response.status_code not in FAILURE_STATUSES
+            except Exception:
+                return False
+
+        results = await asyncio.gather(*[probe(proxy) for proxy in self.proxies])
+        with self._lock:
+            for proxy, healthy in zip(self.proxies, results):
+                if healthy:
+                    proxy.consecutive_failures = 0
+                    proxy.ejections = 0
+                    proxy.ejected_until = 0.0
+                elif proxy.healthy:
+                    self._eject_locked(proxy)
+        return {proxy.url: healthy for proxy, healthy in zip(self.proxies, results)}
+
+    def health_check(self, url : str, timeout : float = 5.0) -> Dict[str, bool]:
+        """Probe every proxy, see `async_health_check`.
+
+        Parameters
+        ----------
+        url : str
+            URL requested through every proxy.
+        timeout : float, optional
+            Seconds of a probe, by default 5.
+
+        Returns
+        -------
+        Dict[str, bool]
+            Health keyed by proxy URL.
+        """
+
+        return asyncio.run(self.async_health_check(url, timeout=timeout))
+
+    def start_health_checks(self, url : str, interval : float = 60.0, timeout : float = 5.0) -> None:
+        """Probe every proxy periodically in a daemon thread until `stop_health_checks` or `finish` is called.
+
+        Parameters
+        ----------
+        url : str
+            URL requested through every proxy.
+        interval : float, optional
+            Seconds between checks, by default 60.
+        timeout : float, optional
+            Seconds of a probe, by default 5.
+        """
+
+        if self._health_thread is not None:
+            raise RuntimeError("The health checks are already running.")
+
+        def run() -> None:
+            while not self._health_stop.wait(interval):
+                self.health_check(url, timeout=timeout)
+
+        self._health_stop.clear()
+        self._health_thread = threading.Thread(target=run, name="taipower-proxy-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self) -> None:
+        """Stop the periodic health checks."""
+
+        self._health_stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+            self._health_thread = None
+
+    def stats(self) -> List[dict]:
+        """Statistics of every proxy.
+
+        Returns
+        -------
+        List[dict]
+            `url`, `weight`, `healthy`, `requests`, `failures`, `in_flight` and `latency` in seconds of every proxy.
+        """
+
+        with self._lock:
+            return [{
+                "url": proxy.url,
+                "weight": proxy.weight,
+                "healthy": proxy.healthy,
+                "requests": proxy.requests,
+                "failures": proxy.failures,
+                "in_flight": proxy.in_flight,
+                "latency": proxy.latency,
+            } for proxy in self.proxies]
+
+    def finish(self) -> None:
+        """Stop the health checks, close the synchronous transports, and drop the asynchronous ones of event loops whose clients were not closed."""
+
+        self.stop_health_checks()
+        with self._lock:
+            for transport in self._sync_transports.values():
+                transport.close()
+            self._sync_transports.clear()
+        self._async_transports.clear()
+
+    # Clients enter and close their transport. The synchronous transports are shared by every thread
+    # and outlive the clients, while the asynchronous ones are bound to the event loop of the client.
+    def __enter__(self) -> "TaipowerProxyPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    async def __aenter__(self) -> "TaipowerProxyPool":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        await self._async_transports.aclose()
@@ -0,0 +1,147 @@
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+from .api import REAUTH_MARGIN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TaipowerTokenRefresher:
+    """Background thread renewing the tokens of an API before they are due, so requests never wait for a login.
+
+    Tokens are renewed with the refresh token `ahead` seconds, minus up to `jitter` random seconds,
+    before requests would reauthenticate on their own. A password login is only made if the
+    refresh token is rejected. New tokens replace the old ones in a single assignment, and
+    requests in flight keep using the old ones, which remain valid until they expire.
+
+    Parameters
+    ----------
+    api : api.TaipowerAPI
+        API.
+    ahead : float, optional
+        Seconds before requests would reauthenticate at which tokens are renewed, by default 1800.
+    jitter : float, optional
+        Maximum random seconds renewals are moved earlier by, spreading the renewals of many APIs, by default 600.
+    retry_interval : float, optional
+        Seconds between attempts after a failed renewal, by default 60.
+    min_interval : float, optional
+        Minimum seconds between renewals, by default 60.
+    """
+
+    def __init__(
+        self,
+        api,
+        ahead : float = 1800.0,
+        jitter : float = 600.0,
+        retry_interval : float = 60.0,
+        min_interval : float = 60.0,
+    ) -> None:
+        self.api = api
+        self.ahead : float = ahead
+        self.jitter : float = jitter
+        self.retry_interval : float = retry_interval
+        self.min_interval : float = min_interval
+
+        self.refreshes : int = 0
+        self.fallbacks : int = 0
+        self.failures : int = 0
+        self.last_error : Optional[Exception] = None
+        self.next_refresh_at : Optional[float] = None
+
+        self._stop_event : threading.Event = threading.Event()
+        self._thread : Optional[threading.Thread] = None
+
+    def __enter__(self) -> "TaipowerTokenRefresher":
+        if self._thread is None:
+            self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        """Whether or not the refresher thread is running.
+
+        Returns
+        -------
+        bool
+            Running.
+        """
+
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start renewing tokens in a daemon thread."""
+
+        if self.running:
+            raise RuntimeError("The token refresher is already running.")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="taipower-token-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop renewing tokens. A renewal in progress is completed first."""
+
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def delay(self) -> float:
+        """Seconds until the current tokens are due for renewal, with a fresh jitter.
+
+        Returns
+        -------
+        float
+            Seconds, 0 if the tokens are due. Before the API logs in, `min_interval`.
+        """
+
+        tokens = self.api._taipower_tokens
+        if tokens is None:
+            return self.min_interval
+        refresh_at = tokens.expiration - REAUTH_MARGIN - self.ahead - random.uniform(0, self.jitter)
+        return max(0.0, refresh_at - time.time())
+
+    def refresh(self) -> None:
+        """Renew the tokens now with the refresh token, falling back to a password login.
+
+        Raises
+        ------
+        RuntimeError
+            If both fail.
+        """
+
+        try:
+            self.api.reauth(use_refresh_token=True)
+        except Exception as e:
+            _LOGGER.warning("Renewing tokens with the refresh token failed, logging in with the password: %s", e)
+            self.fallbacks += 1
+            self.api.reauth(use_refresh_token=False)
+        self.refreshes += 1
+
+    def _run(self) -> None:
+        delay = self.delay()
+        while True:
+            tokens = self.api._taipower_tokens
+            self.next_refresh_at = time.time() + delay
+            if self._stop_event.wait(delay):
+                break
+            if tokens is None or self.api._taipower_tokens is not tokens:
+                # Tokens were obtained or replaced meanwhile, e.g. by a login.
+                delay = self.delay()
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                _LOGGER.warning("Renewing tokens failed, retrying in %s seconds: %s", self.retry_interval, e)
+                self.failures += 1
+                self.last_error = e
+                delay = self.retry_interval
+            else:
+                self.last_error = None
+                delay = max(self.delay(), self.min_interval)
+        self.next_refresh_at = None
@@ -0,0 +1,186 @@
+import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from .model import TaipowerAMI
+from .tou import BUCKETS, classify
+
+PERIODS = ("hour", "daily", "monthly")
+
+_BUCKET_KEYS = {
+    "offpeak": "offPeakKwh",
+    "halfpeak": "halfPeakKwh",
+    "satpeak": "satPeakKwh",
+    "peak": "peakTimeKwh",
+}
+_TIME_FORMAT = "%Y%m%d%H%M%S"
+_QUARTER = datetime.timedelta(minutes=15)
+_QUARTERS_PER_DAY = 96
+
+# Aggregate slots: one per bucket, then total kwh, recorded quarters and missing quarters.
+_TOTAL = len(BUCKETS)
+_RECORDED = _TOTAL + 1
+_MISSING = _TOTAL + 2
+
+
+def parse_time(time_text : str) -> datetime.datetime:
+    """Parse an AMI start or end time.
+
+    Parameters
+    ----------
+    time_text : str
+        In yyyymmddhhmmss format.
+
+    Returns
+    -------
+    datetime.datetime
+        Naive datetime in Taiwan local time.
+    """
+
+    return datetime.datetime.strptime(time_text, _TIME_FORMAT)
+
+
+def tou_bucket(dt : datetime.datetime) -> str:
+    """Classify the quarter starting at `dt` into a time-of-use bucket, see tou.classify.
+
+    Parameters
+    ----------
+    dt : datetime.datetime
+        Start of the quarter.
+
+    Returns
+    -------
+    str
+        `offpeak`, `halfpeak`, `satpeak` or `peak`.
+    """
+
+    return classify(dt)
+
+
+def _period_start(dt : datetime.datetime, period : str) -> datetime.datetime:
+    if period == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    elif period == "daily":
+        return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == "monthly":
+        return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError("period accepts either `hour`, `daily` or `monthly`.")
+
+
+def _period_end(start : datetime.datetime, period : str) -> datetime.datetime:
+    if period == "hour":
+        return start + datetime.timedelta(hours=1)
+    elif period == "daily":
+        return start + datetime.timedelta(days=1)
+    return (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _expected_quarters(start : datetime.datetime, end : datetime.datetime) -> int:
+    return (end - start) // _QUARTER
+
+
+class TaipowerAMIRollup:
+    """Hourly, daily and monthly AMI derived locally from quarter-hour AMI.
+
+    Aggregates are maintained incrementally: adding a quarter updates only the hour, day and month it falls in,
+    and re-adding an already known quarter (e.g. once its missing data is recorded) replaces its contribution.
+    """
+
+    def __init__(self) -> None:
+        self._quarters : Dict[datetime.datetime, Tuple[str, float, bool]] = {}
+        self._aggregates : Dict[str, Dict[datetime.datetime, List[float]]] = {period: {} for period in PERIODS}
+
+    def __len__(self) -> int:
+        return len(self._quarters)
+
+    def _apply(self, start : datetime.datetime, bucket : str, kwh : float, missing : bool, sign : int) -> None:
+        slot = BUCKETS.index(bucket)
+        for period in PERIODS:
+            aggregate = self._aggregates[period].setdefault(
+                _period_start(start, period), [0.0] * (_MISSING + 1)
+            )
+            aggregate[slot] += sign * kwh
+            aggregate[_TOTAL] += sign * kwh
+            aggregate[_RECORDED] += sign
+            aggregate[_MISSING] += sign * missing
+
+    def add(self, amis : Iterable[TaipowerAMI]) -> None:
+        """Add quarter-hour AMI.
+
+        Parameters
+        ----------
+        amis : Iterable[TaipowerAMI]
+            Quarter-hour AMI, e.g. the values of `TaipowerAPI.get_ami` with the `quater` period.
+        """
+
+        for ami in amis:
+            start = parse_time(ami.start_time)
+            missing = ami.is_missing_data
+            kwh = 0.0 if missing else float(ami.total_kwh or 0.0)
+            bucket = tou_bucket(start)
+
+            previous = self._quarters.get(start)
+            if previous is not None:
+                self._apply(start, *previous, sign=-1)
+            self._quarters[start] = (bucket, kwh, missing)
+            self._apply(start, bucket, kwh, missing, sign=1)
+
+    def get(self, period : str) -> Dict[str, TaipowerAMI]:
+        """Get rolled-up AMI.
+
+        Parameters
+        ----------
+        period : str
+            `hour`, `daily` or `monthly`.
+
+        Returns
+        -------
+        Dict[str, TaipowerAMI]
+            AMI keyed by start time, in the same shape as retrieved from the API.
+            An interval is marked as missing data if any of its quarters is missing or absent.
+        """
+
+        if period not in PERIODS:
+            raise ValueError("period accepts either `hour`, `daily` or `monthly`.")
+
+        amis = {}
+        for start in sorted(self._aggregates[period]):
+            aggregate = self._aggregates[period][start]
+            if aggregate[_RECORDED] == 0:
+                continue
+            end = _period_end(start, period)
+            complete = aggregate[_MISSING] == 0 and aggregate[_RECORDED] == _expected_quarters(start, end)
+            ami_json = {
+                "startTime": start.strftime(_TIME_FORMAT),
+                "endTime": end.strftime(_TIME_FORMAT),
+                "isMssingData": 0 if complete else 1,
+                "totalKwh": round(aggregate[_TOTAL], 4),
+            }
+            for slot, bucket in enumerate(BUCKETS):
+                ami_json[_BUCKET_KEYS[bucket]] = round(aggregate[slot], 4)
+            amis[ami_json["startTime"]] = TaipowerAMI(ami_json)
+        return amis
+
+    def missing_dates(self, start : datetime.date, end : datetime.date) -> List[datetime.date]:
+        """Get the dates whose quarter-hour AMI is missing or incomplete.
+
+        Parameters
+        ----------
+        start : datetime.date
+            First date, inclusive.
+        end : datetime.date
+            Last date, inclusive.
+
+        Returns
+        -------
+        List[datetime.date]
+            Dates to be (re)fetched with the `quater` period.
+        """
+
+        dates = []
+        date = start
+        while date <= end:
+            aggregate = self._aggregates["daily"].get(datetime.datetime.combine(date, datetime.time()))
+            if aggregate is None or aggregate[_MISSING] != 0 or aggregate[_RECORDED] != _QUARTERS_PER_DAY:
+                dates.append(date)
+            date += datetime.timedelta(days=1)
+        return dates
@@ -0,0 +1,549 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from . import codec, model
+from .storage import PERIODS, ROW, _build_ami, _check_period, _pack_row, _sorted_amis, numpy_dtype
+
+MAGIC = b"TPSM"
+FORMAT_VERSION = 1
+DEFAULT_SIZE = 16 * 1024 * 1024
+FIELDS = ("meter", "ami_bill", "ami_unbilled", "bill_records")
+
+# Segment header: magic, format version, period code, active buffer, buffer capacity, publication version
+# and the sequence counters of both buffers, padded to 64 bytes. The counters are odd while a buffer is written.
+HEADER = struct.Struct("<4sBBBxQQQQ24x")
+# Buffer header: publication version, publication time, meter count and used bytes.
+BUFFER_HEADER = struct.Struct("<QdII")
+# Meter entry: electric number, AMI epoch base, region offset, AMI row count and the byte lengths of `FIELDS`.
+# A length of -1 stands for None.
+ENTRY = struct.Struct("<16sqII4i")
+
+_ACTIVE_OFFSET = 6
+_VERSION_OFFSET = 16
+_SEQUENCE_OFFSET = 24
+_COUNTER = struct.Struct("<Q")
+
+class _ReadOnlySegment:
+    # Existing POSIX shared memory segment mapped read-only. Unlike `SharedMemory` before Python 3.13,
+    # attaching does not register the segment with the resource tracker, which would remove it at exit.
+
+    def __init__(self, name : str) -> None:
+        import _posixshmem
+
+        self.name : str = name
+        fd = _posixshmem.shm_open(name if name.startswith("/") else f"/{name}", os.O_RDONLY, mode=0o600)
+        try:
+            self._mmap : mmap.mmap = mmap.mmap(fd, os.fstat(fd).st_size, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        self.buf : memoryview = memoryview(self._mmap)
+
+    def close(self) -> None:
+        self.buf.release()
+        self._mmap.close()
+
+
+def _attach(name : str):
+    from multiprocessing import shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    if os.name == "nt":
+        # Windows segments are not tracked by the resource tracker.
+        return shared_memory.SharedMemory(name)
+    return _ReadOnlySegment(name)
+
+
+class TaipowerSharedAMI:
+    """Read-only fixed-width AMI rows of a meter, in the row layout of `storage.TaipowerAMIFile`.
+
+    The rows are those of the `TaipowerSharedMeter` copied out of shared memory, never the shared memory itself.
+
+    Parameters
+    ----------
+    data : memoryview
+        Rows.
+    base : int
+        Epoch base of the rows.
+    period : str
+        AMI period.
+    """
+
+    def __init__(self, data : memoryview, base : int, period : str) -> None:
+        self._data : memoryview = data
+        self.base : int = base
+        self.period : str = period
+
+    def __len__(self) -> int:
+        return len(self._data) // ROW.size
+
+    def rows(self) -> Iterator[Tuple[int, int, Tuple[float, ...]]]:
+        """Iterate raw rows.
+
+        Returns
+        -------
+        Iterator[Tuple[int, int, Tuple[float, ...]]]
+            Unix timestamp, flags and the `storage.COLUMNS` values with NaN for None.
+        """
+
+        for row in ROW.iter_unpack(self._data):
+            yield self.base + row[0], row[1], row[2:]
+
+    def to_series(self) -> model.TaipowerAMISeries:
+        """Build the AMI.
+
+        Returns
+        -------
+        model.TaipowerAMISeries
+            AMI.
+        """
+
+        amis = [_build_ami(epoch, flags, values, self.period) for epoch, flags, values in self.rows()]
+        return model.TaipowerAMISeries({ami.start_time: ami for ami in amis})
+
+    def to_numpy(self):
+        """Get the rows as a NumPy structured array, a view of the rows of the meter without another copy. Requires NumPy.
+
+        Returns
+        -------
+        numpy.ndarray
+            Read-only array of `storage.numpy_dtype()`.
+        """
+
+        import numpy as np
+
+        return np.frombuffer(self._data, dtype=numpy_dtype())
+
+
+class TaipowerSharedMeter:
+    """Consistent, read-only copy of a meter published to a `TaipowerSharedMeterState`.
+
+    Only the raw bytes of the meter are copied when it is read. Fields are decoded on first access.
+
+    Parameters
+    ----------
+    number : str
+        Electric number.
+    version : int
+        Publication version.
+    published_at : float
+        Unix timestamp of the publication.
+    data : bytes
+        Region of the meter.
+    base : int
+        Epoch base of the AMI rows.
+    ami_count : int
+        Number of AMI rows.
+    lengths : Tuple[int, ...]
+        Byte lengths of `FIELDS`, -1 for None.
+    period : str
+        AMI period.
+    """
+
+    def __init__(
+        self,
+        number : str,
+        version : int,
+        published_at : float,
+        data : bytes,
+        base : int,
+        ami_count : int,
+        lengths : Tuple[int, ...],
+        period : str,
+    ) -> None:
+        self.number : str = number
+        self.version : int = version
+        self.published_at : float = published_at
+        self._data : memoryview = memoryview(data).toreadonly()
+        self._base : int = base
+        self._ami_count : int = ami_count
+        self._period : str = period
+        self._blobs : Dict[str, Optional[memoryview]] = {}
+        self._decoded : Dict[str, object] = {}
+
+        offset = max(0, ami_count) * ROW.size
+        for field, length in zip(FIELDS, lengths):
+            if length < 0:
+                self._blobs[field] = None
+            else:
+                self._blobs[field] = self._data[offset:offset + length]
+                offset += length
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.number}, version {self.version})"
+
+    def _decode(self, field : str, build):
+        if field not in self._decoded:
+            blob = self._blobs[field]
+            self._decoded[field] = None if blob is None else build(codec.loads(bytes(blob)))
+        return self._decoded[field]
+
+    @property
+    def meter_json(self) -> dict:
+        """Electric meter JSON, see `api.TaipowerElectricMeter`.
+
+        Returns
+        -------
+        dict
+            Electric meter JSON.
+        """
+
+        return self._decode("meter", lambda value: value)
+
+    @property
+    def ami_view(self) -> Optional[TaipowerSharedAMI]:
+        """AMI rows without decoding, e.g. for `to_numpy`.
+
+        Returns
+        -------
+        Optional[TaipowerSharedAMI]
+            AMI rows. None if the AMI was not loaded.
+        """
+
+        if self._ami_count < 0:
+            return None
+        return TaipowerSharedAMI(self._data[:self._ami_count * ROW.size], self._base, self._period)
+
+    @property
+    def ami(self) -> Optional[model.TaipowerAMISeries]:
+        """AMI, built on first access.
+
+        Returns
+        -------
+        Optional[model.TaipowerAMISeries]
+            AMI. None if the AMI was not loaded.
+        """
+
+        if "ami" not in self._decoded:
+            view = self.ami_view
+            self._decoded["ami"] = None if view is None else view.to_series()
+        return self._decoded["ami"]
+
+    @property
+    def ami_bill(self) -> Optional[model.TaipowerAMIBill]:
+        """AMI bill, decoded on first access.
+
+        Returns
+        -------
+        Optional[model.TaipowerAMIBill]
+            AMI bill.
+        """
+
+        return self._decode("ami_bill", model.TaipowerAMIBill)
+
+    @property
+    def ami_unbilled(self) -> Optional[model.TaipowerAMIUnbilled]:
+        """AMI unbilled, decoded on first access.
+
+        Returns
+        -------
+        Optional[model.TaipowerAMIUnbilled]
+            AMI unbilled.
+        """
+
+        return self._decode("ami_unbilled", model.TaipowerAMIUnbilled)
+
+    @property
+    def bill_records(self) -> Optional[model.TaipowerBillRecords]:
+        """Bill records, decoded on first access.
+
+        Returns
+        -------
+        Optional[model.TaipowerBillRecords]
+            Bill records keyed by issue year and month.
+        """
+
+        return self._decode(
+            "bill_records", lambda records: model.TaipowerBillRecords(
+                (key, model.TaipowerBillRecord(record)) for key, record in records.items()
+            )
+        )
+
+    def to_meter(self):
+        """Build an electric meter holding the published data.
+
+        Returns
+        -------
+        api.TaipowerElectricMeter
+            Electric meter without a loader.
+        """
+
+        from .api import TaipowerElectricMeter
+
+        meter = TaipowerElectricMeter(self.meter_json)
+        meter.publish(
+            ami=self.ami,
+            ami_bill=self.ami_bill,
+            ami_unbilled=self.ami_unbilled,
+            bill_records=self.bill_records,
+        )
+        return meter
+
+
+class TaipowerSharedMeterState:
+    """Meter data shared between processes through `multiprocessing.shared_memory`.
+
+    One poller process creates the state and publishes the meters of its API after every refresh,
+    and any number of processes attach to it by name and read the latest meters without calling the API.
+
+    The segment holds two buffers. A publication is written into the inactive buffer, which is then made
+    active with a version bump, so readers never wait for the writer. A reader copies the bytes of a meter
+    and retries if the sequence counter of the buffer changed meanwhile, e.g. when it was rewritten two
+    publications later. AMI is stored as the fixed-width rows of `storage.TaipowerAMIFile` and the other
+    fields as compact JSON, which is only decoded when accessed.
+
+    Parameters
+    ----------
+    name : str, optional
+        Name of the shared memory segment. If None is given when creating, a unique name is generated, by default None.
+    create : bool, optional
+        Whether or not to create the segment. Otherwise, an existing segment is attached read-only, by default False.
+    size : int, optional
+        Bytes of each of the two buffers when creating, by default 16 MiB.
+    ami_period : str, optional
+        AMI period of the published meters when creating, by default `daily`.
+
+    Raises
+    ------
+    ValueError
+        If an attached segment is not a meter state or its format version is unsupported.
+    """
+
+    def __init__(
+        self,
+        name : Optional[str] = None,
+        create : bool = False,
+        size : int = DEFAULT_SIZE,
+        ami_period : str = "daily",
+    ) -> None:
+        from multiprocessing import shared_memory
+
+        self._lock : threading.Lock = threading.Lock()
+        if create:
+            _check_period(ami_period)
+            self._segment = shared_memory.SharedMemory(name, create=True, size=HEADER.size + 2 * size)
+            HEADER.pack_into(self._segment.buf, 0, MAGIC, FORMAT_VERSION, PERIODS.index(ami_period), 0, size, 0, 0, 0)
+            BUFFER_HEADER.pack_into(self._segment.buf, HEADER.size, 0, 0.0, 0, BUFFER_HEADER.size)
+        else:
+            self._segment = _attach(name)
+            if len(self._segment.buf) < HEADER.size or HEADER.unpack_from(self._segment.buf)[0] != MAGIC:
+                self._segment.close()
+                raise ValueError(f"Not a meter state: {name}.")
+            if HEADER.unpack_from(self._segment.buf)[1] != FORMAT_VERSION:
+                self._segment.close()
+                raise ValueError(f"Unsupported meter state version: {HEADER.unpack_from(self._segment.buf)[1]}, expected {FORMAT_VERSION}.")
+
+        _, _, period_code, _, self.capacity, _, _, _ = HEADER.unpack_from(self._segment.buf)
+        self.name : str = self._segment.name
+        self.period : str = PERIODS[period_code]
+        self.creator : bool = create
+
+    def __enter__(self) -> "TaipowerSharedMeterState":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Detach from the segment. The creator also removes the segment."""
+
+        self._segment.close()
+        if self.creator:
+            self._segment.unlink()
+
+    @property
+    def version(self) -> int:
+        """Number of publications so far.
+
+        Returns
+        -------
+        int
+            Version.
+        """
+
+        return _COUNTER.unpack_from(self._segment.buf, _VERSION_OFFSET)[0]
+
+    def _sequence(self, index : int) -> int:
+        return _COUNTER.unpack_from(self._segment.buf, _SEQUENCE_OFFSET + 8 * index)[0]
+
+    def _buffer_offset(self, index : int) -> int:
+        return HEADER.size + index * self.capacity
+
+    def publish(self, meters : Mapping) -> int:
+        """Publish the current data of meters, replacing the previous publication.
+
+        Parameters
+        ----------
+        meters : Mapping[str, api.TaipowerElectricMeter]
+            Meters keyed by electric number, e.g. `TaipowerAPI.meters`. One snapshot of every meter is read.
+
+        Returns
+        -------
+        int
+            The new version.
+
+        Raises
+        ------
+        ValueError
+            If the publication does not fit into a buffer.
+        """
+
+        entries = []
+        regions = []
+        offset = BUFFER_HEADER.size + ENTRY.size * len(meters)
+        for number in sorted(meters):
+            meter = meters[number]
+            snapshot = meter.snapshot
+            amis = [] if snapshot.ami is None else _sorted_amis(snapshot.ami)
+            base = model.time_to_epoch(amis[0].start_time) if len(amis) != 0 else 0
+            blobs = [
+                codec.dumps(meter._json),
+                None if snapshot.ami_bill is None else codec.dumps(snapshot.ami_bill._json),
+                None if snapshot.ami_unbilled is None else codec.dumps(snapshot.ami_unbilled._json),
+                None if snapshot.bill_records is None else codec.dumps(
+                    {key: record._json for key, record in snapshot.bill_records.items()}
+                ),
+            ]
+            region = b"".join([_pack_row(ami, base) for ami in amis] + [blob for blob in blobs if blob is not None])
+            entries.append(ENTRY.pack(
+                number.encode("ascii"),
+                base,
+                offset,
+                0xFFFFFFFF if snapshot.ami is None else len(amis),
+                *(-1 if blob is None else len(blob) for blob in blobs),
+            ))
+            regions.append(region)
+            offset += len(region)
+
+        if offset > self.capacity:
+            raise ValueError(f"The meters need {offset} bytes, but a buffer holds {self.capacity} bytes.")
+
+        with self._lock:
+            buf = self._segment.buf
+            version = self.version + 1
+            index = version % 2
+            sequence_offset = _SEQUENCE_OFFSET + 8 * index
+            start = self._buffer_offset(index)
+
+            _COUNTER.pack_into(buf, sequence_offset, self._sequence(index) + 1)
+            BUFFER_HEADER.pack_into(buf, start, version, time.time(), len(entries), offset)
+            buf[start + BUFFER_HEADER.size:start + BUFFER_HEADER.size + ENTRY.size * len(entries)] = b"".join(entries)
+            position = start + BUFFER_HEADER.size + ENTRY.size * len(entries)
+            for region in regions:
+                buf[position:position + len(region)] = region
+                position += len(region)
+            _COUNTER.pack_into(buf, sequence_offset, self._sequence(index) + 1)
+
+            buf[_ACTIVE_OFFSET] = index
+            _COUNTER.pack_into(buf, _VERSION_OFFSET, version)
+        return version
+
+    def _read(self, read, retries : int = 1000):
+        # Run `read` on the active buffer until no publication overlapped it.
+        buf = self._segment.buf
+        for attempt in range(retries):
+            if attempt != 0:
+                time.sleep(0)
+            index = buf[_ACTIVE_OFFSET]
+            sequence = self._sequence(index)
+            if sequence % 2 == 1:
+                continue
+            start = self._buffer_offset(index)
+            version, published_at, count, used = BUFFER_HEADER.unpack_from(buf, start)
+            result = None
+            if BUFFER_HEADER.size + ENTRY.size * count <= used <= self.capacity:
+                try:
+                    result = read(buf, start, version, published_at, count, used)
+                except (struct.error, ValueError, IndexError):
+                    pass
+            if self._sequence(index) == sequence and result is not None:
+                return result
+        raise RuntimeError("An error occurred when reading the meter state: too many concurrent publications.")
+
+    def _meter(self, buf, start : int, entry : bytes, version : int, published_at : float) -> TaipowerSharedMeter:
+        number, base, offset, ami_count, *lengths = ENTRY.unpack(entry)
+        ami_count = -1 if ami_count == 0xFFFFFFFF else ami_count
+        size = max(0, ami_count) * ROW.size + sum(length for length in lengths if length > 0)
+        return TaipowerSharedMeter(
+            number.rstrip(b"\0").decode("ascii"),
+            version,
+            published_at,
+            bytes(buf[start + offset:start + offset + size]),
+            base,
+            ami_count,
+            tuple(lengths),
+            self.period,
+        )
+
+    def electric_numbers(self) -> List[str]:
+        """Electric numbers of the latest publication.
+
+        Returns
+        -------
+        List[str]
+            Sorted electric numbers.
+        """
+
+        def read(buf, start, version, published_at, count, used):
+            table = bytes(buf[start + BUFFER_HEADER.size:start + BUFFER_HEADER.size + ENTRY.size * count])
+            return [number.rstrip(b"\0").decode("ascii") for number, *_ in ENTRY.iter_unpack(table)]
+
+        return self._read(read)
+
+    def meter(self, electric_number : str) -> Optional[TaipowerSharedMeter]:
+        """Read a meter of the latest publication, copying only its bytes.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+
+        Returns
+        -------
+        Optional[TaipowerSharedMeter]
+            Meter. None if it is not published.
+        """
+
+        key = electric_number.encode("ascii").ljust(16, b"\0")
+
+        def read(buf, start, version, published_at, count, used):
+            # Entries are sorted by electric number.
+            table = start + BUFFER_HEADER.size
+            lower, upper = 0, count
+            while lower < upper:
+                middle = (lower + upper) // 2
+                if bytes(buf[table + ENTRY.size * middle:table + ENTRY.size * middle + 16]) < key:
+                    lower = middle + 1
+                else:
+                    upper = middle
+            entry = bytes(buf[table + ENTRY.size * lower:table + ENTRY.size * (lower + 1)]) if lower < count else b""
+            if entry[:16] != key:
+                return False
+            return self._meter(buf, start, entry, version, published_at)
+
+        meter = self._read(read)
+        return None if meter is False else meter
+
+    def meters(self) -> Dict[str, TaipowerSharedMeter]:
+        """Read all meters of the latest publication.
+
+        Returns
+        -------
+        Dict[str, TaipowerSharedMeter]
+            Meters of the same publication keyed by electric number.
+        """
+
+        def read(buf, start, version, published_at, count, used):
+            table = bytes(buf[start + BUFFER_HEADER.size:start + BUFFER_HEADER.size + ENTRY.size * count])
+            meters = [self._meter(buf, start, entry, version, published_at) for entry in (
+                table[ENTRY.size * i:ENTRY.size * (i + 1)] for i in range(count)
+            )]
+            return {meter.number: meter for meter in meters}
+
+        return self._read(read)
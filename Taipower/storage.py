@@ -0,0 +1,739 @@
+import bisect
+import datetime
+import math
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from . import gorilla
+from .model import TAIWAN_TIMEZONE, TaipowerAMI, TaipowerAMISeries, datetime_to_epoch, time_to_epoch
+
+MAGIC = b"TPAM"
+COMPRESSED_MAGIC = b"TPAZ"
+FORMAT_VERSION = 1
+PERIODS = ("quater", "hour", "daily", "monthly")
+COLUMNS = ("total", "offpeak", "halfpeak", "satpeak", "peak")
+FLAG_MISSING = 1
+
+# Header: magic, format version, period code, epoch base and row count, padded to 32 bytes.
+HEADER = struct.Struct("<4sBBxxqI12x")
+# Row: seconds from the epoch base, flags and one float32 per column. NaN stands for None.
+ROW = struct.Struct("<II5f")
+
+_COUNT_OFFSET = 16
+_JSON_KEYS = ("totalKwh", "offPeakKwh", "halfPeakKwh", "satPeakKwh", "peakTimeKwh")
+_PERIOD_SECONDS = {"quater": 900, "hour": 3600, "daily": 86400}
+_TIME_FORMAT = "%Y%m%d%H%M%S"
+
+
+def numpy_dtype():
+    """Get the NumPy structured dtype of a row.
+
+    Returns
+    -------
+    numpy.dtype
+        Fields `offset`, `flags` and the float32 `COLUMNS`.
+    """
+
+    import numpy as np
+
+    return np.dtype([("offset", "<u4"), ("flags", "<u4")] + [(column, "<f4") for column in COLUMNS])
+
+
+def _check_period(period : str) -> None:
+    if period not in PERIODS:
+        raise ValueError("period accepts either `quater`, `hour`, `daily` or `monthly`.")
+
+
+def _ami_row(ami : TaipowerAMI) -> Tuple[int, int, Tuple[float, ...]]:
+    values = (ami.total_kwh, ami.offpeak_kwh, ami.halfpeak_kwh, ami.satpeak_kwh, ami.peak_kwh)
+    return (
+        time_to_epoch(ami.start_time),
+        FLAG_MISSING if ami.is_missing_data else 0,
+        tuple(math.nan if value is None else value for value in values),
+    )
+
+
+def _pack_row(ami : TaipowerAMI, base : int) -> bytes:
+    epoch, flags, values = _ami_row(ami)
+    return ROW.pack(epoch - base, flags, *values)
+
+
+def _sorted_amis(amis : Union[Mapping, Iterable[TaipowerAMI]]) -> List[TaipowerAMI]:
+    return sorted(amis.values() if isinstance(amis, Mapping) else amis, key=lambda ami: ami.start_time)
+
+
+def _to_epoch(dt : Union[datetime.datetime, int]) -> int:
+    return dt if isinstance(dt, int) else datetime_to_epoch(dt)
+
+
+def _open_header(path : str, magic : bytes) -> Tuple[mmap.mmap, str, int, int]:
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapping) < HEADER.size or HEADER.unpack_from(mapping)[0] != magic:
+        mapping.close()
+        raise ValueError(f"Not an AMI file: {path}.")
+    _, version, period_code, base, count = HEADER.unpack_from(mapping)
+    if version != FORMAT_VERSION:
+        mapping.close()
+        raise ValueError(f"Unsupported AMI file version: {version}, expected {FORMAT_VERSION}.")
+    return mapping, PERIODS[period_code], base, count
+
+
+def _unpack_value(value : float) -> Optional[float]:
+    # float32 keeps 7 significant digits, which recovers the decimal values of the API.
+    return None if math.isnan(value) else float(f"{value:.7g}")
+
+
+def _end_time(start : datetime.datetime, period : str) -> datetime.datetime:
+    if period == "monthly":
+        return (start + datetime.timedelta(days=32)).replace(day=1)
+    return start + datetime.timedelta(seconds=_PERIOD_SECONDS[period])
+
+
+def _build_ami(epoch : int, flags : int, values : Tuple[float, ...], period : str) -> TaipowerAMI:
+    start = datetime.datetime.fromtimestamp(epoch, TAIWAN_TIMEZONE).replace(tzinfo=None)
+    ami_json = {
+        "startTime": start.strftime(_TIME_FORMAT),
+        "endTime": _end_time(start, period).strftime(_TIME_FORMAT),
+        "isMssingData": 1 if flags & FLAG_MISSING else 0,
+    }
+    if period == "quater":
+        ami_json["kwh"] = _unpack_value(values[0])
+    else:
+        for key, value in zip(_JSON_KEYS, values):
+            value = _unpack_value(value)
+            if value is not None or key == "totalKwh":
+                ami_json[key] = value
+    return TaipowerAMI(ami_json)
+
+
+class TaipowerAMIFile:
+    """Read-only, memory-mapped view of an AMI file written by `write_ami`.
+
+    A file holds the AMI of one meter and period as fixed-width rows in time order, so opening it costs
+    no parsing and `to_numpy` is a zero-copy view of the mapping.
+
+    Parameters
+    ----------
+    path : str
+        File path.
+
+    Raises
+    ------
+    ValueError
+        If the file is not an AMI file or its format version is unsupported.
+    """
+
+    def __init__(self, path : str) -> None:
+        self.path : str = path
+        self._mmap, self.period, self.base, count = _open_header(path, MAGIC)
+        # Rows beyond the header count are an interrupted append and are ignored.
+        self._count : int = min(count, (len(self._mmap) - HEADER.size) // ROW.size)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "TaipowerAMIFile":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the file. Views returned by `buffer` or `to_numpy` must be released beforehand."""
+
+        self._mmap.close()
+
+    @property
+    def buffer(self) -> memoryview:
+        """The rows without copying.
+
+        Returns
+        -------
+        memoryview
+            `len(self) * ROW.size` bytes of packed rows.
+        """
+
+        return memoryview(self._mmap)[HEADER.size:HEADER.size + self._count * ROW.size]
+
+    def epoch(self, index : int) -> int:
+        """Get the start time of a row.
+
+        Parameters
+        ----------
+        index : int
+            Row index.
+
+        Returns
+        -------
+        int
+            Unix timestamp.
+        """
+
+        return self.base + ROW.unpack_from(self._mmap, HEADER.size + index * ROW.size)[0]
+
+    def find(self, epoch : int) -> int:
+        """Binary search the first row starting at or after a time.
+
+        Parameters
+        ----------
+        epoch : int
+            Unix timestamp.
+
+        Returns
+        -------
+        int
+            Row index, `len(self)` if every row starts before `epoch`.
+        """
+
+        lower, upper = 0, self._count
+        while lower < upper:
+            middle = (lower + upper) // 2
+            if self.epoch(middle) < epoch:
+                lower = middle + 1
+            else:
+                upper = middle
+        return lower
+
+    def _bounds(self, start : Optional[Union[datetime.datetime, int]], end : Optional[Union[datetime.datetime, int]]):
+        lower = 0 if start is None else self.find(_to_epoch(start))
+        upper = self._count if end is None else self.find(_to_epoch(end))
+        return lower, upper
+
+    def rows(
+        self,
+        start : Optional[Union[datetime.datetime, int]] = None,
+        end : Optional[Union[datetime.datetime, int]] = None,
+    ) -> Iterator[Tuple[int, int, Tuple[float, ...]]]:
+        """Iterate raw rows starting within a time range.
+
+        Parameters
+        ----------
+        start : datetime.datetime or int, optional
+            Start of the range, inclusive, see `TaipowerAMISeries.slice`, by default None.
+        end : datetime.datetime or int, optional
+            End of the range, exclusive, by default None.
+
+        Returns
+        -------
+        Iterator[Tuple[int, int, Tuple[float, ...]]]
+            Unix timestamp, flags and the `COLUMNS` values with NaN for None.
+        """
+
+        lower, upper = self._bounds(start, end)
+        view = memoryview(self._mmap)[HEADER.size + lower * ROW.size:HEADER.size + upper * ROW.size]
+        try:
+            for row in ROW.iter_unpack(view):
+                yield self.base + row[0], row[1], row[2:]
+        finally:
+            view.release()
+
+    def to_series(
+        self,
+        start : Optional[Union[datetime.datetime, int]] = None,
+        end : Optional[Union[datetime.datetime, int]] = None,
+    ) -> TaipowerAMISeries:
+        """Build the AMI starting within a time range.
+
+        Parameters
+        ----------
+        start : datetime.datetime or int, optional
+            Start of the range, inclusive, by default None.
+        end : datetime.datetime or int, optional
+            End of the range, exclusive, by default None.
+
+        Returns
+        -------
+        TaipowerAMISeries
+            AMI.
+        """
+
+        amis = [_build_ami(epoch, flags, values, self.period) for epoch, flags, values in self.rows(start, end)]
+        return TaipowerAMISeries({ami.start_time: ami for ami in amis})
+
+    def to_numpy(self):
+        """Get the rows as a NumPy structured array without copying. Requires NumPy.
+
+        Start times are `base + array["offset"]`, and the columns are float32 with NaN for None.
+
+        Returns
+        -------
+        numpy.ndarray
+            Read-only array of `numpy_dtype()`.
+        """
+
+        import numpy as np
+
+        return np.frombuffer(self._mmap, dtype=numpy_dtype(), count=self._count, offset=HEADER.size)
+
+
+def _replace(temp_path : str, path : str) -> None:
+    try:
+        os.replace(temp_path, path)
+        return
+    except PermissionError:
+        # Windows refuses to replace a file mapped by an open reader, so the new contents are written over the old
+        # ones. The row count is cleared first and the header is written last, and readers ignore trailing bytes
+        # beyond the row count as an interrupted append.
+        pass
+    with open(temp_path, "rb") as f:
+        data = f.read()
+    with open(path, "r+b") as f:
+        f.seek(_COUNT_OFFSET)
+        f.write(struct.pack("<I", 0))
+        f.flush()
+        f.seek(HEADER.size)
+        f.write(data[HEADER.size:])
+        f.flush()
+        f.seek(0)
+        f.write(data[:HEADER.size])
+    os.remove(temp_path)
+
+
+def write_ami(path : str, amis : Union[Mapping, Iterable[TaipowerAMI]], period : str) -> int:
+    """Write AMI to a file, creating it if needed.
+
+    Newer AMI are appended and already stored ones are overwritten in place, e.g. once their missing data is recorded.
+    Only AMI older than the first row or falling between stored rows rewrite the file.
+    The row count in the header is updated last, so readers never see a partially written row.
+    A rewrite replaces the file, so open readers keep the previous rows. Where a mapped file cannot be replaced,
+    i.e. on Windows, it is rewritten in place instead, and readers opened before must be reopened.
+
+    Parameters
+    ----------
+    path : str
+        File path.
+    amis : Mapping[str, TaipowerAMI] or Iterable[TaipowerAMI]
+        AMI of `period`.
+    period : str
+        `quater`, `hour`, `daily` or `monthly`.
+
+    Returns
+    -------
+    int
+        The number of rows in the file.
+
+    Raises
+    ------
+    ValueError
+        If the file stores another period.
+    """
+
+    _check_period(period)
+    amis = _sorted_amis(amis)
+    if len(amis) == 0 and os.path.exists(path):
+        with TaipowerAMIFile(path) as ami_file:
+            return len(ami_file)
+
+    if not os.path.exists(path):
+        base = time_to_epoch(amis[0].start_time) if len(amis) != 0 else 0
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, PERIODS.index(period), base, 0))
+
+    with TaipowerAMIFile(path) as ami_file:
+        if ami_file.period != period:
+            raise ValueError(f"The file stores `{ami_file.period}` AMI, not `{period}`.")
+        base = ami_file.base
+        count = len(ami_file)
+        last = ami_file.epoch(count - 1) if count != 0 else None
+
+        updates = []
+        appends = []
+        rewrite = False
+        for ami in amis:
+            epoch = time_to_epoch(ami.start_time)
+            if last is None or epoch > last:
+                appends.append(ami)
+                continue
+            index = ami_file.find(epoch) if epoch >= base else count
+            if index < count and ami_file.epoch(index) == epoch:
+                updates.append((index, ami))
+            else:
+                rewrite = True
+                break
+        merged = {epoch: (flags, values) for epoch, flags, values in ami_file.rows()} if rewrite else None
+
+    if merged is not None:
+        for ami in amis:
+            epoch, flags, values = _ami_row(ami)
+            merged[epoch] = (flags, values)
+        base = min(merged)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, PERIODS.index(period), base, len(merged)))
+            f.write(b"".join(ROW.pack(epoch - base, merged[epoch][0], *merged[epoch][1]) for epoch in sorted(merged)))
+        _replace(temp_path, path)
+        return len(merged)
+
+    with open(path, "r+b") as f:
+        for index, ami in updates:
+            f.seek(HEADER.size + index * ROW.size)
+            f.write(_pack_row(ami, base))
+        f.seek(HEADER.size + count * ROW.size)
+        f.write(b"".join(_pack_row(ami, base) for ami in appends))
+        f.flush()
+        f.seek(_COUNT_OFFSET)
+        f.write(struct.pack("<I", count + len(appends)))
+    return count + len(appends)
+
+
+class TaipowerAMICompressedFile:
+    """Read-only, memory-mapped view of a compressed AMI file written by `write_compressed_ami`.
+
+    Rows are stored in `gorilla` blocks. Opening the file only walks the block headers, and
+    range reads decompress only the blocks overlapping the range, one block at a time.
+
+    Parameters
+    ----------
+    path : str
+        File path.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a compressed AMI file or its format version is unsupported.
+    """
+
+    def __init__(self, path : str) -> None:
+        self.path : str = path
+        self._mmap, self.period, self.base, count = _open_header(path, COMPRESSED_MAGIC)
+
+        # (first start time, last start time, offset, rows) per block.
+        self._blocks : List[Tuple[int, int, int, int]] = []
+        offset = HEADER.size
+        rows = 0
+        # Blocks beyond the header count are an interrupted append and are ignored.
+        while rows < count and offset + gorilla.BLOCK_HEADER.size <= len(self._mmap):
+            first, last, block_rows, size = gorilla.BLOCK_HEADER.unpack_from(self._mmap, offset)
+            if rows + block_rows > count or offset + gorilla.BLOCK_HEADER.size + size > len(self._mmap):
+                break
+            self._blocks.append((first, last, offset, block_rows))
+            offset += gorilla.BLOCK_HEADER.size + size
+            rows += block_rows
+        self._count : int = rows
+        self._end : int = offset
+        self._lasts : List[int] = [block[1] for block in self._blocks]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "TaipowerAMICompressedFile":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the file."""
+
+        self._mmap.close()
+
+    @property
+    def blocks(self) -> List[Tuple[int, int, int]]:
+        """The block index.
+
+        Returns
+        -------
+        List[Tuple[int, int, int]]
+            First start time, last start time and the number of rows per block.
+        """
+
+        return [(first, last, rows) for first, last, _, rows in self._blocks]
+
+    def block(self, index : int) -> List[Tuple[int, int, Tuple[float, ...]]]:
+        """Decompress a block.
+
+        Parameters
+        ----------
+        index : int
+            Block index.
+
+        Returns
+        -------
+        List[Tuple[int, int, Tuple[float, ...]]]
+            Unix timestamp, flags and the `COLUMNS` values with NaN for None per row.
+        """
+
+        offset = self._blocks[index][2]
+        size = gorilla.BLOCK_HEADER.unpack_from(self._mmap, offset)[3]
+        return gorilla.decode_block(self._mmap[offset:offset + gorilla.BLOCK_HEADER.size + size])
+
+    def rows(
+        self,
+        start : Optional[Union[datetime.datetime, int]] = None,
+        end : Optional[Union[datetime.datetime, int]] = None,
+    ) -> Iterator[Tuple[int, int, Tuple[float, ...]]]:
+        """Iterate rows starting within a time range, decompressing block by block.
+
+        Parameters
+        ----------
+        start : datetime.datetime or int, optional
+            Start of the range, inclusive, see `TaipowerAMISeries.slice`, by default None.
+        end : datetime.datetime or int, optional
+            End of the range, exclusive, by default None.
+
+        Returns
+        -------
+        Iterator[Tuple[int, int, Tuple[float, ...]]]
+            Unix timestamp, flags and the `COLUMNS` values with NaN for None.
+        """
+
+        start = None if start is None else _to_epoch(start)
+        end = None if end is None else _to_epoch(end)
+        index = 0 if start is None else bisect.bisect_left(self._lasts, start)
+        for index in range(index, len(self._blocks)):
+            if end is not None and self._blocks[index][0] >= end:
+                return
+            for row in self.block(index):
+                if (start is None or row[0] >= start) and (end is None or row[0] < end):
+                    yield row
+
+    def to_series(
+        self,
+        start : Optional[Union[datetime.datetime, int]] = None,
+        end : Optional[Union[datetime.datetime, int]] = None,
+    ) -> TaipowerAMISeries:
+        """Build the AMI starting within a time range.
+
+        Parameters
+        ----------
+        start : datetime.datetime or int, optional
+            Start of the range, inclusive, by default None.
+        end : datetime.datetime or int, optional
+            End of the range, exclusive, by default None.
+
+        Returns
+        -------
+        TaipowerAMISeries
+            AMI.
+        """
+
+        amis = [_build_ami(epoch, flags, values, self.period) for epoch, flags, values in self.rows(start, end)]
+        return TaipowerAMISeries({ami.start_time: ami for ami in amis})
+
+    def to_numpy(self):
+        """Decompress the rows into a NumPy structured array. Requires NumPy.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of `numpy_dtype()`, see `TaipowerAMIFile.to_numpy`.
+        """
+
+        import numpy as np
+
+        return np.array(
+            [(epoch - self.base, flags) + tuple(values) for epoch, flags, values in self.rows()],
+            dtype=numpy_dtype(),
+        )
+
+
+def write_compressed_ami(path : str, amis : Union[Mapping, Iterable[TaipowerAMI]], period : str) -> int:
+    """Write AMI to a compressed file, creating it if needed.
+
+    AMI newer than every stored one only re-encode the last block if it is not full, and append new blocks.
+    Other AMI rewrite the file, see `write_ami`. The row count in the header excludes the re-encoded block until it is written.
+
+    Parameters
+    ----------
+    path : str
+        File path.
+    amis : Mapping[str, TaipowerAMI] or Iterable[TaipowerAMI]
+        AMI of `period`.
+    period : str
+        `quater`, `hour`, `daily` or `monthly`.
+
+    Returns
+    -------
+    int
+        The number of rows in the file.
+
+    Raises
+    ------
+    ValueError
+        If the file stores another period.
+    """
+
+    _check_period(period)
+    rows = [_ami_row(ami) for ami in _sorted_amis(amis)]
+
+    if not os.path.exists(path):
+        base = rows[0][0] if len(rows) != 0 else 0
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(COMPRESSED_MAGIC, FORMAT_VERSION, PERIODS.index(period), base, 0))
+
+    with TaipowerAMICompressedFile(path) as ami_file:
+        if ami_file.period != period:
+            raise ValueError(f"The file stores `{ami_file.period}` AMI, not `{period}`.")
+        count = len(ami_file)
+        if len(rows) == 0:
+            return count
+        base = ami_file.base
+        end = ami_file._end
+        blocks = ami_file._blocks
+        if len(blocks) == 0 or rows[0][0] > blocks[-1][1]:
+            merged = None
+            tail = []
+            if len(blocks) != 0 and blocks[-1][3] < gorilla.BLOCK_SIZE:
+                tail = ami_file.block(len(blocks) - 1)
+                end = blocks[-1][2]
+        else:
+            merged = {epoch: (flags, values) for epoch, flags, values in ami_file.rows()}
+
+    if merged is not None:
+        for epoch, flags, values in rows:
+            merged[epoch] = (flags, values)
+        rows = [(epoch, *merged[epoch]) for epoch in sorted(merged)]
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(COMPRESSED_MAGIC, FORMAT_VERSION, PERIODS.index(period), rows[0][0], len(rows)))
+            for block in gorilla.encode_blocks(rows):
+                f.write(block)
+        _replace(temp_path, path)
+        return len(rows)
+
+    with open(path, "r+b") as f:
+        f.seek(_COUNT_OFFSET)
+        f.write(struct.pack("<I", count - len(tail)))
+        f.flush()
+        f.truncate(end)
+        f.seek(end)
+        for block in gorilla.encode_blocks(tail + rows):
+            f.write(block)
+        f.flush()
+        f.seek(_COUNT_OFFSET)
+        f.write(struct.pack("<I", count + len(rows)))
+    return count + len(rows)
+
+
+class TaipowerAMIStore:
+    """Directory of AMI files, one per meter and period.
+
+    Parameters
+    ----------
+    directory : str
+        Directory, created if it does not exist.
+    compressed : bool, optional
+        Whether or not to store `gorilla` compressed files, which are several times smaller
+        but decompressed on read, by default False.
+    """
+
+    def __init__(self, directory : str, compressed : bool = False) -> None:
+        self.directory : str = directory
+        self.compressed : bool = compressed
+        self._suffix : str = "amiz" if compressed else "ami"
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, electric_number : str, period : str) -> str:
+        """Get the file path of a meter and period.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        period : str
+            `quater`, `hour`, `daily` or `monthly`.
+
+        Returns
+        -------
+        str
+            File path.
+        """
+
+        _check_period(period)
+        return os.path.join(self.directory, f"{electric_number}.{period}.{self._suffix}")
+
+    def electric_numbers(self, period : str) -> List[str]:
+        """Get the stored electric numbers of a period.
+
+        Parameters
+        ----------
+        period : str
+            `quater`, `hour`, `daily` or `monthly`.
+
+        Returns
+        -------
+        List[str]
+            Electric numbers, sorted.
+        """
+
+        _check_period(period)
+        suffix = f".{period}.{self._suffix}"
+        return sorted(name[:-len(suffix)] for name in os.listdir(self.directory) if name.endswith(suffix))
+
+    def write(self, electric_number : str, period : str, amis : Union[Mapping, Iterable[TaipowerAMI]]) -> int:
+        """Write AMI of a meter, see `write_ami` and `write_compressed_ami`.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        period : str
+            `quater`, `hour`, `daily` or `monthly`.
+        amis : Mapping[str, TaipowerAMI] or Iterable[TaipowerAMI]
+            AMI of `period`.
+
+        Returns
+        -------
+        int
+            The number of stored rows.
+        """
+
+        if self.compressed:
+            return write_compressed_ami(self.path(electric_number, period), amis, period)
+        return write_ami(self.path(electric_number, period), amis, period)
+
+    def open(self, electric_number : str, period : str) -> Union[TaipowerAMIFile, TaipowerAMICompressedFile]:
+        """Memory-map the file of a meter and period.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        period : str
+            `quater`, `hour`, `daily` or `monthly`.
+
+        Returns
+        -------
+        TaipowerAMIFile or TaipowerAMICompressedFile
+            Memory-mapped file, to be closed by the caller.
+        """
+
+        if self.compressed:
+            return TaipowerAMICompressedFile(self.path(electric_number, period))
+        return TaipowerAMIFile(self.path(electric_number, period))
+
+    def load(
+        self,
+        electric_number : str,
+        period : str,
+        start : Optional[Union[datetime.datetime, int]] = None,
+        end : Optional[Union[datetime.datetime, int]] = None,
+    ) -> TaipowerAMISeries:
+        """Load AMI of a meter starting within a time range.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        period : str
+            `quater`, `hour`, `daily` or `monthly`.
+        start : datetime.datetime or int, optional
+            Start of the range, inclusive, by default None.
+        end : datetime.datetime or int, optional
+            End of the range, exclusive, by default None.
+
+        Returns
+        -------
+        TaipowerAMISeries
+            AMI, empty if nothing is stored.
+        """
+
+        if not os.path.exists(self.path(electric_number, period)):
+            return TaipowerAMISeries()
+        with self.open(electric_number, period) as ami_file:
+            return ami_file.to_series(start, end)
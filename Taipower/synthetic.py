@@ -0,0 +1,571 @@
+from __future__ import annotations
+
+import asyncio
+import calendar
+import datetime
+import math
+import random
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from . import codec
+from .rollup import BUCKETS
+from .tariff import TaipowerTariff
+from .tou import QUARTERS_PER_DAY, get_calendar
+
+if TYPE_CHECKING:
+    import httpx
+
+_BUCKET_KEYS = {"offpeak": "offPeakKwh", "halfpeak": "halfPeakKwh", "satpeak": "satPeakKwh", "peak": "peakTimeKwh"}
+_TIME_FORMAT = "%Y%m%d%H%M%S"
+
+
+def _roc(date : datetime.date, separator : str = "") -> str:
+    return f"{date.year - 1911:03d}{separator}{date.month:02d}{separator}{date.day:02d}"
+
+
+def _shape(weekend : bool) -> List[float]:
+    # Relative load of every quarter of a day: a night base load, a morning bump and an evening peak.
+    # Weekends shift the morning later and add daytime load.
+    shape = []
+    for quarter in range(QUARTERS_PER_DAY):
+        hour = quarter / 4
+        morning = 0.35 * math.exp(-((hour - (9.5 if weekend else 7.5)) / 1.5) ** 2)
+        evening = 0.9 * math.exp(-((hour - 20.5) / 2.5) ** 2)
+        daytime = 0.25 if weekend and 10 <= hour < 18 else 0.0
+        shape.append(0.5 + morning + evening + daytime)
+    return shape
+
+
+_SHAPES = {False: _shape(False), True: _shape(True)}
+_SHAPE_SUMS = {weekend: sum(shape) for weekend, shape in _SHAPES.items()}
+
+
+class _SyntheticMeter:
+    def __init__(self, index : int, account_index : int, seed : int) -> None:
+        rng = random.Random(seed * 1000003 + index)
+        self.index : int = index
+        self.account_index : int = account_index
+        self.seed : int = seed
+        self.electric_number : str = f"{index + 1:011d}"
+        # kwh of a quarter at the relative load 1.
+        self.base : float = rng.uniform(0.04, 0.2)
+        # Air conditioning raises the load in summer by this factor at the hottest day.
+        self.summer : float = rng.uniform(0.3, 1.2)
+        self.cycle_day : int = rng.randint(1, 28)
+        self.cycle_parity : int = rng.randint(0, 1)
+
+    def scale(self, date : datetime.date) -> float:
+        # Seasonal factor peaking in late July.
+        season = math.cos(2 * math.pi * (date.timetuple().tm_yday - 205) / 365.25)
+        return self.base * (1 + self.summer * max(0.0, season) ** 2)
+
+    def quarters(self, date : datetime.date, missing_rate : float) -> List[Optional[float]]:
+        rng = random.Random((self.seed * 1000003 + self.index) * 1000003 + date.toordinal())
+        scale = self.scale(date)
+        kwhs = [round(max(0.0, load * scale * rng.gauss(1.0, 0.2)), 2) for load in _SHAPES[date.weekday() >= 5]]
+        if rng.random() < missing_rate:
+            start = rng.randrange(QUARTERS_PER_DAY)
+            for quarter in range(start, min(QUARTERS_PER_DAY, start + rng.randint(1, 16))):
+                kwhs[quarter] = None
+        return kwhs
+
+    def expected_kwh(self, date : datetime.date) -> float:
+        return _SHAPE_SUMS[date.weekday() >= 5] * self.scale(date)
+
+    def reading_dates(self, start : datetime.date, end : datetime.date) -> List[datetime.date]:
+        # Meters are read bimonthly on the cycle day of every other month.
+        dates = []
+        year, month = start.year, start.month - 2
+        while True:
+            date = datetime.date(year, month, self.cycle_day) if month > 0 else datetime.date(year - 1, month + 12, self.cycle_day)
+            if date > end:
+                return dates
+            if date.month % 2 == self.cycle_parity:
+                dates.append(date)
+            month += 1
+            if month > 12:
+                year, month = year + 1, month - 12
+
+
+class TaipowerSyntheticFleet:
+    """Deterministic generator of realistic Taipower API payloads for any number of accounts and meters.
+
+    Every payload is generated on demand from the seed, the meter and the requested date, so a fleet of
+    any size takes no memory and the same request always returns the same payload. Quarter-hour loads follow
+    daily and weekly shapes scaled by a per-meter seasonal air conditioning load, with random outages
+    marked as missing data. Hourly, daily and monthly AMI are sums of the quarters split into time-of-use
+    buckets, and bills cover bimonthly reading cycles with ROC dates and residential charges.
+
+    `transport` serves the payloads as a local mock of the Taipower API, e.g. `TaipowerAPI(account, password, transport=fleet.transport())`.
+
+    Parameters
+    ----------
+    accounts : int, optional
+        Number of accounts, by default 1.
+    meters_per_account : int, optional
+        Number of meters of every account, by default 1.
+    start : datetime.date, optional
+        First date of the data. If None is given, January 1st of the previous year is used, by default None.
+    end : datetime.date, optional
+        Last date of the data. If None is given, today is used, by default None.
+    missing_rate : float, optional
+        Probability of an outage of up to four hours on a day, by default 0.01.
+    seed : int, optional
+        Seed of the generator, by default 0.
+    latency : float, optional
+        Seconds the mock API waits before every asynchronous response, by default 0.0.
+    """
+
+    def __init__(
+        self,
+        accounts : int = 1,
+        meters_per_account : int = 1,
+        start : Optional[datetime.date] = None,
+        end : Optional[datetime.date] = None,
+        missing_rate : float = 0.01,
+        seed : int = 0,
+        latency : float = 0.0,
+    ) -> None:
+        today = datetime.date.today()
+        self.end : datetime.date = end or today
+        self.start : datetime.date = start or datetime.date(self.end.year - 1, 1, 1)
+        if self.start > self.end:
+            raise ValueError("start should not be later than end.")
+        self.meters_per_account : int = meters_per_account
+        self.missing_rate : float = missing_rate
+        self.seed : int = seed
+        self.latency : float = latency
+        self.accounts : List[str] = [f"09{index:08d}" for index in range(accounts)]
+        self._account_indexes : Dict[str, int] = {account: index for index, account in enumerate(self.accounts)}
+        self._meters : Dict[int, _SyntheticMeter] = {}
+
+    def __len__(self) -> int:
+        return len(self.accounts) * self.meters_per_account
+
+    def _meter(self, electric_number : str) -> _SyntheticMeter:
+        try:
+            index = int(electric_number) - 1
+        except (TypeError, ValueError):
+            raise KeyError(electric_number) from None
+        if not 0 <= index < len(self):
+            raise KeyError(electric_number)
+        meter = self._meters.get(index)
+        if meter is None:
+            meter = _SyntheticMeter(index, index // self.meters_per_account, self.seed)
+            if len(self._meters) < 65536:
+                self._meters[index] = meter
+        return meter
+
+    def electric_numbers(self, account : str) -> List[str]:
+        """Electric numbers of an account.
+
+        Parameters
+        ----------
+        account : str
+            User phone number, one of `accounts`.
+
+        Returns
+        -------
+        List[str]
+            Electric numbers.
+        """
+
+        first = self._account_indexes[account] * self.meters_per_account
+        return [f"{index + 1:011d}" for index in range(first, first + self.meters_per_account)]
+
+    @staticmethod
+    def _wrap(data) -> dict:
+        return {"success": True, "code": 1, "message": "", "data": data}
+
+    def meter_list(self, account : str) -> dict:
+        """`member/getData` payload of an account.
+
+        Parameters
+        ----------
+        account : str
+            User phone number.
+
+        Returns
+        -------
+        dict
+            Payload.
+        """
+
+        account_index = self._account_indexes[account]
+        electric_list = []
+        for electric_number in self.electric_numbers(account):
+            meter = self._meter(electric_number)
+            electric_list.append({
+                "userID": 100000 + account_index,
+                "electricNumber": electric_number,
+                "electricName": f"Customer {account_index}",
+                "idNumber": "",
+                "idNumberSha": "",
+                "employerId": "",
+                "nickname": f"Meter {meter.index}",
+                "verifiedType": "1",
+                "billPrint": "true",
+                "engBill": "false",
+                "billPrintStatus": "0",
+                "applyStatus": "0",
+                "applyStatusText": "",
+                "applyNo": "",
+                "ami": "true",
+                "orderEdc": "false",
+                "status": "0",
+                "outageId": "A",
+                "notifyLimit": "",
+                "startDatetime": "",
+                "electricAddr": "Taipei City",
+                "billCycle": f"{meter.cycle_day:02d}",
+                "billDate": "",
+                "authorizeCount": "0",
+                "empElectric": "false",
+                "hasUpdate": "false",
+                "verifiedLevel": "2",
+            })
+        return self._wrap({"phoneNo": account, "electricList": electric_list})
+
+    def _days(self, first : datetime.date, last : datetime.date):
+        date = max(first, self.start)
+        last = min(last, self.end)
+        while date <= last:
+            yield date
+            date += datetime.timedelta(days=1)
+
+    def _intervals(self, meter : _SyntheticMeter, date : datetime.date, size : int):
+        # Sums of `size` consecutive quarters of a day split into buckets, with their missing flags.
+        kwhs = meter.quarters(date, self.missing_rate)
+        yday = date.timetuple().tm_yday
+        codes = get_calendar(date.year).table[(yday - 1) * QUARTERS_PER_DAY:yday * QUARTERS_PER_DAY]
+        for first in range(0, QUARTERS_PER_DAY, size):
+            buckets = dict.fromkeys(BUCKETS, 0.0)
+            missing = False
+            for quarter in range(first, first + size):
+                if kwhs[quarter] is None:
+                    missing = True
+                else:
+                    buckets[BUCKETS[codes[quarter]]] += kwhs[quarter]
+            yield first, buckets, missing
+
+    @staticmethod
+    def _ami_json(start : datetime.datetime, end : datetime.datetime, buckets : Dict[str, float], missing : bool) -> dict:
+        ami_json = {
+            "startTime": start.strftime(_TIME_FORMAT),
+            "endTime": end.strftime(_TIME_FORMAT),
+            "isMssingData": 1 if missing else 0,
+        }
+        for bucket, kwh in buckets.items():
+            ami_json[_BUCKET_KEYS[bucket]] = round(kwh, 2)
+        ami_json["totalKwh"] = round(sum(buckets.values()), 2)
+        ami_json["mult"] = 1
+        return ami_json
+
+    def _daily(self, meter : _SyntheticMeter, date : datetime.date) -> Tuple[Dict[str, float], bool]:
+        (_, buckets, missing), = self._intervals(meter, date, QUARTERS_PER_DAY)
+        return buckets, missing
+
+    def amis(self, electric_number : str, period : str, dt : datetime.datetime) -> List[dict]:
+        """AMI of the day, month or year containing a date, as returned in `api/ami/{period}` payloads.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+        period : str
+            `quater` and `hour` return a day, `daily` a month and `monthly` a year.
+        dt : datetime.date or datetime.datetime
+            Date.
+
+        Returns
+        -------
+        List[dict]
+            AMI JSON sorted by start time. Intervals outside of `start` and `end` are omitted.
+        """
+
+        meter = self._meter(electric_number)
+        amis = []
+        if period in ("quater", "hour"):
+            size = 1 if period == "quater" else 4
+            date = datetime.date(dt.year, dt.month, dt.day)
+            for date in self._days(date, date):
+                midnight = datetime.datetime.combine(date, datetime.time())
+                for first, buckets, missing in self._intervals(meter, date, size):
+                    start = midnight + datetime.timedelta(minutes=15 * first)
+                    end = start + datetime.timedelta(minutes=15 * size)
+                    if period == "quater":
+                        amis.append({
+                            "startTime": start.strftime(_TIME_FORMAT),
+                            "endTime": end.strftime(_TIME_FORMAT),
+                            "isMssingData": 1 if missing else 0,
+                            "kwh": round(sum(buckets.values()), 2),
+                        })
+                    else:
+                        amis.append(self._ami_json(start, end, buckets, missing))
+        elif period == "daily":
+            days = calendar.monthrange(dt.year, dt.month)[1]
+            for date in self._days(datetime.date(dt.year, dt.month, 1), datetime.date(dt.year, dt.month, days)):
+                buckets, missing = self._daily(meter, date)
+                start = datetime.datetime.combine(date, datetime.time())
+                amis.append(self._ami_json(start, start + datetime.timedelta(days=1), buckets, missing))
+        elif period == "monthly":
+            for month in range(1, 13):
+                days = calendar.monthrange(dt.year, month)[1]
+                totals = dict.fromkeys(BUCKETS, 0.0)
+                missing = None
+                for date in self._days(datetime.date(dt.year, month, 1), datetime.date(dt.year, month, days)):
+                    buckets, day_missing = self._daily(meter, date)
+                    for bucket, kwh in buckets.items():
+                        totals[bucket] += kwh
+                    missing = bool(missing) or day_missing
+                if missing is not None:
+                    start = datetime.datetime(dt.year, month, 1)
+                    end = datetime.datetime(dt.year + month // 12, month % 12 + 1, 1)
+                    amis.append(self._ami_json(start, end, totals, missing))
+        else:
+            raise ValueError("period accepts either `hour`, `daily`, `monthly`, or `quater`.")
+        return amis
+
+    def _cycles(self, meter : _SyntheticMeter) -> List[Tuple[datetime.date, datetime.date, int, int]]:
+        # (first date, last date, kwh, charge) of every complete billing cycle within the data.
+        cycles = []
+        dates = meter.reading_dates(self.start, self.end)
+        for start, end in zip(dates, dates[1:]):
+            last = end - datetime.timedelta(days=1)
+            if start < self.start:
+                continue
+            kwh = round(sum(meter.expected_kwh(date) for date in self._days(start, last)))
+            try:
+                charge = TaipowerTariff().residential_cost(kwh, start, last)
+            except ValueError:
+                charge = TaipowerTariff(effective=datetime.date(2018, 4, 1)).residential_cost(kwh, start, last)
+            cycles.append((start, last, kwh, round(charge)))
+        return cycles
+
+    def ami_bill(self, electric_number : str) -> dict:
+        """`api/home/bills` payload of the last complete billing cycle.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+
+        Returns
+        -------
+        dict
+            Payload.
+        """
+
+        cycles = self._cycles(self._meter(electric_number))
+        if len(cycles) == 0:
+            return self._wrap({"kwhData": False, "kwh": 0, "status": "", "hasPaid": ""})
+        start, end, kwh, charge = cycles[-1]
+        last_kwh = cycles[-2][2] if len(cycles) >= 2 else 0
+        last_year_kwh = cycles[-7][2] if len(cycles) >= 7 else 0
+        due = end + datetime.timedelta(days=30)
+        return self._wrap({
+            "kwhData": True,
+            "status": "zt",
+            "totalAmount": charge,
+            "kwh": kwh,
+            "comparisonOfLastYear": f"{round(100 * (kwh - last_year_kwh) / last_year_kwh):+d}%" if last_year_kwh else "",
+            "comparisonOfLastMonth": f"{round(100 * (kwh - last_kwh) / last_kwh):+d}%" if last_kwh else "",
+            "outageId": "A",
+            "chkCode": "000",
+            "payMethod": "",
+            "lastKwh": last_kwh,
+            "theLast2Kwh": last_year_kwh,
+            "startDate": _roc(start),
+            "startDateText": _roc(start),
+            "endDate": _roc(end),
+            "endDateText": _roc(end, "/"),
+            "payDueDate": _roc(due),
+            "payDueDateText": _roc(due, "/"),
+            "period": f"{_roc(start, '/')} ~ {_roc(end, '/')}",
+            "totalAmountText": f"{charge:,}",
+            "chargeDate": _roc(end + datetime.timedelta(days=14)),
+            "chargeDateText": _roc(end + datetime.timedelta(days=14))[:5],
+            "lastTotalAmount": cycles[-2][3] if len(cycles) >= 2 else 0,
+            "currentAmount": charge,
+            "currentAmountText": f"{charge:,}",
+            "rtncode": "0",
+            "rtnmsg": "",
+            "collName": "",
+            "collDate": "",
+            "collDateText": "",
+            "chargeInfo": "",
+            "recvDate": "",
+            "hasPaid": "B",
+        })
+
+    def ami_unbilled(self, electric_number : str) -> dict:
+        """`applyCase/amiUnbillData` payload from the last reading date to `end`.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+
+        Returns
+        -------
+        dict
+            Payload.
+        """
+
+        meter = self._meter(electric_number)
+        dates = meter.reading_dates(self.start, self.end)
+        last_reading = dates[-1] if len(dates) != 0 else self.start
+        reading = self.end + datetime.timedelta(days=1)
+        kwh = sum(meter.expected_kwh(date) for date in self._days(last_reading, self.end))
+        next_reading = last_reading + datetime.timedelta(days=61)
+        try:
+            charge = TaipowerTariff().residential_cost(kwh, last_reading, self.end)
+        except ValueError:
+            charge = TaipowerTariff(effective=datetime.date(2018, 4, 1)).residential_cost(kwh, last_reading, self.end)
+        return self._wrap({
+            "readingDate": _roc(reading),
+            "lastReadDate": _roc(last_reading),
+            "nextReadingDate": _roc(next_reading),
+            "totalAmount": str(round(charge)),
+            "payDeadline": _roc(next_reading + datetime.timedelta(days=30)),
+            "finalKwh": f"{kwh:.1f}",
+        })
+
+    def bill_records(self, electric_number : str) -> dict:
+        """`api/mybill/records` payload of every complete billing cycle.
+
+        Parameters
+        ----------
+        electric_number : str
+            Electric number.
+
+        Returns
+        -------
+        dict
+            Payload.
+        """
+
+        records = []
+        for start, end, kwh, charge in self._cycles(self._meter(electric_number)):
+            issue = end + datetime.timedelta(days=1)
+            records.append({
+                "issueYM": _roc(issue, "/")[:6],
+                "ctrClassType": "表燈非營業用",
+                "billFromAndToDate": f"{_roc(start, '/')}~{_roc(end, '/')}",
+                "totalKwh": kwh,
+                "collDate": _roc(issue + datetime.timedelta(days=30)),
+                "collName": "繳費/銷帳日期",
+                "totalCharge": f"{charge:,}",
+                "billFormula": "",
+                "floatFields": [f"應繳總金額:{charge}元"],
+                "outageId": "A",
+                "chkCode": "000",
+                "payMethod": "",
+                "hasPaid": "C",
+                "curReadMtrDate": _roc(issue),
+                "nextReadMtrDate": _roc(issue + datetime.timedelta(days=61)),
+                "recvDate": _roc(issue + datetime.timedelta(days=30)),
+            })
+        return self._wrap(records)
+
+    def _token_account(self, request : httpx.Request) -> Optional[str]:
+        authorization = request.headers.get("authorization", "")
+        prefix = "Bearer synthetic-"
+        if authorization.startswith(prefix):
+            return authorization[len(prefix):]
+        return None
+
+    def handler(self, request : httpx.Request) -> httpx.Response:
+        """Answer a Taipower API request, see `httpx.MockTransport`.
+
+        Parameters
+        ----------
+        request : httpx.Request
+            Request.
+
+        Returns
+        -------
+        httpx.Response
+            Response.
+        """
+
+        import httpx
+
+        path = request.url.path.lstrip("/")
+        if path == "oauth/token":
+            form = dict(parse_qsl(request.content.decode()))
+            if form.get("grant_type") == "refresh_token":
+                account = form.get("refresh_token", "")[len("synthetic-refresh-"):]
+            else:
+                account = form.get("username")
+            if account not in self._account_indexes:
+                return httpx.Response(400, json={"error": "invalid_grant", "error_description": "Bad credentials"})
+            return httpx.Response(200, json={
+                "access_token": f"synthetic-{account}",
+                "refresh_token": f"synthetic-refresh-{account}",
+                "token_type": "bearer",
+                "expires_in": 86400,
+                "scope": "tpec",
+            })
+
+        account = self._token_account(request)
+        if account not in self._account_indexes:
+            return httpx.Response(401, json={"error": "invalid_token", "error_description": "Invalid access token"})
+        if path == "member/getData":
+            return httpx.Response(200, json=self.meter_list(account))
+
+        payload = codec.loads(request.content) if request.content else {}
+        electric_number = payload.get("custNo", payload.get("customNo"))
+        if electric_number not in self.electric_numbers(account):
+            return httpx.Response(200, json={"success": False, "code": 0, "message": "Unknown electric number", "data": None})
+
+        if path.startswith("api/ami/"):
+            period = path[len("api/ami/"):]
+            if "date" in payload:
+                dt = datetime.datetime.strptime(payload["date"], "%Y%m%d")
+            elif "yearMonth" in payload:
+                dt = datetime.datetime.strptime(payload["yearMonth"], "%Y%m")
+            else:
+                dt = datetime.datetime(int(payload["year"]), 1, 1)
+            return httpx.Response(200, json=self._wrap({"data": self.amis(electric_number, period, dt)}))
+        elif path == "api/home/bills":
+            return httpx.Response(200, json=self.ami_bill(electric_number))
+        elif path == "applyCase/amiUnbillData":
+            response_json = self.ami_unbilled(electric_number)
+            response_json["data"]["ami"] = True
+            return httpx.Response(200, json=response_json)
+        elif path == "api/mybill/records":
+            return httpx.Response(200, json=self.bill_records(electric_number))
+        return httpx.Response(404, json={"error": "not_found", "error_description": f"No synthetic endpoint {path}"})
+
+    async def async_handler(self, request : httpx.Request) -> httpx.Response:
+        """Answer a Taipower API request after `latency` seconds, see `httpx.MockTransport`.
+
+        Parameters
+        ----------
+        request : httpx.Request
+            Request.
+
+        Returns
+        -------
+        httpx.Response
+            Response.
+        """
+
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return self.handler(request)
+
+    def transport(self) -> httpx.MockTransport:
+        """Mock Taipower API transport serving the fleet.
+
+        Returns
+        -------
+        httpx.MockTransport
+            Transport. With `latency`, only asynchronous clients are supported.
+        """
+
+        import httpx
+
+        return httpx.MockTransport(self.async_handler if self.latency > 0 else self.handler)
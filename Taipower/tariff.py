@@ -0,0 +1,446 @@
+import bisect
+import datetime
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .model import TaipowerAMI, time_to_epoch
+from .rollup import BUCKETS
+from .tou import TAIWAN_UTC_OFFSET
+
+SCHEDULES = ("residential", "tou2", "tou3")
+
+
+@dataclass(frozen=True)
+class TaipowerRateTable:
+    """Versioned Taipower rate table.
+
+    Parameters
+    ----------
+    schedule : str
+        `residential` (tiered, non-time-of-use), `tou2` (simple two-section) or `tou3` (simple three-section).
+    effective : datetime.date
+        The date from which the rates apply.
+    summer : Tuple[Tuple[int, int], Tuple[int, int]]
+        First and last (month, day) of the summer months, inclusive.
+    tiers : Tuple[Tuple[Optional[float], float, float], ...]
+        `residential` only. (monthly upper bound kwh or None for the last tier, summer rate, non-summer rate).
+    rates : Dict[str, Tuple[float, float]]
+        Time-of-use only. (summer rate, non-summer rate) keyed by bucket, see rollup.BUCKETS.
+    basic_charge : float
+        Time-of-use only. Basic charge per month.
+    excess_kwh : float
+        Time-of-use only. Monthly kwh above which `excess_rate` is added.
+    excess_rate : float
+        Time-of-use only. Additional rate of the kwh above `excess_kwh`.
+    """
+
+    schedule : str
+    effective : datetime.date
+    summer : Tuple[Tuple[int, int], Tuple[int, int]]
+    tiers : Tuple[Tuple[Optional[float], float, float], ...] = ()
+    rates : Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    basic_charge : float = 0.0
+    excess_kwh : float = 0.0
+    excess_rate : float = 0.0
+
+    def is_summer(self, date : datetime.date) -> bool:
+        """Whether or not summer rates apply on a date.
+
+        Parameters
+        ----------
+        date : datetime.date
+            Date.
+
+        Returns
+        -------
+        bool
+            Return True in summer months.
+        """
+
+        return self.summer[0] <= (date.month, date.day) <= self.summer[1]
+
+
+RATE_TABLES : Dict[str, List[TaipowerRateTable]] = {schedule: [] for schedule in SCHEDULES}
+
+
+def register_rate_table(rate_table : TaipowerRateTable) -> None:
+    """Register a rate table, replacing the one of the same schedule and effective date.
+
+    Parameters
+    ----------
+    rate_table : TaipowerRateTable
+        Rate table.
+    """
+
+    tables = [table for table in RATE_TABLES.get(rate_table.schedule, []) if table.effective != rate_table.effective]
+    index = bisect.bisect([table.effective for table in tables], rate_table.effective)
+    tables.insert(index, rate_table)
+    RATE_TABLES[rate_table.schedule] = tables
+
+
+def get_rate_table(schedule : str, date : datetime.date) -> TaipowerRateTable:
+    """Get the rate table in effect on a date.
+
+    Parameters
+    ----------
+    schedule : str
+        `residential`, `tou2` or `tou3`.
+    date : datetime.date
+        Date.
+
+    Returns
+    -------
+    TaipowerRateTable
+        The latest rate table effective on or before the date.
+
+    Raises
+    ------
+    ValueError
+        If no rate table is effective on the date.
+    """
+
+    if schedule not in RATE_TABLES:
+        raise ValueError(f"schedule accepts either {', '.join(f'`{s}`' for s in RATE_TABLES)}.")
+    tables = RATE_TABLES[schedule]
+    index = bisect.bisect([table.effective for table in tables], date)
+    if index == 0:
+        raise ValueError(f"No `{schedule}` rate table is effective on {date}.")
+    return tables[index - 1]
+
+
+for _rate_table in [
+    TaipowerRateTable(
+        schedule="residential",
+        effective=datetime.date(2018, 4, 1),
+        summer=((6, 1), (9, 30)),
+        tiers=((120, 1.63, 1.63), (330, 2.38, 2.10), (500, 3.52, 2.89), (700, 4.80, 3.94), (1000, 5.66, 4.60), (None, 6.41, 5.03)),
+    ),
+    TaipowerRateTable(
+        schedule="residential",
+        effective=datetime.date(2024, 4, 1),
+        summer=((6, 1), (9, 30)),
+        tiers=((120, 1.68, 1.68), (330, 2.45, 2.16), (500, 3.70, 3.03), (700, 5.04, 4.14), (1000, 6.24, 5.07), (None, 8.46, 6.63)),
+    ),
+    TaipowerRateTable(
+        schedule="tou2",
+        effective=datetime.date(2018, 4, 1),
+        summer=((6, 1), (9, 30)),
+        rates={"offpeak": (1.80, 1.73), "halfpeak": (4.44, 4.23), "satpeak": (1.80, 1.73), "peak": (4.44, 4.23)},
+        basic_charge=75.0,
+        excess_kwh=2000.0,
+        excess_rate=0.92,
+    ),
+    TaipowerRateTable(
+        schedule="tou2",
+        effective=datetime.date(2024, 4, 1),
+        summer=((5, 16), (10, 15)),
+        rates={"offpeak": (1.96, 1.89), "halfpeak": (5.16, 4.93), "satpeak": (1.96, 1.89), "peak": (5.16, 4.93)},
+        basic_charge=75.0,
+        excess_kwh=2000.0,
+        excess_rate=1.02,
+    ),
+    TaipowerRateTable(
+        schedule="tou3",
+        effective=datetime.date(2018, 4, 1),
+        summer=((6, 1), (9, 30)),
+        rates={"offpeak": (1.80, 1.73), "halfpeak": (4.07, 3.87), "satpeak": (4.07, 3.87), "peak": (6.20, 3.87)},
+        basic_charge=75.0,
+        excess_kwh=2000.0,
+        excess_rate=0.92,
+    ),
+    TaipowerRateTable(
+        schedule="tou3",
+        effective=datetime.date(2024, 4, 1),
+        summer=((5, 16), (10, 15)),
+        rates={"offpeak": (1.96, 1.89), "halfpeak": (4.69, 4.48), "satpeak": (4.69, 4.48), "peak": (7.13, 4.48)},
+        basic_charge=75.0,
+        excess_kwh=2000.0,
+        excess_rate=1.02,
+    ),
+]:
+    register_rate_table(_rate_table)
+
+
+def _date(time_text : str) -> datetime.date:
+    return datetime.date(int(time_text[0:4]), int(time_text[4:6]), int(time_text[6:8]))
+
+
+def _numpy():
+    # Series are reduced with NumPy when it is installed, and with a Python loop otherwise.
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _ami_arrays(np, amis : List[TaipowerAMI]) -> Dict[str, Any]:
+    # The columns of export.ami_to_numpy needed for costs, with NaN for None.
+    arrays = {"start_time": np.array([time_to_epoch(ami.start_time) for ami in amis], dtype=np.int64)}
+    for column in ("total_kwh",) + tuple(f"{bucket}_kwh" for bucket in BUCKETS):
+        arrays[column] = np.array([getattr(ami, column) for ami in amis], dtype=np.float64)
+    return arrays
+
+
+def _summer_mask(np, epochs, rate_table : TaipowerRateTable):
+    # Whether or not summer rates apply on the Taiwan local date of each epoch.
+    days = ((epochs + TAIWAN_UTC_OFFSET) // 86400).astype("datetime64[D]")
+    months = days.astype("datetime64[M]")
+    month_days = (months.astype(np.int64) % 12 + 1) * 100 + (days - months).astype(np.int64) + 1
+    (first_month, first_day), (last_month, last_day) = rate_table.summer
+    return (month_days >= first_month * 100 + first_day) & (month_days <= last_month * 100 + last_day)
+
+
+def _billing_months(start : datetime.date, end : datetime.date) -> int:
+    # Taipower bills monthly or bi-monthly; tier bounds are scaled by the number of months in the period.
+    return max(1, round(((end - start).days + 1) / 30.4))
+
+
+def cross_check(estimate : float, reference : float, rel_tol : float = 0.02) -> Tuple[bool, float]:
+    """Compare a local estimate with a reference amount, e.g. from a bill or `TaipowerAPI.get_ami_power_rate`.
+
+    Parameters
+    ----------
+    estimate : float
+        Locally estimated amount.
+    reference : float
+        Reference amount.
+    rel_tol : float, optional
+        Relative tolerance, by default 0.02.
+
+    Returns
+    -------
+    Tuple[bool, float]
+        (whether or not the estimate is within tolerance, estimate minus reference).
+    """
+
+    return math.isclose(estimate, reference, rel_tol=rel_tol), estimate - reference
+
+
+class TaipowerTariff:
+    """Local power cost calculator.
+
+    Costs are computed in batch: the kwh of a series are first reduced into per season and bucket sums
+    in one pass, which are then multiplied by the rates, so the per-interval work does not depend on the schedule.
+
+    Parameters
+    ----------
+    schedule : str, optional
+        `residential`, `tou2` or `tou3`, by default `residential`.
+    effective : datetime.date, optional
+        If given, this rate table version is used for every period.
+        Otherwise, the version in effect at the start of each period is used, by default None.
+    """
+
+    def __init__(self, schedule : str = "residential", effective : Optional[datetime.date] = None) -> None:
+        if schedule not in SCHEDULES:
+            raise ValueError(f"schedule accepts either {', '.join(f'`{s}`' for s in SCHEDULES)}.")
+        self.schedule : str = schedule
+        self.effective : Optional[datetime.date] = effective
+
+    def rate_table(self, date : datetime.date) -> TaipowerRateTable:
+        """Get the rate table used for a period starting on a date.
+
+        Parameters
+        ----------
+        date : datetime.date
+            The start date of the period.
+
+        Returns
+        -------
+        TaipowerRateTable
+            Rate table.
+        """
+
+        return get_rate_table(self.schedule, self.effective or date)
+
+    def residential_cost(self, kwh : float, start : datetime.date, end : datetime.date) -> float:
+        """Cost of the kwh consumed in a billing period with the tiered residential schedule.
+
+        Like Taipower bills, the kwh are split into summer and non-summer parts by the number of days.
+
+        Parameters
+        ----------
+        kwh : float
+            The kwh consumed in the billing period.
+        start : datetime.date
+            First date of the billing period, inclusive.
+        end : datetime.date
+            Last date of the billing period, inclusive.
+
+        Returns
+        -------
+        float
+            Cost.
+        """
+
+        rate_table = get_rate_table("residential", self.effective or start)
+        days = (end - start).days + 1
+        summer_days = sum(
+            rate_table.is_summer(start + datetime.timedelta(days=offset)) for offset in range(days)
+        )
+        months = _billing_months(start, end)
+
+        cost = 0.0
+        lower = 0.0
+        for upper, summer_rate, non_summer_rate in rate_table.tiers:
+            upper = math.inf if upper is None else upper * months
+            tier_kwh = max(0.0, min(kwh, upper) - lower)
+            cost += tier_kwh * (summer_rate * summer_days + non_summer_rate * (days - summer_days)) / days
+            lower = upper
+        return cost
+
+    def bucket_kwh(self, amis : Iterable[TaipowerAMI], rate_table : Optional[TaipowerRateTable] = None) -> Dict[Tuple[bool, str], float]:
+        """Reduce a series into per season and bucket kwh.
+
+        Parameters
+        ----------
+        amis : Iterable[TaipowerAMI]
+            AMI with bucket kwh, i.e. `hour`, `daily` or `monthly` AMI, or the output of rollup.TaipowerAMIRollup.get.
+        rate_table : TaipowerRateTable, optional
+            Rate table defining the summer months. If None is given, the one in effect at the first AMI is used, by default None.
+
+        Returns
+        -------
+        Dict[Tuple[bool, str], float]
+            Kwh keyed by (is summer, bucket).
+        """
+
+        amis = list(amis)
+        np = _numpy()
+        if np is not None and amis:
+            if rate_table is None:
+                rate_table = self.rate_table(_date(amis[0].start_time))
+            return self._bucket_sums(np, [_ami_arrays(np, amis)], rate_table)[0]
+
+        sums = {(summer, bucket): 0.0 for summer in (True, False) for bucket in BUCKETS}
+        for ami in amis:
+            date = _date(ami.start_time)
+            if rate_table is None:
+                rate_table = self.rate_table(date)
+            summer = rate_table.is_summer(date)
+            sums[(summer, "offpeak")] += ami.offpeak_kwh or 0.0
+            sums[(summer, "halfpeak")] += ami.halfpeak_kwh or 0.0
+            sums[(summer, "satpeak")] += ami.satpeak_kwh or 0.0
+            sums[(summer, "peak")] += ami.peak_kwh or 0.0
+        return sums
+
+    @staticmethod
+    def _bucket_sums(np, arrays : List[Dict[str, Any]], rate_table : TaipowerRateTable) -> List[Dict[Tuple[bool, str], float]]:
+        # Per season and bucket kwh of many series at once: every row is binned by (series, is not summer).
+        count = len(arrays)
+        series = np.repeat(np.arange(count), [len(columns["start_time"]) for columns in arrays])
+        epochs = np.concatenate([columns["start_time"] for columns in arrays])
+        bins = series * 2 + ~_summer_mask(np, epochs, rate_table)
+        sums = [{(summer, bucket): 0.0 for summer in (True, False) for bucket in BUCKETS} for _ in range(count)]
+        for bucket in BUCKETS:
+            kwh = np.nan_to_num(np.concatenate([columns[f"{bucket}_kwh"] for columns in arrays]))
+            totals = np.bincount(bins, weights=kwh, minlength=2 * count).reshape(count, 2)
+            for series_sums, (summer_kwh, non_summer_kwh) in zip(sums, totals.tolist()):
+                series_sums[(True, bucket)] = summer_kwh
+                series_sums[(False, bucket)] = non_summer_kwh
+        return sums
+
+    def _tou_cost(self, sums : Dict[Tuple[bool, str], float], rate_table : TaipowerRateTable, start : datetime.date, end : datetime.date) -> float:
+        months = _billing_months(start, end)
+        cost = rate_table.basic_charge * months
+        for (summer, bucket), kwh in sums.items():
+            cost += kwh * rate_table.rates[bucket][0 if summer else 1]
+        cost += max(0.0, sum(sums.values()) - rate_table.excess_kwh * months) * rate_table.excess_rate
+        return cost
+
+    def cost(self, amis : Iterable[TaipowerAMI], start : datetime.date, end : datetime.date) -> float:
+        """Cost of a series over a billing period.
+
+        Parameters
+        ----------
+        amis : Iterable[TaipowerAMI]
+            AMI within the billing period. Time-of-use schedules require bucket kwh,
+            i.e. `hour`, `daily` or `monthly` AMI, or the output of rollup.TaipowerAMIRollup.get.
+        start : datetime.date
+            First date of the billing period, inclusive.
+        end : datetime.date
+            Last date of the billing period, inclusive.
+
+        Returns
+        -------
+        float
+            Cost.
+        """
+
+        if self.schedule == "residential":
+            return self.residential_cost(sum(ami.total_kwh or 0.0 for ami in amis), start, end)
+
+        rate_table = self.rate_table(start)
+        return self._tou_cost(self.bucket_kwh(amis, rate_table), rate_table, start, end)
+
+    def costs(
+        self,
+        series : Mapping[str, Iterable[TaipowerAMI]],
+        start : datetime.date,
+        end : datetime.date,
+    ) -> Dict[str, float]:
+        """Cost of many series over the same billing period, e.g. the AMI of every meter of a fleet.
+
+        With NumPy, the kwh of all series are reduced together in a few array passes.
+
+        Parameters
+        ----------
+        series : Mapping[str, Iterable[TaipowerAMI]]
+            AMI keyed by electric number.
+        start : datetime.date
+            First date of the billing period, inclusive.
+        end : datetime.date
+            Last date of the billing period, inclusive.
+
+        Returns
+        -------
+        Dict[str, float]
+            Cost keyed by electric number.
+        """
+
+        np = _numpy()
+        if np is None or not series:
+            return {number: self.cost(amis, start, end) for number, amis in series.items()}
+
+        arrays = [_ami_arrays(np, list(amis)) for amis in series.values()]
+        if self.schedule == "residential":
+            return {
+                number: self.residential_cost(float(np.nansum(columns["total_kwh"])), start, end)
+                for number, columns in zip(series, arrays)
+            }
+        rate_table = self.rate_table(start)
+        return {
+            number: self._tou_cost(sums, rate_table, start, end)
+            for number, sums in zip(series, self._bucket_sums(np, arrays, rate_table))
+        }
+
+
+def compare_schedules(
+    amis : Iterable[TaipowerAMI],
+    start : datetime.date,
+    end : datetime.date,
+    schedules : Iterable[str] = SCHEDULES,
+) -> Dict[str, float]:
+    """What-if cost of a series under several schedules.
+
+    Parameters
+    ----------
+    amis : Iterable[TaipowerAMI]
+        AMI with bucket kwh within the billing period.
+    start : datetime.date
+        First date of the billing period, inclusive.
+    end : datetime.date
+        Last date of the billing period, inclusive.
+    schedules : Iterable[str], optional
+        Schedules to compare, by default all of them.
+
+    Returns
+    -------
+    Dict[str, float]
+        Cost keyed by schedule.
+    """
+
+    amis = list(amis)
+    return {schedule: TaipowerTariff(schedule).cost(amis, start, end) for schedule in schedules}
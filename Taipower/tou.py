@@ -0,0 +1,289 @@
+import datetime
+import warnings
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+BUCKETS = ("offpeak", "halfpeak", "satpeak", "peak")
+QUARTERS_PER_DAY = 96
+TAIWAN_UTC_OFFSET = 8 * 3600
+
+OFFPEAK, HALFPEAK, SATPEAK, PEAK = range(len(BUCKETS))
+
+# Fixed-date holidays, which are off-peak days of the time-of-use schedules.
+FIXED_HOLIDAYS = ((1, 1), (2, 28), (4, 4), (5, 1), (10, 10))
+
+# The first day of the lunar year, Dragon Boat Festival, Mid-Autumn Festival and Tomb Sweeping Day by year.
+LUNAR_HOLIDAYS = {
+    2020: ((1, 25), (6, 25), (10, 1), (4, 4)),
+    2021: ((2, 12), (6, 14), (9, 21), (4, 4)),
+    2022: ((2, 1), (6, 3), (9, 10), (4, 5)),
+    2023: ((1, 22), (6, 22), (9, 29), (4, 5)),
+    2024: ((2, 10), (6, 10), (9, 17), (4, 4)),
+    2025: ((1, 29), (5, 31), (10, 6), (4, 4)),
+    2026: ((2, 17), (6, 19), (9, 25), (4, 5)),
+    2027: ((2, 6), (6, 9), (9, 15), (4, 5)),
+}
+
+
+def holidays(year : int) -> Set[datetime.date]:
+    """Get the off-peak holidays of a year.
+
+    The Lunar New Year holidays span from the eve to the third day.
+    Lunar holidays are only known for the years in `LUNAR_HOLIDAYS`; other years get the fixed-date holidays only,
+    with a warning. Missing holidays can be given to `TaipowerTOUCalendar` as `extra_holidays`.
+
+    Parameters
+    ----------
+    year : int
+        Year.
+
+    Returns
+    -------
+    Set[datetime.date]
+        Holidays.
+    """
+
+    dates = {datetime.date(year, month, day) for month, day in FIXED_HOLIDAYS}
+    if year not in LUNAR_HOLIDAYS:
+        warnings.warn(f"Lunar holidays of {year} are unknown, only fixed-date holidays are off-peak days.", stacklevel=2)
+    else:
+        new_year, dragon_boat, mid_autumn, tomb_sweeping = LUNAR_HOLIDAYS[year]
+        new_year = datetime.date(year, *new_year)
+        dates.update(new_year + datetime.timedelta(days=offset) for offset in range(-1, 3))
+        dates.update(datetime.date(year, *day) for day in (dragon_boat, mid_autumn, tomb_sweeping))
+    # The eve of the next lunar year may fall in this year.
+    if year + 1 in LUNAR_HOLIDAYS:
+        eve = datetime.date(year + 1, *LUNAR_HOLIDAYS[year + 1][0]) - datetime.timedelta(days=1)
+        if eve.year == year:
+            dates.add(eve)
+    return dates
+
+
+def _template(hours : Dict[int, int]) -> bytes:
+    # Expand a bucket per hour into a bucket per quarter.
+    return bytes(bucket for hour in range(24) for bucket in [hours[hour]] * 4)
+
+
+def _hours(default : int, **ranges) -> Dict[int, int]:
+    hours = {hour: default for hour in range(24)}
+    for bucket, spans in ranges.items():
+        for start, end in spans:
+            for hour in range(start, end):
+                hours[hour] = BUCKETS.index(bucket)
+    return hours
+
+
+# Residential three-section schedule: quarter buckets by (summer, day type).
+_TEMPLATES = {
+    (True, "weekday"): _template(_hours(OFFPEAK, halfpeak=[(9, 16), (22, 24)], peak=[(16, 22)])),
+    (True, "saturday"): _template(_hours(OFFPEAK, satpeak=[(9, 24)])),
+    (False, "weekday"): _template(_hours(OFFPEAK, halfpeak=[(6, 11), (14, 24)])),
+    (False, "saturday"): _template(_hours(OFFPEAK, satpeak=[(6, 11), (14, 24)])),
+    (True, "offpeak"): bytes(QUARTERS_PER_DAY),
+    (False, "offpeak"): bytes(QUARTERS_PER_DAY),
+}
+
+
+class TaipowerTOUCalendar:
+    """Precomputed time-of-use buckets of every quarter of a year.
+
+    The bucket of a quarter is a single lookup into a flat table indexed by
+    `(day of year - 1) * 96 + quarter of day`.
+
+    Parameters
+    ----------
+    year : int
+        Year.
+    summer : tuple, optional
+        First and last (month, day) of the summer months, inclusive. If None is given, the summer months
+        of the `schedule` rate table in effect on each day are used, see tariff.get_rate_table, by default None.
+    extra_holidays : Iterable[datetime.date], optional
+        Off-peak days in addition to `holidays(year)`, e.g. typhoon days, by default None.
+    schedule : str, optional
+        Time-of-use schedule whose rate tables define the summer months, by default `tou3`.
+    """
+
+    def __init__(
+        self,
+        year : int,
+        summer : Optional[tuple] = None,
+        extra_holidays : Optional[Iterable[datetime.date]] = None,
+        schedule : str = "tou3",
+    ) -> None:
+        self.year : int = year
+        self.summer : Optional[tuple] = summer
+        self.schedule : str = schedule
+        self.holidays : Set[datetime.date] = holidays(year) | set(extra_holidays or ())
+
+        first = datetime.date(year, 1, 1)
+        days = (datetime.date(year + 1, 1, 1) - first).days
+        self._epoch_base : int = int(datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc).timestamp()) - TAIWAN_UTC_OFFSET
+        self._table : bytes = b"".join(self._day_template(first + datetime.timedelta(days=offset)) for offset in range(days))
+        self._epoch_end : int = self._epoch_base + days * QUARTERS_PER_DAY * 900
+
+    def _summer(self, date : datetime.date) -> tuple:
+        if self.summer is not None:
+            return self.summer
+        # Imported here as the tariff module builds on the rollups of this one.
+        from .tariff import RATE_TABLES, get_rate_table
+
+        try:
+            return get_rate_table(self.schedule, date).summer
+        except ValueError:
+            # Days before the first rate table follow it.
+            return RATE_TABLES[self.schedule][0].summer
+
+    def _day_template(self, date : datetime.date) -> bytes:
+        first, last = self._summer(date)
+        summer = first <= (date.month, date.day) <= last
+        if date.weekday() == 6 or date in self.holidays:
+            day_type = "offpeak"
+        elif date.weekday() == 5:
+            day_type = "saturday"
+        else:
+            day_type = "weekday"
+        return _TEMPLATES[(summer, day_type)]
+
+    @property
+    def table(self) -> bytes:
+        """Bucket codes of every quarter of the year, indexes into BUCKETS.
+
+        Returns
+        -------
+        bytes
+            Table of `days * 96` codes.
+        """
+
+        return self._table
+
+    def index(self, dt : datetime.datetime) -> int:
+        """Table index of the quarter containing `dt`.
+
+        Parameters
+        ----------
+        dt : datetime.datetime
+            Naive datetime in Taiwan local time within the year.
+
+        Returns
+        -------
+        int
+            Table index.
+        """
+
+        return (dt.timetuple().tm_yday - 1) * QUARTERS_PER_DAY + dt.hour * 4 + dt.minute // 15
+
+    def bucket(self, dt : datetime.datetime) -> str:
+        """Classify a quarter.
+
+        Parameters
+        ----------
+        dt : datetime.datetime
+            Naive datetime in Taiwan local time within the year.
+
+        Returns
+        -------
+        str
+            `offpeak`, `halfpeak`, `satpeak` or `peak`.
+        """
+
+        return BUCKETS[self._table[self.index(dt)]]
+
+    def classify_epochs(self, epochs : Sequence[int]):
+        """Classify a series of quarters in one pass.
+
+        Parameters
+        ----------
+        epochs : Sequence[int]
+            Unix timestamps of the quarter starts within the year. A NumPy array is classified without a Python loop.
+
+        Returns
+        -------
+        numpy.ndarray or bytes
+            Bucket codes, indexes into BUCKETS. A `uint8` array if `epochs` is a NumPy array, otherwise bytes.
+
+        Raises
+        ------
+        ValueError
+            If an epoch is outside the year.
+        """
+
+        if type(epochs).__module__ == "numpy":
+            import numpy as np
+
+            epochs = np.asarray(epochs, dtype=np.int64)
+            if len(epochs) != 0 and (epochs.min() < self._epoch_base or epochs.max() >= self._epoch_end):
+                raise ValueError(f"epochs must be within {self.year}.")
+            table = np.frombuffer(self._table, dtype=np.uint8)
+            return table[(epochs - self._epoch_base) // 900]
+
+        table = self._table
+        base = self._epoch_base
+        end = self._epoch_end
+        codes = bytearray()
+        for epoch in epochs:
+            if not base <= epoch < end:
+                raise ValueError(f"epochs must be within {self.year}.")
+            codes.append(table[(epoch - base) // 900])
+        return bytes(codes)
+
+
+_calendars : Dict[int, TaipowerTOUCalendar] = {}
+
+
+def get_calendar(year : int) -> TaipowerTOUCalendar:
+    """Get the cached calendar of a year.
+
+    Parameters
+    ----------
+    year : int
+        Year.
+
+    Returns
+    -------
+    TaipowerTOUCalendar
+        Calendar.
+    """
+
+    calendar = _calendars.get(year)
+    if calendar is None:
+        calendar = _calendars[year] = TaipowerTOUCalendar(year)
+    return calendar
+
+
+def classify(dt : datetime.datetime) -> str:
+    """Classify the quarter containing `dt` with the cached calendar of its year.
+
+    Parameters
+    ----------
+    dt : datetime.datetime
+        Naive datetime in Taiwan local time.
+
+    Returns
+    -------
+    str
+        `offpeak`, `halfpeak`, `satpeak` or `peak`.
+    """
+
+    return get_calendar(dt.year).bucket(dt)
+
+
+def classify_start_times(start_times : Iterable[str]) -> List[str]:
+    """Classify AMI quarters by their start times, e.g. the keys of `TaipowerAPI.get_ami` with the `quater` period.
+
+    Parameters
+    ----------
+    start_times : Iterable[str]
+        Start times in yyyymmddhhmmss format.
+
+    Returns
+    -------
+    List[str]
+        Buckets in the same order.
+    """
+
+    buckets = []
+    for start_time in start_times:
+        year = int(start_time[0:4])
+        date = datetime.date(year, int(start_time[4:6]), int(start_time[6:8]))
+        index = (date.timetuple().tm_yday - 1) * QUARTERS_PER_DAY + int(start_time[8:10]) * 4 + int(start_time[10:12]) // 15
+        buckets.append(BUCKETS[get_calendar(year).table[index]])
+    return buckets
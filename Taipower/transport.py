@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import threading
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Hashable, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+# The body is decoded by the transport, so encoding headers no longer apply.
+_ENCODING_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+_accept_encoding : Optional[str] = None
+
+
+def accept_encoding() -> str:
+    """`Accept-Encoding` of the requests, advertising the encodings httpx can decode here.
+
+    Returns
+    -------
+    str
+        `gzip, br` if brotli or brotlicffi is installed, `gzip` otherwise.
+    """
+
+    global _accept_encoding
+
+    if _accept_encoding is None:
+        encodings = ["gzip"]
+        for module in ("brotli", "brotlicffi"):
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+            encodings.append("br")
+            break
+        _accept_encoding = ", ".join(encodings)
+    return _accept_encoding
+
+
+def http2_available() -> bool:
+    """Whether or not HTTP/2 can be negotiated, which requires h2.
+
+    Returns
+    -------
+    bool
+        Available.
+    """
+
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _LoopTransports:
+    """Transports created on demand in every event loop, e.g. connection pools, which are bound to their loop.
+
+    The transports of a loop are closed when a client sharing them closes, or when the last request
+    in flight finishes if one does, so none of them outlives its loop. Transports of loops closed without
+    that, e.g. by clients never closed, are dropped when the transports of another loop are created.
+
+    Parameters
+    ----------
+    factory : Callable[[Hashable], Any]
+        Factory of the transport of a key.
+    """
+
+    def __init__(self, factory : Callable[[Hashable], Any]) -> None:
+        self._factory = factory
+        self._lock : threading.Lock = threading.Lock()
+        self._loops : Dict[asyncio.AbstractEventLoop, dict] = {}
+
+    @contextlib.asynccontextmanager
+    async def use(self, key : Hashable = None) -> AsyncIterator[Any]:
+        """Use the transport of `key` in the running event loop, which is not closed until the context exits."""
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is None:
+                for closed in [other for other in self._loops if other.is_closed()]:
+                    del self._loops[closed]
+                state = self._loops[loop] = {"transports": {}, "in_flight": 0, "closing": False}
+            transport = state["transports"].get(key)
+            if transport is None:
+                transport = state["transports"][key] = self._factory(key)
+            state["in_flight"] += 1
+        try:
+            yield transport
+        finally:
+            with self._lock:
+                state["in_flight"] -= 1
+                idle = state["closing"] and state["in_flight"] == 0 and self._loops.get(loop) is state
+                if idle:
+                    del self._loops[loop]
+            if idle:
+                await self._close(state)
+
+    async def aclose(self) -> None:
+        """Close the transports of the running event loop once none of their requests is in flight."""
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is None:
+                return
+            if state["in_flight"] != 0:
+                state["closing"] = True
+                return
+            del self._loops[loop]
+        await self._close(state)
+
+    @staticmethod
+    async def _close(state : dict) -> None:
+        for transport in state["transports"].values():
+            await transport.aclose()
+
+    def clear(self) -> None:
+        """Drop the transports of every event loop. They can only be closed in their loops."""
+
+        with self._lock:
+            self._loops.clear()
+
+
+class TaipowerTransport:
+    """httpx transport negotiating HTTP/2 and response compression, and counting the bytes compression saved.
+
+    With `http2` set, concurrent requests of an event loop, e.g. all the requests of a `refresh_status`,
+    are multiplexed over a single connection instead of one connection each. Every request asks for
+    `accept_encoding()`, and responses are decoded by the transport so their size on the wire is known.
+
+    The transport may be shared by many clients, e.g. by all the accounts of a `bulk.TaipowerBulkExporter`.
+    The default network transports of an event loop are closed with the clients of the loop, once none of
+    their requests is in flight, and the synchronous one by `finish`. A given `transport` is never closed.
+
+    Parameters
+    ----------
+    transport : httpx.AsyncBaseTransport, optional
+        Transport performing the requests, e.g. a `proxy.TaipowerProxyPool`. If None is given,
+        the default network transports are used, by default None.
+    http2 : bool, optional
+        Whether or not to negotiate HTTP/2 on the default network transports, ignored if `transport` is given.
+        Requires h2, by default False.
+    compression : bool, optional
+        Whether or not to ask for compressed responses, by default True.
+    max_connections : int, optional
+        Maximum connections of the default network transports, by default 10.
+
+    Raises
+    ------
+    ImportError
+        If HTTP/2 is to be negotiated and h2 is not installed.
+    """
+
+    def __init__(
+        self,
+        transport = None,
+        http2 : bool = False,
+        compression : bool = True,
+        max_connections : int = 10,
+    ) -> None:
+        if http2 and transport is None and not http2_available():
+            raise ImportError("HTTP/2 requires h2, install it with `pip install libtaipower[http2]`.")
+        self.transport = transport
+        self.http2 : bool = http2
+        self.compression : bool = compression
+        self.max_connections : int = max_connections
+
+        self.requests : int = 0
+        self.bytes_received : int = 0
+        self.bytes_decoded : int = 0
+        self.http_versions : Dict[str, int] = {}
+        self.encodings : Dict[str, int] = {}
+
+        self._lock : threading.Lock = threading.Lock()
+        # Connection pools are bound to an event loop, and the synchronous API runs one loop per call.
+        self._async_transports : _LoopTransports = _LoopTransports(self._create_async_transport)
+        self._default_sync_transport = None
+
+    def _create_async_transport(self, key : Hashable = None):
+        import httpx
+
+        return httpx.AsyncHTTPTransport(http2=self.http2, limits=httpx.Limits(max_connections=self.max_connections))
+
+    def _sync_transport(self):
+        if self.transport is not None:
+            return self.transport
+        import httpx
+
+        with self._lock:
+            if self._default_sync_transport is None:
+                self._default_sync_transport = httpx.HTTPTransport(
+                    http2=self.http2, limits=httpx.Limits(max_connections=self.max_connections)
+                )
+        return self._default_sync_transport
+
+    def _prepare(self, request : httpx.Request) -> None:
+        request.headers["Accept-Encoding"] = accept_encoding() if self.compression else "identity"
+
+    def _decoded(self, request : httpx.Request, response : httpx.Response) -> httpx.Response:
+        import httpx
+
+        received = response.num_bytes_downloaded
+        if received == 0 and isinstance(response.stream, httpx.ByteStream):
+            # Responses built in memory, e.g. by mock transports, are decoded without being counted.
+            received = sum(len(chunk) for chunk in response.stream)
+        encoding = response.headers.get("content-encoding", "identity").lower()
+        version = response.extensions.get("http_version", b"HTTP/1.1")
+        version = version.decode() if isinstance(version, bytes) else str(version)
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += received
+            self.bytes_decoded += len(response.content)
+            self.http_versions[version] = self.http_versions.get(version, 0) + 1
+            self.encodings[encoding] = self.encodings.get(encoding, 0) + 1
+
+        headers = [(name, value) for name, value in response.headers.items() if name.lower() not in _ENCODING_HEADERS]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=response.content,
+            request=request,
+            extensions={"http_version": version.encode()},
+        )
+
+    async def _async_read(self, transport, request : httpx.Request) -> httpx.Response:
+        response = await transport.handle_async_request(request)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        return response
+
+    async def handle_async_request(self, request : httpx.Request) -> httpx.Response:
+        self._prepare(request)
+        if self.transport is not None:
+            response = await self._async_read(self.transport, request)
+        else:
+            async with self._async_transports.use() as transport:
+                response = await self._async_read(transport, request)
+        return self._decoded(request, response)
+
+    def handle_request(self, request : httpx.Request) -> httpx.Response:
+        self._prepare(request)
+        response = self._sync_transport().handle_request(request)
+        try:
+            response.read()
+        finally:
+            response.close()
+        return self._decoded(request, response)
+
+    @property
+    def bytes_saved(self) -> int:
+        """Bytes compression saved on the wire.
+
+        Returns
+        -------
+        int
+            Decoded bytes minus received bytes.
+        """
+
+        return self.bytes_decoded - self.bytes_received
+
+    def stats(self) -> dict:
+        """Statistics of the responses.
+
+        Returns
+        -------
+        dict
+            `requests`, `bytes_received`, `bytes_decoded` and `bytes_saved`, and the responses by
+            `http_versions` and by content `encodings`.
+        """
+
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "bytes_received": self.bytes_received,
+                "bytes_decoded": self.bytes_decoded,
+                "bytes_saved": self.bytes_decoded - self.bytes_received,
+                "http_versions": dict(self.http_versions),
+                "encodings": dict(self.encodings),
+            }
+
+    def finish(self) -> None:
+        """Close the default synchronous transport, and drop the asynchronous ones of event loops whose clients were not closed."""
+
+        with self._lock:
+            if self._default_sync_transport is not None:
+                self._default_sync_transport.close()
+                self._default_sync_transport = None
+        self._async_transports.clear()
+
+    # Clients enter and close their transport. The synchronous transport is shared by every thread
+    # and outlives the clients, while the asynchronous ones are bound to the event loop of the client.
+    def __enter__(self) -> "TaipowerTransport":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    async def __aenter__(self) -> "TaipowerTransport":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        if self.transport is None:
+            await self._async_transports.aclose()
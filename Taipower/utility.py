@@ -1,6 +1,4 @@
-from Cryptodome.Cipher import DES3
-from Cryptodome.Util import Padding
-from Cryptodome.Random.random import choice
+import datetime
 
 
 def get_random_key(bytes: int) -> str:
@@ -17,6 +15,8 @@ def get_random_key(bytes: int) -> str:
         Random key.
     """
 
+    from Cryptodome.Random.random import choice
+
     chars = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-_abcdefghijklmnopqrstuvwxyz"
     return ''.join([choice(chars) for _ in range(bytes)])
 
@@ -34,6 +34,9 @@ def des_encrypt(plain_text: str):
         Encrypted text.
     """
 
+    from Cryptodome.Cipher import DES3
+    from Cryptodome.Util import Padding
+
     key = get_random_key(24)
     cipher = DES3.new(key.encode("ascii"), DES3.MODE_ECB)
     encrypted = cipher.encrypt(Padding.pad(plain_text.encode("utf8"), 8))
@@ -53,6 +56,9 @@ def des_decrypt(encrypted : str):
         Decrypted plain text.
     """
 
+    from Cryptodome.Cipher import DES3
+    from Cryptodome.Util import Padding
+
     encrypted_text, key = encrypted.split("@")
     cipher = DES3.new(key.encode("ascii"), DES3.MODE_ECB)
     decrypted = cipher.decrypt(bytes.fromhex(encrypted_text))
@@ -74,4 +80,24 @@ def roc_year_to_wastern(date_text : str) -> str:
 
     assert len(date_text) >= 7, "The `date_text` should be in `yyy...` format."
 
-    return f"{ str( 1911 + int(date_text[0:3])) }{date_text[3:]}"
\ No newline at end of file
+    return f"{ str( 1911 + int(date_text[0:3])) }{date_text[3:]}"
+
+
+def roc_date_to_date(date_text : str) -> datetime.date:
+    """Convert a ROC date to a date.
+
+    Parameters
+    ----------
+    date_text : str
+        `yyy/mm/dd` or `yyymmdd`.
+
+    Returns
+    -------
+    datetime.date
+        Date.
+    """
+
+    date_text = date_text.strip().replace("/", "")
+    assert len(date_text) == 7, "The `date_text` should be in `yyy/mm/dd` or `yyymmdd` format."
+
+    return datetime.date(1911 + int(date_text[0:3]), int(date_text[3:5]), int(date_text[5:7]))
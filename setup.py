@@ -1,4 +1,4 @@
-import distutils.core as dist
+import setuptools
 
 from Taipower import __author__, __version__
 
@@ -13,7 +13,7 @@ with open('requirements_test.txt') as f:
 
 
 if __name__ == "__main__":
-    dist.setup(
+    setuptools.setup(
         name="libtaipower",
         version=__version__,
         author=__author__,
@@ -39,4 +39,16 @@ if __name__ == "__main__":
         python_requires=">=3.7",
         install_requires=install_requires,
         tests_require=tests_require,
+        extras_require={
+            "fast": ["orjson"],
+            "msgspec": ["msgspec"],
+            "numpy": ["numpy"],
+            "pandas": ["pandas"],
+            "arrow": ["pyarrow"],
+            "http2": ["h2"],
+            "brotli": ["brotli"],
+        },
+        entry_points={
+            "console_scripts": ["taipower=Taipower.cli:main"],
+        },
     )
@@ -1,7 +1,24 @@
+import datetime
 import os
 
+from Taipower.model import TaipowerAMI
+
 TEST_ACCOUNT = os.environ["TEST_ACCOUNT"] if "TEST_ACCOUNT" in os.environ else None
 TEST_PASSWORD = os.environ["TEST_PASSWORD"] if "TEST_PASSWORD" in os.environ else None
 TEST_ELECTRIC_NUMBER = os.environ["TEST_ELECTRIC_NUMBER"] if "TEST_ELECTRIC_NUMBER" in os.environ else None
 
-MOCK_ELECTRIC_NUMBER = "00123456700"
\ No newline at end of file
+MOCK_ELECTRIC_NUMBER = "00123456700"
+
+
+def make_quarters(date, kwh=0.25, missing=()):
+    start = datetime.datetime.combine(date, datetime.time())
+    amis = []
+    for index in range(96):
+        dt = start + datetime.timedelta(minutes=15 * index)
+        amis.append(TaipowerAMI({
+            "startTime": dt.strftime("%Y%m%d%H%M%S"),
+            "endTime": (dt + datetime.timedelta(minutes=15)).strftime("%Y%m%d%H%M%S"),
+            "isMssingData": 1 if index in missing else 0,
+            "kwh": 0.0 if index in missing else kwh,
+        }))
+    return amis
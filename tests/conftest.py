@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+from Taipower.api import TaipowerElectricMeter
+from Taipower.model import TaipowerAMI, TaipowerAMIBill, TaipowerAMIUnbilled, TaipowerBillRecord
+
+from . import MOCK_ELECTRIC_NUMBER
+
+
+@pytest.fixture()
+def fixture_mock_meter():
+    meter = TaipowerElectricMeter(
+        json.loads(f"""{{
+            "userID": 123456,
+            "electricNumber": "{MOCK_ELECTRIC_NUMBER}",
+            "electricName": "ABC",
+            "idNumber": "",
+            "idNumberSha": "",
+            "employerId": "",
+            "nickname": "a nick name",
+            "verifiedType": "",
+            "billPrint": "true",
+            "engBill": "false",
+            "billPrintStatus": "0",
+            "applyStatus": "0",
+            "applyStatusText": "",
+            "applyNo": "",
+            "ami": "true",
+            "orderEdc": "false",
+            "status": "0",
+            "outageId": "A",
+            "notifyLimit": "",
+            "startDatetime": "",
+            "updateDatetime": "2022-04-01T05:50:21.810+0000",
+            "electricAddr": "Taipei City",
+            "electricAddr1": "",
+            "electricAddr2": "",
+            "electricAddr3": "",
+            "electricAddr4": "",
+            "createDatetime": "2022-04-05T05:50:55.523+0000",
+            "bindDatetime": "2022-04-05T05:50:55.523+0000",
+            "billCycle": "01",
+            "billDate": "",
+            "authorizeCount": "0",
+            "empElectric": "false",
+            "hasUpdate": "false",
+            "verifiedLevel": "0",
+            "billPrintStatusText": "123"
+        }}""")
+    )
+    meter.ami = {
+        "20220412000000" : TaipowerAMI(
+            json.loads("""{
+                "startTime": "20220403000000",
+                "endTime": "20220404000000",
+                "isMssingData": 0,
+                "offPeakKwh": 25.2,
+                "halfPeakKwh": 0.0,
+                "satPeakKwh": 0.0,
+                "peakTimeKwh": 0.0,
+                "totalKwh": 23.2,
+                "mult": 1
+            }""")
+        )
+    }
+    meter.ami_bill = TaipowerAMIBill(
+        json.loads(
+            """{"kwhData": true,
+            "status": "zt",
+            "totalAmount": 4695,
+            "kwh": 1383,
+            "comparisonOfLastYear": "+51%",
+            "comparisonOfLastMonth": "-22%",
+            "outageId": "A",
+            "chkCode": "478",
+            "payMethod": "",
+            "lastKwh": 918,
+            "theLast2Kwh": 1776,
+            "startDate": "1110121",
+            "startDateText": "1110121",
+            "endDate": "1110323",
+            "endDateText": "111/03/23",
+            "payDueDate": "1110426",
+            "payDueDateText": "111/04/26",
+            "period": "111/01/21 ~ 111/03/23",
+            "totalAmountText": "4,695",
+            "chargeDate": "1110406",
+            "chargeDateText": "11104",
+            "lastTotalAmount": 2618,
+            "currentAmount": 3765,
+            "currentAmountText": "4,695",
+            "rtncode": "0",
+            "rtnmsg": "",
+            "collName": "coll name",
+            "collDate": "1100322",
+            "collDateText": "110/03/22",
+            "chargeInfo": "charge info",
+            "recvDate": "",
+            "hasPaid": "B"
+            }"""
+        )
+    )
+    meter.ami_unbilled = TaipowerAMIUnbilled(
+        json.loads(
+            """{"readingDate": "1110401",
+            "lastReadDate": "1110301",
+            "nextReadingDate": "1110501",
+            "totalAmount": "964",
+            "payDeadline": "1110605",
+            "finalKwh": "100.0"
+            }"""
+        )
+    )
+    meter.bill_records = {
+        "2020/08" : TaipowerBillRecord(
+            json.loads("""{
+                "issueYM": "109/08",
+                "ctrClassType": "\u8868\u71c8\u975e\u71df\u696d\u7528",
+                "billFromAndToDate": "109/05/27~109/07/26",
+                "totalKwh": 1374,
+                "collDate": "1090825",
+                "collName": "\u7e73\u8cbb/\u92b7\u5e33\u65e5\u671f",
+                "totalCharge": "4,329",
+                "billFormula": "1.63x240(56/61)+2.38x420(56/61)+3.52x340(56/61)+4.80x374(56/61)+1.63x240(5/61)+2.10x420(5/61)+2.89x340(5/61)+3.94x374(5/61)",
+                "floatFields": [
+                    "\u6d41\u52d5\u96fb\u8cbb:4329.2\u5143",
+                    "\u61c9\u7e73\u7e3d\u91d1\u984d:4329\u5143"
+                ],
+                "outageId": "A",
+                "chkCode": "252",
+                "payMethod": "免費",
+                "hasPaid": "C",
+                "curReadMtrDate": "1090727",
+                "nextReadMtrDate": "1090924",
+                "recvDate": "1090825"
+            }""")
+        )
+    }
+    return meter
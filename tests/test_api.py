@@ -1,151 +1,22 @@
+import asyncio
 import pytest
 import time
-import json
 import httpx
 import re
+import threading
 
 import datetime
 
 from unittest.mock import patch, MagicMock
 
 from Taipower.api import TaipowerAPI, TaipowerElectricMeter
-from Taipower.model import TaipowerAMI, TaipowerAMIBill, TaipowerAMIUnbilled, TaipowerBillRecord
+from Taipower.model import TaipowerAMI, TaipowerAMIBill, TaipowerAMISeries, TaipowerAMIUnbilled, TaipowerBillRecord, TaipowerBillRecords
 from Taipower.connection import TaipowerTokens
+from Taipower.storage import TaipowerAMIStore
 
-from . import MOCK_ELECTRIC_NUMBER
+from . import MOCK_ELECTRIC_NUMBER, make_quarters
 
 
-@pytest.fixture()
-def fixture_mock_meter():
-    meter = TaipowerElectricMeter(
-        json.loads(f"""{{
-            "userID": 123456,
-            "electricNumber": "{MOCK_ELECTRIC_NUMBER}",
-            "electricName": "ABC",
-            "idNumber": "",
-            "idNumberSha": "",
-            "employerId": "",
-            "nickname": "a nick name",
-            "verifiedType": "",
-            "billPrint": "true",
-            "engBill": "false",
-            "billPrintStatus": "0",
-            "applyStatus": "0",
-            "applyStatusText": "",
-            "applyNo": "",
-            "ami": "true",
-            "orderEdc": "false",
-            "status": "0",
-            "outageId": "A",
-            "notifyLimit": "",
-            "startDatetime": "",
-            "updateDatetime": "2022-04-01T05:50:21.810+0000",
-            "electricAddr": "Taipei City",
-            "electricAddr1": "",
-            "electricAddr2": "",
-            "electricAddr3": "",
-            "electricAddr4": "",
-            "createDatetime": "2022-04-05T05:50:55.523+0000",
-            "bindDatetime": "2022-04-05T05:50:55.523+0000",
-            "billCycle": "01",
-            "billDate": "",
-            "authorizeCount": "0",
-            "empElectric": "false",
-            "hasUpdate": "false",
-            "verifiedLevel": "0",
-            "billPrintStatusText": "123"
-        }}""")
-    )
-    meter.ami = {
-        "20220412000000" : TaipowerAMI(
-            json.loads("""{
-                "startTime": "20220403000000",
-                "endTime": "20220404000000",
-                "isMssingData": 0,
-                "offPeakKwh": 25.2,
-                "halfPeakKwh": 0.0,
-                "satPeakKwh": 0.0,
-                "peakTimeKwh": 0.0,
-                "totalKwh": 23.2,
-                "mult": 1
-            }""")
-        )
-    }
-    meter.ami_bill = TaipowerAMIBill(
-        json.loads(
-            """{"kwhData": true,
-            "status": "zt",
-            "totalAmount": 4695,
-            "kwh": 1383,
-            "comparisonOfLastYear": "+51%",
-            "comparisonOfLastMonth": "-22%",
-            "outageId": "A",
-            "chkCode": "478",
-            "payMethod": "",
-            "lastKwh": 918,
-            "theLast2Kwh": 1776,
-            "startDate": "1110121",
-            "startDateText": "1110121",
-            "endDate": "1110323",
-            "endDateText": "111/03/23",
-            "payDueDate": "1110426",
-            "payDueDateText": "111/04/26",
-            "period": "111/01/21 ~ 111/03/23",
-            "totalAmountText": "4,695",
-            "chargeDate": "1110406",
-            "chargeDateText": "11104",
-            "lastTotalAmount": 2618,
-            "currentAmount": 3765,
-            "currentAmountText": "4,695",
-            "rtncode": "0",
-            "rtnmsg": "",
-            "collName": "coll name",
-            "collDate": "1100322",
-            "collDateText": "110/03/22",
-            "chargeInfo": "charge info",
-            "recvDate": "",
-            "hasPaid": "B"
-            }"""
-        )
-    )
-    meter.ami_unbilled = TaipowerAMIUnbilled(
-        json.loads(
-            """{"readingDate": "1110401",
-            "lastReadDate": "1110301",
-            "nextReadingDate": "1110501",
-            "totalAmount": "964",
-            "payDeadline": "1110605",
-            "finalKwh": "100.0"
-            }"""
-        )
-    )
-    meter.bill_records = {
-        "2020/08" : TaipowerBillRecord(
-            json.loads("""{
-                "issueYM": "109/08",
-                "ctrClassType": "\u8868\u71c8\u975e\u71df\u696d\u7528",
-                "billFromAndToDate": "109/05/27~109/07/26",
-                "totalKwh": 1374,
-                "collDate": "1090825",
-                "collName": "\u7e73\u8cbb/\u92b7\u5e33\u65e5\u671f",
-                "totalCharge": "4,329",
-                "billFormula": "1.63x240(56/61)+2.38x420(56/61)+3.52x340(56/61)+4.80x374(56/61)+1.63x240(5/61)+2.10x420(5/61)+2.89x340(5/61)+3.94x374(5/61)",
-                "floatFields": [
-                    "\u6d41\u52d5\u96fb\u8cbb:4329.2\u5143",
-                    "\u61c9\u7e73\u7e3d\u91d1\u984d:4329\u5143"
-                ],
-                "outageId": "A",
-                "chkCode": "252",
-                "payMethod": "免費",
-                "hasPaid": "C",
-                "curReadMtrDate": "1090727",
-                "nextReadMtrDate": "1090924",
-                "recvDate": "1090825"
-            }""")
-        )
-    }
-    return meter
-
 @pytest.fixture()
 def fixture_mock_api(fixture_mock_meter):
     api = TaipowerAPI("", "")
@@ -161,8 +32,8 @@ class TestTaipowerAPI:
         api = fixture_mock_api
         meter = fixture_mock_meter
         with patch("Taipower.connection.GetMember.async_get_data") as mock_get_data, \
-            patch("Taipower.connection.GetMember.login") as mock_login, \
-            patch.object(api, "refresh_status") as mock_refresh_status:
+            patch("Taipower.connection.GetMember.async_login") as mock_login, \
+            patch.object(api, "async_refresh_status") as mock_refresh_status:
             async def mock(client=None):
                 assert client is None or isinstance(client, httpx.AsyncClient)
                 return_value = {
@@ -180,18 +51,35 @@ class TestTaipowerAPI:
             async def mock_failed(client=None):
                 return "Not OK", {}
 
-            mock_login.return_value = ("OK", "")
+            async def mock_login_ok(client=None):
+                assert isinstance(client, httpx.AsyncClient)
+                return "OK", TaipowerTokens("", "", time.time() + 7300)
+
+            mock_login.side_effect = mock_login_ok
             mock_get_data.side_effect = mock
             api.login()
 
             assert isinstance(api.meters, dict)
             assert isinstance(api.meters[MOCK_ELECTRIC_NUMBER], TaipowerElectricMeter)
+            assert mock_refresh_status.call_count == 1
+            assert isinstance(mock_refresh_status.call_args.kwargs["client"], httpx.AsyncClient)
+
+            api.login(fetch_data=False)
+            assert mock_refresh_status.call_count == 1
 
             mock_get_data.side_effect = mock_failed
 
             with pytest.raises(RuntimeError, match=f"An error occurred when retrieving electric meters: Not OK"):
                 api.login()
 
+            async def mock_login_failed(client=None):
+                return "Bad credentials", None
+
+            mock_login.side_effect = mock_login_failed
+
+            with pytest.raises(RuntimeError, match=f"An error occurred when signing into Taipower API: Bad credentials"):
+                api.login()
+
     def test_reauth(self, fixture_mock_api):
         api = fixture_mock_api
         with patch("Taipower.connection.TaipowerConnection.login") as mock_login:
@@ -217,6 +105,18 @@ class TestTaipowerAPI:
             assert api._taipower_tokens.refresh_token == current_tokens.refresh_token
             assert api._taipower_tokens.expiration > current_tokens.expiration
 
+        with patch("Taipower.connection.TaipowerConnection.async_login") as mock_login:
+            async def mock(use_refresh_token=False, client=None):
+                return "OK", TaipowerTokens("async", "async", api._taipower_tokens.expiration + 86400)
+
+            mock_login.side_effect = mock
+
+            current_tokens = api._taipower_tokens
+            asyncio.run(api.async_reauth())
+
+            assert api._taipower_tokens.access_token == "async"
+            assert api._taipower_tokens.expiration > current_tokens.expiration
+
 
     def test_get_ami(self, fixture_mock_api):
         api = fixture_mock_api
@@ -270,6 +170,30 @@ class TestTaipowerAPI:
             with pytest.raises(RuntimeError, match=f"An error occurred when retrieving AMI: Not OK"):
                 api.get_ami(MOCK_ELECTRIC_NUMBER)
     
+    def test_get_ami_rollup(self, fixture_mock_api):
+        api = fixture_mock_api
+        with patch.object(api, "async_get_ami") as mock_get_ami:
+            async def mock(electric_number, dt, client=None, ami_period=None):
+                assert ami_period == "quater"
+                assert isinstance(client, httpx.AsyncClient)
+                return {ami.start_time: ami for ami in make_quarters(dt.date())}
+
+            mock_get_ami.side_effect = mock
+            ami_rollup = api.get_ami_rollup(MOCK_ELECTRIC_NUMBER, datetime.date(2022, 7, 4), datetime.date(2022, 7, 5))
+
+            assert mock_get_ami.call_count == 2
+            assert ami_rollup.get("daily")["20220705000000"].total_kwh == 24.0
+
+            # Complete dates are not retrieved again.
+            api.get_ami_rollup(MOCK_ELECTRIC_NUMBER, datetime.date(2022, 7, 4), datetime.date(2022, 7, 6), ami_rollup)
+            assert mock_get_ami.call_count == 3
+            assert mock_get_ami.call_args.args[1] == datetime.datetime(2022, 7, 6)
+
+            amis = api.get_ami_range(MOCK_ELECTRIC_NUMBER, datetime.datetime(2022, 7, 4, 23), datetime.datetime(2022, 7, 5, 1), ami_period="quater")
+            assert mock_get_ami.call_count == 5
+            assert sorted(amis)[0] == "20220704230000"
+            assert len(amis) == 8
+
     def test_get_ami_bill(self, fixture_mock_api, fixture_mock_meter):
         api = fixture_mock_api
         meter = fixture_mock_meter
@@ -328,6 +252,26 @@ class TestTaipowerAPI:
             with pytest.raises(RuntimeError, match=f"An error occurred when retrieving AMI unbilled: Not OK"):
                 api.get_ami_unbilled(MOCK_ELECTRIC_NUMBER)
     
+    def test_get_ami_power_rate(self, fixture_mock_api):
+        api = fixture_mock_api
+        with patch("Taipower.connection.GetAMIPowerRate.async_get_data") as mock_get_data:
+            async def mock(electric_number, client=None):
+                assert electric_number == MOCK_ELECTRIC_NUMBER
+                return "OK", {"success": True, "message": "", "data": {"totalAmount": 964}}
+
+            async def mock_failed(electric_number, client=None):
+                return "Not OK", {}
+
+            mock_get_data.side_effect = mock
+            assert api.get_ami_power_rate(MOCK_ELECTRIC_NUMBER) == {"totalAmount": 964}
+            assert api.get_ami_power_rate(MOCK_ELECTRIC_NUMBER) == {"totalAmount": 964}
+            assert mock_get_data.call_count == 1
+
+            mock_get_data.side_effect = mock_failed
+
+            with pytest.raises(RuntimeError, match=f"An error occurred when retrieving AMI power rate: Not OK"):
+                api.get_ami_power_rate(MOCK_ELECTRIC_NUMBER, use_cache=False)
+
     def test_get_bill_records(self, fixture_mock_api, fixture_mock_meter):
         api = fixture_mock_api
         meter = fixture_mock_meter
@@ -375,8 +319,11 @@ class TestTaipowerAPI:
             mock_get_ami_unbilled.side_effect = mock
             mock_get_bill_records.side_effect = mock
 
+            version = api.meters[MOCK_ELECTRIC_NUMBER].snapshot.version
             api.refresh_status()
 
+            # All fields of a refresh are published at once.
+            assert api.meters[MOCK_ELECTRIC_NUMBER].snapshot.version == version + 1
             assert api.meters[MOCK_ELECTRIC_NUMBER].ami == api.meters[MOCK_ELECTRIC_NUMBER].ami # the electric number isn't verified.
             assert api.meters[MOCK_ELECTRIC_NUMBER].ami_bill == "Mock Object"
             assert api.meters[MOCK_ELECTRIC_NUMBER].ami_unbilled == "Mock Object"
@@ -390,6 +337,139 @@ class TestTaipowerAPI:
             with pytest.raises(RuntimeError, match=re.escape("[RuntimeError(), RuntimeError(), RuntimeError()]")):
                 api.refresh_status()
 
+    def test_refresh_status_ami(self, fixture_mock_api):
+        api = fixture_mock_api
+        meter = api.meters[MOCK_ELECTRIC_NUMBER]
+        meter._json["verifiedLevel"] = "1"
+        days = iter([datetime.date(2022, 4, 12), datetime.date(2022, 4, 13), datetime.date(2022, 4, 14)])
+
+        with patch.object(api, "async_get_ami") as mock_get_ami:
+            async def mock(*args, **kwargs):
+                return {ami.start_time: ami for ami in make_quarters(next(days))}
+
+            mock_get_ami.side_effect = mock
+
+            # Refreshed AMI replace the loaded AMI by default.
+            api.refresh_status(refresh_ami_bill=False, refresh_ami_unbilled=False, refresh_bill_records=False)
+            assert len(meter.ami) == 96
+            assert next(iter(meter.ami)) == "20220412000000"
+
+            # With a retention, they are merged and AMI older than the retention are dropped.
+            api.ami_retention = 48 * 3600
+            api.refresh_status(refresh_ami_bill=False, refresh_ami_unbilled=False, refresh_bill_records=False)
+            assert len(meter.ami) == 192
+            api.refresh_status(refresh_ami_bill=False, refresh_ami_unbilled=False, refresh_bill_records=False)
+            assert next(iter(meter.ami)) == "20220412234500"
+            assert list(meter.ami)[-1] == "20220414234500"
+
+    def test_save_load_state(self, fixture_mock_api):
+        api = fixture_mock_api
+        state = api.save_state()
+        assert isinstance(state, bytes)
+
+        restored = TaipowerAPI("", "")
+        with patch("Taipower.connection.TaipowerConnection._async_send") as mock_send:
+            restored.load_state(state)
+            restored._check_before_publish()
+            mock_send.assert_not_called()
+
+        assert restored._taipower_tokens == api._taipower_tokens
+        meter = api.meters[MOCK_ELECTRIC_NUMBER]
+        restored_meter = restored.meters[MOCK_ELECTRIC_NUMBER]
+        assert restored_meter._json == meter._json
+        assert restored_meter.ami["20220403000000"]._json == meter.ami["20220412000000"]._json
+        assert restored_meter.ami_bill._json == meter.ami_bill._json
+        assert restored_meter.ami_unbilled._json == meter.ami_unbilled._json
+        assert restored_meter.bill_records["2020/08"]._json == meter.bill_records["2020/08"]._json
+
+        # AMI of another period is dropped.
+        restored = TaipowerAPI("", "", ami_period="hour")
+        restored.load_state(state)
+        assert restored.meters[MOCK_ELECTRIC_NUMBER].ami is None
+
+        with pytest.raises(ValueError, match="another account"):
+            TaipowerAPI("other", "").load_state(state)
+
+    def test_save_load_ami(self, fixture_mock_api, tmp_path):
+        api = fixture_mock_api
+        store = TaipowerAMIStore(str(tmp_path))
+        api.save_ami(store)
+        state = api.save_state(include_ami=False)
+
+        restored = TaipowerAPI("", "")
+        restored.load_state(state)
+        assert restored.meters[MOCK_ELECTRIC_NUMBER].ami is None
+        restored.load_ami(store)
+        meter = api.meters[MOCK_ELECTRIC_NUMBER]
+        restored_meter = restored.meters[MOCK_ELECTRIC_NUMBER]
+        # AMI are keyed by their start times once stored, and only the kwh columns are kept.
+        for ami in meter.ami.values():
+            restored_ami = restored_meter.ami[ami.start_time]
+            assert restored_ami.end_time == ami.end_time
+            assert restored_ami.total_kwh == ami.total_kwh
+            assert restored_ami.offpeak_kwh == ami.offpeak_kwh
+
+    def test_lazy(self, fixture_mock_meter):
+        api = TaipowerAPI("", "", lazy=True)
+        api._taipower_tokens = TaipowerTokens("", "", time.time() + 7300)
+        meter = TaipowerElectricMeter(fixture_mock_meter._json, loader=api._loader)
+        meter._json["verifiedLevel"] = "1"
+        api._meters = {MOCK_ELECTRIC_NUMBER: meter}
+
+        with patch.object(api, "async_get_ami") as mock_get_ami, \
+             patch.object(api, "async_get_ami_bill") as mock_get_ami_bill:
+            async def mock(electric_number, client=None):
+                assert electric_number == MOCK_ELECTRIC_NUMBER
+                return "Mock Object"
+
+            mock_get_ami.side_effect = mock
+            mock_get_ami_bill.side_effect = mock
+
+            assert meter.snapshot.ami_bill is None
+            assert meter.ami_bill == "Mock Object"
+            assert meter.ami_bill == "Mock Object"
+            assert mock_get_ami_bill.call_count == 1
+            assert mock_get_ami.call_count == 0
+
+            assert asyncio.run(meter.async_load("ami")) == "Mock Object"
+            assert mock_get_ami.call_count == 1
+            assert meter.ami == "Mock Object"
+            assert mock_get_ami.call_count == 1
+
+        with pytest.raises(ValueError, match="field accepts either"):
+            asyncio.run(meter.async_load("unknown"))
+
+    def test_lazy_event_loop(self, fixture_mock_meter):
+        api = TaipowerAPI("", "", lazy=True)
+        api._taipower_tokens = TaipowerTokens("", "", time.time() + 7300)
+        meter = TaipowerElectricMeter(fixture_mock_meter._json, loader=api._loader)
+        api._meters = {MOCK_ELECTRIC_NUMBER: meter}
+
+        with patch.object(api, "async_get_ami") as mock_get_ami, \
+             patch.object(api, "async_get_ami_bill") as mock_get_ami_bill:
+            async def unavailable(electric_number, client=None):
+                return None
+
+            mock_get_ami.side_effect = unavailable
+            mock_get_ami_bill.side_effect = unavailable
+
+            async def main():
+                with pytest.raises(RuntimeError, match="async_load"):
+                    meter.ami_bill
+                return await meter.async_load("ami_bill")
+
+            assert asyncio.run(main()) is None
+            assert mock_get_ami_bill.call_count == 1
+            # An unavailable field is not fetched again.
+            assert meter.ami_bill is None
+            assert mock_get_ami_bill.call_count == 1
+
+            # AMI of unverified meters is never fetched.
+            meter._json["verifiedLevel"] = "0"
+            assert meter.ami is None
+            assert asyncio.run(meter.async_load("ami")) is None
+            assert mock_get_ami.call_count == 0
+
 
 class TestTaipowerElectricMeter:
     def test_repr(self, fixture_mock_meter):
@@ -402,10 +482,10 @@ nickname: a nick name"""
     def test_attrs(self, fixture_mock_meter):
         meter = fixture_mock_meter
         attrs = [
-            ("ami", dict),
+            ("ami", TaipowerAMISeries),
             ("ami_bill", TaipowerAMIBill),
             ("ami_unbilled", TaipowerAMIUnbilled),
-            ("bill_records", dict),
+            ("bill_records", TaipowerBillRecords),
             ("user_id", str),
             ("name", str),
             ("nickname", str),
@@ -417,6 +497,50 @@ nickname: a nick name"""
         for attr_name, attr_type in attrs:
             assert type(getattr(meter, attr_name)) == attr_type, attr_name
 
+    def test_merge_ami(self, fixture_mock_meter):
+        meter = fixture_mock_meter
+        previous = meter.ami
+        meter.merge_ami({ami.start_time: ami for ami in make_quarters(datetime.date(2022, 4, 12))[:2]})
+
+        assert list(meter.ami) == ["20220412000000", "20220412001500"]
+        assert meter.ami["20220412000000"].start_time == "20220412000000"
+        assert len(previous) == 1
+
+    def test_snapshot(self, fixture_mock_meter):
+        meter = fixture_mock_meter
+        snapshot = meter.snapshot
+        published = meter.publish(ami_bill="bill 1", ami_unbilled="unbilled 1")
+
+        assert meter.snapshot is published
+        assert published.version == snapshot.version + 1
+        assert (published.ami_bill, published.ami_unbilled) == ("bill 1", "unbilled 1")
+        assert published.ami is snapshot.ami
+        assert snapshot.ami_bill is not published.ami_bill
+        with pytest.raises(ValueError):
+            meter.publish(unknown=None)
+
+        # Readers never see fields of different refreshes mixed while a writer publishes.
+        stop = threading.Event()
+        torn = []
+
+        def read():
+            while not stop.is_set():
+                snapshot = meter.snapshot
+                if snapshot.ami_bill[5:] != snapshot.ami_unbilled[9:]:
+                    torn.append(snapshot)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for index in range(2000):
+            meter.publish(ami_bill=f"bill {index}", ami_unbilled=f"unbilled {index}")
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+        assert torn == []
+        assert meter.snapshot.version == published.version + 2000
+
     def test_from_electric_meter_list(self, fixture_mock_meter):
         # without specifying electric numbers
         meter = fixture_mock_meter
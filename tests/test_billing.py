@@ -0,0 +1,48 @@
+import datetime
+
+from Taipower.billing import TaipowerBillingCycleIndex
+from Taipower.model import TaipowerAMI, TaipowerAMIBill, TaipowerAMIUnbilled, TaipowerBillRecord
+
+
+def make_daily(start, days, kwh):
+    amis = []
+    for offset in range(days):
+        date = start + datetime.timedelta(days=offset)
+        amis.append(TaipowerAMI({
+            "startTime": date.strftime("%Y%m%d000000"),
+            "endTime": (date + datetime.timedelta(days=1)).strftime("%Y%m%d000000"),
+            "isMssingData": 0,
+            "totalKwh": kwh,
+        }))
+    return amis
+
+
+class TestTaipowerBillingCycleIndex:
+    def test_reconcile(self):
+        bill_records = {
+            "2022/01": TaipowerBillRecord({"billFromAndToDate": "110/11/21~111/01/20", "totalKwh": 61}),
+            "2022/03": TaipowerBillRecord({"billFromAndToDate": "111/01/21~111/03/22", "totalKwh": 600}),
+        }
+        # The AMI bill overlaps with the second record, which takes precedence.
+        ami_bill = TaipowerAMIBill({"startDate": "1110121", "endDate": "1110322", "kwhData": True, "kwh": 1})
+        ami_unbilled = TaipowerAMIUnbilled({"lastReadDate": "1110323", "readingDate": "1110401", "finalKwh": "9.0"})
+        assert (ami_bill.start_date, ami_bill.end_date) == (datetime.date(2022, 1, 21), datetime.date(2022, 3, 22))
+        assert (ami_unbilled.start_date, ami_unbilled.end_date) == (datetime.date(2022, 3, 23), datetime.date(2022, 3, 31))
+
+        index = TaipowerBillingCycleIndex(bill_records, ami_bill, ami_unbilled)
+        assert [cycle.source for cycle in index.cycles] == ["bill_record", "bill_record", "ami_unbilled"]
+        assert index.find(datetime.date(2022, 1, 20)).key == "2022/01"
+        assert index.find(datetime.date(2022, 1, 21)).key == "2022/03"
+        assert index.find(datetime.date(2022, 3, 31)).source == "ami_unbilled"
+        assert index.find(datetime.date(2022, 4, 1)) is None
+        assert index.find(datetime.date(2021, 11, 20)) is None
+
+        amis = make_daily(datetime.date(2021, 11, 21), 131, 1.0)
+        aggregated = index.aggregate(amis)
+        assert [aggregated[cycle] for cycle in index.cycles] == [61.0, 61.0, 9.0]
+
+        results = index.reconcile(amis)
+        assert [(result.cycle.key, result.readings, result.matched) for result in results] == [
+            ("2022/01", 61, True), ("2022/03", 61, False), ("ami_unbilled", 9, True)
+        ]
+        assert results[1].difference == -539.0
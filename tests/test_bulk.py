@@ -0,0 +1,142 @@
+import asyncio
+import datetime
+import json
+import time
+
+from unittest.mock import patch
+
+import httpx
+
+from Taipower.api import TaipowerAPI, TaipowerElectricMeter
+from Taipower.bulk import TaipowerBulkExporter, month_ranges
+from Taipower.cli import main
+from Taipower.connection import TaipowerTokens
+from Taipower.synthetic import TaipowerSyntheticFleet
+from Taipower.transport import TaipowerTransport
+
+from . import MOCK_ELECTRIC_NUMBER, make_quarters
+
+
+class MockAPI(TaipowerAPI):
+    def __init__(self, meter, calls, fail=(), *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._mock_meter = meter
+        self.calls = calls
+        self.fail = fail
+
+    async def async_login(self, fetch_data=True):
+        self._taipower_tokens = TaipowerTokens("", "", time.time() + 7300)
+        meter = TaipowerElectricMeter(self._mock_meter._json)
+        meter._json["verifiedLevel"] = "1"
+        self._meters = {MOCK_ELECTRIC_NUMBER: meter}
+
+    async def async_get_ami_range(self, electric_number, start, end, ami_period=None, client=None):
+        self.calls.append(("ami", start))
+        if start.month in self.fail:
+            raise RuntimeError("Mock Error")
+        return {ami.start_time: ami for ami in make_quarters(start.date())}
+
+    async def async_get_ami_bill(self, electric_number, client=None):
+        self.calls.append(("ami_bill", None))
+        return self._mock_meter.ami_bill
+
+    async def async_get_bill_records(self, electric_number, client=None):
+        self.calls.append(("bill_records", None))
+        return self._mock_meter.bill_records
+
+
+class TestTaipowerBulkExporter:
+    def test_month_ranges(self):
+        ranges = month_ranges(datetime.date(2022, 1, 15), datetime.date(2022, 3, 1))
+        assert [key for key, _, _ in ranges] == ["202201", "202202", "202203"]
+        assert ranges[0][1] == datetime.datetime(2022, 1, 15)
+        assert ranges[-1][2] == datetime.datetime(2022, 3, 2)
+        assert [key for key, _, _ in month_ranges(datetime.date(2021, 6, 1), datetime.date(2022, 3, 1), "monthly")] == ["2021", "2022"]
+
+    def test_export_resume(self, fixture_mock_meter, tmp_path):
+        output = str(tmp_path / "out")
+        checkpoint = str(tmp_path / "checkpoint.jsonl")
+        accounts = [{"account": "a", "password": "p"}]
+        start, end = datetime.date(2022, 6, 1), datetime.date(2022, 7, 31)
+
+        calls = []
+        exporter = TaipowerBulkExporter(output, kinds=["ami", "ami_bill", "bill_records"], checkpoint=checkpoint)
+        with patch.object(exporter, "_create_api", lambda *args: MockAPI(fixture_mock_meter, calls, (7,), *args)):
+            exported = exporter.export(accounts, start, end)
+        assert exported == {"ami": 96, "ami_bill": 1, "bill_records": 1}
+        assert len(exporter.errors) == 1 and "a/00123456700/ami/202207" in exporter.errors[0]
+
+        # Rows of an interrupted unit are dropped on resume.
+        with open(tmp_path / "out" / "ami.jsonl", "ab") as f:
+            f.write(b'{"partial"')
+
+        calls = []
+        exporter = TaipowerBulkExporter(output, kinds=["ami", "ami_bill", "bill_records"], checkpoint=checkpoint)
+        with patch.object(exporter, "_create_api", lambda *args: MockAPI(fixture_mock_meter, calls, (), *args)):
+            exported = exporter.export(accounts, start, end)
+        assert calls == [("ami", datetime.datetime(2022, 7, 1))]
+        assert exported == {"ami": 96, "ami_bill": 0, "bill_records": 0}
+        assert exporter.errors == []
+
+        with open(tmp_path / "out" / "ami.jsonl", "rb") as f:
+            rows = [json.loads(line) for line in f]
+        assert len(rows) == 192
+        assert rows[0]["electric_number"] == MOCK_ELECTRIC_NUMBER
+        assert rows[0]["start_time"] == "20220601000000"
+        assert rows[-1]["start_time"] == "20220701234500"
+
+    def test_cli(self, fixture_mock_meter, tmp_path):
+        calls = []
+        with patch.object(
+            TaipowerBulkExporter, "_create_api", lambda self, *args: MockAPI(fixture_mock_meter, calls, (), *args)
+        ):
+            status = main(["export", "--account", "a", "--password", "p", "-o", str(tmp_path), "-f", "csv", "--data", "bill_records"])
+        assert status == 0
+        with open(tmp_path / "bill_records.csv", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert lines[0] == "account,electric_number,issue_year_month,period,charge,kwh,paid,formula"
+        assert lines[1].startswith(f"a,{MOCK_ELECTRIC_NUMBER},2020/08,")
+
+    def test_concurrency(self, tmp_path):
+        fleet = TaipowerSyntheticFleet(meters_per_account=2, start=datetime.date(2022, 1, 1), end=datetime.date(2022, 1, 31))
+        in_flight = [0, 0]
+
+        async def handler(request):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            await asyncio.sleep(0.001)
+            in_flight[0] -= 1
+            return fleet.handler(request)
+
+        exporter = TaipowerBulkExporter(
+            str(tmp_path), kinds=("ami",), ami_period="quater", concurrency=3, transport=httpx.MockTransport(handler)
+        )
+        accounts = [{"account": account, "password": "password"} for account in fleet.accounts]
+        exported = exporter.export(accounts, datetime.date(2022, 1, 1), datetime.date(2022, 1, 31))
+        assert exporter.errors == []
+        assert exported["ami"] == 31 * 96 * len(fleet)
+        # A month of quarters fans out into a request per day, which still never exceed the concurrency.
+        assert in_flight[1] == 3
+
+    def test_transport_lifetime(self, tmp_path):
+        fleet = TaipowerSyntheticFleet(accounts=4, meters_per_account=1, start=datetime.date(2022, 1, 1), end=datetime.date(2022, 1, 31))
+        closed = []
+
+        class CountingTransport(httpx.MockTransport):
+            async def aclose(self):
+                closed.append(self)
+
+        class CountingTaipowerTransport(TaipowerTransport):
+            async def aclose(self):
+                closed.append(self)
+
+        accounts = [{"account": account, "password": "password"} for account in fleet.accounts]
+        # Clients of an account closing never close a transport the other accounts are still using.
+        exporter = TaipowerBulkExporter(str(tmp_path), transport=CountingTransport(fleet.handler))
+        exporter.export(accounts, datetime.date(2022, 1, 1), datetime.date(2022, 1, 31))
+        assert exporter.errors == [] and closed == []
+
+        # The connection pools a given transport keeps for the export are closed once it finishes.
+        exporter = TaipowerBulkExporter(str(tmp_path / "pools"), transport=CountingTaipowerTransport(fleet.transport()))
+        exporter.export(accounts, datetime.date(2022, 1, 1), datetime.date(2022, 1, 31))
+        assert exporter.errors == [] and closed == [exporter.transport]
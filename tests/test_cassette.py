@@ -0,0 +1,136 @@
+import asyncio
+import gzip
+import json
+
+import httpx
+import pytest
+
+from Taipower.api import TaipowerAPI
+from Taipower.cassette import REDACTED, TaipowerRecordTransport, TaipowerRedactor, TaipowerReplayTransport, load_cassette
+
+from . import MOCK_ELECTRIC_NUMBER
+
+MOCK_ACCESS_TOKEN = "secret-access-token"
+
+
+def mock_handler(request):
+    if request.url.path == "/oauth/token":
+        return httpx.Response(200, json={
+            "access_token": MOCK_ACCESS_TOKEN,
+            "refresh_token": "secret-refresh-token",
+            "token_type": "bearer",
+            "expires_in": 3600,
+        })
+    elif request.url.path == "/member/getData":
+        return httpx.Response(200, json={
+            "success": True,
+            "message": "",
+            "data": {
+                "phoneNo": "0912345678",
+                "electricList": [
+                    {"userID": 123456, "electricNumber": MOCK_ELECTRIC_NUMBER, "nickname": "home", "ami": "true"},
+                ],
+            },
+        })
+    elif request.url.path == "/api/mybill/records":
+        assert json.loads(request.content)["customNo"] == MOCK_ELECTRIC_NUMBER
+        return httpx.Response(200, json={
+            "success": True,
+            "message": "",
+            "data": [{
+                "issueYM": "11104",
+                "billFromAndToDate": "111/02/24~111/04/24",
+                "totalCharge": "1,234",
+                "totalKwh": 456.0,
+                "hasPaid": "C",
+                "customNo": MOCK_ELECTRIC_NUMBER,
+            }],
+        })
+    return httpx.Response(404, json={"error": "not_found"})
+
+
+def record(path):
+    transport = TaipowerRecordTransport(path, transport=httpx.MockTransport(mock_handler))
+    api = TaipowerAPI("0912345678", "password", transport=transport)
+    asyncio.run(api.async_login(fetch_data=False))
+    records = api.get_bill_records(MOCK_ELECTRIC_NUMBER)
+    transport.finish()
+    return records
+
+
+class TestTaipowerCassette:
+    def test_redactor(self):
+        redactor = TaipowerRedactor()
+        redacted = redactor.redact({
+            "access_token": "abc",
+            "customNo": "01234567890",
+            "userID": 42,
+            "message": "Meter 01234567890 is ready",
+            "empty": {"password": ""},
+        })
+
+        assert redacted["access_token"] == REDACTED
+        assert redacted["customNo"] == "00000000001"
+        assert redacted["userID"] == 100002
+        assert redacted["message"] == "Meter 00000000001 is ready"
+        assert redacted["empty"] == {"password": ""}
+        assert redactor.redact({"custNo": "01234567890"})["custNo"] == "00000000001"
+
+    def test_record_redacts(self, tmp_path):
+        path = str(tmp_path / "session.jsonl.gz")
+        records = record(path)
+        assert records["202204"].charge == 1234
+
+        with gzip.open(path, "rb") as f:
+            content = f.read().decode()
+        for secret in (MOCK_ACCESS_TOKEN, "secret-refresh-token", "0912345678", MOCK_ELECTRIC_NUMBER):
+            assert secret not in content
+
+        interactions = load_cassette(path)
+        assert [interaction["path"] for interaction in interactions] == ["/oauth/token", "/member/getData", "/api/mybill/records"]
+        meters = json.loads(interactions[1]["response"])["data"]["electricList"]
+        pseudonym = meters[0]["electricNumber"]
+        assert len(pseudonym) == len(MOCK_ELECTRIC_NUMBER)
+        assert json.loads(interactions[2]["request"]) == {"customNo": pseudonym}
+
+    def test_replay(self, tmp_path):
+        path = str(tmp_path / "session.jsonl.gz")
+        recorded = record(path)
+
+        transport = TaipowerReplayTransport(path, time_scale=0)
+        api = TaipowerAPI("0987654321", "another password", transport=transport)
+        asyncio.run(api.async_login(fetch_data=False))
+        pseudonym, = api.meters
+        replayed = api.get_bill_records(pseudonym)
+
+        assert transport.replayed == 3
+        assert list(replayed) == list(recorded)
+        assert replayed["202204"].charge == recorded["202204"].charge
+        assert replayed["202204"].kwh == recorded["202204"].kwh
+
+        with pytest.raises(httpx.TransportError):
+            asyncio.run(api.async_get_ami_bill(pseudonym))
+
+    def test_network_transports(self, tmp_path):
+        closed = []
+
+        class Pool(httpx.MockTransport):
+            def __init__(self, key):
+                super().__init__(mock_handler)
+
+            async def aclose(self):
+                closed.append(self)
+
+        transport = TaipowerRecordTransport(str(tmp_path / "session.jsonl.gz"))
+        transport._async_transports._factory = Pool
+
+        async def main():
+            async with httpx.AsyncClient(transport=transport) as client:
+                await client.get("https://example.com/oauth/token")
+
+        # The connection pool of a loop is closed with its clients rather than kept until `finish`.
+        asyncio.run(main())
+        assert len(closed) == 1
+        assert transport._async_transports._loops == {}
+        transport.finish()
+        assert len(load_cassette(transport.path)) == 1
@@ -0,0 +1,72 @@
+import dataclasses
+import json
+
+import pytest
+
+from Taipower import codec
+from Taipower.model import TaipowerAMI, TaipowerAMIBill, TaipowerAMIUnbilled, TaipowerBillRecord
+
+PAYLOADS = {
+    "ami": {"data": [{"startTime": "20220401000000", "endTime": "20220402000000", "isMssingData": 0, "totalKwh": 23.2, "mult": 1}]},
+    "ami_bill": {"kwhData": True, "kwh": 1383, "currentAmount": 4695, "startDate": "1110121", "endDate": "1110322", "status": "zt"},
+    "ami_unbilled": {"ami": True, "totalAmount": "1234", "finalKwh": "456.5", "readingDate": "1110522", "lastReadDate": "1110322"},
+    "bill_records": [{"issueYM": "111/04", "billFromAndToDate": "111/02/24~111/04/24", "totalKwh": 456, "totalCharge": "1,234", "hasPaid": "C"}],
+}
+
+
+class TestCodec:
+    def test_backends(self):
+        available = codec.available_backends()
+        assert "json" in available
+        assert available == [name for name in codec.BACKENDS if name in available]
+
+        previous = codec.get_backend()
+        try:
+            for name in available:
+                assert codec.set_backend(name) == name
+                assert codec.get_backend() == name
+                assert codec.loads(b'{"data": {"data": [{"totalKwh": 1.5}]}}') == {"data": {"data": [{"totalKwh": 1.5}]}}
+                assert codec.loads('{"success": true}') == {"success": True}
+        finally:
+            codec.set_backend(previous)
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="backend accepts either"):
+            codec.set_backend("yaml")
+
+    @pytest.mark.parametrize("backend", codec.BACKENDS)
+    def test_decode(self, backend):
+        if backend not in codec.available_backends():
+            pytest.skip(f"{backend} is not installed")
+        previous = codec.get_backend()
+        try:
+            codec.set_backend(backend)
+            decoded = {
+                schema: codec.decode(json.dumps({"success": True, "message": "", "data": payload}).encode(), schema)["data"]
+                for schema, payload in PAYLOADS.items()
+            }
+            error = codec.decode(b'{"success": false, "message": "failed", "data": null}', "ami_bill")
+        finally:
+            codec.set_backend(previous)
+
+        records = [decoded["ami"], decoded["ami_bill"], decoded["ami_unbilled"], decoded["bill_records"][0]]
+        for record, cls in zip(records, (codec.AMIPage, codec.AMIBill, codec.AMIUnbilled, codec.BillRecord)):
+            if backend == "msgspec":
+                import msgspec
+
+                assert isinstance(record, msgspec.Struct)
+                assert type(record).__name__ == f"{cls.__name__}Struct"
+            else:
+                assert dataclasses.is_dataclass(record) and isinstance(record, cls)
+        assert error == {"success": False, "message": "failed", "data": None}
+
+        ami = TaipowerAMI(decoded["ami"].data[0])
+        assert ami.start_time == "20220401000000" and ami.total_kwh == 23.2 and not ami.is_missing_data
+        # Keys outside of the schema are not kept.
+        assert ami._json == {key: value for key, value in PAYLOADS["ami"]["data"][0].items() if key != "mult"}
+        bill = TaipowerAMIBill(decoded["ami_bill"])
+        assert (bill.kwh, bill.current_amount, bill.bill_start_date) == (1383, 4695, TaipowerAMIBill(PAYLOADS["ami_bill"]).bill_start_date)
+        unbilled = TaipowerAMIUnbilled(decoded["ami_unbilled"])
+        assert (unbilled.charge, unbilled.kwh) == (1234, 456.5)
+        record = TaipowerBillRecord(decoded["bill_records"][0])
+        assert (record.charge, record.kwh, record.paid) == (1234, 456, True)
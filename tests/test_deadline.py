@@ -0,0 +1,134 @@
+import asyncio
+import datetime
+import time
+
+import httpx
+import pytest
+
+from Taipower import deadline
+from Taipower.api import TaipowerAPI
+from Taipower.bulk import TaipowerBulkExporter
+from Taipower.synthetic import TaipowerSyntheticFleet
+
+
+@pytest.fixture()
+def fixture_fleet():
+    return TaipowerSyntheticFleet(
+        accounts=2,
+        meters_per_account=3,
+        start=datetime.date(2022, 1, 1),
+        end=datetime.date(2022, 3, 31),
+    )
+
+
+def slow_transport(fleet, marker, delay=5.0):
+    # Requests whose path or body contains `marker` hang for `delay` seconds.
+    async def handler(request):
+        if marker in request.url.path.encode() or marker in request.content:
+            await asyncio.sleep(delay)
+        return fleet.handler(request)
+
+    return httpx.MockTransport(handler)
+
+
+class TestTaipowerDeadline:
+    def test_scope(self):
+        assert deadline.current() is None
+        assert deadline.timeout(10.0) == 10.0
+
+        with deadline.scope(0.05) as outer:
+            assert deadline.current() is outer
+            assert deadline.timeout(10.0) <= 0.05
+            with deadline.scope(60) as inner:
+                # A nested budget never extends the outer one.
+                assert inner.expires_at == outer.expires_at
+            with deadline.scope(None):
+                assert deadline.current() is outer
+            time.sleep(0.06)
+            assert outer.expired
+            with pytest.raises(deadline.TaipowerDeadlineExceeded):
+                deadline.timeout(10.0)
+        assert deadline.current() is None
+
+        with pytest.raises(ValueError):
+            deadline.TaipowerDeadline(-1)
+
+    def test_gather(self):
+        async def work(seconds, value):
+            await asyncio.sleep(seconds)
+            return value
+
+        async def fail():
+            raise ValueError("failed")
+
+        async def main():
+            with deadline.scope(0.1):
+                return await deadline.gather([work(0.01, 1), work(5, 2), fail()], ["fast", "slow", "fail"])
+
+        start = time.perf_counter()
+        results, cancelled = asyncio.run(main())
+        assert time.perf_counter() - start < 1
+        assert results[0] == 1
+        assert results[1] is None
+        assert isinstance(results[2], ValueError)
+        assert cancelled == ["slow"]
+
+        results, cancelled = asyncio.run(deadline.gather([work(0.01, 1)], ["fast"]))
+        assert results == [1]
+        assert cancelled == []
+
+    def test_refresh_status(self, fixture_fleet):
+        fleet = fixture_fleet
+        api = TaipowerAPI(fleet.accounts[0], "password", transport=slow_transport(fleet, b"api/ami/"))
+        api.login(fetch_data=False)
+
+        start = time.perf_counter()
+        with pytest.raises(deadline.TaipowerDeadlineExceeded) as e:
+            api.refresh_status(budget=0.3)
+        assert time.perf_counter() - start < 2
+
+        assert sorted(e.value.cancelled) == [(number, "ami") for number in sorted(api.meters)]
+        assert len(e.value.completed) == 3 * len(api.meters)
+        for meter in api.meters.values():
+            # Completed fields are published.
+            assert meter.snapshot.ami is None
+            assert meter.snapshot.ami_bill is not None
+            assert meter.snapshot.bill_records is not None
+
+        api.refresh_status(refresh_ami=False, budget=5)
+
+    def test_get_ami_range(self, fixture_fleet):
+        fleet = fixture_fleet
+        api = TaipowerAPI(fleet.accounts[0], "password", transport=slow_transport(fleet, b"202203"))
+        api.login(fetch_data=False)
+        electric_number = list(api.meters)[0]
+
+        with pytest.raises(deadline.TaipowerDeadlineExceeded) as e:
+            api.get_ami_range(
+                electric_number, datetime.datetime(2022, 1, 1), datetime.datetime(2022, 4, 1), budget=0.3
+            )
+        assert e.value.cancelled == [datetime.datetime(2022, 3, 1)]
+        assert e.value.completed == [datetime.datetime(2022, 1, 1), datetime.datetime(2022, 2, 1)]
+        assert len(e.value.result) == 59
+
+    def test_bulk(self, fixture_fleet, tmp_path):
+        fleet = fixture_fleet
+        accounts = [{"account": account, "password": "password"} for account in fleet.accounts]
+        checkpoint = str(tmp_path / "checkpoint.jsonl")
+
+        exporter = TaipowerBulkExporter(
+            str(tmp_path), concurrency=64, checkpoint=checkpoint, transport=slow_transport(fleet, b"202203"),
+        )
+        start = time.perf_counter()
+        exported = exporter.export(accounts, datetime.date(2022, 1, 1), datetime.date(2022, 3, 31), budget=0.5)
+        assert time.perf_counter() - start < 2
+        assert exporter.errors == []
+        assert len(exporter.cancelled) == len(fleet)
+        assert all(unit.endswith("/ami/202203") for unit in exporter.cancelled)
+        assert exported["bill_records"] != 0
+
+        # The cancelled units are exported when resuming.
+        exporter = TaipowerBulkExporter(str(tmp_path), checkpoint=checkpoint, transport=fleet.transport())
+        exported = exporter.export(accounts, datetime.date(2022, 1, 1), datetime.date(2022, 3, 31))
+        assert exporter.cancelled == []
+        assert exported == {"ami": 31 * len(fleet), "ami_bill": 0, "ami_unbilled": 0, "bill_records": 0}
@@ -0,0 +1,78 @@
+import datetime
+import pytest
+
+from Taipower.model import TaipowerAMISeries, TaipowerBillRecord, TaipowerBillRecords
+from Taipower.storage import TaipowerAMIStore
+from Taipower import export
+
+from . import MOCK_ELECTRIC_NUMBER, make_quarters
+
+
+@pytest.fixture()
+def fixture_series():
+    return TaipowerAMISeries({ami.start_time: ami for ami in make_quarters(datetime.date(2022, 7, 4), missing=(1,))})
+
+
+@pytest.fixture()
+def fixture_bill_records():
+    return TaipowerBillRecord.from_bill_records({"data": [
+        {"issueYM": "109/08", "billFromAndToDate": "109/05/27~109/07/26", "totalKwh": 1374, "totalCharge": "4,329", "hasPaid": "C"},
+        {"issueYM": "109/10", "billFromAndToDate": "109/07/27~109/09/24", "totalKwh": 1200, "totalCharge": "3,900", "hasPaid": "N"},
+    ]})
+
+
+class TestTaipowerExport:
+    def test_ami_columns(self, fixture_series):
+        columns = export.ami_columns(fixture_series)
+        assert columns["start_time"] == fixture_series.epochs
+        assert columns["is_missing_data"][0:2] == [False, True]
+        assert columns["total_kwh"][0] == 0.25
+        assert columns["peak_kwh"][0] is None
+
+    def test_bill_records_columns(self, fixture_bill_records):
+        assert isinstance(fixture_bill_records, TaipowerBillRecords)
+        columns = export.bill_records_columns(fixture_bill_records)
+        assert columns["issue_year_month"] == ["2020/08", "2020/10"]
+        assert columns["start_date"][0] == datetime.date(2020, 5, 27)
+        assert columns["charge"] == [4329, 3900]
+        assert columns["paid"] == [True, False]
+
+    def test_to_numpy(self, fixture_series, fixture_bill_records, tmp_path):
+        np = pytest.importorskip("numpy")
+        arrays = fixture_series.to_numpy()
+        assert arrays["start_time"].dtype == np.int64
+        assert np.isnan(arrays["peak_kwh"]).all()
+        assert arrays["total_kwh"].sum() == 0.25 * 95
+
+        store = TaipowerAMIStore(str(tmp_path))
+        store.write(MOCK_ELECTRIC_NUMBER, "quater", fixture_series)
+        with store.open(MOCK_ELECTRIC_NUMBER, "quater") as ami_file:
+            file_arrays = export.ami_to_numpy(ami_file)
+            assert (file_arrays["start_time"] == arrays["start_time"]).all()
+            assert (file_arrays["is_missing_data"] == arrays["is_missing_data"]).all()
+            # Columns of a memory-mapped file are views without copying.
+            assert not file_arrays["total_kwh"].flags.owndata
+            del file_arrays
+
+        assert fixture_bill_records.to_numpy()["start_date"][1] == np.datetime64("2020-07-27")
+
+    def test_to_pandas(self, fixture_series, fixture_bill_records):
+        pytest.importorskip("pandas")
+        df = fixture_series.to_pandas()
+        assert len(df) == 96
+        assert df.index[0].hour == 0 and df.index[0].utcoffset() == datetime.timedelta(hours=8)
+        assert bool(df["is_missing_data"].iloc[1])
+
+        df = fixture_bill_records.to_pandas()
+        assert list(df.index) == ["2020/08", "2020/10"]
+        assert df.loc["2020/08", "kwh"] == 1374
+
+    def test_to_arrow(self, fixture_series, fixture_bill_records):
+        pytest.importorskip("pyarrow")
+        table = fixture_series.to_arrow()
+        assert table.num_rows == 96
+        assert table.column("peak_kwh").null_count == 96
+        assert table.column("total_kwh")[0].as_py() == 0.25
+
+        table = fixture_bill_records.to_arrow()
+        assert table.column("charge").to_pylist() == [4329, 3900]
@@ -0,0 +1,102 @@
+import asyncio
+import datetime
+
+from unittest.mock import MagicMock
+
+from Taipower.gaps import TaipowerAMIGapRepairer, TaipowerAMIGapTracker
+from Taipower.model import datetime_to_epoch
+
+from . import MOCK_ELECTRIC_NUMBER, make_quarters
+
+
+class TestTaipowerAMIGapTracker:
+    def test_tracker(self):
+        tracker = TaipowerAMIGapTracker()
+        tracker.expect(MOCK_ELECTRIC_NUMBER, datetime.datetime(2022, 7, 4), datetime.datetime(2022, 7, 6))
+        assert tracker.completeness() == 0.0
+
+        tracker.observe(MOCK_ELECTRIC_NUMBER, make_quarters(datetime.date(2022, 7, 4)))
+        tracker.observe(MOCK_ELECTRIC_NUMBER, make_quarters(datetime.date(2022, 7, 5), missing=(95,)))
+        assert tracker.gaps(MOCK_ELECTRIC_NUMBER) == [datetime_to_epoch(datetime.datetime(2022, 7, 5, 23, 45))]
+        assert tracker.gap_dates(MOCK_ELECTRIC_NUMBER) == [datetime.date(2022, 7, 5)]
+        assert tracker.report() == {MOCK_ELECTRIC_NUMBER: 100.0 * 191 / 192}
+
+        # Extending the range backwards keeps what is known.
+        tracker.expect(MOCK_ELECTRIC_NUMBER, datetime.datetime(2022, 7, 3), datetime.datetime(2022, 7, 6))
+        assert tracker.gap_dates(MOCK_ELECTRIC_NUMBER) == [datetime.date(2022, 7, 3), datetime.date(2022, 7, 5)]
+        assert len(tracker.gaps(MOCK_ELECTRIC_NUMBER)) == 97
+
+
+class TestTaipowerAMIGapRepairer:
+    def test_repair(self):
+        tracker = TaipowerAMIGapTracker()
+        tracker.expect(MOCK_ELECTRIC_NUMBER, datetime.datetime(2022, 7, 4), datetime.datetime(2022, 7, 6))
+        tracker.observe(MOCK_ELECTRIC_NUMBER, make_quarters(datetime.date(2022, 7, 4)))
+
+        api = MagicMock()
+        api.ami_period = "daily"
+        api.meters = {}
+        fills = {"count": 0}
+
+        async def mock_check(client=None):
+            pass
+
+        async def mock_get_ami(electric_number, dt, client=None, ami_period=None):
+            assert ami_period == "quater"
+            fills["count"] += 1
+            missing = () if fills["count"] > 1 else (0,)
+            return {ami.start_time: ami for ami in make_quarters(dt.date(), missing=missing)}
+
+        api._async_check_before_publish.side_effect = mock_check
+        api.async_get_ami.side_effect = mock_get_ami
+
+        repairer = TaipowerAMIGapRepairer(api, tracker, initial_delay=100, horizon=86400)
+        now = datetime_to_epoch(datetime.datetime(2022, 7, 6, 1))
+
+        report = asyncio.run(repairer.run_once(now))
+        assert fills["count"] == 1
+        assert report[MOCK_ELECTRIC_NUMBER] == 100.0 * 191 / 192
+
+        # Not due until the delay elapses.
+        asyncio.run(repairer.run_once(now + 50))
+        assert fills["count"] == 1
+        report = asyncio.run(repairer.run_once(now + 100))
+        assert fills["count"] == 2
+        assert report[MOCK_ELECTRIC_NUMBER] == 100.0
+        # Repaired dates are forgotten.
+        assert repairer._attempts == {}
+
+        # Dates beyond the horizon are given up.
+        tracker.expect(MOCK_ELECTRIC_NUMBER, datetime.datetime(2022, 7, 1), datetime.datetime(2022, 7, 6))
+        asyncio.run(repairer.run_once(now + 200))
+        assert fills["count"] == 2
+        assert repairer.given_up == {MOCK_ELECTRIC_NUMBER: [datetime.date(2022, 7, 1), datetime.date(2022, 7, 2), datetime.date(2022, 7, 3)]}
+
+    def test_background_errors(self):
+        tracker = TaipowerAMIGapTracker()
+        tracker.expect(MOCK_ELECTRIC_NUMBER, datetime.datetime(2022, 7, 4), datetime.datetime(2022, 7, 5))
+
+        api = MagicMock()
+        api.ami_period = "daily"
+        api.meters = {}
+        checks = {"count": 0}
+
+        async def mock_check(client=None):
+            checks["count"] += 1
+            raise RuntimeError("An error occurred when signing into Taipower API: Not OK")
+
+        api._async_check_before_publish.side_effect = mock_check
+        repairer = TaipowerAMIGapRepairer(api, tracker, horizon=10 * 365 * 86400)
+
+        async def main():
+            task = repairer.start(interval=0.01)
+            await asyncio.sleep(0.1)
+            repairer.stop()
+            return task
+
+        task = asyncio.run(main())
+        # Errors are logged and the repairs keep being retried.
+        assert checks["count"] > 1
+        assert repairer.failures == checks["count"]
+        assert isinstance(repairer.last_error, RuntimeError)
+        assert task.cancelled()
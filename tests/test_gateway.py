@@ -0,0 +1,148 @@
+import datetime
+import threading
+
+import httpx
+import pytest
+
+from Taipower.api import TaipowerAPI
+from Taipower.gateway import TaipowerGateway
+from Taipower.synthetic import TaipowerSyntheticFleet
+
+
+@pytest.fixture()
+def fixture_gateway():
+    today = datetime.date.today()
+    fleet = TaipowerSyntheticFleet(
+        meters_per_account=3,
+        start=today - datetime.timedelta(days=90),
+        end=today,
+        latency=0.02,
+    )
+    api = TaipowerAPI(fleet.accounts[0], "password", transport=fleet.transport())
+    with TaipowerGateway(api, ttl=60, port=0) as gateway:
+        host, port = gateway.address
+        with httpx.Client(base_url=f"http://{host}:{port}") as client:
+            yield gateway, client
+
+
+class TestTaipowerGateway:
+    def test_read_through(self, fixture_gateway):
+        gateway, client = fixture_gateway
+        assert client.get("/healthz").status_code == 200
+
+        response = client.get("/meters")
+        assert response.status_code == 200
+        meters = response.json()["meters"]
+        assert len(meters) == 3
+        assert all(meter["version"] == 1 and not meter["stale"] for meter in meters)
+        assert all("ami" not in meter for meter in meters)
+        assert gateway.upstream_refreshes == 1
+
+        electric_number = meters[0]["electric_number"]
+        meter = client.get(f"/meters/{electric_number}", params={"ami": 1}).json()
+        assert meter["version"] == 1
+        assert meter["ami_bill"] == gateway.api.meters[electric_number].ami_bill._json
+        assert len(meter["ami"]) == len(gateway.api.meters[electric_number].ami)
+        assert gateway.upstream_refreshes == 1
+        assert gateway.cache_hits == 1
+
+        # Expired data is refreshed on the next request.
+        gateway.ttl = 0
+        assert client.get(f"/meters/{electric_number}").json()["version"] == 2
+        assert gateway.upstream_refreshes == 2
+
+        assert client.get("/meters/00000000000").status_code == 404
+        assert client.get("/unknown").status_code == 404
+
+    def test_coalescing(self, fixture_gateway):
+        gateway, client = fixture_gateway
+        responses = []
+
+        def request(path):
+            responses.append(client.get(path))
+
+        gateway.api.login(fetch_data=False)
+        electric_number = list(gateway.api.meters)[0]
+        paths = ["/meters"] * 4 + [f"/meters/{electric_number}"] * 4 + ["/metrics"] * 4
+        threads = [threading.Thread(target=request, args=(path,)) for path in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(response.status_code == 200 for response in responses)
+        # One refresh of all meters may be preceded by one of a single meter.
+        assert gateway.upstream_refreshes <= 2
+        assert gateway.coalesced + gateway.cache_hits + gateway.upstream_refreshes >= len(paths)
+        assert all(meter.snapshot.version >= 1 for meter in gateway.api.meters.values())
+
+    def test_metrics(self, fixture_gateway):
+        gateway, client = fixture_gateway
+        client.get("/meters")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+
+        text = response.text
+        electric_number = list(gateway.api.meters)[0]
+        kwh = gateway.api.meters[electric_number].ami_bill.kwh
+        assert f'taipower_meter_bill_kwh{{electric_number="{electric_number}"}} {float(kwh)!r}' in text
+        assert "# TYPE taipower_gateway_upstream_refreshes_total counter" in text
+        assert 'taipower_gateway_requests_total{endpoint="meters"} 1.0' in text
+        assert text.count("# TYPE taipower_meter_version counter") == 1
+
+    def test_upstream_errors(self, fixture_gateway):
+        gateway, client = fixture_gateway
+        electric_number = client.get("/meters").json()["meters"][0]["electric_number"]
+
+        def fail(request):
+            raise httpx.ConnectError("unreachable", request=request)
+
+        gateway.api.transport = httpx.MockTransport(fail)
+        gateway.ttl = 0
+        # The last data is served and marked as stale.
+        response = client.get(f"/meters/{electric_number}")
+        assert response.status_code == 200
+        assert response.json()["version"] == 1
+        assert response.json()["stale"]
+        assert gateway.upstream_errors == 1
+
+        other = TaipowerAPI("0900000099", "password", transport=httpx.MockTransport(fail))
+        with TaipowerGateway(other, port=0) as failing:
+            host, port = failing.address
+            assert httpx.get(f"http://{host}:{port}/meters").status_code == 502
+
+    def test_retry_backoff(self):
+        today = datetime.date.today()
+        fleet = TaipowerSyntheticFleet(meters_per_account=2, start=today - datetime.timedelta(days=30), end=today)
+
+        def handler(request):
+            # Logins succeed while every field of the meters fails.
+            if request.url.path in ("/oauth/token", "/member/getData"):
+                return fleet.handler(request)
+            return httpx.Response(503, json={"error": "unavailable"})
+
+        api = TaipowerAPI(fleet.accounts[0], "password", transport=httpx.MockTransport(handler))
+        gateway = TaipowerGateway(api, ttl=60, port=0, retry_interval=10)
+        gateway.refresh()
+        assert gateway.upstream_refreshes == 1
+        assert all(meter.snapshot.version == 0 for meter in api.meters.values())
+
+        # Unpublished meters are not refreshed again until the retry interval is up.
+        gateway.refresh()
+        assert gateway.upstream_refreshes == 1
+        for number, (failed_at, failures) in list(gateway._failures.items()):
+            gateway._failures[number] = (failed_at - 10, failures)
+        gateway.refresh()
+        assert gateway.upstream_refreshes == 2
+        assert all(failures == 2 for _, failures in gateway._failures.values())
+        # The interval doubles on every consecutive failure.
+        for number, (failed_at, failures) in list(gateway._failures.items()):
+            gateway._failures[number] = (failed_at - 10, failures)
+        gateway.refresh()
+        assert gateway.upstream_refreshes == 2
+
+        api.transport = fleet.transport()
+        gateway.refresh(force=True)
+        assert all(meter.snapshot.version == 1 for meter in api.meters.values())
+        assert gateway._failures == {}
@@ -0,0 +1,31 @@
+import math
+import struct
+
+from Taipower.gorilla import decode_block, encode_block, encode_blocks
+
+
+def float32(value):
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+class TestTaipowerGorilla:
+    def test_block(self):
+        rows = []
+        epoch = 1656864000
+        for index in range(300):
+            # Irregular spacing and flag changes exercise every encoding branch.
+            epoch += 900 if index % 50 else 86400 * 40
+            values = (0.25 * (index % 7), math.nan, 0.0, 1234.5678, float(index))
+            rows.append((epoch, index % 13 == 0, values))
+
+        block = encode_block(rows)
+        assert len(block) < len(rows) * 28 / 2
+        decoded = decode_block(block)
+        assert len(decoded) == len(rows)
+        for (epoch, flags, values), (decoded_epoch, decoded_flags, decoded_values) in zip(rows, decoded):
+            assert decoded_epoch == epoch
+            assert decoded_flags == flags
+            for value, decoded_value in zip(values, decoded_values):
+                assert math.isnan(decoded_value) if math.isnan(value) else decoded_value == float32(value)
+
+        assert [len(decode_block(block)) for block in encode_blocks(rows, block_size=128)] == [128, 128, 44]
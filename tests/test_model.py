@@ -0,0 +1,39 @@
+import datetime
+
+from Taipower.model import TaipowerAMISeries, datetime_to_epoch, time_to_epoch
+
+from . import make_quarters
+
+
+class TestTaipowerAMISeries:
+    def test_epoch(self):
+        assert time_to_epoch("20220101080000") == 1640995200
+        assert datetime_to_epoch(datetime.datetime(2022, 1, 1, 8)) == 1640995200
+        assert datetime_to_epoch(datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)) == 1640995200
+
+    def test_series(self):
+        quarters = {ami.start_time: ami for ami in make_quarters(datetime.date(2022, 7, 4))}
+        keys = list(quarters)
+
+        series = TaipowerAMISeries(dict(reversed(list(quarters.items())[:10])))
+        assert list(series) == keys[:10]
+
+        # Overlapping fetches are merged without duplicates.
+        series.merge(dict(list(quarters.items())[5:20]))
+        series.merge(dict(list(quarters.items())[19:21]))
+        assert list(series) == keys[:21]
+        assert series.epochs == sorted(series.epochs)
+        assert series == {key: quarters[key] for key in keys[:21]}
+
+        series[keys[50]] = quarters[keys[50]]
+        del series[keys[0]]
+        assert list(series) == keys[1:21] + [keys[50]]
+
+        sliced = series.slice(datetime.datetime(2022, 7, 4, 1), datetime.datetime(2022, 7, 4, 2))
+        assert list(sliced) == keys[4:8]
+        assert [ami.start_time for ami in series.irange(end=datetime.datetime(2022, 7, 4, 0, 30))] == keys[1:2]
+        assert list(series.slice(start=time_to_epoch(keys[20]))) == [keys[20], keys[50]]
+
+        copied = series.copy()
+        copied.merge({keys[60]: quarters[keys[60]]})
+        assert keys[60] not in series
@@ -0,0 +1,87 @@
+import asyncio
+import datetime
+import time
+
+import pytest
+
+from Taipower import profiling
+from Taipower.api import TaipowerAPI
+from Taipower.synthetic import TaipowerSyntheticFleet
+
+
+@pytest.fixture()
+def fixture_synthetic_api():
+    fleet = TaipowerSyntheticFleet(
+        meters_per_account=3,
+        start=datetime.date(2022, 1, 1),
+        end=datetime.date(2022, 3, 31),
+        latency=0.001,
+    )
+    return TaipowerAPI(fleet.accounts[0], "password", transport=fleet.transport())
+
+
+class TestTaipowerProfile:
+    def test_spans(self):
+        assert profiling.span("send") is profiling.span("decode")
+
+        async def task():
+            with profiling.span("send"):
+                await asyncio.sleep(0.02)
+
+        async def main():
+            with profiling.span("build"):
+                await asyncio.gather(task(), task())
+
+        with profiling.TaipowerProfile() as profile:
+            profiling.run(main())
+
+        assert set(profile.stages) == {"run", "build", "send"}
+        send = profile.stages["send"]
+        assert send.count == 2
+        assert send.total >= 0.04
+        # Concurrent spans overlap, so the wall time is close to a single span.
+        assert send.wall < send.total
+        assert profile.stages["build"].exclusive < 0.01
+        assert dict(profile.folded())["run;build;send"] >= 40000
+
+        with pytest.raises(ValueError):
+            profiling.TaipowerProfile("perf")
+
+    def test_api_profile(self, fixture_synthetic_api, tmp_path):
+        api = fixture_synthetic_api
+        with api.profile() as profile:
+            api.login()
+        assert {"run", "auth", "send", "decode", "build", "assign"} <= set(profile.stages)
+        assert profile.stages["auth"].count == 1
+        assert profile.stages["decode"].count == profile.stages["send"].count
+        assert "decode" in profile.summary()
+
+        # Outside of the context nothing is recorded.
+        count = profile.stages["send"].count
+        api.get_bill_records(list(api.meters)[0])
+        assert profile.stages["send"].count == count
+
+        paths = profile.dump(str(tmp_path / "login"))
+        assert len(paths) == 2
+        with open(paths[1]) as f:
+            stack, weight = f.readline().rsplit(" ", 1)
+        assert stack.startswith("run")
+        assert int(weight) >= 0
+
+    @pytest.mark.parametrize("profiler", ["cprofile", "sampling"])
+    def test_profilers(self, fixture_synthetic_api, tmp_path, profiler):
+        api = fixture_synthetic_api
+        with api.profile(profiler, interval=0.0005) as profile:
+            api.login()
+            end = time.perf_counter() + 0.05
+            while time.perf_counter() < end:
+                pass
+
+        summary = profile.summary()
+        paths = profile.dump(str(tmp_path / profiler))
+        if profiler == "cprofile":
+            assert "function calls" in summary
+            assert paths[-1].endswith(".pstats")
+        else:
+            assert "samples" in summary
+            assert any("test_profilers" in stack for stack, _ in profile.folded())
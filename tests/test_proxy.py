@@ -0,0 +1,155 @@
+import asyncio
+import collections
+import datetime
+import time
+
+import httpx
+import pytest
+
+from Taipower import connection
+from Taipower.api import TaipowerAPI
+from Taipower.proxy import TaipowerProxyPool
+from Taipower.synthetic import TaipowerSyntheticFleet
+
+PROXIES = ["http://proxy-a:3128", "http://proxy-b:3128", "http://proxy-c:3128"]
+
+
+def make_pool(proxies=PROXIES, handler=None, down=(), **kwargs):
+    # A pool whose proxies are mock transports recording the requests they carry.
+    # Proxies in `down` fail with a connection error.
+    carried = collections.Counter()
+
+    def factory(url, asynchronous):
+        def handle(request):
+            carried[url] += 1
+            if url in down:
+                raise httpx.ConnectError("Connection refused", request=request)
+            return handler(request) if handler is not None else httpx.Response(200, json={})
+
+        if asynchronous:
+            async def async_handle(request):
+                return handle(request)
+
+            return httpx.MockTransport(async_handle)
+        return httpx.MockTransport(handle)
+
+    return TaipowerProxyPool(proxies, transport_factory=factory, **kwargs), carried
+
+
+def request(pool, count=1):
+    with httpx.Client(transport=pool) as client:
+        for _ in range(count):
+            try:
+                client.get("https://example.com/")
+            except httpx.ConnectError:
+                pass
+
+
+class TestTaipowerProxyPool:
+    def test_round_robin(self):
+        pool, carried = make_pool({PROXIES[0]: 3, PROXIES[1]: 1})
+        selected = [pool.select().url for _ in range(8)]
+        # Heavier proxies are interleaved rather than burst.
+        assert selected[:4] == [PROXIES[0], PROXIES[0], PROXIES[1], PROXIES[0]]
+        assert selected.count(PROXIES[0]) == 6
+
+        pool, carried = make_pool()
+        request(pool, 30)
+        assert carried == {url: 10 for url in PROXIES}
+        assert all(stats["in_flight"] == 0 and stats["latency"] is not None for stats in pool.stats())
+
+        with pytest.raises(ValueError):
+            TaipowerProxyPool(PROXIES, strategy="random")
+        with pytest.raises(ValueError):
+            TaipowerProxyPool([])
+
+    def test_least_latency(self):
+        pool, carried = make_pool(strategy="least_latency")
+        for proxy, latency in zip(pool.proxies, (0.5, 0.1, 0.25)):
+            proxy.latency = latency
+        assert pool.select().url == PROXIES[1]
+        assert pool.select().url == PROXIES[1]
+        # Requests in flight weigh against the fastest proxy.
+        assert pool.proxies[1].in_flight == 2
+        assert pool.select().url == PROXIES[2]
+
+        # Latencies are measured by requests.
+        pool, carried = make_pool(strategy="least_latency")
+        request(pool, 6)
+        assert all(proxy.latency is not None for proxy in pool.proxies)
+
+    def test_ejection(self):
+        down = {PROXIES[0]}
+        pool, carried = make_pool(down=down, max_failures=2, ejection_time=0.1)
+        request(pool, 30)
+        assert not pool.proxies[0].healthy
+        assert carried[PROXIES[0]] == 2
+        assert carried[PROXIES[1]] + carried[PROXIES[2]] == 28
+
+        # When the time is up a single probe is made, and failing it doubles the ejection.
+        time.sleep(0.15)
+        request(pool, 3)
+        assert carried[PROXIES[0]] == 3
+        assert pool.proxies[0].ejections == 2
+        assert pool.proxies[0].ejected_until - time.monotonic() > 0.1
+
+        # A successful probe readmits the proxy.
+        pool.proxies[0].ejected_until = time.monotonic()
+        down.clear()
+        request(pool, 3)
+        assert pool.proxies[0].healthy
+        assert pool.proxies[0].ejections == 0
+
+    def test_fail_open(self):
+        pool, carried = make_pool(down=PROXIES, max_failures=1, ejection_time=60)
+        request(pool, 3)
+        assert not any(proxy.healthy for proxy in pool.proxies)
+
+        # With every proxy ejected, requests still go to the one due back first.
+        first = min(pool.proxies, key=lambda proxy: proxy.ejected_until)
+        request(pool)
+        assert carried[first.url] == 2
+
+    def test_failure_status(self):
+        pool, carried = make_pool(handler=lambda request: httpx.Response(503), max_failures=3)
+        request(pool, 9)
+        assert not any(proxy.healthy for proxy in pool.proxies)
+        assert all(stats["failures"] == 3 for stats in pool.stats())
+
+    def test_health_check(self):
+        pool, carried = make_pool(down=(PROXIES[2],))
+        assert pool.health_check("https://example.com/") == {PROXIES[0]: True, PROXIES[1]: True, PROXIES[2]: False}
+        assert [proxy.healthy for proxy in pool.proxies] == [True, True, False]
+
+        pool.start_health_checks("https://example.com/", interval=0.01)
+        with pytest.raises(RuntimeError):
+            pool.start_health_checks("https://example.com/")
+        time.sleep(0.1)
+        pool.finish()
+        assert carried[PROXIES[0]] > 1
+
+    def test_api(self):
+        fleet = TaipowerSyntheticFleet(meters_per_account=2, start=datetime.date(2022, 1, 1), end=datetime.date(2022, 1, 31))
+        pool, carried = make_pool(handler=fleet.handler)
+        api = TaipowerAPI(fleet.accounts[0], "password", proxies=pool)
+        api.login()
+        assert len(api.meters) == 2
+        # The requests of the sync API and of every event loop it runs are spread over the proxies.
+        assert set(carried) == set(PROXIES)
+        assert sum(carried.values()) == sum(stats["requests"] for stats in pool.stats())
+
+        async def main():
+            async with httpx.AsyncClient(transport=pool) as client:
+                await asyncio.gather(*[client.get("https://example.com/") for _ in range(3)])
+
+        asyncio.run(main())
+        assert pool.proxies[0].in_flight == 0
+        # The connection pools of a loop are closed with its clients.
+        assert pool._async_transports._loops == {}
+
+        # A single proxy is used by the clients of the connection rather than by a pool.
+        conn = connection.TaipowerConnection(fleet.accounts[0], "password", proxy="10.0.0.1:3128", auto_login=False)
+        assert conn._proxy == "http://10.0.0.1:3128" and conn._transport is None
+
+        with pytest.raises(ValueError):
+            TaipowerAPI(fleet.accounts[0], "password", transport=fleet.transport(), proxies=pool)
@@ -0,0 +1,101 @@
+import datetime
+import time
+from dataclasses import replace
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+
+from Taipower.api import REAUTH_MARGIN, TaipowerAPI
+from Taipower.synthetic import TaipowerSyntheticFleet
+
+
+def make_api(reject=()):
+    # An API whose transport records the grant of every login and rejects the grants in `reject`.
+    fleet = TaipowerSyntheticFleet(meters_per_account=1, start=datetime.date(2022, 1, 1), end=datetime.date(2022, 1, 31))
+    grants = []
+
+    def handler(request):
+        if request.url.path == "/oauth/token":
+            grant = dict(parse_qsl(request.content.decode()))["grant_type"]
+            grants.append(grant)
+            if grant in reject:
+                return httpx.Response(400, json={"error": "invalid_grant", "error_description": "Rejected"})
+        return fleet.handler(request)
+
+    api = TaipowerAPI(fleet.accounts[0], "password", transport=httpx.MockTransport(handler))
+    return api, grants
+
+
+def expire_soon(api):
+    api._taipower_tokens = replace(api._taipower_tokens, expiration=time.time() + REAUTH_MARGIN + 1)
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end
+        time.sleep(0.01)
+
+
+class TestTaipowerTokenRefresher:
+    def test_refresh_token(self):
+        api, grants = make_api()
+        api.login(fetch_data=False)
+        assert grants == ["password"]
+
+        with api.start_token_refresher(ahead=0, jitter=0) as refresher:
+            # Fresh tokens are not renewed.
+            assert refresher.next_refresh_at is None or refresher.next_refresh_at > time.time() + 3600
+            tokens = api._taipower_tokens
+            expire_soon(api)
+            refresher.stop()
+            refresher.start()
+            wait_for(lambda: refresher.refreshes == 1)
+
+        assert not refresher.running
+        assert grants == ["password", "refresh_token"]
+        assert api._taipower_tokens is not tokens
+        assert not api._need_reauth()
+        assert refresher.fallbacks == 0
+
+        # Requests no longer reauthenticate on their own.
+        api.refresh_status()
+        assert grants == ["password", "refresh_token"]
+
+    def test_fallback(self):
+        api, grants = make_api(reject=("refresh_token",))
+        api.login(fetch_data=False)
+        expire_soon(api)
+
+        with api.start_token_refresher(ahead=0, jitter=0) as refresher:
+            wait_for(lambda: refresher.refreshes == 1)
+        assert grants == ["password", "refresh_token", "password"]
+        assert refresher.fallbacks == 1
+        assert not api._need_reauth()
+
+    def test_failure(self):
+        api, grants = make_api()
+        api.login(fetch_data=False)
+        api.transport = httpx.MockTransport(lambda request: httpx.Response(503, json={"error": "unavailable"}))
+        expire_soon(api)
+
+        with api.start_token_refresher(ahead=0, jitter=0, retry_interval=0.01) as refresher:
+            wait_for(lambda: refresher.failures >= 2)
+        assert refresher.refreshes == 0
+        assert isinstance(refresher.last_error, RuntimeError)
+
+        with pytest.raises(RuntimeError):
+            refresher.start()
+            refresher.start()
+        refresher.stop()
+
+    def test_jitter(self):
+        api, _ = make_api()
+        api.login(fetch_data=False)
+        refresher = api.start_token_refresher(ahead=600, jitter=300)
+        refresher.stop()
+        lifetime = api._taipower_tokens.expiration - time.time()
+        delays = [refresher.delay() for _ in range(50)]
+        assert all(lifetime - REAUTH_MARGIN - 900 - 1 <= delay <= lifetime - REAUTH_MARGIN - 600 for delay in delays)
+        assert len(set(delays)) > 1
@@ -0,0 +1,55 @@
+import datetime
+
+from Taipower.rollup import TaipowerAMIRollup, tou_bucket
+
+from . import make_quarters
+
+
+class TestTaipowerAMIRollup:
+    def test_tou_bucket(self):
+        # 2022/07/04 is a summer Monday, 2022/07/09 a Saturday and 2022/07/10 a Sunday.
+        assert tou_bucket(datetime.datetime(2022, 7, 4, 8, 45)) == "offpeak"
+        assert tou_bucket(datetime.datetime(2022, 7, 4, 9, 0)) == "halfpeak"
+        assert tou_bucket(datetime.datetime(2022, 7, 4, 16, 0)) == "peak"
+        assert tou_bucket(datetime.datetime(2022, 7, 4, 22, 0)) == "halfpeak"
+        assert tou_bucket(datetime.datetime(2022, 7, 9, 12, 0)) == "satpeak"
+        assert tou_bucket(datetime.datetime(2022, 7, 10, 18, 0)) == "offpeak"
+        # 2022/01/03 is a non-summer Monday.
+        assert tou_bucket(datetime.datetime(2022, 1, 3, 12, 0)) == "offpeak"
+        assert tou_bucket(datetime.datetime(2022, 1, 3, 18, 0)) == "halfpeak"
+
+    def test_rollup(self):
+        ami_rollup = TaipowerAMIRollup()
+        ami_rollup.add(make_quarters(datetime.date(2022, 7, 4)))
+        ami_rollup.add(make_quarters(datetime.date(2022, 7, 5), missing=(0,)))
+
+        hourly = ami_rollup.get("hour")
+        assert len(hourly) == 48
+        assert hourly["20220704160000"].total_kwh == 1.0
+        assert hourly["20220704160000"].peak_kwh == 1.0
+        assert hourly["20220704160000"].end_time == "20220704170000"
+        assert hourly["20220705000000"].is_missing_data
+
+        daily = ami_rollup.get("daily")
+        assert daily["20220704000000"].total_kwh == 24.0
+        assert daily["20220704000000"].offpeak_kwh == 9.0
+        assert daily["20220704000000"].halfpeak_kwh == 9.0
+        assert daily["20220704000000"].peak_kwh == 6.0
+        assert not daily["20220704000000"].is_missing_data
+        assert daily["20220705000000"].is_missing_data
+
+        monthly = ami_rollup.get("monthly")
+        assert monthly["20220701000000"].total_kwh == 47.75
+        assert monthly["20220701000000"].end_time == "20220801000000"
+        assert monthly["20220701000000"].is_missing_data
+
+        assert ami_rollup.missing_dates(datetime.date(2022, 7, 4), datetime.date(2022, 7, 6)) == [
+            datetime.date(2022, 7, 5), datetime.date(2022, 7, 6)
+        ]
+
+        # Recorded data replaces the missing quarter incrementally.
+        ami_rollup.add(make_quarters(datetime.date(2022, 7, 5))[:1])
+        assert len(ami_rollup) == 192
+        assert ami_rollup.get("daily")["20220705000000"].total_kwh == 24.0
+        assert not ami_rollup.get("daily")["20220705000000"].is_missing_data
+        assert ami_rollup.missing_dates(datetime.date(2022, 7, 4), datetime.date(2022, 7, 5)) == []
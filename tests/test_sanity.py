@@ -1,4 +1,5 @@
 import os
+import subprocess
 import sys
 
 from Taipower import __author__, __version__
@@ -10,8 +11,33 @@ sys.path.append(os.path.join(git_repo_path, "docs", "source"))
 
 import conf
 
+IMPORT_TIME_BUDGET_US = 500000 # loose upper bound for slow CI runners; the module check below is the strict guard.
+
 
 class TestSanity:
     def test_annotions_consistency(self):
         assert __author__ == conf.author
         assert f"v{__version__}" == conf.release
+
+    def test_import_time(self):
+        code = (
+            "import sys, Taipower.api; "
+            "print(','.join(m for m in ('httpx', 'Cryptodome', 'uuid') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=git_repo_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert result.stdout.strip() == "", f"Heavy modules imported eagerly: {result.stdout.strip()}"
+
+        cumulative = None
+        for line in result.stderr.splitlines():
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) == 3 and fields[2] == "Taipower.api":
+                cumulative = int(fields[1])
+        assert cumulative is not None
+        assert cumulative < IMPORT_TIME_BUDGET_US, f"`import Taipower.api` took {cumulative} us."
@@ -0,0 +1,147 @@
+import datetime
+import multiprocessing
+import os
+import sys
+import threading
+
+import pytest
+
+from Taipower.api import TaipowerAPI
+from Taipower.shared import TaipowerSharedMeterState
+from Taipower.synthetic import TaipowerSyntheticFleet
+
+
+@pytest.fixture(scope="module")
+def fixture_api():
+    fleet = TaipowerSyntheticFleet(
+        meters_per_account=3,
+        start=datetime.date(2022, 1, 1),
+        end=datetime.date(2022, 3, 31),
+    )
+    api = TaipowerAPI(fleet.accounts[0], "password", transport=fleet.transport())
+    api.login()
+    for electric_number, meter in api.meters.items():
+        meter.ami = api.get_ami_range(electric_number, datetime.datetime(2022, 1, 1), datetime.datetime(2022, 3, 1))
+    return api
+
+
+def _read_in_child(name, electric_number, queue):
+    with TaipowerSharedMeterState(name) as state:
+        meter = state.meter(electric_number)
+        queue.put((state.version, len(meter.ami), meter.ami_bill.kwh, state.electric_numbers()))
+
+
+class TestTaipowerSharedMeterState:
+    def test_publish(self, fixture_api):
+        api = fixture_api
+        with TaipowerSharedMeterState(create=True, size=1024 * 1024, ami_period=api.ami_period) as state:
+            assert state.version == 0
+            assert state.meters() == {}
+            assert state.publish(api.meters) == 1
+
+            with TaipowerSharedMeterState(state.name) as reader:
+                assert reader.version == 1
+                assert reader.period == api.ami_period
+                assert reader.electric_numbers() == sorted(api.meters)
+                assert reader.meter("00000000000") is None
+
+                electric_number = list(api.meters)[0]
+                expected = api.meters[electric_number]
+                meter = reader.meter(electric_number)
+                assert meter.version == 1
+                assert meter.meter_json == expected._json
+                assert meter.ami_bill.kwh == expected.ami_bill.kwh
+                assert meter.ami_unbilled._json == expected.ami_unbilled._json
+                assert list(meter.bill_records) == list(expected.bill_records)
+                assert len(meter.ami) == 59
+                assert list(meter.ami) == list(expected.ami)
+                last = list(expected.ami)[-1]
+                assert meter.ami[last].total_kwh == pytest.approx(expected.ami[last].total_kwh)
+
+                view = meter.ami_view.to_numpy()
+                assert len(view) == len(expected.ami)
+                assert not view.flags.writeable
+
+                copy = meter.to_meter()
+                assert copy.number == electric_number
+                assert copy.snapshot.bill_records is not None
+
+                assert set(reader.meters()) == set(api.meters)
+                assert state.publish(api.meters) == 2
+                assert reader.meter(electric_number).version == 2
+
+    def test_unloaded(self, fixture_api):
+        api = fixture_api
+        electric_number = list(api.meters)[0]
+        meters = {electric_number: api.meters[electric_number].__class__(api.meters[electric_number]._json)}
+        with TaipowerSharedMeterState(create=True, size=64 * 1024) as state:
+            state.publish(meters)
+            meter = state.meter(electric_number)
+            assert meter.ami is None
+            assert meter.ami_view is None
+            assert meter.ami_bill is None
+            assert meter.bill_records is None
+
+            with TaipowerSharedMeterState(create=True, size=64) as small, pytest.raises(ValueError):
+                small.publish(meters)
+            assert state.version == 1
+
+    def test_other_process(self, fixture_api):
+        api = fixture_api
+        electric_number = list(api.meters)[1]
+        context = multiprocessing.get_context("spawn")
+        with TaipowerSharedMeterState(create=True, size=1024 * 1024, ami_period=api.ami_period) as state:
+            state.publish(api.meters)
+            queue = context.Queue()
+            process = context.Process(target=_read_in_child, args=(state.name, electric_number, queue))
+            process.start()
+            version, ami_count, kwh, electric_numbers = queue.get(timeout=60)
+            process.join(60)
+
+        assert process.exitcode == 0
+        assert version == 1
+        assert ami_count == len(api.meters[electric_number].ami)
+        assert kwh == api.meters[electric_number].ami_bill.kwh
+        assert electric_numbers == sorted(api.meters)
+
+    def test_attach(self, fixture_api, monkeypatch):
+        from multiprocessing import resource_tracker
+
+        registered = []
+        monkeypatch.setattr(resource_tracker, "register", lambda name, rtype: registered.append(name))
+        with TaipowerSharedMeterState(create=True, size=1024 * 1024, ami_period=fixture_api.ami_period) as state:
+            state.publish(fixture_api.meters)
+            registered.clear()
+            with TaipowerSharedMeterState(state.name) as reader:
+                assert reader.name == state.name
+                assert reader._segment.buf.readonly == (sys.version_info < (3, 13) and os.name != "nt")
+                assert reader.electric_numbers() == sorted(fixture_api.meters)
+            assert registered == []
+            assert state.meter(list(fixture_api.meters)[0]) is not None
+
+        with pytest.raises(FileNotFoundError):
+            TaipowerSharedMeterState(state.name)
+
+    def test_concurrent_publications(self, fixture_api):
+        api = fixture_api
+        with TaipowerSharedMeterState(create=True, size=1024 * 1024, ami_period=api.ami_period) as state:
+            state.publish(api.meters)
+            stop = threading.Event()
+
+            def publisher():
+                while not stop.is_set():
+                    state.publish(api.meters)
+
+            thread = threading.Thread(target=publisher)
+            thread.start()
+            try:
+                with TaipowerSharedMeterState(state.name) as reader:
+                    for _ in range(200):
+                        meters = reader.meters()
+                        # Every meter of a read comes from the same publication.
+                        assert len({meter.version for meter in meters.values()}) == 1
+                        assert all(len(meter.ami) == len(api.meters[number].ami) for number, meter in meters.items())
+            finally:
+                stop.set()
+                thread.join()
+            assert state.version > 1
@@ -0,0 +1,118 @@
+import datetime
+import os
+import pytest
+
+from Taipower.model import TaipowerAMI
+from Taipower.storage import HEADER, ROW, TaipowerAMICompressedFile, TaipowerAMIFile, TaipowerAMIStore, write_ami, write_compressed_ami
+
+from . import MOCK_ELECTRIC_NUMBER, make_quarters
+
+
+class TestTaipowerAMIStore:
+    @pytest.mark.parametrize("compressed", [False, True])
+    def test_write_read(self, tmp_path, compressed):
+        store = TaipowerAMIStore(str(tmp_path), compressed=compressed)
+        first = make_quarters(datetime.date(2022, 7, 4), kwh=0.1, missing=(3,))
+        second = make_quarters(datetime.date(2022, 7, 5), kwh=0.3)
+
+        assert store.write(MOCK_ELECTRIC_NUMBER, "quater", first) == 96
+        # Appending is append-only on disk.
+        assert store.write(MOCK_ELECTRIC_NUMBER, "quater", {ami.start_time: ami for ami in second}) == 192
+        path = store.path(MOCK_ELECTRIC_NUMBER, "quater")
+        if compressed:
+            assert os.path.getsize(path) < (HEADER.size + 192 * ROW.size) / 4
+        else:
+            assert os.path.getsize(path) == HEADER.size + 192 * ROW.size
+        assert store.electric_numbers("quater") == [MOCK_ELECTRIC_NUMBER]
+
+        series = store.load(MOCK_ELECTRIC_NUMBER, "quater")
+        assert list(series) == [ami.start_time for ami in first + second]
+        assert series[first[0].start_time]._json == first[0]._json
+        assert series[first[3].start_time].is_missing_data
+        assert series[second[0].start_time].total_kwh == 0.3
+
+        # Known quarters are overwritten in place, older ones rewrite the file.
+        filled = make_quarters(datetime.date(2022, 7, 4), kwh=0.1)[3:4]
+        older = make_quarters(datetime.date(2022, 7, 3))
+        assert store.write(MOCK_ELECTRIC_NUMBER, "quater", filled) == 192
+        assert store.write(MOCK_ELECTRIC_NUMBER, "quater", older) == 288
+        series = store.load(MOCK_ELECTRIC_NUMBER, "quater", datetime.datetime(2022, 7, 4), datetime.datetime(2022, 7, 5))
+        assert len(series) == 96
+        assert not series[first[3].start_time].is_missing_data
+
+        with pytest.raises(ValueError):
+            (write_compressed_ami if compressed else write_ami)(path, first, "daily")
+
+    @pytest.mark.parametrize("compressed", [False, True])
+    @pytest.mark.parametrize("replaceable", [True, False])
+    def test_rewrite_with_open_reader(self, tmp_path, monkeypatch, compressed, replaceable):
+        store = TaipowerAMIStore(str(tmp_path), compressed=compressed)
+        store.write(MOCK_ELECTRIC_NUMBER, "quater", make_quarters(datetime.date(2022, 7, 4), kwh=0.1))
+        if not replaceable:
+            def replace(src, dst):
+                raise PermissionError(13, "The process cannot access the file", dst)
+
+            # As on Windows, where a mapped file cannot be replaced.
+            monkeypatch.setattr(os, "replace", replace)
+
+        reader = store.open(MOCK_ELECTRIC_NUMBER, "quater")
+        try:
+            assert store.write(MOCK_ELECTRIC_NUMBER, "quater", make_quarters(datetime.date(2022, 7, 3), kwh=0.2)) == 192
+            if replaceable:
+                assert len(reader) == 96
+                assert reader.to_series()["20220704000000"].total_kwh == pytest.approx(0.1)
+        finally:
+            reader.close()
+
+        assert not os.path.exists(store.path(MOCK_ELECTRIC_NUMBER, "quater") + ".tmp")
+        series = store.load(MOCK_ELECTRIC_NUMBER, "quater")
+        assert len(series) == 192
+        assert series["20220703000000"].total_kwh == pytest.approx(0.2)
+        assert series["20220704000000"].total_kwh == pytest.approx(0.1)
+
+    def test_compressed_blocks(self, tmp_path):
+        path = str(tmp_path / "quater.amiz")
+        for day in range(1, 15):
+            write_compressed_ami(path, make_quarters(datetime.date(2022, 7, day)), "quater")
+        with TaipowerAMICompressedFile(path) as ami_file:
+            assert len(ami_file) == 14 * 96
+            # Appends fill the last block up before starting another.
+            assert [rows for _, _, rows in ami_file.blocks] == [672, 672]
+            rows = list(ami_file.rows(datetime.datetime(2022, 7, 8, 23), datetime.datetime(2022, 7, 9, 1)))
+            assert len(rows) == 8
+
+    def test_daily(self, tmp_path):
+        ami_json = {
+            "startTime": "20220401000000",
+            "endTime": "20220402000000",
+            "isMssingData": 0,
+            "offPeakKwh": 25.2,
+            "halfPeakKwh": 0.0,
+            "satPeakKwh": 0.0,
+            "peakTimeKwh": 0.0,
+            "totalKwh": 23.2,
+        }
+        path = str(tmp_path / "daily.ami")
+        write_ami(path, [TaipowerAMI(ami_json)], "daily")
+        with TaipowerAMIFile(path) as ami_file:
+            assert ami_file.period == "daily"
+            assert ami_file.to_series()["20220401000000"]._json == ami_json
+
+        with open(path, "r+b") as f:
+            f.write(b"XXXX")
+        with pytest.raises(ValueError, match="Not an AMI file"):
+            TaipowerAMIFile(path)
+
+    def test_to_numpy(self, tmp_path):
+        np = pytest.importorskip("numpy")
+        store = TaipowerAMIStore(str(tmp_path))
+        store.write(MOCK_ELECTRIC_NUMBER, "quater", make_quarters(datetime.date(2022, 7, 4), missing=(0,)))
+        ami_file = store.open(MOCK_ELECTRIC_NUMBER, "quater")
+        array = ami_file.to_numpy()
+        assert len(array) == 96
+        assert np.all(np.diff(array["offset"]) == 900)
+        assert array["flags"][0] == 1
+        assert float(array["total"][1:].sum()) == 95 * 0.25
+        assert np.isnan(array["peak"]).all()
+        del array
+        ami_file.close()
@@ -0,0 +1,91 @@
+import datetime
+
+import pytest
+
+from Taipower.api import TaipowerAPI, TaipowerElectricMeter
+from Taipower.billing import TaipowerBillingCycleIndex
+from Taipower.model import TaipowerAMI
+from Taipower.synthetic import TaipowerSyntheticFleet
+
+
+@pytest.fixture()
+def fixture_fleet():
+    return TaipowerSyntheticFleet(
+        accounts=3,
+        meters_per_account=4,
+        start=datetime.date(2022, 1, 1),
+        end=datetime.date(2022, 12, 31),
+        missing_rate=0.2,
+        seed=7,
+    )
+
+
+class TestTaipowerSyntheticFleet:
+    def test_meter_list(self, fixture_fleet):
+        fleet = fixture_fleet
+        assert len(fleet) == 12
+
+        meters = TaipowerElectricMeter.from_electric_meter_list(fleet.meter_list(fleet.accounts[1]))
+        assert list(meters) == fleet.electric_numbers(fleet.accounts[1])
+        assert all(meter.number_verified for meter in meters.values())
+
+    def test_amis(self, fixture_fleet):
+        fleet = fixture_fleet
+        electric_number = fleet.electric_numbers(fleet.accounts[0])[0]
+        dt = datetime.datetime(2022, 7, 4)
+
+        quarters = fleet.amis(electric_number, "quater", dt)
+        assert quarters == fleet.amis(electric_number, "quater", dt)
+        assert len(quarters) == 96
+        hours = fleet.amis(electric_number, "hour", dt)
+        assert len(hours) == 24
+        assert sum(ami["totalKwh"] for ami in hours) == pytest.approx(sum(ami["kwh"] for ami in quarters))
+
+        days = TaipowerAMI.from_amis({"data": {"data": fleet.amis(electric_number, "daily", dt)}})
+        assert len(days) == 31
+        day = days["20220704000000"]
+        assert day.total_kwh == pytest.approx(sum(ami["kwh"] for ami in quarters))
+        assert day.total_kwh == pytest.approx(day.offpeak_kwh + day.halfpeak_kwh + day.satpeak_kwh + day.peak_kwh)
+
+        months = fleet.amis(electric_number, "monthly", dt)
+        assert len(months) == 12
+        assert months[6]["totalKwh"] == pytest.approx(sum(ami.total_kwh for ami in days.values()))
+        # Summer months consume more than winter months.
+        assert months[6]["totalKwh"] > months[0]["totalKwh"]
+
+        missing = [
+            ami for date in range(1, 32)
+            for ami in fleet.amis(electric_number, "quater", datetime.datetime(2022, 1, date))
+            if ami["isMssingData"] == 1
+        ]
+        assert len(missing) != 0
+        assert fleet.amis(electric_number, "daily", datetime.datetime(2023, 1, 1)) == []
+
+        other = TaipowerSyntheticFleet(accounts=3, meters_per_account=4, start=fleet.start, end=fleet.end, seed=8)
+        assert other.amis(electric_number, "quater", dt) != quarters
+
+    def test_api(self, fixture_fleet):
+        fleet = fixture_fleet
+        api = TaipowerAPI(fleet.accounts[2], "password", transport=fleet.transport())
+        api.login(fetch_data=False)
+        assert list(api.meters) == fleet.electric_numbers(fleet.accounts[2])
+
+        electric_number = list(api.meters)[0]
+        meter = api.meters[electric_number]
+        meter.ami_bill = api.get_ami_bill(electric_number)
+        meter.ami_unbilled = api.get_ami_unbilled(electric_number)
+        meter.bill_records = api.get_bill_records(electric_number)
+        assert len(meter.bill_records) == 5
+        assert all(record.charge > 0 for record in meter.bill_records.values())
+
+        amis = api.get_ami_range(electric_number, datetime.datetime(2022, 1, 1), datetime.datetime(2023, 1, 1), ami_period="daily")
+        assert len(amis) == 365
+        index = TaipowerBillingCycleIndex.from_meter(meter)
+        reconciliations = index.reconcile(amis.values(), rel_tol=0.05)
+        assert len(reconciliations) != 0
+        assert all(reconciliation.matched for reconciliation in reconciliations)
+
+        with pytest.raises(RuntimeError):
+            api.get_ami_bill(fleet.electric_numbers(fleet.accounts[0])[0])
+        with pytest.raises(RuntimeError):
+            TaipowerAPI("0900000099", "password", transport=fleet.transport()).login()
@@ -0,0 +1,68 @@
+import datetime
+
+import pytest
+
+from Taipower.rollup import TaipowerAMIRollup
+from Taipower.tariff import TaipowerTariff, compare_schedules, cross_check, get_rate_table
+
+from . import make_quarters
+
+
+class TestTaipowerTariff:
+    def test_get_rate_table(self):
+        assert get_rate_table("residential", datetime.date(2020, 5, 27)).effective == datetime.date(2018, 4, 1)
+        assert get_rate_table("residential", datetime.date(2024, 4, 1)).effective == datetime.date(2024, 4, 1)
+
+        with pytest.raises(ValueError, match="No `tou3` rate table"):
+            get_rate_table("tou3", datetime.date(2000, 1, 1))
+        with pytest.raises(ValueError, match="schedule accepts either"):
+            TaipowerTariff("business")
+
+    def test_residential_cost(self):
+        # Reproduces the bill record `109/05/27~109/07/26`, 1374 kwh, 4329.2 dollars.
+        tariff = TaipowerTariff()
+        cost = tariff.residential_cost(1374, datetime.date(2020, 5, 27), datetime.date(2020, 7, 26))
+        assert cost == pytest.approx(4329.2, abs=0.1)
+        assert cross_check(cost, 4329)[0]
+        assert not cross_check(cost, 5000)[0]
+
+    def test_tou_cost(self):
+        ami_rollup = TaipowerAMIRollup()
+        for day in range(1, 32):
+            ami_rollup.add(make_quarters(datetime.date(2024, 7, day)))
+        daily = list(ami_rollup.get("daily").values())
+        start, end = datetime.date(2024, 7, 1), datetime.date(2024, 7, 31)
+
+        costs = compare_schedules(daily, start, end)
+        tariff = TaipowerTariff("tou3")
+        sums = tariff.bucket_kwh(daily)
+        assert sum(sums.values()) == pytest.approx(24.0 * 31)
+        assert sums[(False, "peak")] == 0.0
+        expected = 75.0 + sums[(True, "offpeak")] * 1.96 + (sums[(True, "halfpeak")] + sums[(True, "satpeak")]) * 4.69 + sums[(True, "peak")] * 7.13
+        assert costs["tou3"] == pytest.approx(expected)
+        assert costs["residential"] == pytest.approx(TaipowerTariff().residential_cost(24.0 * 31, start, end))
+
+        assert tariff.costs({"a": daily, "b": daily[:1]}, start, end)["a"] == pytest.approx(expected)
+
+    @pytest.mark.parametrize("schedule", ["residential", "tou2", "tou3"])
+    def test_numpy_costs(self, schedule, monkeypatch):
+        pytest.importorskip("numpy")
+        from Taipower import tariff as tariff_module
+
+        series = {}
+        for index, first in enumerate([datetime.date(2024, 5, 1), datetime.date(2024, 5, 10), datetime.date(2024, 10, 1)]):
+            ami_rollup = TaipowerAMIRollup()
+            for offset in range(20 + index):
+                ami_rollup.add(make_quarters(first + datetime.timedelta(days=offset)))
+            series[str(index)] = list(ami_rollup.get("hour").values())
+        series["empty"] = []
+        start, end = datetime.date(2024, 5, 1), datetime.date(2024, 6, 30)
+        tariff = TaipowerTariff(schedule)
+
+        costs = tariff.costs(series, start, end)
+        sums = tariff.bucket_kwh(series["1"], get_rate_table("tou3", start))
+        monkeypatch.setattr(tariff_module, "_numpy", lambda: None)
+        assert costs == pytest.approx(tariff.costs(series, start, end))
+        assert costs["0"] == pytest.approx(tariff.cost(series["0"], start, end))
+        assert sums == pytest.approx(tariff.bucket_kwh(series["1"], get_rate_table("tou3", start)))
+        assert sums[(True, "peak")] > 0.0 and sums[(False, "halfpeak")] > 0.0
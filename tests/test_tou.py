@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+
+from Taipower.tou import BUCKETS, TaipowerTOUCalendar, classify, classify_start_times, get_calendar, holidays
+
+
+class TestTaipowerTOUCalendar:
+    def test_holidays(self):
+        dates = holidays(2024)
+        assert datetime.date(2024, 2, 9) in dates # Lunar New Year's Eve
+        assert datetime.date(2024, 2, 12) in dates
+        assert datetime.date(2024, 6, 10) in dates
+        assert datetime.date(2024, 10, 10) in dates
+        assert datetime.date(2024, 2, 13) not in dates
+        # The eve of Lunar New Year 2025 falls in 2025, the one of 2021 falls in 2021.
+        assert datetime.date(2020, 2, 11) not in holidays(2020)
+        assert datetime.date(2021, 2, 11) in holidays(2021)
+
+    def test_classify(self):
+        calendar = get_calendar(2024)
+        assert len(calendar.table) == 366 * 96
+        # 2024/06/11 is a summer Tuesday, 2024/06/10 is the Dragon Boat Festival.
+        assert classify(datetime.datetime(2024, 6, 11, 17, 30)) == "peak"
+        assert classify(datetime.datetime(2024, 6, 10, 17, 30)) == "offpeak"
+        assert classify(datetime.datetime(2024, 6, 15, 17, 30)) == "satpeak"
+        # Summer starts on May 16.
+        assert classify(datetime.datetime(2024, 5, 15, 17, 30)) == "halfpeak"
+        assert classify(datetime.datetime(2024, 5, 16, 17, 30)) == "peak"
+        assert classify(datetime.datetime(2024, 12, 31, 23, 45)) == "halfpeak"
+
+        assert classify_start_times(["20240611173000", "20240610173000"]) == ["peak", "offpeak"]
+
+        # Summer follows the rate table in effect, which ran from June 1 to September 30 before 2024.
+        assert classify(datetime.datetime(2022, 5, 31, 17, 30)) == "halfpeak"
+        assert classify(datetime.datetime(2022, 6, 1, 17, 30)) == "peak"
+        assert classify(datetime.datetime(2022, 10, 3, 17, 30)) == "halfpeak"
+        assert TaipowerTOUCalendar(2022, summer=((5, 16), (10, 15))).bucket(datetime.datetime(2022, 10, 3, 17, 30)) == "peak"
+
+        typhoon = TaipowerTOUCalendar(2024, extra_holidays=[datetime.date(2024, 6, 11)])
+        assert typhoon.bucket(datetime.datetime(2024, 6, 11, 17, 30)) == "offpeak"
+
+    def test_classify_epochs(self):
+        calendar = get_calendar(2024)
+        start = datetime.datetime(2024, 6, 11, tzinfo=datetime.timezone(datetime.timedelta(hours=8)))
+        epochs = [int(start.timestamp()) + 900 * index for index in range(96)]
+        codes = calendar.classify_epochs(epochs)
+        assert [BUCKETS[code] for code in codes] == [
+            classify(datetime.datetime(2024, 6, 11) + datetime.timedelta(minutes=15 * index)) for index in range(96)
+        ]
+
+        # Epochs of another year are rejected rather than wrapped around.
+        year_start = int(datetime.datetime(2024, 1, 1, tzinfo=start.tzinfo).timestamp())
+        year_end = int(datetime.datetime(2025, 1, 1, tzinfo=start.tzinfo).timestamp())
+        assert len(calendar.classify_epochs([year_start, year_end - 900])) == 2
+        for epoch in (year_start - 900, year_end):
+            with pytest.raises(ValueError):
+                calendar.classify_epochs([epoch])
+
+        np = pytest.importorskip("numpy")
+        assert calendar.classify_epochs(np.array(epochs)).tolist() == list(codes)
+        for epoch in (year_start - 900, year_end):
+            with pytest.raises(ValueError):
+                calendar.classify_epochs(np.array([epoch]))
+
+    def test_unknown_lunar_holidays(self):
+        with pytest.warns(UserWarning, match="2030"):
+            dates = holidays(2030)
+        assert dates == {datetime.date(2030, month, day) for month, day in ((1, 1), (2, 28), (4, 4), (5, 1), (10, 10))}
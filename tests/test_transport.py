@@ -0,0 +1,158 @@
+import asyncio
+import datetime
+import gzip
+import sys
+import types
+
+import httpx
+import pytest
+
+from Taipower import transport
+from Taipower.api import TaipowerAPI
+from Taipower.gateway import TaipowerGateway
+from Taipower.synthetic import TaipowerSyntheticFleet
+from Taipower.transport import TaipowerTransport
+
+
+def gzip_handler(handler, accepted):
+    # Compresses the responses of `handler` when asked to, recording the accepted encodings.
+    def handle(request):
+        accepted.append(request.headers.get("accept-encoding"))
+        response = handler(request)
+        if "gzip" not in request.headers.get("accept-encoding", ""):
+            return response
+        return httpx.Response(
+            response.status_code,
+            headers={"content-type": "application/json", "content-encoding": "gzip"},
+            content=gzip.compress(response.content),
+            extensions={"http_version": b"HTTP/2"},
+        )
+
+    return handle
+
+
+def payload(request):
+    return httpx.Response(200, json={"values": list(range(200))})
+
+
+class TestTaipowerTransport:
+    def test_accept_encoding(self, monkeypatch):
+        monkeypatch.setattr(transport, "_accept_encoding", None)
+        monkeypatch.setitem(sys.modules, "brotli", None)
+        monkeypatch.setitem(sys.modules, "brotlicffi", None)
+        assert transport.accept_encoding() == "gzip"
+
+        monkeypatch.setattr(transport, "_accept_encoding", None)
+        monkeypatch.setitem(sys.modules, "brotli", types.ModuleType("brotli"))
+        assert transport.accept_encoding() == "gzip, br"
+
+    def test_compression(self):
+        accepted = []
+        taipower_transport = TaipowerTransport(httpx.MockTransport(gzip_handler(payload, accepted)))
+        with httpx.Client(transport=taipower_transport) as client:
+            response = client.get("https://example.com/")
+        assert response.json() == {"values": list(range(200))}
+        assert "content-encoding" not in response.headers
+        assert accepted == [transport.accept_encoding()]
+
+        async def main():
+            async with httpx.AsyncClient(transport=taipower_transport) as client:
+                responses = await asyncio.gather(*[client.get("https://example.com/") for _ in range(3)])
+            return [response.json() for response in responses]
+
+        assert asyncio.run(main()) == [{"values": list(range(200))}] * 3
+
+        stats = taipower_transport.stats()
+        assert stats["requests"] == 4
+        assert stats["encodings"] == {"gzip": 4}
+        assert stats["http_versions"] == {"HTTP/2": 4}
+        assert stats["bytes_decoded"] == 4 * len(payload(None).content)
+        assert stats["bytes_saved"] == stats["bytes_decoded"] - stats["bytes_received"] > 0
+        assert taipower_transport.bytes_saved == stats["bytes_saved"]
+
+        accepted = []
+        taipower_transport = TaipowerTransport(httpx.MockTransport(gzip_handler(payload, accepted)), compression=False)
+        with httpx.Client(transport=taipower_transport) as client:
+            client.get("https://example.com/")
+        assert accepted == ["identity"]
+        assert taipower_transport.stats()["encodings"] == {"identity": 1}
+        assert taipower_transport.bytes_saved == 0
+
+    def test_network_transports(self, monkeypatch):
+        taipower_transport = TaipowerTransport()
+
+        async def transports():
+            async with taipower_transport._async_transports.use() as first:
+                async with taipower_transport._async_transports.use() as second:
+                    pass
+            return first, second
+
+        first, second = asyncio.run(transports())
+        # Concurrent requests of an event loop share one connection pool.
+        assert first is second
+        assert isinstance(first, httpx.AsyncHTTPTransport)
+        assert asyncio.run(transports())[0] is not first
+        assert taipower_transport._sync_transport() is taipower_transport._sync_transport()
+        taipower_transport.finish()
+
+        closed = []
+
+        class Pool:
+            def __init__(self, key):
+                pass
+
+            async def handle_async_request(self, request):
+                await asyncio.sleep(0.01)
+                return httpx.Response(200, json={})
+
+            async def aclose(self):
+                closed.append(self)
+
+        taipower_transport._async_transports._factory = Pool
+
+        async def main():
+            async with httpx.AsyncClient(transport=taipower_transport) as first:
+                client = httpx.AsyncClient(transport=taipower_transport)
+                request = asyncio.ensure_future(first.get("https://example.com/"))
+                await asyncio.sleep(0)
+                # The pool of the loop outlives a client closing while a request of another is in flight.
+                await client.aclose()
+                assert closed == []
+                await request
+                assert len(closed) == 1
+                await first.get("https://example.com/")
+            assert len(closed) == 2
+
+        asyncio.run(main())
+        assert taipower_transport._async_transports._loops == {}
+
+        monkeypatch.setattr(transport, "http2_available", lambda: False)
+        with pytest.raises(ImportError):
+            TaipowerTransport(http2=True)
+        with pytest.raises(ImportError):
+            TaipowerAPI("0900000000", "password", http2=True)
+        # HTTP/2 only applies to the network transports.
+        TaipowerTransport(httpx.MockTransport(payload), http2=True)
+
+    def test_api(self):
+        fleet = TaipowerSyntheticFleet(meters_per_account=2, start=datetime.date(2022, 1, 1), end=datetime.date(2022, 1, 31))
+        accepted = []
+        mock_transport = httpx.MockTransport(gzip_handler(fleet.handler, accepted))
+        # Transports are only wrapped when HTTP/2 or the statistics are asked for.
+        assert TaipowerAPI(fleet.accounts[0], "password", transport=mock_transport).transport is mock_transport
+        assert TaipowerAPI(fleet.accounts[0], "password").transport is None
+        api = TaipowerAPI(fleet.accounts[0], "password", transport=mock_transport, transfer_stats=True)
+        assert isinstance(api.transport, TaipowerTransport)
+        api.login()
+        assert len(api.meters) == 2
+
+        stats = api.transport.stats()
+        assert stats["requests"] == len(accepted)
+        assert stats["bytes_saved"] > 0
+
+        # A shared transport is not wrapped again.
+        assert TaipowerAPI(fleet.accounts[0], "password", transport=api.transport).transport is api.transport
+
+        metrics = TaipowerGateway(api).metrics()
+        assert f'taipower_upstream_responses_total{{http_version="HTTP/2"}} {float(len(accepted))!r}' in metrics
+        assert f"taipower_upstream_compression_saved_bytes_total {float(stats['bytes_saved'])!r}" in metrics
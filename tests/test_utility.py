@@ -1,4 +1,6 @@
-from Taipower.utility import des_decrypt, des_encrypt, get_random_key, roc_year_to_wastern
+import datetime
+
+from Taipower.utility import des_decrypt, des_encrypt, get_random_key, roc_date_to_date, roc_year_to_wastern
 
 class TestUtility:
     def test_get_random_key(self):
@@ -21,3 +23,7 @@ class TestUtility:
         assert roc_year_to_wastern(mock_roc_date) == "2022/03/05"
         mock_roc_date = "1100406"
         assert roc_year_to_wastern(mock_roc_date) == "20210406"
+
+    def test_roc_date_to_date(self):
+        assert roc_date_to_date("109/05/27") == datetime.date(2020, 5, 27)
+        assert roc_date_to_date("1100406") == datetime.date(2021, 4, 6)